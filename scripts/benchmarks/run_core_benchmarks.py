@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Performance regression benchmarks of the core algorithms.
+
+Records the throughput and peak memory of each case to a JSON file, and
+compares them to a baseline:
+
+    python scripts/benchmarks/run_core_benchmarks.py \\
+      --output benchmarks.json --baseline scripts/benchmarks/baseline.json
+
+Exits with status 1 if a case is slower, or uses more memory, than the
+baseline allows. Throughput is the median of --repeats timed calls, and the
+default --tolerance is above the run-to-run variance of a shared host.
+Baselines are machine specific: regenerate baseline.json with --output on
+the reference machine when a change is expected.
+"""
+
+import argparse
+import datetime
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy
+
+from nupic.support.benchmark import (DEFAULT_TOLERANCE, BenchmarkSuite,
+                                     findRegressions, readResults,
+                                     writeResults)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "baseline.json")
+
+suite = BenchmarkSuite()
+
+
+
+def _randomSDRs(numSDRs, size, numActive, seed=42):
+  rng = numpy.random.RandomState(seed)
+  sdrs = numpy.zeros((numSDRs, size), dtype=numpy.uint32)
+  for sdr in sdrs:
+    sdr[rng.choice(size, numActive, replace=False)] = 1
+  return sdrs
+
+
+
+def _sequence(numSteps, sequenceLength=25):
+  return [5.0 + 4.0 * numpy.sin(2 * numpy.pi * (i % sequenceLength) /
+                                sequenceLength)
+          for i in xrange(numSteps)]
+
+
+
+@suite.add("SpatialPooler.compute",
+           params=[dict(imp="cpp", columns=1024),
+                   dict(imp="cpp", columns=4096),
+                   dict(imp="py", columns=1024)],
+           numOps=50)
+def spCompute(imp, columns):
+  if imp == "py":
+    from nupic.algorithms.spatial_pooler import SpatialPooler
+  else:
+    from nupic.bindings.algorithms import SpatialPooler
+  inputSize = 1024
+  sp = SpatialPooler(inputDimensions=[inputSize], columnDimensions=[columns],
+                     potentialPct=0.85, globalInhibition=True,
+                     numActiveColumnsPerInhArea=0.02 * columns,
+                     synPermActiveInc=0.04, synPermInactiveDec=0.005,
+                     boostStrength=3.0, seed=1956)
+  inputs = _randomSDRs(50, inputSize, 40)
+  activeArray = numpy.zeros(columns, dtype=numpy.uint32)
+
+  def run():
+    for inputVector in inputs:
+      sp.compute(inputVector, True, activeArray)
+  return run
+
+
+
+@suite.add("TemporalMemory.compute",
+           params=[dict(imp="cpp", columns=1024),
+                   dict(imp="cpp", columns=2048),
+                   dict(imp="py", columns=1024)],
+           numOps=100)
+def tmCompute(imp, columns):
+  if imp == "py":
+    from nupic.algorithms.temporal_memory import TemporalMemory
+  else:
+    from nupic.bindings.algorithms import TemporalMemory
+  tm = TemporalMemory(columnDimensions=[columns], cellsPerColumn=32,
+                      activationThreshold=13, minThreshold=10,
+                      maxNewSynapseCount=20, seed=1960)
+  # A repeating sequence of 25 patterns, learned during the warm-up call
+  patterns = [numpy.flatnonzero(sdr).astype(numpy.uint32)
+              for sdr in _randomSDRs(25, columns, columns // 50)]
+
+  def run():
+    for i in xrange(100):
+      tm.compute(patterns[i % len(patterns)], learn=True)
+  return run
+
+
+
+@suite.add("SDRClassifier.compute",
+           params=[dict(imp="cpp"), dict(imp="py")],
+           numOps=200)
+def sdrClassifierCompute(imp):
+  from nupic.algorithms.sdr_classifier_factory import SDRClassifierFactory
+  classifier = SDRClassifierFactory.create(steps=[1], alpha=0.1,
+                                           implementation=imp)
+  patterns = [numpy.flatnonzero(sdr).tolist()
+              for sdr in _randomSDRs(25, 4096, 80)]
+  values = _sequence(len(patterns))
+  state = dict(recordNum=0)
+
+  def run():
+    for _ in xrange(200):
+      i = state["recordNum"] % len(patterns)
+      classifier.compute(state["recordNum"], patterns[i],
+                         {"bucketIdx": i, "actValue": values[i]},
+                         learn=True, infer=True)
+      state["recordNum"] += 1
+  return run
+
+
+
+@suite.add("KNNClassifier.infer",
+           params=[dict(numPatterns=100), dict(numPatterns=1000)],
+           numOps=100)
+def knnInfer(numPatterns):
+  from nupic.algorithms.knn_classifier import KNNClassifier
+  classifier = KNNClassifier(k=3)
+  for i, pattern in enumerate(_randomSDRs(numPatterns, 2048, 40)):
+    classifier.learn(pattern, i % 10)
+  queries = _randomSDRs(100, 2048, 40, seed=7)
+
+  def run():
+    for query in queries:
+      classifier.infer(query)
+  return run
+
+
+
+@suite.add("Encoder.encode",
+           params=[dict(encoder="ScalarEncoder"),
+                   dict(encoder="RandomDistributedScalarEncoder"),
+                   dict(encoder="DateEncoder")],
+           numOps=1000)
+def encoderEncode(encoder):
+  if encoder == "ScalarEncoder":
+    from nupic.encoders.scalar import ScalarEncoder
+    instance = ScalarEncoder(w=21, minval=0, maxval=100, n=400)
+    values = [float(i % 100) for i in xrange(1000)]
+  elif encoder == "RandomDistributedScalarEncoder":
+    from nupic.encoders.random_distributed_scalar import (
+      RandomDistributedScalarEncoder)
+    instance = RandomDistributedScalarEncoder(resolution=0.88, n=2048, w=41)
+    values = [float(i % 500) for i in xrange(1000)]
+  else:
+    from nupic.encoders.date import DateEncoder
+    instance = DateEncoder(timeOfDay=(21, 9.49), weekend=21)
+    start = datetime.datetime(2017, 1, 1)
+    values = [start + datetime.timedelta(hours=i) for i in xrange(1000)]
+
+  def run():
+    for value in values:
+      instance.encode(value)
+  return run
+
+
+
+@suite.add("FileRecordStream.getNextRecord",
+           params=[dict(numRecords=10000)],
+           numOps=10000)
+def fileRecordStreamRead(numRecords):
+  from nupic.data.field_meta import FieldMetaInfo
+  from nupic.data.file_record_stream import FileRecordStream
+  tmpDir = tempfile.mkdtemp()
+  path = os.path.join(tmpDir, "data.csv")
+  fields = [FieldMetaInfo("timestamp", "datetime", "T"),
+            FieldMetaInfo("value", "float", ""),
+            FieldMetaInfo("category", "string", "")]
+  start = datetime.datetime(2017, 1, 1)
+  with FileRecordStream(path, write=True, fields=fields) as stream:
+    for i, value in enumerate(_sequence(numRecords)):
+      stream.appendRecord([start + datetime.timedelta(minutes=i), value,
+                           "c%d" % (i % 7)])
+
+  def run():
+    with FileRecordStream(path) as stream:
+      while stream.getNextRecord() is not None:
+        pass
+  return run, lambda: shutil.rmtree(tmpDir)
+
+
+
+@suite.add("AnomalyLikelihood.anomalyProbability",
+           params=[dict(historicWindowSize=8640)],
+           numOps=1000)
+def anomalyLikelihood(historicWindowSize):
+  from nupic.algorithms.anomaly_likelihood import AnomalyLikelihood
+  likelihood = AnomalyLikelihood(historicWindowSize=historicWindowSize)
+  rng = numpy.random.RandomState(42)
+  scores = rng.beta(0.5, 5.0, 1000).tolist()
+  values = _sequence(1000)
+  start = datetime.datetime(2017, 1, 1)
+  timestamps = [start + datetime.timedelta(minutes=5 * i)
+                for i in xrange(1000)]
+
+  def run():
+    for value, score, timestamp in zip(values, scores, timestamps):
+      likelihood.anomalyProbability(value, score, timestamp)
+  return run
+
+
+
+@suite.add("HTMPredictionModel.run",
+           params=[dict(columns=512), dict(columns=2048)],
+           numOps=50)
+def htmPredictionModelRun(columns):
+  from nupic.frameworks.opf.model_factory import ModelFactory
+  description = {
+    "model": "HTMPrediction",
+    "version": 1,
+    "predictAheadTime": None,
+    "modelParams": {
+      "inferenceType": "TemporalMultiStep",
+      "sensorParams": {
+        "verbosity": 0,
+        "sensorAutoReset": None,
+        "encoders": {
+          "value": {"fieldname": "value", "name": "value", "n": 400,
+                    "w": 21, "minval": 0, "maxval": 10, "clipInput": True,
+                    "type": "ScalarEncoder"},
+        },
+      },
+      "spEnable": True,
+      "spParams": {"spVerbosity": 0, "spatialImp": "cpp",
+                   "globalInhibition": 1, "columnCount": columns,
+                   "inputWidth": 0,
+                   "numActiveColumnsPerInhArea": columns // 50,
+                   "seed": 1956, "potentialPct": 0.8,
+                   "synPermConnected": 0.1, "synPermActiveInc": 0.05,
+                   "synPermInactiveDec": 0.01, "boostStrength": 0.0},
+      "tmEnable": True,
+      "tmParams": {"verbosity": 0, "columnCount": columns,
+                   "cellsPerColumn": 32, "inputWidth": columns,
+                   "seed": 1960, "temporalImp": "cpp",
+                   "newSynapseCount": 20, "maxSynapsesPerSegment": 32,
+                   "maxSegmentsPerCell": 128, "initialPerm": 0.21,
+                   "permanenceInc": 0.1, "permanenceDec": 0.1,
+                   "globalDecay": 0.0, "maxAge": 0, "minThreshold": 9,
+                   "activationThreshold": 12, "outputType": "normal",
+                   "pamLength": 1},
+      "clEnable": True,
+      "clParams": {"regionName": "SDRClassifierRegion", "verbosity": 0,
+                   "alpha": 0.1, "steps": "1"},
+      "trainSPNetOnlyIfRequested": False,
+    },
+  }
+  model = ModelFactory.create(description)
+  model.enableInference({"predictedField": "value"})
+  records = [{"value": value} for value in _sequence(50)]
+
+  def run():
+    for record in records:
+      model.run(record)
+  return run
+
+
+
+def main(argv):
+  parser = argparse.ArgumentParser(description=__doc__,
+                                   formatter_class=argparse.RawTextHelpFormatter)
+  parser.add_argument("--filter", default=None,
+                      help="regular expression selecting the cases to run")
+  parser.add_argument("--repeats", type=int, default=9,
+                      help="timed calls per case (default: %(default)s)")
+  parser.add_argument("--output", default=None,
+                      help="JSON file the results are written to")
+  parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                      help="JSON baseline to compare to, or '' to skip the "
+                           "comparison (default: %(default)s)")
+  parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                      help="accepted relative slowdown or memory growth "
+                           "(default: %(default)s)")
+  parser.add_argument("--list", action="store_true",
+                      help="list the cases and exit")
+  args = parser.parse_args(argv)
+
+  if args.list:
+    for case in suite.getCases(args.filter):
+      print case[0]
+    return 0
+
+  def log(message):
+    print message
+    sys.stdout.flush()
+
+  results = suite.run(pattern=args.filter, repeats=args.repeats, log=log)
+  if args.output:
+    writeResults(args.output, results)
+
+  if not args.baseline or not os.path.isfile(args.baseline):
+    return 0
+  regressions = findRegressions(results, readResults(args.baseline),
+                                tolerance=args.tolerance)
+  for caseName, metric, expected, actual in regressions:
+    print "REGRESSION %s %s: baseline %.4g, now %.4g" % (caseName, metric,
+                                                         expected, actual)
+  return 1 if regressions else 0
+
+
+
+if __name__ == "__main__":
+  sys.exit(main(sys.argv[1:]))
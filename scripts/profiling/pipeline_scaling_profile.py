@@ -0,0 +1,131 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""
+Profile a temporal memory pipeline at production scale, over a reproducible
+stream of high-order sequences:
+
+    python scripts/profiling/pipeline_scaling_profile.py --steps 2000000 \\
+      --alphabet 4096 --sequences 2000 --length 30 --branching 4 \\
+      --noise 0.02 --output profile.json
+
+Prints the throughput, resident memory and number of segments and synapses
+at each checkpoint, and writes the profile to a JSON file. With --baseline,
+compares its summary to a profile written earlier.
+"""
+
+import argparse
+import sys
+
+from nupic.data.generators.high_order_sequence_generator import (
+  HighOrderSequenceGenerator)
+from nupic.support.pipeline_profile import (readProfile, runPipelineProfile,
+                                            writeProfile)
+
+
+
+def main(argv):
+  parser = argparse.ArgumentParser(description=__doc__,
+                                   formatter_class=argparse.RawTextHelpFormatter)
+  parser.add_argument("--steps", type=int, default=1000000,
+                      help="number of steps (default: %(default)s)")
+  parser.add_argument("--checkpoint-interval", type=int, default=10000,
+                      help="steps between checkpoints (default: %(default)s)")
+  parser.add_argument("--alphabet", type=int, default=1000,
+                      help="number of symbols (default: %(default)s)")
+  parser.add_argument("--sequences", type=int, default=100,
+                      help="number of sequences (default: %(default)s)")
+  parser.add_argument("--length", type=int, default=20,
+                      help="elements per sequence (default: %(default)s)")
+  parser.add_argument("--branching", type=int, default=2,
+                      help="sequences sharing their middle elements "
+                           "(default: %(default)s)")
+  parser.add_argument("--noise", type=float, default=0.0,
+                      help="probability of replacing an element by a random "
+                           "symbol (default: %(default)s)")
+  parser.add_argument("--bits", type=int, default=2048,
+                      help="bits per pattern (default: %(default)s)")
+  parser.add_argument("--active-bits", type=int, default=40,
+                      help="on bits per pattern (default: %(default)s)")
+  parser.add_argument("--columns", type=int, default=2048,
+                      help="spatial pooler columns (default: %(default)s)")
+  parser.add_argument("--cells", type=int, default=32,
+                      help="cells per column (default: %(default)s)")
+  parser.add_argument("--sp", action="store_true",
+                      help="feed the patterns through a spatial pooler")
+  parser.add_argument("--no-classifier", action="store_true",
+                      help="do not run an SDR classifier")
+  parser.add_argument("--resets", action="store_true",
+                      help="reset the temporal memory at each sequence")
+  parser.add_argument("--implementation", choices=["cpp", "py"],
+                      default="cpp",
+                      help="algorithms implementation (default: %(default)s)")
+  parser.add_argument("--seed", type=int, default=42,
+                      help="seed of the stream (default: %(default)s)")
+  parser.add_argument("--output", default=None,
+                      help="JSON file the profile is written to")
+  parser.add_argument("--baseline", default=None,
+                      help="JSON profile to compare the summary to")
+  args = parser.parse_args(argv)
+
+  generator = HighOrderSequenceGenerator(alphabetSize=args.alphabet,
+                                         numSequences=args.sequences,
+                                         sequenceLength=args.length,
+                                         branching=args.branching,
+                                         noise=args.noise,
+                                         n=args.bits,
+                                         w=args.active_bits,
+                                         seed=args.seed)
+
+  def log(message):
+    print message
+    sys.stdout.flush()
+
+  profile = runPipelineProfile(generator, args.steps,
+                               checkpointInterval=args.checkpoint_interval,
+                               columnCount=args.columns,
+                               cellsPerColumn=args.cells,
+                               useSpatialPooler=args.sp,
+                               useClassifier=not args.no_classifier,
+                               useResets=args.resets,
+                               implementation=args.implementation,
+                               log=log)
+  if args.output:
+    writeProfile(args.output, profile)
+
+  summary = profile["summary"]
+  baseline = readProfile(args.baseline)["summary"] if args.baseline else {}
+  for key in sorted(summary):
+    if key in baseline:
+      print "%s: %.4g (baseline %.4g)" % (key, summary[key], baseline[key])
+    else:
+      print "%s: %.4g" % (key, summary[key])
+  for stage, stats in sorted(profile["latency"].iteritems()):
+    print "%s latency: p50 %.3g ms, p99 %.3g ms, p99.9 %.3g ms" % (
+      stage, stats["p50Secs"] * 1000, stats["p99Secs"] * 1000,
+      stats["p999Secs"] * 1000)
+  return 0
+
+
+
+if __name__ == "__main__":
+  sys.exit(main(sys.argv[1:]))
@@ -93,6 +93,13 @@ def runPermutations(args):
     help="Replace existing csv report file if it exists. Default is to "
          "append to the existing file. [default: %default].")
 
+  parser.add_option(
+    "--resumeReport", dest="resumeReport", action="store_true",
+    default=DEFAULT_OPTIONS["resumeReport"],
+    help="Continue the existing report of the same search after the last "
+         "model that had finished when it was written, rather than "
+         "reporting on all the models again [default: %default].")
+
   parser.add_option(
     "--action", dest="action", default=DEFAULT_OPTIONS["action"],
     choices=["run", "pickup", "report", "dryRun"],
@@ -124,12 +131,41 @@ def runPermutations(args):
     default=DEFAULT_OPTIONS["useTerminators"], help="Use early model terminators in HyperSearch"
          "[default: %default].")
 
+  parser.add_option(
+    "--earlyStopping", dest="earlyStopping",
+    default=DEFAULT_OPTIONS["earlyStopping"],
+    choices=["none", "halving", "median"],
+    help="Stop models that fall behind the other models of their swarm at "
+         "record milestones. halving: asynchronous successive halving. "
+         "median: median stopping rule. [default: the "
+         "nupic.hypersearch.earlyStopping.policy configuration property].")
+
+  parser.add_option(
+    "--particleProposal", dest="particleProposal",
+    default=DEFAULT_OPTIONS["particleProposal"],
+    choices=["pso", "tpe"],
+    help="How particles choose their next position. pso: particle swarm "
+         "velocity update. tpe: the most promising of several candidate "
+         "positions according to a Tree-structured Parzen Estimator fitted "
+         "over the results of the swarm. [default: the "
+         "nupic.hypersearch.particleProposal.strategy configuration "
+         "property].")
+
   parser.add_option(
       "--maxWorkers", dest="maxWorkers", default=DEFAULT_OPTIONS["maxWorkers"],
       type="int",
       help="Maximum number of concurrent workers to launch. Applies only to "
       "the 'run' action. [default: %default].")
 
+  parser.add_option(
+    "--executor", dest="executor", default=DEFAULT_OPTIONS["executor"],
+    choices=["workers", "local"],
+    help="How models are evaluated. workers: launch Hypersearch worker "
+         "processes that coordinate through the jobs database. local: run "
+         "the search in this process with a pool of maxWorkers worker "
+         "processes and no jobs database; such searches can't be picked up "
+         "or reported on later. [default: %default].")
+
   parser.add_option(
     "-v", dest="verbosityCount", action="count", default=0,
     help="Increase verbosity of the output.  Specify multiple times for "
@@ -120,6 +120,7 @@ import numbers
 import numpy
 
 from nupic.serializable import Serializable
+from nupic.support.memory_usage import getObjectSize
 from nupic.utils import MovingAverage
 
 
@@ -398,6 +399,21 @@ class AnomalyLikelihood(Serializable):
     return likelihood
 
 
+  def getMemoryUsage(self):
+    """
+    :returns: (dict) number of bytes used by the ``history`` of
+              (timestamp, value, anomalyScore) records, by the estimated
+              ``distribution`` with its moving average window, and by
+              everything else (``other``)
+    """
+    return {
+      "history": getObjectSize(self._historicalScores),
+      "distribution": getObjectSize(self._distribution),
+      "other": getObjectSize(self, exclude=[self._historicalScores,
+                                            self._distribution]),
+    }
+
+
 
 def estimateAnomalyLikelihoods(anomalyScores,
                                averagingWindow=10,
@@ -19,8 +19,13 @@
 # http://numenta.org/licenses/
 # ----------------------------------------------------------------------
 
+import sys
 from bisect import bisect_left
 from collections import defaultdict
+from itertools import izip
+from operator import attrgetter
+
+import numpy
 
 from nupic.serializable import Serializable
 
@@ -410,6 +415,43 @@ class Connections(Serializable):
     return self._numSynapses
 
 
+  def getMemoryUsage(self):
+    """
+    Returns the number of bytes used by the Python objects of each component
+    of the connections: ``cells`` (cell records and their segment lists),
+    ``segments`` (segment objects, their synapse sets and the flat segment
+    list), ``synapses`` (synapse objects, with their permanence and ordinal)
+    and ``presynapticIndex`` (the synapses of each presynaptic cell). Runs in
+    time linear in the number of segments.
+
+    :returns: (dict) number of bytes used by each component
+    """
+    cellsSize = sys.getsizeof(self._cells)
+    segmentsSize = (sys.getsizeof(self._segmentForFlatIdx) +
+                    sys.getsizeof(self._freeFlatIdxs))
+    for cellData in self._cells:
+      cellsSize += sys.getsizeof(cellData) + sys.getsizeof(cellData._segments)
+      for segment in cellData._segments:
+        segmentsSize += (sys.getsizeof(segment) +
+                         sys.getsizeof(segment._synapses) +
+                         sys.getsizeof(segment._ordinal))
+
+    # Synapses all have the same size
+    synapseSize = (sys.getsizeof(Synapse(None, 0, 0.0, long(0))) +
+                   sys.getsizeof(0.0) + sys.getsizeof(self._nextSynapseOrdinal))
+
+    presynapticIndexSize = sys.getsizeof(self._synapsesForPresynapticCell)
+    for synapses in self._synapsesForPresynapticCell.itervalues():
+      presynapticIndexSize += sys.getsizeof(synapses)
+
+    return {
+      "cells": cellsSize,
+      "segments": segmentsSize,
+      "synapses": self._numSynapses * synapseSize,
+      "presynapticIndex": presynapticIndexSize,
+    }
+
+
   def segmentPositionSortKey(self, segment):
     """ 
     Return a numeric key for sorting this segment. This can be used with the 
@@ -422,25 +464,137 @@ class Connections(Serializable):
     return segment.cell + (segment._ordinal / float(self._nextSegmentOrdinal))
 
 
+  def idxOnCellForFlatIdx(self):
+    """
+    Returns the index of every segment on its cell, i.e. the ``idx`` that
+    :meth:`getSegment` takes, in linear time.
+
+    :returns: (list) index of the segment on its cell at each ``flatIdx``; -1
+              for the flatIdxs of destroyed segments
+    """
+    idxOnCell = [-1] * self._nextFlatIdx
+    for cellData in self._cells:
+      for idx, segment in enumerate(cellData._segments):
+        idxOnCell[segment.flatIdx] = idx
+    return idxOnCell
+
+
+  def toArrays(self):
+    """
+    Returns the connections as flat arrays. Segments are listed cell by cell,
+    in the order of :meth:`segmentsForCell`, and synapses segment by segment,
+    oldest first.
+
+    :returns: (dict) with the following numpy arrays:
+              ``segmentCells``: the cell of each segment
+              ``numSynapsesForSegment``: the number of synapses of each segment
+              ``presynapticCells``: the presynaptic cell of each synapse
+              ``permanences``: the permanence of each synapse
+    """
+    segmentCells = []
+    numSynapsesForSegment = []
+    presynapticCells = []
+    permanences = []
+    ordinalKey = attrgetter("_ordinal")
+
+    for cell, cellData in enumerate(self._cells):
+      for segment in cellData._segments:
+        synapses = sorted(segment._synapses, key=ordinalKey)
+        segmentCells.append(cell)
+        numSynapsesForSegment.append(len(synapses))
+        presynapticCells.extend([synapse.presynapticCell
+                                 for synapse in synapses])
+        permanences.extend([synapse.permanence for synapse in synapses])
+
+    return dict(
+      segmentCells=numpy.array(segmentCells, dtype=numpy.uint32),
+      numSynapsesForSegment=numpy.array(numSynapsesForSegment,
+                                        dtype=numpy.uint32),
+      presynapticCells=numpy.array(presynapticCells, dtype=numpy.uint32),
+      permanences=numpy.array(permanences, dtype=numpy.float64))
+
+
+  @classmethod
+  def fromArrays(cls, numCells, segmentCells, numSynapsesForSegment,
+                 presynapticCells, permanences):
+    """
+    Creates an instance from the flat arrays returned by :meth:`toArrays`.
+    Segments get their position in ``segmentCells`` as ``flatIdx``.
+
+    :param numCells: (int) Number of cells in collection.
+    :param segmentCells: (sequence) cell of each segment
+    :param numSynapsesForSegment: (sequence) number of synapses of each segment
+    :param presynapticCells: (sequence) presynaptic cell of each synapse
+    :param permanences: (sequence) permanence of each synapse
+
+    :returns: (:class:`Connections`) instance
+    """
+    #pylint: disable=W0212
+    connections = cls(numCells)
+    cells = connections._cells
+    segmentForFlatIdx = connections._segmentForFlatIdx
+    synapsesForPresynapticCell = connections._synapsesForPresynapticCell
+
+    segmentCells = numpy.asarray(segmentCells).tolist()
+    synapseEnds = numpy.cumsum(numSynapsesForSegment, dtype=numpy.int64)
+    presynapticCells = numpy.asarray(presynapticCells).tolist()
+    permanences = numpy.asarray(permanences, dtype=numpy.float64).tolist()
+
+    synapseIdx = 0
+    for flatIdx, (cell, end) in enumerate(izip(segmentCells,
+                                               synapseEnds.tolist())):
+      segment = Segment(cell, flatIdx, long(flatIdx))
+      cells[cell]._segments.append(segment)
+      segmentForFlatIdx.append(segment)
+
+      synapses = segment._synapses
+      while synapseIdx < end:
+        presynapticCell = presynapticCells[synapseIdx]
+        synapse = Synapse(segment, presynapticCell, permanences[synapseIdx],
+                          long(synapseIdx))
+        synapses.add(synapse)
+        synapsesForPresynapticCell[presynapticCell].add(synapse)
+        synapseIdx += 1
+
+    connections._nextFlatIdx = len(segmentCells)
+    connections._nextSegmentOrdinal = long(len(segmentCells))
+    connections._nextSynapseOrdinal = long(synapseIdx)
+    connections._numSynapses = synapseIdx
+    #pylint: enable=W0212
+    return connections
+
+
   def write(self, proto):
     """ 
     Writes serialized data to proto object.
 
     :param proto: (DynamicStructBuilder) Proto object
     """
+    arrays = self.toArrays()
+    numSynapsesForSegment = arrays["numSynapsesForSegment"].tolist()
+    presynapticCells = arrays["presynapticCells"].tolist()
+    permanences = arrays["permanences"].tolist()
+
     protoCells = proto.init('cells', self.numCells)
+    numSegmentsForCell = numpy.bincount(
+      arrays["segmentCells"], minlength=self.numCells).tolist()
 
-    for i in xrange(self.numCells):
-      segments = self._cells[i]._segments
-      protoSegments = protoCells[i].init('segments', len(segments))
+    segmentIdx = 0
+    synapseIdx = 0
+    for cell, numSegments in enumerate(numSegmentsForCell):
+      if numSegments == 0:
+        continue
+      protoSegments = protoCells[cell].init('segments', numSegments)
 
-      for j, segment in enumerate(segments):
-        synapses = segment._synapses
-        protoSynapses = protoSegments[j].init('synapses', len(synapses))
+      for protoSegment in protoSegments:
+        numSynapses = numSynapsesForSegment[segmentIdx]
+        segmentIdx += 1
+        protoSynapses = protoSegment.init('synapses', numSynapses)
 
-        for k, synapse in enumerate(sorted(synapses, key=lambda s: s._ordinal)):
-          protoSynapses[k].presynapticCell = synapse.presynapticCell
-          protoSynapses[k].permanence = synapse.permanence
+        for protoSynapse in protoSynapses:
+          protoSynapse.presynapticCell = presynapticCells[synapseIdx]
+          protoSynapse.permanence = permanences[synapseIdx]
+          synapseIdx += 1
 
 
   @classmethod
@@ -452,40 +606,23 @@ class Connections(Serializable):
 
     :returns: (:class:`Connections`) instance
     """
-    #pylint: disable=W0212
     protoCells = proto.cells
-    connections = cls(len(protoCells))
+    segmentCells = []
+    numSynapsesForSegment = []
+    presynapticCells = []
+    permanences = []
 
     for cellIdx, protoCell in enumerate(protoCells):
-      protoCell = protoCells[cellIdx]
-      protoSegments = protoCell.segments
-      connections._cells[cellIdx] = CellData()
-      segments = connections._cells[cellIdx]._segments
-
-      for segmentIdx, protoSegment in enumerate(protoSegments):
-        segment = Segment(cellIdx, connections._nextFlatIdx,
-                          connections._nextSegmentOrdinal)
-
-        segments.append(segment)
-        connections._segmentForFlatIdx.append(segment)
-        connections._nextFlatIdx += 1
-        connections._nextSegmentOrdinal += 1
-
-        synapses = segment._synapses
+      for protoSegment in protoCell.segments:
         protoSynapses = protoSegment.synapses
-
-        for synapseIdx, protoSynapse in enumerate(protoSynapses):
-          presynapticCell = protoSynapse.presynapticCell
-          synapse = Synapse(segment, presynapticCell, protoSynapse.permanence,
-                            ordinal=connections._nextSynapseOrdinal)
-          connections._nextSynapseOrdinal += 1
-          synapses.add(synapse)
-          connections._synapsesForPresynapticCell[presynapticCell].add(synapse)
-
-          connections._numSynapses += 1
-
-    #pylint: enable=W0212
-    return connections
+        segmentCells.append(cellIdx)
+        numSynapsesForSegment.append(len(protoSynapses))
+        for protoSynapse in protoSynapses:
+          presynapticCells.append(protoSynapse.presynapticCell)
+          permanences.append(protoSynapse.permanence)
+
+    return cls.fromArrays(len(protoCells), segmentCells, numSynapsesForSegment,
+                          presynapticCells, permanences)
 
 
   def __eq__(self, other):
@@ -26,6 +26,7 @@ import numpy
 from nupic.bindings.math import (NearestNeighbor, min_score_per_category)
 
 from nupic.serializable import Serializable
+from nupic.support.memory_usage import getObjectSize
 
 try:
   import capnp
@@ -373,6 +374,7 @@ class KNNClassifier(Serializable):
       # Delete backwards
       for rowIndex in rowsToRemove[::-1]:
         self._Memory.deleteRow(rowIndex)
+      self._protoSizes = None     # need to re-compute
     else:
       self._M = numpy.delete(self._M, removalArray, 0)
 
@@ -911,6 +913,26 @@ class KNNClassifier(Serializable):
     return self._partitionIdMap.get(partitionId, [])
 
 
+  def getMemoryUsage(self):
+    """
+    :returns: (dict) number of bytes used by each component of the
+        classifier: the stored ``patterns`` (dense array or sparse
+        NearestNeighbor matrix), their ``categories`` and partition ids, the
+        ``svd`` projection, and everything else (``other``)
+    """
+    patterns = (self._Memory, self._M)
+    categories = (self._categoryList, self._partitionIdList,
+                  self._partitionIdMap,
+                  getattr(self, "_categoryRecencyList", None))
+    svd = (self._s, self._vt, self._mean)
+    return {
+      "patterns": getObjectSize(patterns),
+      "categories": getObjectSize(categories),
+      "svd": getObjectSize(svd),
+      "other": getObjectSize(self, exclude=patterns + categories + svd),
+    }
+
+
   def _addPartitionId(self, index, partitionId=None):
     """
     Adds partition id for pattern index
@@ -55,7 +55,8 @@ class Metric(object):
   def createFromTrace(trace, excludeResets=None):
     data = list(trace.data)
     if excludeResets is not None:
-      data = [x for i, x in enumerate(trace.data) if not excludeResets.data[i]]
+      data = [x for x, reset in zip(trace.data, excludeResets.data)
+              if not reset]
     return Metric(trace.monitor, trace.title, data)
 
 
@@ -95,3 +96,59 @@ class Metric(object):
             round(self.min, sigFigs),
             round(self.max, sigFigs),
             round(self.sum, sigFigs)]
+
+
+
+class MetricAccumulator(object):
+  """
+  Computes a `Metric` incrementally, one value at a time, in constant memory.
+  """
+
+  def __init__(self, monitor, title):
+    """
+    @param monitor (MonitorMixinBase) Monitor Mixin instance that generated
+                                      this metric
+    @param title   (string)           Title
+    """
+    self.monitor = monitor
+    self.title = title
+
+    self._count = 0
+    self._min = None
+    self._max = None
+    self._sum = 0
+    self._mean = 0.0
+    self._sumSquaredDeviations = 0.0
+
+
+  def add(self, value):
+    """
+    @param value (number) Value to add to the metric
+    """
+    self._count += 1
+    if self._count == 1:
+      self._min = self._max = value
+    else:
+      self._min = min(self._min, value)
+      self._max = max(self._max, value)
+    self._sum += value
+
+    # Welford's online variance
+    delta = value - self._mean
+    self._mean += delta / float(self._count)
+    self._sumSquaredDeviations += delta * (value - self._mean)
+
+
+  def getMetric(self):
+    """
+    @return (Metric) Metric over the values added so far
+    """
+    metric = Metric(self.monitor, self.title, [])
+    if self._count > 0:
+      metric.min = self._min
+      metric.max = self._max
+      metric.sum = self._sum
+      metric.mean = self._mean
+      metric.standardDeviation = (self._sumSquaredDeviations /
+                                  self._count) ** 0.5
+    return metric
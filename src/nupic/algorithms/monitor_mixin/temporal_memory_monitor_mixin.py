@@ -23,14 +23,29 @@
 Temporal Memory mixin that enables detailed monitoring of history.
 """
 
-import copy
 from collections import defaultdict
-from nupic.algorithms.monitor_mixin.metric import Metric
+from nupic.algorithms.monitor_mixin.metric import Metric, MetricAccumulator
 from nupic.algorithms.monitor_mixin.monitor_mixin_base import MonitorMixinBase
 from prettytable import PrettyTable
 
 from nupic.algorithms.monitor_mixin.trace import (IndicesTrace, CountsTrace,
-                                                  BoolsTrace, StringsTrace)
+                                                  BoolsTrace, StringsTrace,
+                                                  PackedIndicesTrace)
+
+
+# Titles of the transition traces
+_TRANSITION_TITLES = (
+  ("predictedActiveCells", "predicted => active cells (correct)"),
+  ("predictedInactiveCells", "predicted => inactive cells (extra)"),
+  ("predictedActiveColumns", "predicted => active columns (correct)"),
+  ("predictedInactiveColumns", "predicted => inactive columns (extra)"),
+  ("unpredictedActiveColumns", "unpredicted => active columns (bursting)"),
+)
+
+# Traces of the default metrics, excluding resets
+_METRIC_TRACE_NAMES = ("activeColumns", "predictedActiveColumns",
+                       "predictedInactiveColumns", "unpredictedActiveColumns",
+                       "predictedActiveCells", "predictedInactiveCells")
 
 
 
@@ -38,14 +53,62 @@ class TemporalMemoryMonitorMixin(MonitorMixinBase):
   """
   Mixin for TemporalMemory that stores a detailed history, for inspection and
   debugging.
+
+  By default the whole history is kept. To leave monitoring on in long runs,
+  call `mmEnableStreaming` to keep a bounded history, in compact form, and
+  to record only a sample of the iterations.
   """
 
   def __init__(self, *args, **kwargs):
+    self._mmHistoryLength = None
+    self._mmSampleInterval = 1
+    self._mmIteration = 0
+
     super(TemporalMemoryMonitorMixin, self).__init__(*args, **kwargs)
 
     self._mmResetActive = True  # First iteration is always a reset
 
 
+  def mmEnableStreaming(self, historyLength=1000, sampleInterval=1):
+    """
+    Switches to streaming mode, and clears the history. In streaming mode:
+
+    - traces keep the last `historyLength` recorded iterations, with cells
+      and columns stored as packed bitsets;
+    - transition traces and default metrics are updated at each recorded
+      iteration instead of being recomputed over the history; metrics cover
+      all the recorded iterations since the history was cleared;
+    - only one iteration in `sampleInterval` is recorded.
+
+    @param historyLength  (int) Number of recorded iterations kept in traces
+    @param sampleInterval (int) Record one iteration in `sampleInterval`
+    """
+    if historyLength < 1:
+      raise ValueError("historyLength must be at least 1")
+    if sampleInterval < 1:
+      raise ValueError("sampleInterval must be at least 1")
+
+    self._mmHistoryLength = historyLength
+    self._mmSampleInterval = sampleInterval
+    self.mmClearHistory()
+
+
+  def mmDisableStreaming(self):
+    """
+    Switches back to keeping the whole history, and clears the history.
+    """
+    self._mmHistoryLength = None
+    self._mmSampleInterval = 1
+    self.mmClearHistory()
+
+
+  def mmIsStreaming(self):
+    """
+    @return (bool) True if in streaming mode
+    """
+    return self._mmHistoryLength is not None
+
+
   def mmGetTraceActiveColumns(self):
     """
     @return (Trace) Trace of active columns
@@ -128,6 +191,13 @@ class TemporalMemoryMonitorMixin(MonitorMixinBase):
     return self._mmTraces["unpredictedActiveColumns"]
 
 
+  def mmGetTraceActiveCells(self):
+    """
+    @return (Trace) Trace of active cells
+    """
+    return self._mmTraces["activeCells"]
+
+
   def mmGetMetricFromTrace(self, trace):
     """
     Convenience method to compute a metric over an indices trace, excluding
@@ -271,75 +341,118 @@ class TemporalMemoryMonitorMixin(MonitorMixinBase):
       return
 
     self._mmData["predictedActiveCellsForSequence"] = defaultdict(set)
+    self._mmCreateTransitionTraces()
 
-    self._mmTraces["predictedActiveCells"] = IndicesTrace(self,
-      "predicted => active cells (correct)")
-    self._mmTraces["predictedInactiveCells"] = IndicesTrace(self,
-      "predicted => inactive cells (extra)")
-    self._mmTraces["predictedActiveColumns"] = IndicesTrace(self,
-      "predicted => active columns (correct)")
-    self._mmTraces["predictedInactiveColumns"] = IndicesTrace(self,
-      "predicted => inactive columns (extra)")
-    self._mmTraces["unpredictedActiveColumns"] = IndicesTrace(self,
-      "unpredicted => active columns (bursting)")
-
-    predictedCellsTrace = self._mmTraces["predictedCells"]
-
-    for i, activeColumns in enumerate(self.mmGetTraceActiveColumns().data):
-      predictedActiveCells = set()
-      predictedInactiveCells = set()
-      predictedActiveColumns = set()
-      predictedInactiveColumns = set()
-
-      for predictedCell in predictedCellsTrace.data[i]:
-        predictedColumn = self.columnForCell(predictedCell)
-
-        if predictedColumn  in activeColumns:
-          predictedActiveCells.add(predictedCell)
-          predictedActiveColumns.add(predictedColumn)
-
-          sequenceLabel = self.mmGetTraceSequenceLabels().data[i]
-          if sequenceLabel is not None:
-            self._mmData["predictedActiveCellsForSequence"][sequenceLabel].add(
-              predictedCell)
-        else:
-          predictedInactiveCells.add(predictedCell)
-          predictedInactiveColumns.add(predictedColumn)
-
-      unpredictedActiveColumns = activeColumns - predictedActiveColumns
-
-      self._mmTraces["predictedActiveCells"].data.append(predictedActiveCells)
-      self._mmTraces["predictedInactiveCells"].data.append(predictedInactiveCells)
-      self._mmTraces["predictedActiveColumns"].data.append(predictedActiveColumns)
-      self._mmTraces["predictedInactiveColumns"].data.append(
-        predictedInactiveColumns)
-      self._mmTraces["unpredictedActiveColumns"].data.append(
-        unpredictedActiveColumns)
+    for activeColumns, predictedCells, sequenceLabel in zip(
+        self.mmGetTraceActiveColumns().data,
+        self._mmTraces["predictedCells"].data,
+        self.mmGetTraceSequenceLabels().data):
+      self._mmAddTransitions(activeColumns, predictedCells, sequenceLabel)
 
     self._mmTransitionTracesStale = False
 
 
+  def _mmCreateTransitionTraces(self):
+    for name, title in _TRANSITION_TITLES:
+      self._mmTraces[name] = self._mmCreateIndicesTrace(title,
+                                                        name.endswith("Cells"))
+
+
+  def _mmAddTransitions(self, activeColumns, predictedCells, sequenceLabel):
+    """
+    Appends one iteration to the transition traces.
+
+    @return (dict) Transition trace name => indices appended to it
+    """
+    predictedActiveCells = set()
+    predictedInactiveCells = set()
+    predictedActiveColumns = set()
+    predictedInactiveColumns = set()
+
+    for predictedCell in predictedCells:
+      predictedColumn = self.columnForCell(predictedCell)
+
+      if predictedColumn in activeColumns:
+        predictedActiveCells.add(predictedCell)
+        predictedActiveColumns.add(predictedColumn)
+
+        if sequenceLabel is not None:
+          self._mmData["predictedActiveCellsForSequence"][sequenceLabel].add(
+            predictedCell)
+      else:
+        predictedInactiveCells.add(predictedCell)
+        predictedInactiveColumns.add(predictedColumn)
+
+    transitions = {
+      "predictedActiveCells": predictedActiveCells,
+      "predictedInactiveCells": predictedInactiveCells,
+      "predictedActiveColumns": predictedActiveColumns,
+      "predictedInactiveColumns": predictedInactiveColumns,
+      "unpredictedActiveColumns": set(activeColumns) - predictedActiveColumns,
+    }
+    for name, indices in transitions.iteritems():
+      self._mmTraces[name].data.append(indices)
+
+    return transitions
+
+
+  def _mmCreateIndicesTrace(self, title, ofCells):
+    """
+    @param title   (string) Title
+    @param ofCells (bool)   True for a trace of cells, False for columns
+
+    @return (IndicesTrace) New trace; packed and bounded in streaming mode
+    """
+    if self._mmHistoryLength is None:
+      return IndicesTrace(self, title)
+    numIndices = self.numberOfCells() if ofCells else self.numberOfColumns()
+    return PackedIndicesTrace(self, title, numIndices,
+                              maxLength=self._mmHistoryLength)
+
+
   # ==============================
   # Overrides
   # ==============================
   def compute(self, activeColumns, sequenceLabel=None, **kwargs):
+    record = self._mmIteration % self._mmSampleInterval == 0
+    self._mmIteration += 1
+    if not record:
+      super(TemporalMemoryMonitorMixin, self).compute(activeColumns, **kwargs)
+      self._mmResetActive = False
+      return
+
     # Append last cycle's predictiveCells to *predicTEDCells* trace
-    self._mmTraces["predictedCells"].data.append(set(self.getPredictiveCells()))
+    predictedCells = set(self.getPredictiveCells())
+    self._mmTraces["predictedCells"].data.append(predictedCells)
 
     super(TemporalMemoryMonitorMixin, self).compute(activeColumns, **kwargs)
 
     # Append this cycle's predictiveCells to *predicTIVECells* trace
     self._mmTraces["predictiveCells"].data.append(set(self.getPredictiveCells()))
 
+    numSegments = self.connections.numSegments()
+    numSynapses = self.connections.numSynapses()
     self._mmTraces["activeCells"].data.append(set(self.getActiveCells()))
     self._mmTraces["activeColumns"].data.append(activeColumns)
-    self._mmTraces["numSegments"].data.append(self.connections.numSegments())
-    self._mmTraces["numSynapses"].data.append(self.connections.numSynapses())
+    self._mmTraces["numSegments"].data.append(numSegments)
+    self._mmTraces["numSynapses"].data.append(numSynapses)
     self._mmTraces["sequenceLabels"].data.append(sequenceLabel)
     self._mmTraces["resets"].data.append(self._mmResetActive)
-    self._mmResetActive = False
 
-    self._mmTransitionTracesStale = True
+    if self._mmHistoryLength is None:
+      self._mmTransitionTracesStale = True
+    else:
+      # Streaming: update the transition traces and the metrics now
+      counts = self._mmAddTransitions(activeColumns, predictedCells,
+                                      sequenceLabel)
+      counts["activeColumns"] = activeColumns
+      if not self._mmResetActive:
+        for name in _METRIC_TRACE_NAMES:
+          self._mmData["metrics"][name].add(len(counts[name]))
+      self._mmData["metrics"]["numSegments"].add(numSegments)
+      self._mmData["metrics"]["numSynapses"].add(numSynapses)
+
+    self._mmResetActive = False
 
 
   def reset(self):
@@ -370,6 +483,14 @@ class TemporalMemoryMonitorMixin(MonitorMixinBase):
 
 
   def mmGetDefaultMetrics(self, verbosity=1):
+    if self._mmHistoryLength is not None:
+      metrics = self._mmData["metrics"]
+      return ([metrics[name].getMetric()
+               for name in _METRIC_TRACE_NAMES + ("numSegments",
+                                                  "numSynapses")] +
+              [self.mmGetMetricSequencesPredictedActiveCellsPerColumn(),
+               self.mmGetMetricSequencesPredictedActiveCellsShared()])
+
     resetsTrace = self.mmGetTraceResets()
     return ([Metric.createFromTrace(trace, excludeResets=resetsTrace)
               for trace in self.mmGetDefaultTraces()[:-3]] +
@@ -382,15 +503,36 @@ class TemporalMemoryMonitorMixin(MonitorMixinBase):
   def mmClearHistory(self):
     super(TemporalMemoryMonitorMixin, self).mmClearHistory()
 
-    self._mmTraces["predictedCells"] = IndicesTrace(self, "predicted cells")
-    self._mmTraces["activeColumns"] = IndicesTrace(self, "active columns")
-    self._mmTraces["activeCells"] = IndicesTrace(self, "active cells")
-    self._mmTraces["predictiveCells"] = IndicesTrace(self, "predictive cells")
-    self._mmTraces["numSegments"] = CountsTrace(self, "# segments")
-    self._mmTraces["numSynapses"] = CountsTrace(self, "# synapses")
-    self._mmTraces["sequenceLabels"] = StringsTrace(self, "sequence labels")
-    self._mmTraces["resets"] = BoolsTrace(self, "resets")
-    self._mmTransitionTracesStale = True
+    maxLength = self._mmHistoryLength
+    self._mmTraces["predictedCells"] = self._mmCreateIndicesTrace(
+      "predicted cells", True)
+    self._mmTraces["activeColumns"] = self._mmCreateIndicesTrace(
+      "active columns", False)
+    self._mmTraces["activeCells"] = self._mmCreateIndicesTrace(
+      "active cells", True)
+    self._mmTraces["predictiveCells"] = self._mmCreateIndicesTrace(
+      "predictive cells", True)
+    self._mmTraces["numSegments"] = CountsTrace(self, "# segments", maxLength)
+    self._mmTraces["numSynapses"] = CountsTrace(self, "# synapses", maxLength)
+    self._mmTraces["sequenceLabels"] = StringsTrace(self, "sequence labels",
+                                                    maxLength)
+    self._mmTraces["resets"] = BoolsTrace(self, "resets", maxLength)
+    self._mmIteration = 0
+
+    if maxLength is None:
+      self._mmTransitionTracesStale = True
+    else:
+      # Streaming: transition traces and metrics are updated by compute
+      self._mmData["predictedActiveCellsForSequence"] = defaultdict(set)
+      self._mmCreateTransitionTraces()
+      titles = dict((name, "# " + self._mmTraces[name].title)
+                    for name in _METRIC_TRACE_NAMES)
+      titles["numSegments"] = self._mmTraces["numSegments"].title
+      titles["numSynapses"] = self._mmTraces["numSynapses"].title
+      self._mmData["metrics"] = dict(
+        (name, MetricAccumulator(self, title))
+        for name, title in titles.iteritems())
+      self._mmTransitionTracesStale = False
 
 
   def mmGetCellActivityPlot(self, title="", showReset=False,
@@ -417,9 +559,8 @@ class TemporalMemoryMonitorMixin(MonitorMixinBase):
     if activityType == "predictedActiveCells":
       self._mmComputeTransitionTraces()
 
-    cellTrace = copy.deepcopy(self._mmTraces[activityType].data)
-    for i in xrange(len(cellTrace)):
-      cellTrace[i] = self.getCellIndices(cellTrace[i])
+    cellTrace = [self.getCellIndices(cells)
+                 for cells in self._mmTraces[activityType].data]
 
     return self.mmGetCellTracePlot(cellTrace, self.numberOfCells(),
                                    activityType, title, showReset,
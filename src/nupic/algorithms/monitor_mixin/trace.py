@@ -24,6 +24,7 @@ Trace classes used in monitor mixin framework.
 """
 
 import abc
+from collections import deque
 
 import numpy
 
@@ -37,16 +38,18 @@ class Trace(object):
   __metaclass__ = abc.ABCMeta
 
 
-  def __init__(self, monitor, title):
+  def __init__(self, monitor, title, maxLength=None):
     """
-    @param monitor (MonitorMixinBase) Monitor Mixin instance that generated
-                                      this trace
-    @param title   (string)           Title
+    @param monitor   (MonitorMixinBase) Monitor Mixin instance that generated
+                                        this trace
+    @param title     (string)           Title
+    @param maxLength (int)              If set, only the last `maxLength`
+                                        entries are kept
     """
     self.monitor = monitor
     self.title = title
 
-    self.data = []
+    self.data = [] if maxLength is None else deque(maxlen=maxLength)
 
 
   def prettyPrintTitle(self):
@@ -103,6 +106,33 @@ class IndicesTrace(Trace):
 
 
 
+class PackedIndicesTrace(IndicesTrace):
+  """
+  IndicesTrace with compact entries, for long histories: each entry is stored
+  as a packed bitset of `numIndices` bits, or as an array of its indices when
+  that is smaller. Entries are read back as sets.
+  """
+
+  def __init__(self, monitor, title, numIndices, maxLength=None):
+    """
+    @param monitor    (MonitorMixinBase) Monitor Mixin instance that
+                                         generated this trace
+    @param title      (string)           Title
+    @param numIndices (int)              Number of possible indices
+    @param maxLength  (int)              If set, only the last `maxLength`
+                                         entries are kept
+    """
+    super(PackedIndicesTrace, self).__init__(monitor, title)
+    self.data = _PackedIndicesList(numIndices, maxLength)
+
+
+  def makeCountsTrace(self):
+    trace = CountsTrace(self.monitor, "# {0}".format(self.title))
+    trace.data = self.data.getCounts()
+    return trace
+
+
+
 class BoolsTrace(Trace):
   """
   Each entry contains bools (for example resets).
@@ -137,3 +167,55 @@ class MetricsTrace(Trace):
     return ("min: {0:.2f}, max: {1:.2f}, sum: {2:.2f}, "
             "mean: {3:.2f}, std dev: {4:.2f}").format(
       datum.min, datum.max, datum.sum, datum.mean, datum.standardDeviation)
+
+
+
+class _PackedIndicesList(object):
+  """
+  Sequence of sets of indices, stored packed. Supports `append`, `len`,
+  iteration and indexing.
+  """
+
+  def __init__(self, numIndices, maxLength=None):
+    self._numIndices = numIndices
+    self._numBitsetBytes = (numIndices + 7) // 8
+    self._entries = deque(maxlen=maxLength)
+    self._counts = deque(maxlen=maxLength)
+
+
+  def append(self, indices):
+    indices = numpy.fromiter(indices, dtype=numpy.uint32)
+    if indices.nbytes < self._numBitsetBytes:
+      entry = numpy.sort(indices)
+    else:
+      bits = numpy.zeros(self._numIndices, dtype=numpy.bool_)
+      bits[indices] = True
+      entry = numpy.packbits(bits)
+    self._entries.append(entry)
+    self._counts.append(len(indices))
+
+
+  def getCounts(self):
+    """
+    @return (list) Number of indices of each entry
+    """
+    return list(self._counts)
+
+
+  def _unpack(self, entry):
+    if entry.dtype == numpy.uint8:
+      entry = numpy.flatnonzero(numpy.unpackbits(entry)[:self._numIndices])
+    return set(entry.tolist())
+
+
+  def __len__(self):
+    return len(self._entries)
+
+
+  def __iter__(self):
+    for entry in self._entries:
+      yield self._unpack(entry)
+
+
+  def __getitem__(self, index):
+    return self._unpack(self._entries[index])
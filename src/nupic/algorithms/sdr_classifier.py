@@ -31,6 +31,7 @@ from collections import deque
 import numpy
 
 from nupic.serializable import Serializable
+from nupic.support.memory_usage import getArraysSize, getObjectSize
 
 try:
   import capnp
@@ -379,6 +380,24 @@ class SDRClassifier(Serializable):
     return predictDist
 
 
+  def getMemoryUsage(self):
+    """
+    Return the number of bytes used by each component of the classifier.
+
+    :return: dict with the bytes used by the ``weightMatrices`` of all steps,
+             the ``patternHistory`` of recent input patterns, the
+             ``actualValues`` of the buckets, and everything else (``other``)
+    """
+    weightMatrices = self._weightMatrix.values()
+    return {
+      "weightMatrices": getArraysSize(*weightMatrices),
+      "patternHistory": getObjectSize(self._patternNZHistory),
+      "actualValues": getObjectSize(self._actualValues),
+      "other": getObjectSize(self, exclude=weightMatrices + [
+        self._patternNZHistory, self._actualValues]),
+    }
+
+
   @classmethod
   def getSchema(cls):
     return SdrClassifierProto
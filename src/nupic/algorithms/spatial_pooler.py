@@ -34,6 +34,7 @@ if capnp:
 
 from nupic.math import topology
 from nupic.serializable import Serializable
+from nupic.support.memory_usage import getArraysSize, getObjectSize
 
 realDType = GetNTAReal()
 uintType = "uint32"
@@ -874,6 +875,27 @@ class SpatialPooler(Serializable):
     return self._boostedOverlaps
 
 
+  def getMemoryUsage(self):
+    """
+    :returns: (dict) number of bytes used by each component of the spatial
+              pooler: the ``permanences``, ``potentialPools`` and
+              ``connectedSynapses`` sparse matrices, the ``dutyCycles`` and
+              ``boostFactors`` arrays, and everything else (``other``)
+    """
+    dutyCycles = [self._overlapDutyCycles, self._activeDutyCycles,
+                  self._minOverlapDutyCycles]
+    components = [self._permanences, self._potentialPools,
+                  self._connectedSynapses, self._boostFactors] + dutyCycles
+    return {
+      "permanences": self._permanences.nBytes(),
+      "potentialPools": self._potentialPools.nBytes(),
+      "connectedSynapses": self._connectedSynapses.nBytes(),
+      "dutyCycles": getArraysSize(*dutyCycles),
+      "boostFactors": getArraysSize(self._boostFactors),
+      "other": getObjectSize(self, exclude=components),
+    }
+
+
   def compute(self, inputVector, learn, activeArray):
     """
     This is the primary public method of the SpatialPooler class. This
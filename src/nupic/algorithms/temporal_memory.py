@@ -24,6 +24,7 @@ Temporal Memory implementation in Python. See
 `numenta.com <https://numenta.com/temporal-memory-algorithm/>`_ for details.
 """
 
+import sys
 from collections import defaultdict
 from nupic.bindings.math import Random
 from operator import mul
@@ -31,6 +32,7 @@ from operator import mul
 from nupic.algorithms.connections import Connections, binSearch
 from nupic.serializable import Serializable
 from nupic.support.group_by import groupby2
+from nupic.support.memory_usage import getObjectSize
 
 EPSILON = 0.00001 # constant error threshold to check equality of permanences to
                   # other floats
@@ -943,6 +945,31 @@ class TemporalMemory(Serializable):
     return self.matchingSegments
 
 
+  def getMemoryUsage(self):
+    """
+    Returns the number of bytes used by each component of the temporal
+    memory: the components of its :class:`Connections` (see
+    :meth:`~nupic.algorithms.connections.Connections.getMemoryUsage`),
+    ``cellState`` (the lists of active and winner cells and of active and
+    matching segments), ``segmentCounters`` (the per-segment synapse counts
+    and last used iterations) and everything else (``other``).
+
+    :returns: (dict) number of bytes used by each component
+    """
+    cellState = [self.activeCells, self.winnerCells, self.activeSegments,
+                 self.matchingSegments]
+    segmentCounters = [self.numActiveConnectedSynapsesForSegment,
+                       self.numActivePotentialSynapsesForSegment,
+                       self.lastUsedIterationForSegment]
+    usage = self.connections.getMemoryUsage()
+    usage["cellState"] = sum(sys.getsizeof(cells) for cells in cellState)
+    usage["segmentCounters"] = sum(sys.getsizeof(counters)
+                                   for counters in segmentCounters)
+    usage["other"] = getObjectSize(
+      self, exclude=[self.connections] + cellState + segmentCounters)
+    return usage
+
+
   def getCellsPerColumn(self):
     """
     Returns the number of cells per column.
@@ -1150,43 +1177,46 @@ class TemporalMemory(Serializable):
     proto.activeCells = list(self.activeCells)
     proto.winnerCells = list(self.winnerCells)
 
+    # Segments are serialized by (cell, idxOnCell); look the indexes up once
+    idxOnCell = self.connections.idxOnCellForFlatIdx()
+
     protoActiveSegments = proto.init("activeSegments", len(self.activeSegments))
-    for i, segment in enumerate(self.activeSegments):
-      protoActiveSegments[i].cell = segment.cell
-      idx = self.connections.segmentsForCell(segment.cell).index(segment)
-      protoActiveSegments[i].idxOnCell = idx
+    for protoSegment, segment in zip(protoActiveSegments, self.activeSegments):
+      protoSegment.cell = segment.cell
+      protoSegment.idxOnCell = idxOnCell[segment.flatIdx]
 
     protoMatchingSegments = proto.init("matchingSegments",
                                        len(self.matchingSegments))
-    for i, segment in enumerate(self.matchingSegments):
-      protoMatchingSegments[i].cell = segment.cell
-      idx = self.connections.segmentsForCell(segment.cell).index(segment)
-      protoMatchingSegments[i].idxOnCell = idx
-
+    for protoSegment, segment in zip(protoMatchingSegments,
+                                     self.matchingSegments):
+      protoSegment.cell = segment.cell
+      protoSegment.idxOnCell = idxOnCell[segment.flatIdx]
+
+    # Only the existing segments have entries; the flatIdxs of destroyed
+    # segments are skipped
+    flatIdxs = [flatIdx for flatIdx, idx in enumerate(idxOnCell) if idx >= 0]
+    segmentForFlatIdx = self.connections.segmentForFlatIdx
+
+    # Segments created since the last compute() have no activity yet
+    numActivePotentialFlatIdxs = [
+      flatIdx for flatIdx in flatIdxs
+      if flatIdx < len(self.numActivePotentialSynapsesForSegment)]
     protoNumActivePotential = proto.init(
-      "numActivePotentialSynapsesForSegment",
-      len(self.numActivePotentialSynapsesForSegment))
-    for i, numActivePotentialSynapses in enumerate(
-        self.numActivePotentialSynapsesForSegment):
-      segment = self.connections.segmentForFlatIdx(i)
-      if segment is not None:
-        protoNumActivePotential[i].cell = segment.cell
-        idx = self.connections.segmentsForCell(segment.cell).index(segment)
-        protoNumActivePotential[i].idxOnCell = idx
-        protoNumActivePotential[i].number = numActivePotentialSynapses
+      "numActivePotentialSynapsesForSegment", len(numActivePotentialFlatIdxs))
+    for protoSegment, flatIdx in zip(protoNumActivePotential,
+                                     numActivePotentialFlatIdxs):
+      protoSegment.cell = segmentForFlatIdx(flatIdx).cell
+      protoSegment.idxOnCell = idxOnCell[flatIdx]
+      protoSegment.number = self.numActivePotentialSynapsesForSegment[flatIdx]
 
     proto.iteration = self.iteration
 
     protoLastUsedIteration = proto.init(
-      "lastUsedIterationForSegment",
-      len(self.numActivePotentialSynapsesForSegment))
-    for i, lastUsed in enumerate(self.lastUsedIterationForSegment):
-      segment = self.connections.segmentForFlatIdx(i)
-      if segment is not None:
-        protoLastUsedIteration[i].cell = segment.cell
-        idx = self.connections.segmentsForCell(segment.cell).index(segment)
-        protoLastUsedIteration[i].idxOnCell = idx
-        protoLastUsedIteration[i].number = lastUsed
+      "lastUsedIterationForSegment", len(flatIdxs))
+    for protoSegment, flatIdx in zip(protoLastUsedIteration, flatIdxs):
+      protoSegment.cell = segmentForFlatIdx(flatIdx).cell
+      protoSegment.idxOnCell = idxOnCell[flatIdx]
+      protoSegment.number = self.lastUsedIterationForSegment[flatIdx]
 
 
   @classmethod
@@ -0,0 +1,131 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""
+Reproducible streams of high-order sequences, for profiling the algorithms
+at scale.
+"""
+
+import numpy as np
+
+
+
+class HighOrderSequenceGenerator(object):
+  """
+  Generates an endless stream of sequences of symbols, each encoded as a
+  fixed sparse pattern.
+
+  The sequences come in groups of ``branching`` sequences sharing all their
+  elements but the first and the last, e.g. A B C D and X B C Y: predicting
+  the last element requires remembering the first one, ``sequenceLength - 1``
+  steps back. The stream picks a sequence at random after each one ends, and
+  with probability ``noise`` replaces each element by a random symbol.
+  """
+
+  def __init__(self,
+               alphabetSize=1000,
+               numSequences=100,
+               sequenceLength=20,
+               branching=2,
+               noise=0.0,
+               n=2048,
+               w=40,
+               seed=42):
+    """
+    @param alphabetSize   (int)   Number of distinct symbols
+    @param numSequences   (int)   Number of sequences
+    @param sequenceLength (int)   Number of elements of each sequence
+    @param branching      (int)   Number of sequences sharing the same middle
+                                  elements
+    @param noise          (float) Probability of replacing an element of the
+                                  stream by a random symbol
+    @param n              (int)   Number of bits of the patterns
+    @param w              (int)   Number of on bits of each pattern
+    @param seed           (int)   Seed of the sequences, patterns and stream
+    """
+    if sequenceLength < 3:
+      raise ValueError("Sequences need at least 3 elements")
+    if branching < 1 or alphabetSize < max(2 * branching, sequenceLength - 2):
+      raise ValueError("The alphabet is too small for the branching and "
+                       "sequence length")
+    if w > n:
+      raise ValueError("Patterns cannot have more on bits than bits")
+
+    self.alphabetSize = alphabetSize
+    self.sequenceLength = sequenceLength
+    self.branching = branching
+    self.noise = noise
+    self.n = n
+    self.w = w
+    self.seed = seed
+
+    random = np.random.RandomState(seed)
+
+    # Each group of branches shares its middle elements; the first and last
+    # elements of the branches of a group are distinct
+    self.sequences = []
+    while len(self.sequences) < numSequences:
+      middle = random.choice(alphabetSize, sequenceLength - 2, replace=False)
+      ends = random.choice(alphabetSize, 2 * branching, replace=False)
+      for branch in xrange(min(branching, numSequences - len(self.sequences))):
+        self.sequences.append([int(ends[2 * branch])] + middle.tolist() +
+                              [int(ends[2 * branch + 1])])
+
+    self._patterns = np.empty((alphabetSize, w), dtype="uint32")
+    for symbol in xrange(alphabetSize):
+      self._patterns[symbol] = np.sort(random.choice(n, w, replace=False))
+
+
+  def getPattern(self, symbol):
+    """
+    Return the pattern of a symbol.
+
+    @param symbol (int) Symbol
+
+    @return (numpy.array) Sorted indices of the on bits
+    """
+    return self._patterns[symbol]
+
+
+  def generate(self, numSteps, seed=None):
+    """
+    Generate the stream. Two streams with the same seed are identical.
+
+    @param numSteps (int) Number of elements to generate
+    @param seed     (int) Seed of the stream, or None for the seed of the
+                          generator
+
+    @return (iterator) (symbol, pattern, reset) tuples, where reset is True
+                       for the first element of each sequence
+    """
+    random = np.random.RandomState(self.seed if seed is None else seed)
+    step = 0
+    while step < numSteps:
+      sequence = self.sequences[random.randint(len(self.sequences))]
+      noisy = random.random_sample(len(sequence)) < self.noise
+      for position, symbol in enumerate(sequence):
+        if step == numSteps:
+          break
+        if noisy[position]:
+          symbol = random.randint(self.alphabetSize)
+        yield symbol, self._patterns[symbol], position == 0
+        step += 1
@@ -452,6 +452,10 @@ class ClientJobsDAO(object):
   _SEQUENCE_TYPES = (list, set, tuple)
   """ Sequence types that we accept in args """
 
+  _MAX_IN_LIST_LEN = 1000
+  """ Longest list of values of a single 'IN' predicate; longer lists are
+  queried in chunks of this size """
+
   # There is one instance of the ClientJobsDAO per process. This class static
   #  variable gets filled in the first time the process calls
   # ClientJobsDAO.get()
@@ -580,6 +584,10 @@ class ClientJobsDAO(object):
     # Our connection ID, filled in during connect()
     self._connectionID = None
 
+    # SQL of the queries built by _getMatchingRowsNoRetries(), keyed by the
+    #  table, selected fields and kind of each match predicate
+    self._matchingRowsQueries = dict()
+
 
   @property
   def jobsTableName(self):
@@ -938,7 +946,8 @@ class ClientJobsDAO(object):
                      operator 'IN' will be used in the corresponding SQL
                      predicate; if the value is bool: "IS TRUE/FALSE"; if the
                      value is None: "IS NULL"; '=' will be used for all other
-                     cases.
+                     cases. A sequence longer than _MAX_IN_LIST_LEN is queried
+                     in chunks, all on this connection.
     selectFieldNames:
                      list of fields to return, using internal field names
     maxRows:         maximum number of rows to return; unlimited if maxRows
@@ -958,27 +967,47 @@ class ClientJobsDAO(object):
       selectFieldNames)
 
     # NOTE: make sure match expressions and values are in the same order
-    matchPairs = fieldsToMatch.items()
-    matchExpressionGen = (
-      p[0] +
-      (' IS ' + {True:'TRUE', False:'FALSE'}[p[1]] if isinstance(p[1], bool)
-       else ' IS NULL' if p[1] is None
-       else ' IN %s' if isinstance(p[1], self._SEQUENCE_TYPES)
-       else '=%s')
+    matchPairs = sorted(fieldsToMatch.items())
+    matchKinds = tuple(
+      (p[0],
+       {True:'TRUE', False:'FALSE'}[p[1]] if isinstance(p[1], bool)
+       else 'NULL' if p[1] is None
+       else 'IN' if isinstance(p[1], self._SEQUENCE_TYPES)
+       else '=')
       for p in matchPairs)
     matchFieldValues = [p[1] for p in matchPairs
                         if (not isinstance(p[1], (bool)) and p[1] is not None)]
 
-    query = 'SELECT %s FROM %s WHERE (%s)' % (
-      ','.join(selectFieldNames), tableInfo.tableName,
-      ' AND '.join(matchExpressionGen))
-    sqlParams = matchFieldValues
-    if maxRows is not None:
-      query += ' LIMIT %s'
-      sqlParams.append(maxRows)
+    query = self._getMatchingRowsQuery(tableInfo, matchKinds, selectFieldNames,
+                                       maxRows is not None)
+
+    # Query very long 'IN' lists in chunks, so that the statements stay well
+    #  within the server's max_allowed_packet
+    chunkIdx = None
+    for i, value in enumerate(matchFieldValues):
+      if (isinstance(value, self._SEQUENCE_TYPES) and
+          len(value) > self._MAX_IN_LIST_LEN and
+          (chunkIdx is None or len(value) > len(matchFieldValues[chunkIdx]))):
+        chunkIdx = i
+    if chunkIdx is None:
+      chunks = [None]
+    else:
+      values = list(matchFieldValues[chunkIdx])
+      chunks = [values[i:i + self._MAX_IN_LIST_LEN]
+                for i in xrange(0, len(values), self._MAX_IN_LIST_LEN)]
+
+    rows = []
+    for chunk in chunks:
+      sqlParams = list(matchFieldValues)
+      if chunk is not None:
+        sqlParams[chunkIdx] = chunk
+      if maxRows is not None:
+        sqlParams.append(maxRows - len(rows))
 
-    conn.cursor.execute(query, sqlParams)
-    rows = conn.cursor.fetchall()
+      conn.cursor.execute(query, sqlParams)
+      rows.extend(conn.cursor.fetchall())
+      if maxRows is not None and len(rows) >= maxRows:
+        break
 
     if rows:
       assert maxRows is None or len(rows) <= maxRows, "%d !<= %d" % (
@@ -991,6 +1020,40 @@ class ClientJobsDAO(object):
     return rows
 
 
+  def _getMatchingRowsQuery(self, tableInfo, matchKinds, selectFieldNames,
+                            limited):
+    """ Return the SQL of a _getMatchingRowsNoRetries() query, building it only
+    the first time it is requested.
+
+    tableInfo:       Table information: a ClientJobsDAO._TableInfoBase  instance
+    matchKinds:      tuple of (fieldName, kind) pairs, kind being one of 'TRUE',
+                     'FALSE', 'NULL', 'IN' and '='
+    selectFieldNames:
+                     list of fields to return, using internal field names
+    limited:         True to end the query with a 'LIMIT %s' clause
+
+    retval:          The query, with one '%s' placeholder per 'IN' and '='
+                      predicate, in the order of matchKinds, followed by the
+                      one of the LIMIT clause
+    """
+    key = (tableInfo.tableName, tuple(selectFieldNames), matchKinds, limited)
+    query = self._matchingRowsQueries.get(key)
+    if query is None:
+      matchExpressions = [
+        fieldName + (' IS %s' % (kind,) if kind in ('TRUE', 'FALSE', 'NULL')
+                     else ' IN %s' if kind == 'IN'
+                     else '=%s')
+        for fieldName, kind in matchKinds]
+      query = 'SELECT %s FROM %s WHERE (%s)' % (
+        ','.join(selectFieldNames), tableInfo.tableName,
+        ' AND '.join(matchExpressions))
+      if limited:
+        query += ' LIMIT %s'
+      self._matchingRowsQueries[key] = query
+
+    return query
+
+
   @g_retrySQL
   def _getMatchingRowsWithRetries(self, tableInfo, fieldsToMatch,
                                   selectFieldNames, maxRows=None):
@@ -2442,6 +2505,42 @@ class ClientJobsDAO(object):
     return results
 
 
+  @logExceptions(_LOGGER)
+  @g_retrySQL
+  def modelsInfoForJob(self, jobID, afterModelID=None, maxRows=1000):
+    """ Get ALL info for the next page of models of a job, in model ID order.
+
+    The page is selected by model ID rather than by offset, so a job's models
+    can be read with a bounded amount of memory by passing the ID of the last
+    model of each page to the next call, and a reader can resume from any
+    model ID. Models inserted while paging show up in later pages.
+
+    Parameters:
+    ----------------------------------------------------------------
+    jobID:         jobID of the models
+    afterModelID:  only return models with an ID greater than this one, or
+                    None to start from the first model of the job
+    maxRows:       maximum number of models to return
+    retval:        (possibly empty) list of namedtuples containing all the
+                    fields stored for each model, sorted by model ID. Fewer
+                    than maxRows models are returned only for the last page.
+    """
+    dbFields = [self._models.pubToDBNameDict[f]
+                for f in self._models.modelInfoNamedTuple._fields]
+    query = 'SELECT %s FROM %s ' \
+            '          WHERE job_id=%%s AND model_id>%%s ' \
+            '          ORDER BY model_id LIMIT %%s' \
+            % (','.join(dbFields), self.modelsTableName)
+    sqlParams = [jobID, afterModelID if afterModelID is not None else 0,
+                 maxRows]
+
+    with ConnectionFactory.get() as conn:
+      conn.cursor.execute(query, sqlParams)
+      rows = conn.cursor.fetchall()
+
+    return [self._models.modelInfoNamedTuple._make(r) for r in rows]
+
+
   @logExceptions(_LOGGER)
   def modelsGetFields(self, modelIDs, fields):
     """ Fetch the values of 1 or more fields from a sequence of model records.
@@ -2777,6 +2876,69 @@ class ClientJobsDAO(object):
     self.modelUpdateResults(modelID)
 
 
+  @logExceptions(_LOGGER)
+  @g_retrySQL
+  def modelsUpdateResults(self, updates):
+    """ Multi-row version of modelUpdateResults: update the results string,
+    optimized metric and/or num_records fields, and the last update time, of
+    several models in a single statement. This will fail if any of the models
+    does not currently belong to this client (connection_id doesn't match);
+    the models that do belong to it are still updated.
+
+    Parameters:
+    ----------------------------------------------------------------
+    updates:      sequence of (modelID, results, metricValue, numRecords)
+                    tuples. As in modelUpdateResults, None values (and NaN
+                    metric values) leave the field unchanged.
+    """
+    if not updates:
+      return
+
+    assignmentExpressions = ['_eng_last_update_time=UTC_TIMESTAMP()',
+                             'update_counter=update_counter+1']
+    assignmentValues = []
+
+    # One CASE expression per field, covering the models that change it
+    # NOTE1: (metricValue==metricValue) tests for Nan
+    # NOTE2: metricValue is being passed as numpy.float64
+    columns = (
+      ('results', 1, lambda value: value),
+      ('optimized_metric', 2,
+       lambda value: float(value) if value == value else None),
+      ('num_records', 3, lambda value: value))
+    for column, position, convert in columns:
+      cases = []
+      for update in updates:
+        if update[position] is None:
+          continue
+        value = convert(update[position])
+        if value is None:
+          continue
+        cases.append('WHEN %s THEN %s')
+        assignmentValues.extend([update[0], value])
+      if cases:
+        assignmentExpressions.append('%s=CASE model_id %s ELSE %s END' % (
+          column, ' '.join(cases), column))
+
+    modelIDs = [update[0] for update in updates]
+    query = 'UPDATE %s SET %s ' \
+            '          WHERE model_id IN (%s) and _eng_worker_conn_id=%%s' \
+                % (self.modelsTableName, ','.join(assignmentExpressions),
+                   ','.join(['%s'] * len(modelIDs)))
+    sqlParams = assignmentValues + modelIDs + [self._connectionID]
+
+    # Get a database connection and cursor
+    with ConnectionFactory.get() as conn:
+      numRowsAffected = conn.cursor.execute(query, sqlParams)
+
+    if numRowsAffected != len(set(modelIDs)):
+      raise InvalidConnectionException(
+        ("Tried to update the info of modelIDs=%r using connectionID=%r, but "
+         "some of these models belong to some other worker or were not found; "
+         "numRowsAffected=%r") % (modelIDs, self._connectionID,
+                                  numRowsAffected,))
+
+
   @logExceptions(_LOGGER)
   @g_retrySQL
   def modelSetCompleted(self, modelID, completionReason, completionMsg,
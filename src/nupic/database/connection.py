@@ -21,6 +21,8 @@
 
 import logging
 import platform
+import threading
+import time
 import traceback
 
 from DBUtils import SteadyDB
@@ -93,6 +95,42 @@ def disableConcurrencyChecks():
 
 
 
+class LatencyStats(object):
+  """ Thread-safe count, total and maximum of a series of durations """
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self.reset()
+
+
+  def reset(self):
+    with self._lock:
+      self.count = 0
+      self.totalSecs = 0.0
+      self.maxSecs = 0.0
+
+
+  def record(self, secs):
+    with self._lock:
+      self.count += 1
+      self.totalSecs += secs
+      if secs > self.maxSecs:
+        self.maxSecs = secs
+
+
+  def getStats(self):
+    """
+    Returns:  dict with the count, totalSecs, meanSecs and maxSecs of the
+              recorded durations
+    """
+    with self._lock:
+      return dict(count=self.count,
+                  totalSecs=self.totalSecs,
+                  meanSecs=self.totalSecs / self.count if self.count else 0.0,
+                  maxSecs=self.maxSecs)
+
+
+
 class ConnectionFactory(object):
   """ Database connection factory.
 
@@ -164,7 +202,38 @@ class ConnectionFactory(object):
 
       logger.debug("Created connection policy: %r", cls._connectionPolicy)
 
-    return cls._connectionPolicy.acquireConnection()
+    startTime = time.time()
+    connWrap = cls._connectionPolicy.acquireConnection()
+    cls._poolWaitStats.record(time.time() - startTime)
+    return connWrap
+
+
+  @classmethod
+  def getMetrics(cls):
+    """ Return the latency metrics of the database accesses of this process.
+
+    Parameters:
+    ----------------------------------------------------------------
+    retval:       dict with the following keys:
+                    poolWait: LatencyStats.getStats() of the time spent
+                      acquiring connections from the connection policy,
+                      including opening new connections
+                    query: LatencyStats.getStats() of the execute() and
+                      executemany() calls of the connections' cursors
+                    peakConnections: the highest number of connections that
+                      were outstanding at the same time
+    """
+    return dict(poolWait=cls._poolWaitStats.getStats(),
+                query=cls._queryStats.getStats(),
+                peakConnections=ConnectionWrapper._clsPeakOutstanding)
+
+
+  @classmethod
+  def resetMetrics(cls):
+    """ Reset the metrics returned by getMetrics() """
+    cls._poolWaitStats.reset()
+    cls._queryStats.reset()
+    ConnectionWrapper._clsPeakOutstanding = ConnectionWrapper._clsNumOutstanding
 
 
   @classmethod
@@ -218,11 +287,20 @@ class ConnectionFactory(object):
     """
     logger = _getLogger(cls)
 
-    logger.debug(
-      "Creating database connection policy: platform=%r; pymysql.VERSION=%r",
-      platform.system(), pymysql.VERSION)
+    backend = Configuration.get('nupic.cluster.database.backend', 'mysql')
 
-    if platform.system() == "Java":
+    logger.debug(
+      "Creating database connection policy: backend=%r; platform=%r; "
+      "pymysql.VERSION=%r", backend, platform.system(), pymysql.VERSION)
+
+    if backend == "sqlite":
+      # NOTE: imported here because sqlite_connection imports this module
+      from nupic.database.sqlite_connection import SQLiteConnectionPolicy
+      policy = SQLiteConnectionPolicy()
+    elif backend != "mysql":
+      raise ValueError(
+        "Unsupported nupic.cluster.database.backend: %r" % (backend,))
+    elif platform.system() == "Java":
       # NOTE: PooledDB doesn't seem to work under Jython
       # NOTE: not appropriate for multi-threaded applications.
       # TODO: this was fixed in Webware DBUtils r8228, so once
@@ -242,6 +320,12 @@ class ConnectionFactory(object):
   """ This class variable holds the method that DatabaseConnectionPolicy uses
   to create the singleton database connection policy instance
   """
+
+  _poolWaitStats = LatencyStats()
+  """ Latencies of acquiring connections """
+
+  _queryStats = LatencyStats()
+  """ Latencies of executing statements """
   # <-- End of class ConnectionFactory
 
 
@@ -254,6 +338,10 @@ class ConnectionWrapper(object):
   _clsNumOutstanding = 0
   """ For tracking the count of outstanding instances """
 
+  _clsPeakOutstanding = 0
+  """ Highest count of outstanding instances; see ConnectionFactory.getMetrics
+  """
+
   _clsOutstandingInstances = set()
   """ tracks outstanding instances of this class while g_max_concurrency is
   enabled
@@ -278,7 +366,7 @@ class ConnectionWrapper(object):
       self.dbConn = dbConn
       """ database connection instance """
 
-      self.cursor = cursor
+      self.cursor = _TimedCursor(cursor, ConnectionFactory._queryStats)
       """ Public cursor instance. Don't close it directly:  Connection.release()
       will do the right thing.
       """
@@ -309,6 +397,8 @@ class ConnectionWrapper(object):
       raise
     else:
       self.__class__._clsNumOutstanding += 1
+      if self._clsNumOutstanding > self._clsPeakOutstanding:
+        self.__class__._clsPeakOutstanding = self._clsNumOutstanding
 
     return
 
@@ -355,7 +445,7 @@ class ConnectionWrapper(object):
           "Failed to remove self from _clsOutstandingInstances: %r;", self)
         raise
 
-    self._releaser(dbConn=self.dbConn, cursor=self.cursor)
+    self._releaser(dbConn=self.dbConn, cursor=self.cursor.rawCursor)
 
     self.__class__._clsNumOutstanding -= 1
     assert self._clsNumOutstanding >= 0,  \
@@ -411,6 +501,41 @@ class ConnectionWrapper(object):
 
 
 
+class _TimedCursor(object):
+  """ Cursor proxy that records the latency of execute() and executemany()
+  calls. All other attributes are those of the wrapped cursor.
+  """
+
+  def __init__(self, cursor, queryStats):
+    self.rawCursor = cursor
+    self._queryStats = queryStats
+
+
+  def __getattr__(self, name):
+    return getattr(self.rawCursor, name)
+
+
+  def __iter__(self):
+    return iter(self.rawCursor)
+
+
+  def execute(self, query, args=None):
+    startTime = time.time()
+    try:
+      return self.rawCursor.execute(query, args)
+    finally:
+      self._queryStats.record(time.time() - startTime)
+
+
+  def executemany(self, query, args):
+    startTime = time.time()
+    try:
+      return self.rawCursor.executemany(query, args)
+    finally:
+      self._queryStats.record(time.time() - startTime)
+
+
+
 class DatabaseConnectionPolicyIface(object):
   """ Database connection policy base class/interface.
 
@@ -519,7 +644,11 @@ class PooledConnectionPolicy(DatabaseConnectionPolicyIface):
     self._logger = _getLogger(self.__class__)
 
     self._logger.debug("Opening")
-    self._pool = PooledDB(**_getCommonSteadyDBArgsDict())
+    # With no configured size, the pool keeps every connection that is
+    #  returned to it, so it grows to the number of concurrent users
+    poolSize = getPoolSize()
+    self._pool = PooledDB(mincached=poolSize, maxcached=poolSize,
+                          **_getCommonSteadyDBArgsDict())
 
     self._logger.info("Created %s", self.__class__.__name__)
     return
@@ -640,6 +769,15 @@ class PerTransactionConnectionPolicy(DatabaseConnectionPolicyIface):
 
 
 
+def getPoolSize():
+  """ Returns the number of idle connections connection pools keep, per
+  nupic.cluster.database.poolSize; 0 means as many as were ever in use at the
+  same time.
+  """
+  return int(Configuration.get('nupic.cluster.database.poolSize', 0))
+
+
+
 def _getCommonSteadyDBArgsDict():
   """ Returns a dictionary of arguments for DBUtils.SteadyDB.SteadyDBConnection
   constructor.
@@ -0,0 +1,143 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Write-behind buffer for the heartbeat, metric and result updates of the models
+table.
+"""
+
+import logging
+import time
+
+from nupic.support.configuration import Configuration
+
+
+
+class ModelUpdateBuffer(object):
+  """ Coalesces ``modelUpdateResults()`` and ``modelUpdateTimestamp()`` calls
+  of a jobs DAO and writes them with a single multi-row
+  ``modelsUpdateResults()`` statement every so often.
+
+  Each update also refreshes the model's last update time, which other workers
+  use to detect orphaned models (see ``ClientJobsDAO.modelAdoptNextOrphan``).
+  Buffering delays that refresh, so the delay is capped at a fraction of
+  ``nupic.hypersearch.modelOrphanIntervalSecs``: at any update, the models'
+  records are never staler than :meth:`getMaxDelaySecs`.
+
+  Updates are only written from within :meth:`updateResults`,
+  :meth:`updateTimestamp` and :meth:`flush`; there is no background thread.
+  Callers must :meth:`flush` before they complete a model or otherwise rely on
+  its record being current.
+
+  :param jobsDAO: the ClientJobsDAO (or compatible) instance to write to
+  :param flushIntervalSecs: (float) how long updates may be held back. 0 writes
+         every update through. Defaults to
+         ``nupic.hypersearch.modelUpdateFlushSecs``.
+  :param orphanIntervalSecs: (float) the orphan detection interval. Defaults to
+         ``nupic.hypersearch.modelOrphanIntervalSecs``.
+  """
+
+  # Fraction of the orphan detection interval updates may be held back. The
+  #  rest leaves room for the time between the updates themselves.
+  ORPHAN_INTERVAL_FRACTION = 0.25
+
+
+  def __init__(self, jobsDAO, flushIntervalSecs=None, orphanIntervalSecs=None):
+    if flushIntervalSecs is None:
+      flushIntervalSecs = float(Configuration.get(
+        'nupic.hypersearch.modelUpdateFlushSecs'))
+    if orphanIntervalSecs is None:
+      orphanIntervalSecs = float(Configuration.get(
+        'nupic.hypersearch.modelOrphanIntervalSecs'))
+
+    self._jobsDAO = jobsDAO
+    self._maxDelaySecs = max(0.0, min(
+      flushIntervalSecs, orphanIntervalSecs * self.ORPHAN_INTERVAL_FRACTION))
+
+    # modelID -> [results, metricValue, numRecords] of the pending updates, in
+    #  the order the models were first updated
+    self._pending = dict()
+    self._pendingOrder = []
+    self._lastFlushTime = time.time()
+
+    self._logger = logging.getLogger(".".join(
+      ['com.numenta', self.__class__.__module__, self.__class__.__name__]))
+
+
+  def getMaxDelaySecs(self):
+    """ :returns: (float) the longest time updates are held back """
+    return self._maxDelaySecs
+
+
+  def hasPendingUpdates(self):
+    """ :returns: (bool) True if some updates have not been written yet """
+    return bool(self._pending)
+
+
+  def updateResults(self, modelID, results=None, metricValue=None,
+                    numRecords=None):
+    """ Buffered version of ``ClientJobsDAO.modelUpdateResults()``. Values
+    replace those of earlier pending updates of the model; None values (and
+    NaN metric values) leave them unchanged.
+
+    :param modelID: model ID of model to modify
+    :param results: new results, or None to ignore
+    :param metricValue: the value of the metric being optimized, or None to
+           ignore
+    :param numRecords: new numRecords, or None to ignore
+    """
+    pending = self._pending.get(modelID)
+    if pending is None:
+      pending = self._pending[modelID] = [None, None, None]
+      self._pendingOrder.append(modelID)
+
+    if results is not None:
+      pending[0] = results
+    # NOTE: (metricValue==metricValue) tests for NaN
+    if metricValue is not None and (metricValue == metricValue):
+      pending[1] = metricValue
+    if numRecords is not None:
+      pending[2] = numRecords
+
+    if time.time() - self._lastFlushTime >= self._maxDelaySecs:
+      self.flush()
+
+
+  def updateTimestamp(self, modelID):
+    """ Buffered version of ``ClientJobsDAO.modelUpdateTimestamp()`` """
+    self.updateResults(modelID)
+
+
+  def flush(self):
+    """ Write all the pending updates. Raises the DAO's
+    InvalidConnectionException if some of the models belong to another
+    worker; the pending updates are dropped either way. """
+    self._lastFlushTime = time.time()
+    if not self._pending:
+      return
+
+    updates = [(modelID,) + tuple(self._pending[modelID])
+               for modelID in self._pendingOrder]
+    self._pending = dict()
+    self._pendingOrder = []
+
+    self._logger.debug("Writing %d buffered model updates", len(updates))
+    self._jobsDAO.modelsUpdateResults(updates)
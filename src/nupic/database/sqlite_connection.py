@@ -0,0 +1,768 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Embedded SQLite backend for :class:`~nupic.database.connection.ConnectionFactory`.
+
+Selected with ``nupic.cluster.database.backend=sqlite``, it lets
+:class:`~nupic.database.client_jobs_dao.ClientJobsDAO` run without a MySQL
+server, e.g. for single-host swarms. Each MySQL database becomes the file
+``<nupic.cluster.database.sqliteDir>/<name>.sqlite``, opened in WAL mode so that
+worker processes on the same host can read while another one writes.
+
+The cursors handed out by :class:`SQLiteConnectionPolicy` accept the MySQL
+dialect used by ``ClientJobsDAO`` (``%s`` parameters, ``UTC_TIMESTAMP()``,
+``INSERT IGNORE``, ``UPDATE ... LIMIT``, ``SHOW TABLES``, ``DESCRIBE``, ...)
+and translate it to SQLite. Errors are re-raised as the equivalent ``pymysql``
+exceptions, so that ``retrySQL`` retries a locked database just like a MySQL
+lock wait timeout, and duplicate keys still report "Duplicate entry".
+"""
+
+import datetime
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+
+import pymysql
+from pymysql.constants import ER
+
+from nupic.database.connection import (ConnectionWrapper,
+                                       DatabaseConnectionPolicyIface,
+                                       getPoolSize,
+                                       _getLogger)
+from nupic.support.configuration import Configuration
+
+
+
+# Name of the file, in the database directory, that holds the connection ids
+_MAIN_DB_FILENAME = "_nupic_connections.sqlite"
+
+# How long a statement waits for a lock held by another connection before
+# failing with "database is locked"
+DEFAULT_BUSY_TIMEOUT_SEC = 30.0
+
+# Number of prepared statements each connection keeps for reuse
+_CACHED_STATEMENTS = 512
+
+# Most queries whose translation _translateQuery() keeps
+_MAX_TRANSLATED_QUERIES = 1024
+_translatedQueries = dict()
+
+_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Seconds per TIMESTAMPDIFF() unit
+_TIMESTAMPDIFF_UNITS = {
+  "MICROSECOND": 1e-6,
+  "SECOND": 1,
+  "MINUTE": 60,
+  "HOUR": 60 * 60,
+  "DAY": 24 * 60 * 60,
+  "WEEK": 7 * 24 * 60 * 60,
+}
+
+_PARAM_RE = re.compile(r"%s|%%")
+_QUALIFIED_NAME_RE = re.compile(r"\b([A-Za-z_]\w*)\.[A-Za-z_]")
+_CREATE_DATABASE_RE = re.compile(
+  r"^\s*CREATE\s+DATABASE\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)\s*;?\s*$", re.I)
+_DROP_DATABASE_RE = re.compile(
+  r"^\s*DROP\s+DATABASE\s+(IF\s+EXISTS\s+)?(\w+)\s*;?\s*$", re.I)
+_SHOW_TABLES_RE = re.compile(r"^\s*SHOW\s+TABLES\s+(?:IN|FROM)\s+(\w+)\s*;?\s*$",
+                             re.I)
+_DESCRIBE_RE = re.compile(r"^\s*(?:DESCRIBE|DESC)\s+(?:(\w+)\.)?(\w+)\s*;?\s*$",
+                          re.I)
+_CREATE_TABLE_RE = re.compile(
+  r"^\s*CREATE\s+TABLE\s+(IF\s+NOT\s+EXISTS\s+)?(?:(\w+)\.)?(\w+)\s*"
+  r"\((.*)\)\s*([^()]*)$", re.I | re.S)
+_INDEX_RE = re.compile(r"^(UNIQUE\s+)?(?:INDEX|KEY)\s*(?:\w+\s*)?\((.*)\)$",
+                       re.I | re.S)
+_PRIMARY_KEY_RE = re.compile(r"^PRIMARY\s+KEY\s*\((.*)\)$", re.I | re.S)
+_LIMITED_UPDATE_RE = re.compile(
+  r"^\s*((?:UPDATE\s+(\S+)\s+SET\s+.*?)|(?:DELETE\s+FROM\s+(\S+)))"
+  r"\s+WHERE\s+(.*?)\s+LIMIT\s+(\S+)\s*$", re.I | re.S)
+_TIMESTAMPDIFF_RE = re.compile(
+  r"\bTIMESTAMPDIFF\s*\(\s*(%s)\s*," % "|".join(_TIMESTAMPDIFF_UNITS), re.I)
+_BINARY_TYPE_RE = re.compile(r"\b(?:VAR)?BINARY\s*\(\s*\d+\s*\)", re.I)
+_DOUBLE_QUOTED_RE = re.compile(r'"([^"]*)"')
+
+
+
+class SQLiteConnectionPolicy(DatabaseConnectionPolicyIface):
+  """ This connection policy keeps a pool of SQLite connections to the
+  databases under ``databaseDir``, doled out as needed for each transaction.
+  At most ``nupic.cluster.database.poolSize`` idle connections are kept, if
+  that is not 0. NOTE: Appropriate for multi-threaded and multi-process
+  applications; the pool is discarded in a forked child, which opens its own
+  connections.
+
+  :param databaseDir: (string) directory holding the database files; defaults
+         to ``nupic.cluster.database.sqliteDir`` or, if that is empty, to
+         ``nupic-sqlite`` in the system's temporary directory
+  :param busyTimeout: (float) seconds a statement waits for another
+         connection's lock before failing
+  """
+
+
+  def __init__(self, databaseDir=None, busyTimeout=DEFAULT_BUSY_TIMEOUT_SEC):
+    self._logger = _getLogger(self.__class__)
+
+    if databaseDir is None:
+      databaseDir = getDefaultDatabaseDir()
+    self._databaseDir = os.path.abspath(databaseDir)
+    self._busyTimeout = busyTimeout
+
+    if not os.path.isdir(self._databaseDir):
+      try:
+        os.makedirs(self._databaseDir)
+      except OSError:
+        # Another process may have created it concurrently
+        if not os.path.isdir(self._databaseDir):
+          raise
+
+    self._lock = threading.Lock()
+    self._pid = os.getpid()
+    self._idle = []
+    self._maxIdle = getPoolSize()
+    self._opened = True
+
+    self._logger.info("Created %s in %r", self.__class__.__name__,
+                      self._databaseDir)
+
+
+  def __repr__(self):
+    return "%s<databaseDir=%r>" % (self.__class__.__name__, self._databaseDir)
+
+
+  def close(self):
+    """ Close the policy instance and its idle connections. """
+    self._logger.info("Closing")
+
+    if not self._opened:
+      self._logger.warning(
+        "close() called, but connection policy was alredy closed")
+      return
+
+    self._opened = False
+    with self._lock:
+      idle, self._idle = self._idle, []
+    if self._pid == os.getpid():
+      for dbConn in idle:
+        dbConn.close()
+
+
+  def acquireConnection(self):
+    """ Get a connection from the pool, opening a new one if none is idle.
+
+    :returns: (:class:`~nupic.database.connection.ConnectionWrapper`) caller
+              is responsible for calling its release() method or using it in
+              a context manager expression (with ... as:)
+    """
+    self._logger.debug("Acquiring connection")
+
+    dbConn = None
+    with self._lock:
+      if self._pid != os.getpid():
+        # We were forked: the parent's connections must not be used here
+        self._pid = os.getpid()
+        self._idle = []
+      if self._idle:
+        dbConn = self._idle.pop()
+
+    if dbConn is None:
+      dbConn = SQLiteConnection(self._databaseDir, self._busyTimeout)
+
+    return ConnectionWrapper(dbConn=dbConn,
+                             cursor=dbConn.cursor(),
+                             releaser=self._releaseConnection,
+                             logger=self._logger)
+
+
+  def _releaseConnection(self, dbConn, cursor):
+    """ Release database connection and cursor; passed as a callback to
+    ConnectionWrapper
+    """
+    self._logger.debug("Releasing connection")
+
+    cursor.close()
+
+    if dbConn.pid != os.getpid():
+      # Opened by the process we were forked from; leave it to that process
+      return
+
+    with self._lock:
+      if self._opened and (not self._maxIdle or
+                           len(self._idle) < self._maxIdle):
+        self._idle.append(dbConn)
+        return
+    dbConn.close()
+
+
+
+class SQLiteConnection(object):
+  """ One SQLite connection with the databases it has attached.
+
+  Every connection gets a unique id from the main database in the database
+  directory, which is what ``CONNECTION_ID()`` returns.
+
+  :param databaseDir: (string) directory holding the database files
+  :param busyTimeout: (float) seconds to wait for another connection's lock
+  """
+
+  def __init__(self, databaseDir, busyTimeout=DEFAULT_BUSY_TIMEOUT_SEC):
+    self.databaseDir = databaseDir
+    self.pid = os.getpid()
+
+    # Statements run in autocommit mode, as the MySQL connections do
+    self._con = sqlite3.connect(
+      os.path.join(databaseDir, _MAIN_DB_FILENAME), timeout=busyTimeout,
+      isolation_level=None, detect_types=sqlite3.PARSE_DECLTYPES,
+      check_same_thread=False, cached_statements=_CACHED_STATEMENTS)
+    self._con.text_factory = unicode
+    self._con.create_function("UTC_TIMESTAMP", 0, _utcTimestamp)
+    self._con.create_function("TIMESTAMPDIFF", 3, _timestampDiff)
+    self._con.create_function("CONNECTION_ID", 0, lambda: self.connectionID)
+
+    self._attached = set()
+
+    cursor = self._con.cursor()
+    try:
+      _runMapped(cursor.execute, "PRAGMA journal_mode=WAL")
+      _runMapped(cursor.execute,
+                 "CREATE TABLE IF NOT EXISTS connections "
+                 "(connection_id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                 " pid INTEGER, created DATETIME)")
+      _runMapped(cursor.execute,
+                 "INSERT INTO connections (pid, created) VALUES (?, ?)",
+                 (self.pid, _utcTimestamp()))
+      self.connectionID = cursor.lastrowid
+    finally:
+      cursor.close()
+
+
+  def __repr__(self):
+    return "%s<connectionID=%r, databaseDir=%r>" % (
+      self.__class__.__name__, getattr(self, "connectionID", None),
+      self.databaseDir)
+
+
+  def cursor(self):
+    """
+    :returns: (:class:`SQLiteCursor`) a new cursor on this connection
+    """
+    return SQLiteCursor(self)
+
+
+  def close(self):
+    self._con.close()
+
+
+  def getDatabasePath(self, dbName):
+    """
+    :param dbName: (string) MySQL database name
+    :returns: (string) path of the file holding the database
+    """
+    return os.path.join(self.databaseDir, "%s.sqlite" % dbName)
+
+
+  def databaseExists(self, dbName):
+    return (dbName.lower() in self._attached or
+            os.path.exists(self.getDatabasePath(dbName)))
+
+
+  def attach(self, dbName):
+    """ Attach a database to this connection, creating its file if needed.
+
+    :param dbName: (string) MySQL database name
+    """
+    key = dbName.lower()
+    if key in self._attached:
+      return
+    cursor = self._con.cursor()
+    try:
+      _runMapped(cursor.execute, "ATTACH DATABASE ? AS %s" % dbName,
+                 (self.getDatabasePath(dbName),))
+      self._attached.add(key)
+      _runMapped(cursor.execute, "PRAGMA %s.journal_mode=WAL" % dbName)
+    finally:
+      cursor.close()
+
+
+  def attachReferenced(self, query):
+    """ Attach the existing databases that qualify names in a query, e.g.
+    ``client_jobs_v30_root`` in ``SELECT * FROM client_jobs_v30_root.jobs``.
+
+    :param query: (string) SQL query
+    """
+    for dbName in set(_QUALIFIED_NAME_RE.findall(query)):
+      if (dbName.lower() not in self._attached and
+          dbName.lower() not in ("main", "temp") and
+          os.path.exists(self.getDatabasePath(dbName))):
+        self.attach(dbName)
+
+
+
+class SQLiteCursor(object):
+  """ DB-API cursor that accepts the MySQL dialect used by ClientJobsDAO.
+
+  As with pymysql, :meth:`execute` returns the number of affected rows, or of
+  selected rows for queries that return rows.
+  """
+
+  arraysize = 1
+
+  def __init__(self, connection):
+    self.connection = connection
+    self._cursor = connection._con.cursor()
+    self._rows = []
+    self._rowIndex = 0
+    self.rowcount = -1
+    self.lastrowid = None
+    self.description = None
+
+
+  def close(self):
+    if self._cursor is not None:
+      self._cursor.close()
+      self._cursor = None
+    self._rows = []
+
+
+  def execute(self, query, args=None):
+    """ Translate and execute a query.
+
+    :param query: (string) MySQL query with ``%s`` placeholders
+    :param args: (sequence) query parameters; sequence values expand to
+           ``(v1, v2, ...)`` as they do with pymysql
+    :returns: (int) number of affected or selected rows
+    """
+    self._rows = []
+    self._rowIndex = 0
+    self.description = None
+
+    match = _CREATE_DATABASE_RE.match(query)
+    if match:
+      self.connection.attach(match.group(1))
+      return self._setResult(1)
+
+    match = _DROP_DATABASE_RE.match(query)
+    if match:
+      return self._dropDatabase(match.group(2), mustExist=not match.group(1))
+
+    match = _SHOW_TABLES_RE.match(query)
+    if match:
+      dbName = self._getExistingDatabase(match.group(1))
+      return self._run(
+        "SELECT name FROM %s.sqlite_master WHERE type='table' AND "
+        "name NOT LIKE 'sqlite_%%' ORDER BY name" % dbName)
+
+    match = _DESCRIBE_RE.match(query)
+    if match:
+      return self._describe(match.group(1), match.group(2))
+
+    self.connection.attachReferenced(query)
+
+    match = _CREATE_TABLE_RE.match(query)
+    if match:
+      for statement, params in _translateCreateTable(match):
+        self._run(statement, params)
+      return self._setResult(0)
+
+    query, params = _bindParameters(_translateQuery(query), args)
+    return self._run(query, params)
+
+
+  def executemany(self, query, argsList):
+    """ Execute a query once per set of parameters. DML statements whose
+    parameters have no sequence values are translated and prepared once, and
+    run as a batch.
+
+    :returns: (int) total number of affected rows
+    """
+    argsList = list(argsList)
+    if (not argsList or
+        any(regex.match(query) for regex in (
+          _CREATE_DATABASE_RE, _DROP_DATABASE_RE, _SHOW_TABLES_RE, _DESCRIBE_RE,
+          _CREATE_TABLE_RE)) or
+        any(args is None or isinstance(args, dict) or
+            any(isinstance(value, (list, tuple, set, frozenset))
+                for value in args)
+            for args in argsList)):
+      rowcount = 0
+      for args in argsList:
+        rowcount += self.execute(query, args)
+      self.rowcount = rowcount
+      return rowcount
+
+    self._rows = []
+    self._rowIndex = 0
+    self.description = None
+    self.connection.attachReferenced(query)
+
+    translated = _translateQuery(query)
+    query, params = _bindParameters(translated, argsList[0])
+    paramsList = [params] + [_bindParameters(translated, args)[1]
+                             for args in argsList[1:]]
+    _runMapped(self._cursor.executemany, query, paramsList)
+    self.lastrowid = self._cursor.lastrowid
+    return self._setResult(self._cursor.rowcount)
+
+
+  def fetchone(self):
+    if self._rowIndex >= len(self._rows):
+      return None
+    row = self._rows[self._rowIndex]
+    self._rowIndex += 1
+    return row
+
+
+  def fetchmany(self, size=None):
+    if size is None:
+      size = self.arraysize
+    rows = self._rows[self._rowIndex:self._rowIndex + size]
+    self._rowIndex += len(rows)
+    return rows
+
+
+  def fetchall(self):
+    rows = self._rows[self._rowIndex:]
+    self._rowIndex = len(self._rows)
+    return rows
+
+
+  def __iter__(self):
+    return iter(self.fetchone, None)
+
+
+  def _run(self, query, params=()):
+    _runMapped(self._cursor.execute, query, params)
+    self.lastrowid = self._cursor.lastrowid
+    if self._cursor.description is None:
+      return self._setResult(self._cursor.rowcount)
+
+    # Buffer the rows so that the row count is known, as with pymysql
+    self.description = self._cursor.description
+    self._rows = [tuple(_convertValue(value) for value in row)
+                  for row in _runMapped(self._cursor.fetchall)]
+    return self._setResult(len(self._rows))
+
+
+  def _setResult(self, rowcount):
+    self.rowcount = rowcount
+    return rowcount
+
+
+  def _getExistingDatabase(self, dbName):
+    if not self.connection.databaseExists(dbName):
+      raise pymysql.InternalError(ER.BAD_DB_ERROR,
+                                  "Unknown database '%s'" % dbName)
+    self.connection.attach(dbName)
+    return dbName
+
+
+  def _dropDatabase(self, dbName, mustExist):
+    """ Drop every table of a database. The (then empty) file is kept, since
+    other connections may still have it attached.
+    """
+    if not mustExist and not self.connection.databaseExists(dbName):
+      return self._setResult(0)
+    self._getExistingDatabase(dbName)
+
+    self._run("SELECT name FROM %s.sqlite_master WHERE type='table' AND "
+                 "name NOT LIKE 'sqlite_%%'" % dbName)
+    tableNames = [row[0] for row in self.fetchall()]
+    for tableName in tableNames:
+      self._run('DROP TABLE IF EXISTS %s."%s"' % (dbName, tableName))
+
+    self._run("SELECT name FROM %s.sqlite_master WHERE type='table' AND "
+                 "name='sqlite_sequence'" % dbName)
+    if self.fetchall():
+      self._run("DELETE FROM %s.sqlite_sequence" % dbName)
+
+    return self._setResult(len(tableNames))
+
+
+  def _describe(self, dbName, tableName):
+    """ Emulate DESCRIBE: one (Field, Type, Null, Key, Default, Extra) row per
+    column, in declaration order.
+    """
+    if dbName is None:
+      dbName = "main"
+    else:
+      self._getExistingDatabase(dbName)
+
+    self._run('PRAGMA %s.table_info("%s")' % (dbName, tableName))
+    columns = self.fetchall()
+    if not columns:
+      raise pymysql.ProgrammingError(
+        ER.NO_SUCH_TABLE, "Table '%s.%s' doesn't exist" % (dbName, tableName))
+
+    self._rows = [(name, colType, "NO" if notNull else "YES",
+                   "PRI" if pk else "", default, "")
+                  for _, name, colType, notNull, default, pk in columns]
+    self._rowIndex = 0
+    return self._setResult(len(self._rows))
+
+
+
+def getDefaultDatabaseDir():
+  """
+  :returns: (string) the directory holding the SQLite databases, per the
+            ``nupic.cluster.database.sqliteDir`` configuration setting
+  """
+  databaseDir = Configuration.get("nupic.cluster.database.sqliteDir")
+  if not databaseDir:
+    databaseDir = os.path.join(tempfile.gettempdir(), "nupic-sqlite")
+  return databaseDir
+
+
+
+def _runMapped(method, *args):
+  """ Call a sqlite3 method, translating its errors to the pymysql exceptions
+  the MySQL backend would raise.
+  """
+  try:
+    return method(*args)
+  except sqlite3.IntegrityError as e:
+    message = str(e)
+    if "UNIQUE" in message or "PRIMARY KEY" in message:
+      raise pymysql.IntegrityError(ER.DUP_ENTRY, "Duplicate entry: %s" % message)
+    raise pymysql.IntegrityError(ER.BAD_NULL_ERROR, message)
+  except sqlite3.OperationalError as e:
+    message = str(e)
+    if "locked" in message or "busy" in message:
+      raise pymysql.OperationalError(ER.LOCK_WAIT_TIMEOUT, message)
+    raise pymysql.ProgrammingError(ER.PARSE_ERROR, message)
+  except sqlite3.ProgrammingError as e:
+    raise pymysql.ProgrammingError(ER.PARSE_ERROR, str(e))
+  except sqlite3.DatabaseError as e:
+    raise pymysql.InternalError(ER.UNKNOWN_ERROR, str(e))
+
+
+
+def _utcTimestamp():
+  return datetime.datetime.utcnow().strftime(_DATETIME_FORMAT)
+
+
+
+def _parseDatetime(value):
+  if value is None or isinstance(value, datetime.datetime):
+    return value
+  if isinstance(value, buffer):
+    value = str(value)
+  if "." in value:
+    return datetime.datetime.strptime(value, _DATETIME_FORMAT + ".%f")
+  return datetime.datetime.strptime(value, _DATETIME_FORMAT)
+
+
+
+sqlite3.register_converter("DATETIME", _parseDatetime)
+
+
+
+def _timestampDiff(unit, start, end):
+  """ TIMESTAMPDIFF(unit, start, end): whole units from start to end. """
+  start = _parseDatetime(start)
+  end = _parseDatetime(end)
+  if start is None or end is None:
+    return None
+  seconds = (end - start).total_seconds()
+  # Truncate towards zero, as MySQL does
+  return int(seconds / _TIMESTAMPDIFF_UNITS[unit.upper()])
+
+
+
+def _convertValue(value):
+  """ Return BLOBs as byte strings, as pymysql does for binary columns. """
+  if isinstance(value, buffer):
+    return str(value)
+  return value
+
+
+
+def _adaptParameter(value):
+  """ Bind a byte string that is not valid text (e.g. a binary hash) as a
+  BLOB. Since the choice only depends on the value, a value stored this way
+  still compares equal to the same value passed as a query parameter.
+  """
+  if isinstance(value, str):
+    if "\0" in value:
+      return buffer(value)
+    try:
+      value.decode("utf-8")
+    except UnicodeDecodeError:
+      return buffer(value)
+  return value
+
+
+
+def _bindParameters(query, args):
+  """ Replace pymysql's ``%s`` placeholders with SQLite's ``?``.
+
+  :returns: (tuple) the query and its list of parameters
+  """
+  if args is None:
+    return query, ()
+  if isinstance(args, dict):
+    raise pymysql.ProgrammingError(
+      ER.PARSE_ERROR, "Named parameters are not supported by the SQLite backend")
+
+  argIter = iter(args)
+  params = []
+
+  def replace(match):
+    if match.group(0) == "%%":
+      return "%"
+    try:
+      value = next(argIter)
+    except StopIteration:
+      raise pymysql.ProgrammingError(
+        ER.PARSE_ERROR, "Not enough parameters for query %r" % query)
+    if isinstance(value, (list, tuple, set, frozenset)):
+      values = list(value)
+      params.extend(_adaptParameter(v) for v in values)
+      return "(%s)" % ", ".join("?" * len(values))
+    params.append(_adaptParameter(value))
+    return "?"
+
+  query = _PARAM_RE.sub(replace, query)
+  return query, params
+
+
+
+def _translateQuery(query):
+  """ Translate the MySQL-only constructs of a DML query. Translations are
+  kept, as the DAO runs the same few queries over and over.
+  """
+  translated = _translatedQueries.get(query)
+  if translated is None:
+    if len(_translatedQueries) >= _MAX_TRANSLATED_QUERIES:
+      _translatedQueries.clear()
+    translated = _translatedQueries[query] = _translateUncachedQuery(query)
+  return translated
+
+
+
+def _translateUncachedQuery(query):
+  query = re.sub(r"\bLAST_INSERT_ID\s*\(\s*\)", "last_insert_rowid()", query,
+                 flags=re.I)
+  query = re.sub(r"^\s*INSERT\s+IGNORE\b", "INSERT OR IGNORE", query,
+                 flags=re.I)
+  # SQLite does not accept database-qualified wildcards, e.g. db.jobs.*
+  query = re.sub(r"\b\w+\.(\w+)\.\*", r"\1.*", query)
+  query = _TIMESTAMPDIFF_RE.sub(
+    lambda match: "TIMESTAMPDIFF('%s'," % match.group(1).upper(), query)
+
+  # SQLite only supports UPDATE/DELETE ... LIMIT when compiled with
+  # SQLITE_ENABLE_UPDATE_DELETE_LIMIT
+  match = _LIMITED_UPDATE_RE.match(query)
+  if match:
+    statement, updateTable, deleteTable, where, limit = match.groups()
+    query = "%s WHERE rowid IN (SELECT rowid FROM %s WHERE %s LIMIT %s)" % (
+      statement, updateTable or deleteTable, where, limit)
+
+  return query
+
+
+
+def _splitTopLevel(text):
+  """ Split a comma-separated list, ignoring the commas inside parentheses. """
+  items = []
+  depth = 0
+  start = 0
+  for i, char in enumerate(text):
+    if char == "(":
+      depth += 1
+    elif char == ")":
+      depth -= 1
+    elif char == "," and depth == 0:
+      items.append(text[start:i].strip())
+      start = i + 1
+  items.append(text[start:].strip())
+  return [item for item in items if item]
+
+
+
+def _translateCreateTable(match):
+  """ Translate a MySQL CREATE TABLE statement.
+
+  :param match: match of ``_CREATE_TABLE_RE``
+  :returns: (list) of (statement, parameters) tuples to execute in order
+  """
+  ifNotExists, dbName, tableName, body, options = match.groups()
+  qualifiedName = "%s.%s" % (dbName, tableName) if dbName else tableName
+  prefix = "%s." % dbName if dbName else ""
+
+  columns = []
+  constraints = []
+  indexes = []
+  primaryKey = None
+  autoIncrementColumn = None
+
+  for definition in _splitTopLevel(body):
+    if _PRIMARY_KEY_RE.match(definition):
+      primaryKey = definition
+      continue
+
+    indexMatch = _INDEX_RE.match(definition)
+    if indexMatch:
+      unique, indexColumns = indexMatch.groups()
+      if unique:
+        constraints.append("UNIQUE (%s)" % indexColumns)
+      else:
+        indexes.append([c.strip() for c in indexColumns.split(",")])
+      continue
+
+    if re.search(r"\bAUTO_INCREMENT\b", definition, re.I):
+      autoIncrementColumn = definition.split()[0]
+      columns.append("%s INTEGER PRIMARY KEY AUTOINCREMENT" %
+                     autoIncrementColumn)
+      continue
+
+    definition = _BINARY_TYPE_RE.sub("BLOB", definition)
+    definition = _DOUBLE_QUOTED_RE.sub(r"'\1'", definition)
+    columns.append(definition)
+
+  if primaryKey is not None:
+    keyColumns = [c.strip()
+                  for c in _PRIMARY_KEY_RE.match(primaryKey).group(1).split(",")]
+    if keyColumns != [autoIncrementColumn]:
+      constraints.append(primaryKey)
+
+  statements = [("CREATE TABLE %s%s (%s)" % (
+    "IF NOT EXISTS " if ifNotExists else "", qualifiedName,
+    ", ".join(columns + constraints)), ())]
+
+  for indexColumns in indexes:
+    statements.append((
+      "CREATE INDEX IF NOT EXISTS %s%s_%s ON %s (%s)" % (
+        prefix, tableName, "_".join(indexColumns), tableName,
+        ", ".join(indexColumns)), ()))
+
+  autoIncrementMatch = re.search(r"\bAUTO_INCREMENT\s*=\s*(\d+)", options, re.I)
+  if autoIncrementMatch and autoIncrementColumn is not None:
+    # The next AUTOINCREMENT id is one more than the sequence's value
+    statements.append((
+      "INSERT INTO %ssqlite_sequence (name, seq) SELECT ?, ? WHERE NOT EXISTS "
+      "(SELECT 1 FROM %ssqlite_sequence WHERE name=?)" % (prefix, prefix),
+      (tableName, int(autoIncrementMatch.group(1)) - 1, tableName)))
+
+  return statements
@@ -27,6 +27,7 @@ import numpy
 
 from nupic.encoders.utils import bitsToString
 from nupic.serializable import Serializable
+from nupic.support.memory_usage import getObjectSize
 
 defaultDtype = numpy.uint8
 
@@ -259,6 +260,18 @@ class Encoder(Serializable):
     return encoders
 
 
+  def getMemoryUsage(self):
+    """
+    :return: dict with the number of bytes used by the encoder. An encoder
+             with sub-encoders maps the name of each sub-encoder to its own
+             memory usage; other encoders report their whole ``state``.
+    """
+    if getattr(self, "encoders", None) is not None:
+      return dict((name, encoder.getMemoryUsage())
+                  for (name, encoder, offset) in self.encoders)
+    return {"state": getObjectSize(self)}
+
+
   def getScalars(self, inputData):
     """
     Returns a numpy array containing the sub-field scalar value(s) for
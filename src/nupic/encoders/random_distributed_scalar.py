@@ -29,6 +29,7 @@ from nupic.data import SENTINEL_VALUE_FOR_MISSING_DATA
 from nupic.data.field_meta import FieldMetaType
 from nupic.encoders.base import Encoder
 from nupic.bindings.math import Random as NupicRandom
+from nupic.support.memory_usage import getObjectSize
 
 
 
@@ -190,6 +191,14 @@ class RandomDistributedScalarEncoder(Encoder):
     return [(self.name, 0)]
 
 
+  def getMemoryUsage(self):
+    """ See method description in base.py. Reports the ``bucketMap`` of the
+    bucket representations created so far apart from the rest of the
+    ``state``. """
+    return {"bucketMap": getObjectSize(self.bucketMap),
+            "state": getObjectSize(self, exclude=[self.bucketMap])}
+
+
   def getBucketIndices(self, x):
     """ See method description in base.py """
 
@@ -0,0 +1,322 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Incremental checkpoints of serialized model state.
+
+A :class:`DeltaCheckpoint` stores the successive states of one model in a
+single directory. Each state is first serialized as usual, e.g. by
+:meth:`~nupic.frameworks.opf.model.Model.save`, and its files are split into
+content-defined chunks. Only the chunks that are not already stored are
+written, to a new delta pack; the state of the spatial pooler columns and
+temporal memory segments that did not change serializes to the same chunks
+as before. After ``maxDeltas`` deltas, or once the deltas outgrow
+``maxDeltaRatio`` times the base, the next checkpoint is written as a new
+base and the old packs are deleted.
+
+Directory layout::
+
+    delta_checkpoint.json   manifest: files of the latest state, as lists of
+                            chunk hashes, and the packs holding the chunks
+    pack-000001.chunks      base pack: concatenated chunks
+    pack-000002.chunks      delta packs: chunks new in later states
+    ...
+
+The manifest is replaced atomically, so an interrupted checkpoint leaves the
+previous one readable.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy
+
+from nupic.frameworks.opf import opf_utils
+from nupic.support.configuration import Configuration
+
+
+
+MANIFEST_FILENAME = "delta_checkpoint.json"
+
+# Chunks are cut where the sum of the random values of the bytes in a
+# _WINDOW_SIZE byte window has its low bits all zero, which yields chunks of
+# _AVERAGE_CHUNK_SIZE bytes on average, independently of their offset
+_WINDOW_SIZE = 64
+_AVERAGE_CHUNK_SIZE = 8192
+_MIN_CHUNK_SIZE = 2048
+_MAX_CHUNK_SIZE = 65536
+_BYTE_VALUES = numpy.random.RandomState(1956).randint(
+  0, 2 ** 31, 256).astype(numpy.uint64)
+
+# Bytes of data scanned for cut points at a time
+_SCAN_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+
+class DeltaCheckpoint(object):
+  """
+  Writes and reads the successive states of a model in ``checkpointDir``.
+
+  :param checkpointDir: (string) directory of the checkpoint; created by the
+         first :meth:`write`
+  :param maxDeltas: (int) number of deltas after which the next checkpoint is
+         a new base; defaults to ``nupic.model.checkpoint.maxDeltas``
+  :param maxDeltaRatio: (float) total size of the deltas, relative to the
+         base, above which the next checkpoint is a new base; defaults to
+         ``nupic.model.checkpoint.maxDeltaRatio``
+  """
+
+  def __init__(self, checkpointDir, maxDeltas=None, maxDeltaRatio=None):
+    if maxDeltas is None:
+      maxDeltas = Configuration.getInt("nupic.model.checkpoint.maxDeltas")
+    if maxDeltaRatio is None:
+      maxDeltaRatio = Configuration.getFloat(
+        "nupic.model.checkpoint.maxDeltaRatio")
+    if maxDeltas < 0:
+      raise ValueError("maxDeltas must be >= 0, got %r" % maxDeltas)
+
+    self._logger = opf_utils.initLogger(self)
+    self.checkpointDir = os.path.abspath(checkpointDir)
+    self.maxDeltas = maxDeltas
+    self.maxDeltaRatio = maxDeltaRatio
+
+
+  def exists(self):
+    """
+    :returns: (bool) True if a state was written to the checkpoint
+    """
+    return os.path.isfile(self._getManifestPath())
+
+
+  def getMetadata(self):
+    """
+    :returns: (dict) the metadata passed to :meth:`write` with the latest state
+    """
+    return self._readManifest()["metadata"]
+
+
+  def getNumDeltas(self):
+    """
+    :returns: (int) number of deltas on top of the base
+    """
+    return len(self._readManifest()["packs"]) - 1
+
+
+  def write(self, writeState, metadata=None):
+    """ Write a new state to the checkpoint.
+
+    :param writeState: (function) called with the path of a directory that
+           does not exist yet; must serialize the full state into it
+    :param metadata: (dict) JSON-serializable metadata kept with the state
+    :returns: (int) number of bytes written to the new pack
+    """
+    manifest = None
+    if self.exists():
+      manifest = self._readManifest()
+    else:
+      _makeDirectory(self.checkpointDir)
+
+    isBase = (manifest is None or
+              len(manifest["packs"]) > self.maxDeltas or
+              manifest["deltaBytes"] > self.maxDeltaRatio * manifest["baseBytes"])
+    if isBase:
+      knownChunks = set()
+      packs = []
+      sequence = manifest["sequence"] + 1 if manifest is not None else 1
+    else:
+      knownChunks = set()
+      for pack in manifest["packs"]:
+        knownChunks.update(pack["chunks"])
+      packs = list(manifest["packs"])
+      sequence = manifest["sequence"] + 1
+
+    packName = "pack-%06d.chunks" % sequence
+    packChunks = dict()
+    tmpDir = tempfile.mkdtemp(prefix=".tmp", dir=self.checkpointDir)
+    try:
+      stateDir = os.path.join(tmpDir, "state")
+      writeState(stateDir)
+
+      files = dict()
+      dirs = []
+      packPath = os.path.join(tmpDir, packName)
+      with open(packPath, "wb") as packFile:
+        for dirPath, dirNames, fileNames in os.walk(stateDir):
+          relDir = os.path.relpath(dirPath, stateDir)
+          dirs.extend(os.path.normpath(os.path.join(relDir, dirName))
+                      for dirName in dirNames)
+          for fileName in fileNames:
+            with open(os.path.join(dirPath, fileName), "rb") as f:
+              data = f.read()
+            chunkHashes = []
+            start = 0
+            for end in _chunkBoundaries(data):
+              chunk = data[start:end]
+              chunkHash = hashlib.sha1(chunk).hexdigest()
+              if chunkHash not in knownChunks and chunkHash not in packChunks:
+                packChunks[chunkHash] = (packFile.tell(), len(chunk))
+                packFile.write(chunk)
+              chunkHashes.append(chunkHash)
+              start = end
+            files[os.path.normpath(os.path.join(relDir, fileName))] = (
+              chunkHashes)
+        packBytes = packFile.tell()
+        packFile.flush()
+        os.fsync(packFile.fileno())
+
+      os.rename(packPath, os.path.join(self.checkpointDir, packName))
+      packs.append(dict(name=packName, chunks=packChunks, numBytes=packBytes))
+
+      newManifest = dict(
+        version=1,
+        sequence=sequence,
+        metadata=metadata or dict(),
+        dirs=sorted(dirs),
+        files=files,
+        packs=packs,
+        baseBytes=packs[0]["numBytes"],
+        deltaBytes=sum(pack["numBytes"] for pack in packs[1:]))
+      manifestPath = os.path.join(tmpDir, MANIFEST_FILENAME)
+      with open(manifestPath, "w") as f:
+        json.dump(newManifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+      os.rename(manifestPath, self._getManifestPath())
+    finally:
+      shutil.rmtree(tmpDir)
+
+    # Only delete the packs of the previous base once the new manifest is in
+    # place
+    packNames = set(pack["name"] for pack in packs)
+    for fileName in os.listdir(self.checkpointDir):
+      if fileName.endswith(".chunks") and fileName not in packNames:
+        os.remove(os.path.join(self.checkpointDir, fileName))
+
+    self._logger.debug("Wrote %s %r to %r: %d bytes",
+                       "base" if isBase else "delta", packName,
+                       self.checkpointDir, packBytes)
+    return packBytes
+
+
+  def read(self, readState):
+    """ Read the latest state from the checkpoint.
+
+    :param readState: (function) called with the path of a directory holding
+           the files written by the ``writeState`` function of the latest
+           :meth:`write`; its result is returned
+    :returns: the result of ``readState``
+    """
+    manifest = self._readManifest()
+
+    chunkLocations = dict()
+    for pack in manifest["packs"]:
+      for chunkHash, (offset, length) in pack["chunks"].iteritems():
+        chunkLocations[chunkHash] = (pack["name"], offset, length)
+
+    packFiles = dict()
+    tmpDir = tempfile.mkdtemp(prefix=".tmp", dir=self.checkpointDir)
+    try:
+      for pack in manifest["packs"]:
+        packFiles[pack["name"]] = open(
+          os.path.join(self.checkpointDir, pack["name"]), "rb")
+
+      stateDir = os.path.join(tmpDir, "state")
+      os.mkdir(stateDir)
+      for relDir in manifest["dirs"]:
+        _makeDirectory(os.path.join(stateDir, relDir))
+
+      for relPath, chunkHashes in manifest["files"].iteritems():
+        with open(os.path.join(stateDir, relPath), "wb") as f:
+          for chunkHash in chunkHashes:
+            packName, offset, length = chunkLocations[chunkHash]
+            packFile = packFiles[packName]
+            packFile.seek(offset)
+            f.write(packFile.read(length))
+
+      return readState(stateDir)
+    finally:
+      for packFile in packFiles.itervalues():
+        packFile.close()
+      shutil.rmtree(tmpDir)
+
+
+  def _getManifestPath(self):
+    return os.path.join(self.checkpointDir, MANIFEST_FILENAME)
+
+
+  def _readManifest(self):
+    with open(self._getManifestPath()) as f:
+      return json.load(f)
+
+
+
+def _chunkBoundaries(data):
+  """ Split data into content-defined chunks.
+
+  :param data: (string) data to split
+  :returns: (list) end offset of each chunk
+  """
+  boundaries = []
+  start = 0
+  for cut in _findCutCandidates(data):
+    while cut - start > _MAX_CHUNK_SIZE:
+      start += _MAX_CHUNK_SIZE
+      boundaries.append(start)
+    if cut - start >= _MIN_CHUNK_SIZE:
+      boundaries.append(cut)
+      start = cut
+
+  while len(data) - start > _MAX_CHUNK_SIZE:
+    start += _MAX_CHUNK_SIZE
+    boundaries.append(start)
+  if start < len(data) or not boundaries:
+    boundaries.append(len(data))
+  return boundaries
+
+
+
+def _findCutCandidates(data):
+  """ Yield the offsets, in increasing order, after which the content of data
+  allows a chunk to end.
+  """
+  mask = numpy.uint64(_AVERAGE_CHUNK_SIZE - 1)
+  blockStart = 0
+  while blockStart + _WINDOW_SIZE <= len(data):
+    # Blocks overlap by a window, so that every window is scanned once
+    blockEnd = min(len(data), blockStart + _SCAN_BLOCK_SIZE + _WINDOW_SIZE)
+    values = _BYTE_VALUES[numpy.frombuffer(data, dtype=numpy.uint8,
+                                           count=blockEnd - blockStart,
+                                           offset=blockStart)]
+    sums = numpy.zeros(len(values) + 1, dtype=numpy.uint64)
+    numpy.cumsum(values, out=sums[1:])
+    windowSums = sums[_WINDOW_SIZE:] - sums[:-_WINDOW_SIZE]
+    for offset in numpy.flatnonzero((windowSums & mask) == 0).tolist():
+      yield blockStart + offset + _WINDOW_SIZE
+    blockStart = blockEnd - _WINDOW_SIZE + 1
+
+
+
+def _makeDirectory(path):
+  if not os.path.isdir(path):
+    os.makedirs(path)
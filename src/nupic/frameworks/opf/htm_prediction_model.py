@@ -30,8 +30,9 @@ import os
 import json
 import itertools
 import logging
+import timeit
 import traceback
-from collections import deque
+from collections import deque, Mapping
 from operator import itemgetter
 from functools import wraps
 
@@ -43,10 +44,13 @@ from nupic.data.field_meta import FieldMetaSpecial, FieldMetaInfo
 from nupic.encoders import MultiEncoder, DeltaEncoder
 from nupic.engine import Network
 from nupic.support.fs_helpers import makeDirectoryFromAbsolutePath
+from nupic.support.latency_histogram import LatencyHistogram
+from nupic.support.memory_usage import getTotal
 from nupic.frameworks.opf.opf_utils import (InferenceType,
                                             InferenceElement,
                                             SensorInput,
                                             ClassifierInput,
+                                            ModelResult,
                                             initLogger)
 
 try:
@@ -65,6 +69,14 @@ DEFAULT_ANOMALY_TRAINRECORDS = 4000
 DEFAULT_ANOMALY_THRESHOLD = 1.1
 DEFAULT_ANOMALY_CACHESIZE = 10000
 
+# Number of ModelResult containers recycled by the fast run mode. A result
+# returned by run() stays valid for this many subsequent run() calls.
+DEFAULT_FAST_RUN_RESULT_POOL_SIZE = 2
+
+# Stages of run() timed by HTMPredictionModel.enableStageTiming(). "result"
+# covers the construction of the ModelResult and of its input records.
+RUN_STAGES = ("sensor", "sp", "tm", "classifier", "anomaly", "result")
+
 
 def requireAnomalyModel(func):
   """
@@ -103,6 +115,141 @@ class NetworkInfo(object):
 
 
 
+class _ReadOnlyRecordView(Mapping):
+  """ Read-only mapping over an input record. Handed out by the fast run mode
+  in place of a deep copy of the record.
+  """
+
+  __slots__ = ("_record",)
+
+  def __init__(self, record):
+    self._record = record
+
+  def __getitem__(self, key):
+    return self._record[key]
+
+  def __iter__(self):
+    return iter(self._record)
+
+  def __len__(self):
+    return len(self._record)
+
+  def __repr__(self):
+    return "%s(%r)" % (self.__class__.__name__, self._record)
+
+  def copy(self):
+    """ Returns a mutable (shallow) dict copy of the record. """
+    return dict(self._record)
+
+
+
+class _FastRunState(object):
+  """ Ephemeral caches used by HTMPredictionModel's fast run mode.
+
+  None of the cached state is serialized; a restored model starts with empty
+  caches and repopulates them on its first record.
+
+  :param resultPoolSize: (int) number of ModelResult containers to recycle
+  """
+
+  def __init__(self, resultPoolSize):
+    if resultPoolSize < 1:
+      raise ValueError("resultPoolSize must be >= 1, got %r" % resultPoolSize)
+    self.resultPoolSize = resultPoolSize
+    self.reset()
+
+
+  def reset(self):
+    """ Drop all cached region handles and parameter values. """
+    # region name -> region handle
+    self.regions = {}
+    # (region name, parameter name) -> last value pushed to the region
+    self.regionParams = {}
+    # Parsed value of the classifier's 'steps' parameter
+    self.predictionSteps = None
+    self.resultPool = deque()
+
+
+  def nextResult(self):
+    """ Returns a recycled ModelResult with its per-record fields cleared. """
+    if len(self.resultPool) < self.resultPoolSize:
+      result = ModelResult(inferences={},
+                           sensorInput=SensorInput(),
+                           classifierInput=ClassifierInput())
+    else:
+      result = self.resultPool.popleft()
+      result.inferences.clear()
+      result.metrics = None
+    self.resultPool.append(result)
+    return result
+
+
+  def __getstate__(self):
+    return {"resultPoolSize": self.resultPoolSize}
+
+
+  def __setstate__(self, state):
+    self.__init__(state["resultPoolSize"])
+
+
+
+class _StageTimers(object):
+  """ Per-stage latency histograms of HTMPredictionModel's stage timing.
+
+  Within a sampled run() call, :meth:`lap` charges the time elapsed since the
+  previous lap to a stage; :meth:`finish` records the time charged to each
+  stage, and the total, in the histograms.
+
+  :param sampleInterval: (int) time one run() call out of this many
+  """
+
+  def __init__(self, sampleInterval):
+    if sampleInterval < 1:
+      raise ValueError("sampleInterval must be >= 1, got %r" % sampleInterval)
+    self.sampleInterval = sampleInterval
+    self.histograms = dict((stage, LatencyHistogram())
+                           for stage in RUN_STAGES + ("total",))
+    self._numCalls = 0
+    self._startTime = None
+    self._lapTime = None
+    self._elapsed = None
+
+
+  def start(self):
+    """ Called at the start of each run() call.
+
+    :returns: (bool) True if the call is sampled
+    """
+    sampled = self._numCalls % self.sampleInterval == 0
+    self._numCalls += 1
+    if sampled:
+      self._elapsed = dict.fromkeys(RUN_STAGES, 0.0)
+      self._startTime = self._lapTime = timeit.default_timer()
+    return sampled
+
+
+  def lap(self, stage):
+    now = timeit.default_timer()
+    self._elapsed[stage] += now - self._lapTime
+    self._lapTime = now
+
+
+  def finish(self):
+    for stage, elapsed in self._elapsed.iteritems():
+      self.histograms[stage].record(elapsed)
+    self.histograms["total"].record(self._lapTime - self._startTime)
+
+
+  def getStats(self):
+    """
+    :returns: (dict) stage name -> statistics of its latency histogram, see
+              :meth:`~nupic.support.latency_histogram.LatencyHistogram.getStats`
+    """
+    return dict((stage, histogram.getStats())
+                for stage, histogram in self.histograms.iteritems())
+
+
+
 class HTMPredictionModel(Model):
   """
 
@@ -227,6 +374,11 @@ class HTMPredictionModel(Model):
     self._predictedFieldIdx = None
     self._predictedFieldName = None
     self._numFields = None
+
+    # Fast run mode caches; None while the mode is disabled
+    self._fastRunState = None
+    # Stage timing histograms; None while the timing is disabled
+    self._stageTimers = None
     # init anomaly
 
     # -----------------------------------------------------------------------
@@ -280,6 +432,69 @@ class HTMPredictionModel(Model):
         (paramName))
 
 
+  def enableFastRun(self, resultPoolSize=DEFAULT_FAST_RUN_RESULT_POOL_SIZE):
+    """
+    Enable the fast run mode, which trims the per-record overhead of
+    :meth:`run` outside of the algorithms:
+
+    - region handles and the parsed classifier ``steps`` are cached
+    - region parameters (``topDownMode``, ``inferenceMode``, ``learningMode``)
+      are only pushed to a region when their value changes
+    - ``sensorInput.dataRow`` and ``sensorInput.dataDict`` are read-only views
+      instead of deep copies
+    - :class:`~nupic.frameworks.opf.opf_utils.ModelResult` containers are
+      recycled
+
+    Because results are recycled, a result returned by :meth:`run` is only
+    valid until ``resultPoolSize`` more records have been run; callers that keep
+    results longer must copy them. Region parameters must not be changed behind
+    the model's back while the mode is enabled.
+
+    :param resultPoolSize: (int) number of ModelResult containers to recycle
+    """
+    self._fastRunState = _FastRunState(resultPoolSize)
+
+
+  def enableStageTiming(self, sampleInterval=1):
+    """
+    Enable the timing of the stages of :meth:`run`: the sensor and encoders,
+    the spatial pooler, the temporal memory, the classifier, the anomaly
+    computation, and the construction of the result. The latencies are
+    recorded in fixed-size histograms, reported by :meth:`getRuntimeStats`
+    under ``stageLatencies``. Enabling the timing again resets them.
+
+    :param sampleInterval: (int) time one :meth:`run` call out of this many,
+           to bound the overhead; the overhead of a timed call is a few
+           microseconds
+    """
+    self._stageTimers = _StageTimers(sampleInterval)
+
+
+  def disableStageTiming(self):
+    """ Disable the timing of the stages of :meth:`run` and drop its
+    histograms. """
+    self._stageTimers = None
+
+
+  def isStageTimingEnabled(self):
+    """
+    :returns: (bool) True if the stages of :meth:`run` are timed
+    """
+    return self._stageTimers is not None
+
+
+  def disableFastRun(self):
+    """ Disable the fast run mode and drop its caches. """
+    self._fastRunState = None
+
+
+  def isFastRunEnabled(self):
+    """
+    :returns: (bool) True if the fast run mode is enabled
+    """
+    return self._fastRunState is not None
+
+
   def resetSequenceStates(self):
     if self._hasTP:
       # Reset TM's sequence states
@@ -404,14 +619,26 @@ class HTMPredictionModel(Model):
     assert not self.__restoringFromState
     assert inputRecord
 
-    results = super(HTMPredictionModel, self).run(inputRecord)
+    timers = self._stageTimers
+    if timers is not None and not timers.start():
+      timers = None
+
+    fastRunState = self._fastRunState
+    if fastRunState is None:
+      results = super(HTMPredictionModel, self).run(inputRecord)
+      results.inferences = {}
+    else:
+      # Same bookkeeping as Model.run(), but on a recycled container
+      results = fastRunState.nextResult()
+      results.predictionNumber = self._numPredictions
+      results.rawInput = inputRecord
+      self._numPredictions += 1
 
     self.__numRunCalls += 1
 
     if self.__logger.isEnabledFor(logging.DEBUG):
       self.__logger.debug("HTMPredictionModel.run() inputRecord=%s", (inputRecord))
 
-    results.inferences = {}
     self._input = inputRecord
 
     # -------------------------------------------------------------------------
@@ -426,11 +653,24 @@ class HTMPredictionModel(Model):
     ###########################################################################
     # Predictions and Learning
     ###########################################################################
+    if timers is not None:
+      timers.lap("result")
     self._sensorCompute(inputRecord)
+    if timers is not None:
+      timers.lap("sensor")
     self._spCompute()
+    if timers is not None:
+      timers.lap("sp")
     self._tpCompute()
+    if timers is not None:
+      timers.lap("tm")
 
-    results.sensorInput = self._getSensorInputRecord(inputRecord)
+    if fastRunState is None:
+      results.sensorInput = self._getSensorInputRecord(inputRecord)
+    else:
+      self._fillSensorInputRecord(inputRecord, results.sensorInput)
+    if timers is not None:
+      timers.lap("result")
 
     inferences = {}
 
@@ -444,15 +684,25 @@ class HTMPredictionModel(Model):
       inferences = self._classificationCompute()
 
     results.inferences.update(inferences)
+    if timers is not None:
+      timers.lap("classifier")
 
     inferences = self._anomalyCompute()
     results.inferences.update(inferences)
+    if timers is not None:
+      timers.lap("anomaly")
 
     # -----------------------------------------------------------------------
     # Store the index and name of the predictedField
     results.predictedFieldIdx = self._predictedFieldIdx
     results.predictedFieldName = self._predictedFieldName
-    results.classifierInput = self._getClassifierInputRecord(inputRecord)
+    if fastRunState is None:
+      results.classifierInput = self._getClassifierInputRecord(inputRecord)
+    else:
+      self._fillClassifierInputRecord(inputRecord, results.classifierInput)
+    if timers is not None:
+      timers.lap("result")
+      timers.finish()
 
     # =========================================================================
     # output
@@ -488,6 +738,25 @@ class HTMPredictionModel(Model):
                        sequenceReset=resetOut,
                        category=inputRecordCategory)
 
+  def _fillSensorInputRecord(self, inputRecord, sensorInput):
+    """
+    Fast run counterpart of _getSensorInputRecord(): fills the recycled
+    'SensorInput' object with read-only views instead of deep copies.
+
+    inputRecord - dict containing the input to the sensor
+    sensorInput - SensorInput object to fill in
+    """
+    sensor = self._getSensorRegion()
+    sensorSelf = sensor.getSelf()
+    # The sensor builds a new 'sourceOut' list on every compute, so a tuple
+    # of it is safe to hand out without copying the values
+    sensorInput.dataRow = tuple(sensorSelf.getOutputValues('sourceOut'))
+    sensorInput.dataDict = _ReadOnlyRecordView(inputRecord)
+    sensorInput.dataEncodings = sensorSelf.getOutputValues('sourceEncodings')
+    sensorInput.sequenceReset = sensor.getOutputData('resetOut')[0]
+    sensorInput.category = int(sensor.getOutputData('categoryOut')[0])
+
+
   def _getClassifierInputRecord(self, inputRecord):
     """
     inputRecord - dict containing the input to the sensor
@@ -495,6 +764,17 @@ class HTMPredictionModel(Model):
     Return a 'ClassifierInput' object, which contains the mapped
     bucket index for input Record
     """
+    classifierInput = ClassifierInput()
+    self._fillClassifierInputRecord(inputRecord, classifierInput)
+    return classifierInput
+
+
+  def _fillClassifierInputRecord(self, inputRecord, classifierInput):
+    """
+    inputRecord - dict containing the input to the sensor
+    classifierInput - ClassifierInput object to fill in with the mapped bucket
+                      index for input Record
+    """
     absoluteValue = None
     bucketIdx = None
 
@@ -502,13 +782,35 @@ class HTMPredictionModel(Model):
       absoluteValue = inputRecord[self._predictedFieldName]
       bucketIdx = self._classifierInputEncoder.getBucketIndices(absoluteValue)[0]
 
-    return ClassifierInput(dataRow=absoluteValue,
-                           bucketIndex=bucketIdx)
+    classifierInput.dataRow = absoluteValue
+    classifierInput.bucketIndex = bucketIdx
+
+
+  def _setRegionParameter(self, regionName, region, paramName, value):
+    """
+    Set a parameter on one of the network's regions. In fast run mode the
+    last value pushed is remembered and unchanged values are not pushed again.
+
+    regionName - name of the region in the network, used as cache key
+    region - the region itself
+    paramName - name of the parameter to set
+    value - value to set
+    """
+    fastRunState = self._fastRunState
+    if fastRunState is not None:
+      key = (regionName, paramName)
+      if key in fastRunState.regionParams and \
+         fastRunState.regionParams[key] == value:
+        return
+      fastRunState.regionParams[key] = value
+
+    region.setParameter(paramName, value)
+
 
   def _sensorCompute(self, inputRecord):
     sensor = self._getSensorRegion()
     self._getDataSource().push(inputRecord)
-    sensor.setParameter('topDownMode', False)
+    self._setRegionParameter('sensor', sensor, 'topDownMode', False)
     sensor.prepareInputs()
     try:
       sensor.compute()
@@ -522,9 +824,11 @@ class HTMPredictionModel(Model):
     if sp is None:
       return
 
-    sp.setParameter('topDownMode', False)
-    sp.setParameter('inferenceMode', self.isInferenceEnabled())
-    sp.setParameter('learningMode', self.isLearningEnabled())
+    self._setRegionParameter('SP', sp, 'topDownMode', False)
+    self._setRegionParameter('SP', sp, 'inferenceMode',
+                             self.isInferenceEnabled())
+    self._setRegionParameter('SP', sp, 'learningMode',
+                             self.isLearningEnabled())
     sp.prepareInputs()
     sp.compute()
 
@@ -541,10 +845,11 @@ class HTMPredictionModel(Model):
     else:
       topDownCompute = False
 
-    tm = self._getTPRegion()
-    tm.setParameter('topDownMode', topDownCompute)
-    tm.setParameter('inferenceMode', self.isInferenceEnabled())
-    tm.setParameter('learningMode', self.isLearningEnabled())
+    self._setRegionParameter('TM', tm, 'topDownMode', topDownCompute)
+    self._setRegionParameter('TM', tm, 'inferenceMode',
+                             self.isInferenceEnabled())
+    self._setRegionParameter('TM', tm, 'learningMode',
+                             self.isLearningEnabled())
     tm.prepareInputs()
     tm.compute()
 
@@ -600,8 +905,9 @@ class HTMPredictionModel(Model):
   def _classificationCompute(self):
     inference = {}
     classifier = self._getClassifierRegion()
-    classifier.setParameter('inferenceMode', True)
-    classifier.setParameter('learningMode', self.isLearningEnabled())
+    self._setRegionParameter('Classifier', classifier, 'inferenceMode', True)
+    self._setRegionParameter('Classifier', classifier, 'learningMode',
+                             self.isLearningEnabled())
     classifier.prepareInputs()
     classifier.compute()
 
@@ -628,13 +934,13 @@ class HTMPredictionModel(Model):
 
     #--------------------------------------------------
     # SP Top-down flow
-    sp.setParameter('topDownMode', True)
+    self._setRegionParameter('SP', sp, 'topDownMode', True)
     sp.prepareInputs()
     sp.compute()
 
     #--------------------------------------------------
     # Sensor Top-down flow
-    sensor.setParameter('topDownMode', True)
+    self._setRegionParameter('sensor', sensor, 'topDownMode', True)
     sensor.prepareInputs()
     sensor.compute()
 
@@ -810,8 +1116,9 @@ class HTMPredictionModel(Model):
     # so that it can assign the current classification to possibly
     # multiple patterns from the past and current, and also provide
     # the expected classification for some time step(s) in the future.
-    classifier.setParameter('inferenceMode', True)
-    classifier.setParameter('learningMode', needLearning)
+    self._setRegionParameter('Classifier', classifier, 'inferenceMode', True)
+    self._setRegionParameter('Classifier', classifier, 'learningMode',
+                             needLearning)
     classificationIn = {'bucketIdx': bucketIdx,
                         'actValue': actualValue}
 
@@ -826,8 +1133,7 @@ class HTMPredictionModel(Model):
 
     # ---------------------------------------------------------------
     # Get the prediction for every step ahead learned by the classifier
-    predictionSteps = classifier.getParameter('steps')
-    predictionSteps = [int(x) for x in predictionSteps.split(',')]
+    predictionSteps = self._getPredictionSteps(classifier)
 
     # We will return the results in this dict. The top level keys
     # are the step number, the values are the relative likelihoods for
@@ -950,6 +1256,25 @@ class HTMPredictionModel(Model):
     return inferences
 
 
+  def _getPredictionSteps(self, classifier):
+    """
+    Returns the classifier's 'steps' parameter parsed into a list of ints. The
+    parsed value is cached in fast run mode.
+
+    classifier - the classifier region
+    """
+    fastRunState = self._fastRunState
+    if fastRunState is not None and fastRunState.predictionSteps is not None:
+      return fastRunState.predictionSteps
+
+    predictionSteps = classifier.getParameter('steps')
+    predictionSteps = [int(x) for x in predictionSteps.split(',')]
+
+    if fastRunState is not None:
+      fastRunState.predictionSteps = predictionSteps
+    return predictionSteps
+
+
   @classmethod
   def _removeUnlikelyPredictions(cls, likelihoodsDict, minLikelihoodThreshold,
                                  maxPredictionsPerStep):
@@ -975,10 +1300,14 @@ class HTMPredictionModel(Model):
 
   def getRuntimeStats(self):
     """
-    Only returns data for a stat called ``numRunCalls``.
+    Returns ``numRunCalls`` and, while :meth:`enableStageTiming` is in effect,
+    ``stageLatencies``: the latency statistics of each stage of :meth:`run`
+    (see :data:`RUN_STAGES`) and of the whole call (``total``).
     :return:
     """
     ret = {"numRunCalls" : self.__numRunCalls}
+    if self._stageTimers is not None:
+      ret["stageLatencies"] = self._stageTimers.getStats()
 
     #--------------------------------------------------
     # Query temporal network stats
@@ -994,6 +1323,48 @@ class HTMPredictionModel(Model):
     return ret
 
 
+  def getMemoryUsage(self):
+    """
+    Returns the memory used by the model's algorithms, as reported by their
+    ``getMemoryUsage()`` methods (e.g.
+    :meth:`~nupic.algorithms.spatial_pooler.SpatialPooler.getMemoryUsage`):
+    ``encoders``, ``sp``, ``tm``, ``classifier`` and ``anomalyClassifier``,
+    each broken down by component, and ``total``, the number of bytes used by
+    all of them. Algorithms that cannot report their memory usage, such as
+    the C++ implementations, are left out.
+
+    :returns: (dict) memory usage of each algorithm, and ``total``
+    """
+    algorithms = {
+      "encoders": self._getEncoder(),
+      "sp": self._getRegionAlgorithm(self._getSPRegion(), "_sfdr"),
+      "tm": self._getRegionAlgorithm(self._getTPRegion(), "_tfdr"),
+      "classifier": self._getRegionAlgorithm(self._getClassifierRegion(),
+                                             "_sdrClassifier", "_knn"),
+      "anomalyClassifier": self._getRegionAlgorithm(
+        self._getAnomalyClassifier(), "_knnclassifier", "_knn"),
+    }
+    usage = dict((name, algorithm.getMemoryUsage())
+                 for name, algorithm in algorithms.iteritems()
+                 if hasattr(algorithm, "getMemoryUsage"))
+    usage["total"] = getTotal(usage)
+    return usage
+
+
+  @staticmethod
+  def _getRegionAlgorithm(region, *attrNames):
+    """ Returns the algorithm instance held by a region, found by following,
+    in order, each of ``attrNames`` that the current object has; None if
+    there is no such region. """
+    if region is None:
+      return None
+    algorithm = region.getSelf()
+    for attrName in attrNames:
+      if hasattr(algorithm, attrName):
+        algorithm = getattr(algorithm, attrName)
+    return algorithm
+
+
   def getFieldInfo(self, includeClassifierOnlyField=False):
     encoder = self._getEncoder()
 
@@ -1028,40 +1399,57 @@ class HTMPredictionModel(Model):
     return self.__logger
 
 
+  def _getRegion(self, regionName):
+    """
+    Returns reference to the network's region with the given name, or None if
+    the network has no such region. Handles are cached in fast run mode.
+    """
+    fastRunState = self._fastRunState
+    if fastRunState is not None:
+      regions = fastRunState.regions
+      if regionName not in regions:
+        regions[regionName] = self._netInfo.net.regions.get(regionName, None)
+      return regions[regionName]
+
+    return self._netInfo.net.regions.get(regionName, None)
+
+
   def _getSPRegion(self):
     """
     Returns reference to the network's SP region
     """
-    return self._netInfo.net.regions.get('SP', None)
+    return self._getRegion('SP')
 
 
   def _getTPRegion(self):
     """
     Returns reference to the network's TM region
     """
-    return self._netInfo.net.regions.get('TM', None)
+    return self._getRegion('TM')
 
 
   def _getSensorRegion(self):
     """
     Returns reference to the network's Sensor region
     """
-    return self._netInfo.net.regions['sensor']
+    sensor = self._getRegion('sensor')
+    if sensor is None:
+      raise KeyError('sensor')
+    return sensor
 
 
   def _getClassifierRegion(self):
     """
     Returns reference to the network's Classifier region
     """
-    if (self._netInfo.net is not None and
-        "Classifier" in self._netInfo.net.regions):
-      return self._netInfo.net.regions["Classifier"]
+    if self._netInfo.net is not None:
+      return self._getRegion("Classifier")
     else:
       return None
 
 
   def _getAnomalyClassifier(self):
-    return self._netInfo.net.regions.get("AnomalyClassifier", None)
+    return self._getRegion("AnomalyClassifier")
 
 
   def _getEncoder(self):
@@ -1307,6 +1695,12 @@ class HTMPredictionModel(Model):
     if not hasattr(self, '_maxPredictionsPerStep'):
       self._maxPredictionsPerStep = DEFAULT_MAX_PREDICTIONS_PER_STEP
 
+    if not hasattr(self, '_fastRunState'):
+      self._fastRunState = None
+
+    if not hasattr(self, '_stageTimers'):
+      self._stageTimers = None
+
     if not hasattr(self, '_hasCL'):
       self._hasCL = (self._getClassifierRegion() is not None)
 
@@ -1498,6 +1892,10 @@ class HTMPredictionModel(Model):
               and self._getAnomalyClassifier() is not None:
       self._netInfo.net.removeRegion('AnomalyClassifier')
 
+    # Cached region handles and parameters refer to the old network layout
+    if self._fastRunState is not None:
+      self._fastRunState.reset()
+
     network.addRegion("AnomalyClassifier",
                       "py.KNNAnomalyClassifierRegion",
                       json.dumps(allParams))
@@ -77,16 +77,17 @@ implementation classes.
 
 from abc import ABCMeta, abstractmethod
 
+import math
 import numbers
 import copy
 import numpy as np
 
-import nupic.math.roc_utils as roc
 from nupic.data import SENTINEL_VALUE_FOR_MISSING_DATA
 from nupic.frameworks.opf.opf_utils import InferenceType
+from nupic.math.roc_utils import SlidingAUC
 from nupic.utils import MovingAverage
 
-from collections import deque
+from collections import defaultdict, deque
 from operator import itemgetter
 from safe_interpreter import SafeInterpreter
 from io import StringIO
@@ -312,6 +313,72 @@ class _MovingMode(object):
 
 
 
+class _WindowedSum(object):
+  """ Fixed-size ring buffer that maintains the sum of the values it holds, so
+  that windowed averages are O(1) per record.
+
+  The incremental updates accumulate floating point error over long runs, so
+  the sum is recomputed exactly each time the ring wraps around (amortized O(1)
+  per record).
+  """
+
+  def __init__(self, windowSize):
+    """
+    :param windowSize: (int) number of most recent values kept in the window
+    """
+    self._windowSize = windowSize
+    self._values = [0] * windowSize
+    self._size = 0
+    self._next = 0
+    self._sum = 0
+
+
+  def __len__(self):
+    return self._size
+
+
+  def __iter__(self):
+    """ Iterate over the values in the window, oldest first. """
+    start = self._next if self._size == self._windowSize else 0
+    for i in xrange(self._size):
+      yield self._values[(start + i) % self._windowSize]
+
+
+  @property
+  def sum(self):
+    return self._sum
+
+
+  def add(self, value):
+    """ Add a value, dropping the oldest one if the window is full.
+
+    :param value: (number) value to add
+    :returns: (number) sum of the values in the window
+    """
+    if self._size == self._windowSize:
+      self._sum -= self._values[self._next]
+    else:
+      self._size += 1
+
+    self._values[self._next] = value
+    self._sum += value
+
+    self._next += 1
+    if self._next == self._windowSize:
+      self._next = 0
+      self._sum = math.fsum(self._values)
+
+    return self._sum
+
+
+
+def _probabilityThenValue(item):
+  """ Sort key of a (value, probability) item that ranks by probability, and
+  ties by value. """
+  return (item[1], item[0])
+
+
+
 def _isNumber(value):
   return isinstance(value, (numbers.Number, np.number))
 
@@ -490,8 +557,8 @@ class AggregateMetric(MetricsIface):
       # Get the metric window size
       if 'window' in metricSpec.params:
         assert metricSpec.params['window'] >= 1
-        self.history = deque([])
         self.window = metricSpec.params['window']
+        self.history = self._createHistoryBuffer(self.window)
 
       # Get the name of the sub-metric to chain to from addInstance()
       if 'errorMetric' in metricSpec.params:
@@ -506,6 +573,16 @@ class AggregateMetric(MetricsIface):
 
 
 
+  def _createHistoryBuffer(self, window):
+    """ Create the buffer passed to :meth:`accumulate` and :meth:`aggregate`
+    as ``historyBuffer`` when the metric has a window.
+
+    :param window: (int) the window size
+    :returns: the history buffer; by default an empty ``deque``
+    """
+    return deque([])
+
+
   def _getShiftedGroundTruth(self, groundTruth):
     """ Utility function that saves the passed in groundTruth into a local
     history buffer, and returns the groundTruth from self._predictionSteps ago,
@@ -567,7 +644,34 @@ class AggregateMetric(MetricsIface):
     return self.aggregateError
 
 
-class MetricNegativeLogLikelihood(AggregateMetric):
+
+class _RunningSumMetric(AggregateMetric):
+  """ Base class of the metrics that average a per-record error. The history
+  buffer is a :class:`_WindowedSum`, so the windowed sum of the errors is
+  updated in O(1) per record.
+  """
+
+  def _createHistoryBuffer(self, window):
+    return _WindowedSum(window)
+
+
+  @staticmethod
+  def _accumulateError(error, accumulatedError, historyBuffer):
+    if historyBuffer is not None:
+      return historyBuffer.add(error)
+    return accumulatedError + error
+
+
+  def aggregate(self, accumulatedError, historyBuffer, steps):
+    n = steps
+    if historyBuffer is not None:
+      n = len(historyBuffer)
+
+    return accumulatedError / float(n)
+
+
+
+class MetricNegativeLogLikelihood(_RunningSumMetric):
   """
   Computes negative log-likelihood. Likelihood is the predicted probability of
   the true data from a model. It is more powerful than metrics that only 
@@ -596,44 +700,24 @@ class MetricNegativeLogLikelihood(AggregateMetric):
           prob = minProb
         negLL -= np.log(prob)
 
-      accumulatedError += negLL
-
-      if historyBuffer is not None:
-        historyBuffer.append(negLL)
-        if len(historyBuffer) > self.spec.params["window"]:
-          accumulatedError -= historyBuffer.popleft()
+      accumulatedError = self._accumulateError(negLL, accumulatedError,
+                                               historyBuffer)
 
     return accumulatedError
 
-  def aggregate(self, accumulatedError, historyBuffer, steps):
-    n = steps
-    if historyBuffer is not None:
-      n = len(historyBuffer)
-
-    return accumulatedError / float(n)
-
 
-class MetricRMSE(AggregateMetric):
+class MetricRMSE(_RunningSumMetric):
   """
   Computes root-mean-square error.
   """
   def accumulate(self, groundTruth, prediction, accumulatedError, historyBuffer, result = None):
     error = (groundTruth - prediction)**2
-    accumulatedError += error
-
-    if historyBuffer is not None:
-      historyBuffer.append(error)
-      if len(historyBuffer) > self.spec.params["window"] :
-        accumulatedError -= historyBuffer.popleft()
-
-    return accumulatedError
+    return self._accumulateError(error, accumulatedError, historyBuffer)
 
   def aggregate(self, accumulatedError, historyBuffer, steps):
-    n = steps
-    if historyBuffer is not None:
-      n = len(historyBuffer)
-
-    return np.sqrt(accumulatedError / float(n))
+    return np.sqrt(super(MetricRMSE, self).aggregate(accumulatedError,
+                                                     historyBuffer,
+                                                     steps))
 
 
 
@@ -643,10 +727,17 @@ class MetricNRMSE(MetricRMSE):
   """
   def __init__(self, *args, **kwargs):
     super(MetricNRMSE, self).__init__(*args, **kwargs)
-    self.groundTruths = []
+    # Running count, mean and sum of squared deviations (Welford) of all the
+    #  ground truths seen so far, for their standard deviation
+    self._groundTruthCount = 0
+    self._groundTruthMean = 0.0
+    self._groundTruthM2 = 0.0
 
   def accumulate(self, groundTruth, prediction, accumulatedError, historyBuffer, result = None):
-    self.groundTruths.append(groundTruth)
+    self._groundTruthCount += 1
+    delta = groundTruth - self._groundTruthMean
+    self._groundTruthMean += delta / float(self._groundTruthCount)
+    self._groundTruthM2 += delta * (groundTruth - self._groundTruthMean)
 
     return super(MetricNRMSE, self).accumulate(groundTruth,
                                                prediction,
@@ -658,32 +749,18 @@ class MetricNRMSE(MetricRMSE):
     rmse = super(MetricNRMSE, self).aggregate(accumulatedError,
                                               historyBuffer,
                                               steps)
-    denominator = np.std(self.groundTruths)
+    denominator = np.sqrt(self._groundTruthM2 / self._groundTruthCount)
     return rmse / denominator if denominator > 0 else float("inf")
 
 
 
-class MetricAAE(AggregateMetric):
+class MetricAAE(_RunningSumMetric):
   """
   Computes average absolute error.
   """
   def accumulate(self, groundTruth, prediction, accumulatedError, historyBuffer, result = None):
     error = abs(groundTruth - prediction)
-    accumulatedError += error
-
-    if historyBuffer is not None:
-      historyBuffer.append(error)
-      if len(historyBuffer) > self.spec.params["window"] :
-        accumulatedError -= historyBuffer.popleft()
-
-    return accumulatedError
-
-  def aggregate(self, accumulatedError, historyBuffer, steps):
-    n = steps
-    if historyBuffer is not None:
-      n = len(historyBuffer)
-
-    return accumulatedError/ float(n)
+    return self._accumulateError(error, accumulatedError, historyBuffer)
 
 
 
@@ -701,10 +778,17 @@ class MetricAltMAPE(AggregateMetric):
   """
 
   def __init__(self, metricSpec):
+    self._groundTruthWindow = None
     super(MetricAltMAPE, self).__init__(metricSpec)
     self._accumulatedGroundTruth = 0
     self._accumulatedError = 0
 
+  def _createHistoryBuffer(self, window):
+    # The history buffer holds the absolute errors; the absolute ground truths
+    #  are kept in a parallel window
+    self._groundTruthWindow = _WindowedSum(window)
+    return _WindowedSum(window)
+
   def addInstance(self, groundTruth, prediction, record = None, result = None):
 
     # If missing data,
@@ -720,14 +804,12 @@ class MetricAltMAPE(AggregateMetric):
 
     # Update the accumulated groundTruth and aggregate error
     if self.history is not None:
-      self.history.append((groundTruth, error))
-      if len(self.history) > self.spec.params["window"] :
-        (oldGT, oldErr) = self.history.popleft()
-        self._accumulatedGroundTruth -= oldGT
-        self._accumulatedError -= oldErr
-
-    self._accumulatedGroundTruth += abs(groundTruth)
-    self._accumulatedError += error
+      self._accumulatedGroundTruth = self._groundTruthWindow.add(
+        abs(groundTruth))
+      self._accumulatedError = self.history.add(error)
+    else:
+      self._accumulatedGroundTruth += abs(groundTruth)
+      self._accumulatedError += error
 
     # Compute aggregate pct error
     if self._accumulatedGroundTruth > 0:
@@ -762,6 +844,10 @@ class MetricMAPE(AggregateMetric):
   def __init__(self, metricSpec):
     super(MetricMAPE, self).__init__(metricSpec)
     self._accumulatedPctError = 0
+    self._numSamples = 0
+
+  def _createHistoryBuffer(self, window):
+    return _WindowedSum(window)
 
   def addInstance(self, groundTruth, prediction, record = None, result = None):
 
@@ -786,15 +872,14 @@ class MetricMAPE(AggregateMetric):
 
     # Update the accumulated groundTruth and aggregate error
     if self.history is not None:
-      self.history.append(pctError)
-      if len(self.history) > self.spec.params["window"] :
-        (oldPctErr) = self.history.popleft()
-        self._accumulatedPctError -= oldPctErr
-
-    self._accumulatedPctError += pctError
+      self._accumulatedPctError = self.history.add(pctError)
+      self._numSamples = len(self.history)
+    else:
+      self._accumulatedPctError += pctError
+      self._numSamples += 1
 
     # Compute aggregate pct error
-    self.aggregateError = 100.0 * self._accumulatedPctError / len(self.history)
+    self.aggregateError = 100.0 * self._accumulatedPctError / self._numSamples
 
     if self.verbosity >= 1:
       print "  accumPctError:", self._accumulatedPctError
@@ -1255,7 +1340,7 @@ class MetricTwoGram(AggregateMetric):
 
 
 
-class MetricAccuracy(AggregateMetric):
+class MetricAccuracy(_RunningSumMetric):
   """
   Computes simple accuracy for an enumerated type. all inputs are treated as
   discrete members of a set, therefore for example 0.5 is only a correct
@@ -1267,25 +1352,11 @@ class MetricAccuracy(AggregateMetric):
 
     # This is really an accuracy measure rather than an "error" measure
     error = 1.0 if groundTruth == prediction else 0.0
-    accumulatedError += error
-
-    if historyBuffer is not None:
-      historyBuffer.append(error)
-      if len(historyBuffer) > self.spec.params["window"] :
-        accumulatedError -= historyBuffer.popleft()
-
-    return accumulatedError
-
-  def aggregate(self, accumulatedError, historyBuffer, steps):
-    n = steps
-    if historyBuffer is not None:
-      n = len(historyBuffer)
-
-    return accumulatedError/ float(n)
+    return self._accumulateError(error, accumulatedError, historyBuffer)
 
 
 
-class MetricAveError(AggregateMetric):
+class MetricAveError(_RunningSumMetric):
   """
   Simply the inverse of the Accuracy metric.  More consistent with scalar 
   metrics because they all report an error to be minimized.
@@ -1294,21 +1365,7 @@ class MetricAveError(AggregateMetric):
   def accumulate(self, groundTruth, prediction, accumulatedError, historyBuffer, result = None):
 
     error = 1.0 if groundTruth != prediction else 0.0
-    accumulatedError += error
-
-    if historyBuffer is not None:
-      historyBuffer.append(error)
-      if len(historyBuffer) > self.spec.params["window"] :
-        accumulatedError -= historyBuffer.popleft()
-
-    return accumulatedError
-
-  def aggregate(self, accumulatedError, historyBuffer, steps):
-    n = steps
-    if historyBuffer is not None:
-      n = len(historyBuffer)
-
-    return accumulatedError/ float(n)
+    return self._accumulateError(error, accumulatedError, historyBuffer)
 
 
 
@@ -1323,6 +1380,13 @@ class MetricNegAUC(AggregateMetric):
   y-axis and the FPR (False Positive Rate) on the x-axis.
   """
 
+  def __init__(self, metricSpec):
+    super(MetricNegAUC, self).__init__(metricSpec)
+    # AUC of the binary samples in the history buffer
+    self._slidingAUC = SlidingAUC()
+    # Number of samples of each class in the history buffer
+    self._classCounts = defaultdict(int)
+
   def accumulate(self, groundTruth, prediction, accumulatedError, historyBuffer, result = None):
     """ 
     Accumulate history of groundTruth and "prediction" values.
@@ -1340,12 +1404,18 @@ class MetricNegAUC(AggregateMetric):
     if self.disabled:
       return 0
 
-    # Just store the groundTruth, probability into our history buffer. We will
-    #  wait until aggregate gets called to actually compute AUC.
+    # Store the groundTruth and the score of category 1 into our history buffer
+    #  and update the AUC of the window incrementally. Note that because we are
+    #  online, there's a chance that some of the earlier classification
+    #  probabilities don't have the True class (category 1) yet because it
+    #  hasn't been seen yet. Therefore, we use probs.get() with a default value
+    #  of 0.
     if historyBuffer is not None:
-      historyBuffer.append((groundTruth, prediction[0]))
+      sample = (groundTruth, prediction[0].get(1, 0))
+      historyBuffer.append(sample)
+      self._addSample(sample)
       if len(historyBuffer) > self.spec.params["window"] :
-        historyBuffer.popleft()
+        self._removeSample(historyBuffer.popleft())
 
     # accumulatedError not used in this metric
     return 0
@@ -1356,19 +1426,15 @@ class MetricNegAUC(AggregateMetric):
     if self.disabled:
       return 0.0
 
-    if historyBuffer is not None:
-      n = len(historyBuffer)
-    else:
+    if historyBuffer is None:
       return 0.0
 
-    # For performance reasons, only re-compute this every 'computeEvery' steps
+    # Only report a new value every 'computeEvery' steps
     frequency = self.spec.params.get('computeEvery', 1)
     if ((steps+1) % frequency) != 0:
       return self.aggregateError
 
-    # Compute the ROC curve and the area underneath it
-    actuals = [gt for (gt, probs) in historyBuffer]
-    classes = np.unique(actuals)
+    classes = sorted(self._classCounts)
 
     # We can only compute ROC when we have at least 1 sample of each category
     if len(classes) < 2:
@@ -1376,7 +1442,7 @@ class MetricNegAUC(AggregateMetric):
 
     # Print warning the first time this metric is asked to be computed on a
     #  problem with more than 2 classes
-    if sorted(classes) != [0,1]:
+    if classes != [0,1]:
       print "WARNING: AUC only implemented for binary classifications where " \
           "the categories are category 0 and 1. In this network, the " \
           "categories are: %s" % (classes)
@@ -1385,26 +1451,21 @@ class MetricNegAUC(AggregateMetric):
       self.disabled = True
       return 0.0
 
-    # Compute the ROC and AUC. Note that because we are online, there's a
-    #  chance that some of the earlier classification probabilities don't
-    #  have the True class (category 1) yet because it hasn't been seen yet.
-    #  Therefore, we use probs.get() with a default value of 0.
-    scores = [probs.get(1, 0) for (gt, probs) in historyBuffer]
-    (fpr, tpr, thresholds) = roc.ROCCurve(actuals, scores)
-    auc = roc.AreaUnderCurve(fpr, tpr)
+    return -1 * self._slidingAUC.getAUC()
 
-    # Debug?
-    if False:
-      print
-      print "AUC metric debug info (%d steps):" % (steps)
-      print " actuals:", actuals
-      print " probabilities:", ["%.2f" % x for x in scores]
-      print " fpr:", fpr
-      print " tpr:", tpr
-      print " thresholds:", thresholds
-      print " AUC:", auc
+  def _addSample(self, sample):
+    groundTruth, score = sample
+    self._classCounts[groundTruth] += 1
+    if groundTruth in (0, 1):
+      self._slidingAUC.add(groundTruth, score)
 
-    return -1 * auc
+  def _removeSample(self, sample):
+    groundTruth, score = sample
+    self._classCounts[groundTruth] -= 1
+    if self._classCounts[groundTruth] == 0:
+      del self._classCounts[groundTruth]
+    if groundTruth in (0, 1):
+      self._slidingAUC.remove(groundTruth, score)
 
 
 
@@ -1454,10 +1515,8 @@ class MetricMultiStep(AggregateMetric):
         #  them.
         if isinstance(stepPrediction, dict) \
             and not isinstance(subErrorMetric, CustomErrorMetric):
-          predictions = [(prob,value) for (value, prob) in \
-                                                    stepPrediction.iteritems()]
-          predictions.sort()
-          stepPrediction = predictions[-1][1]
+          stepPrediction = max(stepPrediction.iteritems(),
+                               key=_probabilityThenValue)[0]
 
         # Get sum of the errors
         aggErr = subErrorMetric.addInstance(groundTruth, stepPrediction, record, result)
@@ -1522,6 +1581,8 @@ class MetricMultiStepProbability(AggregateMetric):
     for subErrorMetric in self._subErrorMetrics:
       subErrorMetric.window = 1
       subErrorMetric.spec.params['window'] = 1
+      if getattr(subErrorMetric, "history", None) is not None:
+        subErrorMetric.history = subErrorMetric._createHistoryBuffer(1)
 
     self._movingAverage = MovingAverage(self.window)
 
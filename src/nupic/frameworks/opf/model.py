@@ -27,9 +27,11 @@ import os
 import shutil
 from abc import ABCMeta, abstractmethod
 
+from nupic.frameworks.opf.delta_checkpoint import DeltaCheckpoint
 from nupic.frameworks.opf.opf_utils import InferenceType
 import nupic.frameworks.opf.opf_utils as opf_utils
-from nupic.serializable import Serializable
+from nupic.serializable import Serializable, readMappedProto
+from nupic.support import mapped_arrays
 
 
 class Model(Serializable):
@@ -264,16 +266,48 @@ class Model(Serializable):
 
   @classmethod
   def readFromCheckpoint(cls, checkpointDir):
-    """Deerializes model from checkpointDir using capnproto"""
+    """Deerializes model from checkpointDir using capnproto. The checkpoint
+    file is memory-mapped rather than read, see
+    :func:`~nupic.serializable.readMappedProto`."""
     checkpointPath = cls._getModelCheckpointFilePath(checkpointDir)
 
-    with open(checkpointPath, 'r') as f:
-      proto = cls.getSchema().read(f)
+    with open(checkpointPath, 'rb') as f:
+      proto = readMappedProto(cls.getSchema(), f)
 
     model = cls.read(proto)
     return model
 
 
+  def writeToDeltaCheckpoint(self, checkpointDir, newSerialization=True):
+    """Serializes the model to an incremental checkpoint in ``checkpointDir``:
+    only the parts of the serialized state that changed since the previous
+    call with the same directory are written, see
+    :class:`~nupic.frameworks.opf.delta_checkpoint.DeltaCheckpoint`.
+
+    :param checkpointDir: (string) directory of the incremental checkpoint
+    :param newSerialization: (bool) True to serialize the model with
+           :meth:`writeToCheckpoint` (capnp), False to use :meth:`save`
+           (pickle)
+    :returns: (int) number of bytes written
+    """
+    return DeltaCheckpoint(checkpointDir).write(
+      self.writeToCheckpoint if newSerialization else self.save,
+      metadata=dict(newSerialization=newSerialization))
+
+
+  @classmethod
+  def readFromDeltaCheckpoint(cls, checkpointDir):
+    """Deserializes the latest state written by :meth:`writeToDeltaCheckpoint`
+
+    :param checkpointDir: (string) directory of the incremental checkpoint
+    :returns: (:class:`Model`) The loaded model instance
+    """
+    checkpoint = DeltaCheckpoint(checkpointDir)
+    if checkpoint.getMetadata()["newSerialization"]:
+      return checkpoint.read(cls.readFromCheckpoint)
+    return checkpoint.read(Model.load)
+
+
   def writeBaseToProto(self, proto):
     """Save the state maintained by the Model base class
 
@@ -311,7 +345,7 @@ class Model(Serializable):
   # Implementation of common save/load functionality
   ###############################################################################
 
-  def save(self, saveModelDir):
+  def save(self, saveModelDir, mmapArrays=False):
     """ Save the model in the given directory.
 
     :param saveModelDir: (string)
@@ -321,6 +355,11 @@ class Model(Serializable):
          pre-existing directory will only be accepted if it contains previously
          saved model data. If such a directory is given, the full contents of
          the directory will be deleted and replaced with current model data.
+    :param mmapArrays: (bool) If True, the large numpy arrays of the model and
+         of its Python regions, e.g. the SDR classifier weights, are saved to
+         their own files; :meth:`load` memory-maps them, so that they are only
+         read when used and only copied into memory when modified. See
+         :mod:`nupic.support.mapped_arrays`.
     """
     logger = self._getLogger()
     logger.debug("(%s) Creating local checkpoint in %r...",
@@ -345,16 +384,19 @@ class Model(Serializable):
     # Create a new directory for saving state
     self.__makeDirectoryFromAbsolutePath(saveModelDir)
 
-    with open(modelPickleFilePath, 'wb') as modelPickleFile:
-      logger.debug("(%s) Pickling Model instance...", self)
+    arrayDir = self._getModelArrayDir(saveModelDir) if mmapArrays else None
+    with mapped_arrays.externalArrays(arrayDir):
+      with open(modelPickleFilePath, 'wb') as modelPickleFile:
+        logger.debug("(%s) Pickling Model instance...", self)
 
-      pickle.dump(self, modelPickleFile)
+        pickle.dump(self, modelPickleFile)
 
-      logger.debug("(%s) Finished pickling Model instance", self)
+        logger.debug("(%s) Finished pickling Model instance", self)
 
 
-    # Tell the model to save extra data, if any, that's too big for pickling
-    self._serializeExtraData(extraDataDir=self._getModelExtraDataDir(saveModelDir))
+      # Tell the model to save extra data, if any, that's too big for pickling
+      self._serializeExtraData(
+        extraDataDir=self._getModelExtraDataDir(saveModelDir))
 
     logger.debug("(%s) Finished creating local checkpoint", self)
 
@@ -384,16 +426,18 @@ class Model(Serializable):
     # Load the model
     modelPickleFilePath = Model._getModelPickleFilePath(savedModelDir)
 
-    with open(modelPickleFilePath, 'r') as modelPickleFile:
-      logger.debug("Unpickling Model instance...")
+    with mapped_arrays.mappedArrays(Model._getModelArrayDir(savedModelDir)):
+      with open(modelPickleFilePath, 'r') as modelPickleFile:
+        logger.debug("Unpickling Model instance...")
 
-      model = pickle.load(modelPickleFile)
+        model = pickle.load(modelPickleFile)
 
-      logger.debug("Finished unpickling Model instance")
+        logger.debug("Finished unpickling Model instance")
 
-    # Tell the model to load extra data, if any, that was too big for pickling
-    model._deSerializeExtraData(
-        extraDataDir=Model._getModelExtraDataDir(savedModelDir))
+      # Tell the model to load extra data, if any, that was too big for
+      # pickling
+      model._deSerializeExtraData(
+          extraDataDir=Model._getModelExtraDataDir(savedModelDir))
 
     logger.debug("Finished Loading model from local checkpoint")
 
@@ -436,6 +480,17 @@ class Model(Serializable):
 
     return path
 
+  @staticmethod
+  def _getModelArrayDir(saveModelDir):
+    """ Return the absolute path to the directory where the model's
+    memory-mapped arrays are stored.
+
+    :param saveModelDir: (string)
+           Directory of where the experiment is to be or was saved
+    :returns: (string) An absolute path.
+    """
+    return os.path.abspath(os.path.join(saveModelDir, "modelarrays"))
+
   @staticmethod
   def __makeDirectoryFromAbsolutePath(absDirPath):
     """ Make directory for the given directory path if it doesn't already
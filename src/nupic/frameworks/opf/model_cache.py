@@ -0,0 +1,368 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+LRU cache that keeps a bounded number of OPF models resident in memory.
+
+Models beyond the bound are paged out to checkpoints and transparently loaded
+again the next time they are used:
+
+.. code-block:: python
+
+   cache = ModelCache("/var/models", maxResident=100)
+   cache.add("cpu", model)
+   ...
+   result = cache.run("cpu", record)   # reloads "cpu" if it was evicted
+"""
+
+import collections
+import os
+import shutil
+import time
+import urllib
+
+from nupic.frameworks.opf.model import Model
+from nupic.frameworks.opf import opf_utils
+
+
+
+# Smoothing factor of the per-model inter-arrival time estimate used for
+# prefetching
+ARRIVAL_SMOOTHING = 0.3
+
+
+
+class ModelCache(object):
+  """
+  Holds at most ``maxResident`` models in memory. When a model has to make
+  room, the least recently used one is written to its checkpoint under
+  ``checkpointDir`` and dropped; :meth:`get` and :meth:`run` load it back on
+  its next use.
+
+  The cache also estimates each model's inter-arrival time from the times
+  it is used; :meth:`prefetch` loads the evicted models that are predicted to
+  be needed within a given horizon.
+
+  :param checkpointDir: (string) directory holding the paged-out models, one
+         subdirectory per model; may be None if ``maxResident`` is None
+  :param maxResident: (int) maximum number of models kept in memory, or None
+         to keep every model resident
+  :param newSerialization: (bool) True to page models out with
+         :meth:`~nupic.frameworks.opf.model.Model.writeToCheckpoint` (capnp),
+         False to use :meth:`~nupic.frameworks.opf.model.Model.save` (pickle)
+  :param deltaCheckpoints: (bool) True to page models out to incremental
+         checkpoints with
+         :meth:`~nupic.frameworks.opf.model.Model.writeToDeltaCheckpoint`, so
+         that paging a model out again only writes what changed since its
+         previous checkpoint
+  :param mmapArrays: (bool) True to page models out with
+         ``Model.save(mmapArrays=True)`` when ``newSerialization`` and
+         ``deltaCheckpoints`` are False, so that the large numpy arrays of a
+         model are memory-mapped rather than read when it is paged back in
+  """
+
+  def __init__(self, checkpointDir, maxResident, newSerialization=True,
+               deltaCheckpoints=False, mmapArrays=False):
+    if maxResident is not None:
+      if maxResident < 1:
+        raise ValueError("maxResident must be >= 1, got %r" % maxResident)
+      if checkpointDir is None:
+        raise ValueError("A bounded ModelCache requires a checkpointDir")
+
+    self._logger = opf_utils.initLogger(self)
+    self._checkpointDir = (os.path.abspath(checkpointDir)
+                           if checkpointDir is not None else None)
+    self._maxResident = maxResident
+    self._newSerialization = newSerialization
+    self._deltaCheckpoints = deltaCheckpoints
+    self._mmapArrays = mmapArrays
+
+    # Resident models, least recently used first
+    self._resident = collections.OrderedDict()
+    # name -> class of every model known to the cache, resident or not
+    self._modelClasses = {}
+    # name -> (time of last use, smoothed inter-arrival time or None)
+    self._arrivals = {}
+    # Models loaded by prefetch() and not used since
+    self._prefetched = set()
+
+    self._hits = 0
+    self._misses = 0
+    self._evictions = 0
+    self._loads = 0
+    self._loadSeconds = 0.0
+    self._maxLoadSeconds = 0.0
+    self._prefetches = 0
+    self._prefetchHits = 0
+
+
+  def __contains__(self, name):
+    return name in self._modelClasses
+
+
+  def __len__(self):
+    return len(self._modelClasses)
+
+
+  def getModelNames(self):
+    """
+    :returns: (list) names of all models in the cache, resident or not
+    """
+    return sorted(self._modelClasses)
+
+
+  def isResident(self, name):
+    """
+    :param name: (string) model name
+    :returns: (bool) True if the model is currently held in memory
+    """
+    return name in self._resident
+
+
+  def add(self, name, model):
+    """ Add a model to the cache as its most recently used entry. This may
+    evict the least recently used model.
+
+    :param name: (string) model name
+    :param model: (:class:`~nupic.frameworks.opf.model.Model`) the model
+    """
+    if name in self._modelClasses:
+      raise ValueError("Model with name <%s> already exists" % name)
+
+    self._modelClasses[name] = model.__class__
+    self._insert(name, model)
+
+
+  def get(self, name):
+    """ Return a model, loading it from its checkpoint if it was evicted, and
+    mark it as the most recently used.
+
+    :param name: (string) model name
+    :returns: (:class:`~nupic.frameworks.opf.model.Model`) the model
+    """
+    if name not in self._modelClasses:
+      raise KeyError("Model with name <%s> does not exist" % name)
+
+    self._recordArrival(name)
+
+    if name in self._resident:
+      self._hits += 1
+      if name in self._prefetched:
+        self._prefetched.discard(name)
+        self._prefetchHits += 1
+      model = self._resident.pop(name)
+      self._resident[name] = model
+      return model
+
+    self._misses += 1
+    model = self._load(name)
+    self._insert(name, model)
+    return model
+
+
+  def run(self, name, inputRecord):
+    """ Run one record through a model, see :meth:`get`.
+
+    :param name: (string) model name
+    :param inputRecord: (dict) record passed to
+           :meth:`~nupic.frameworks.opf.model.Model.run`
+    :returns: (:class:`~nupic.frameworks.opf.opf_utils.ModelResult`)
+    """
+    return self.get(name).run(inputRecord)
+
+
+  def remove(self, name):
+    """ Drop a model from the cache and delete its checkpoint, if any.
+
+    :param name: (string) model name
+    """
+    if name not in self._modelClasses:
+      raise KeyError("Model with name <%s> does not exist" % name)
+
+    del self._modelClasses[name]
+    self._resident.pop(name, None)
+    self._arrivals.pop(name, None)
+    self._prefetched.discard(name)
+
+    if self._checkpointDir is not None:
+      checkpointDir = self.getCheckpointDir(name)
+      if os.path.isdir(checkpointDir):
+        shutil.rmtree(checkpointDir)
+
+
+  def evict(self, name):
+    """ Write a resident model to its checkpoint and drop it from memory.
+
+    :param name: (string) model name
+    """
+    # Only drop the model once its checkpoint has been written
+    self._save(name, self._resident[name])
+    del self._resident[name]
+    self._prefetched.discard(name)
+    self._evictions += 1
+
+
+  def flush(self):
+    """ Write every resident model to its checkpoint, keeping it resident. """
+    for name, model in self._resident.iteritems():
+      self._save(name, model)
+
+
+  def getCheckpointDir(self, name):
+    """
+    :param name: (string) model name
+    :returns: (string) directory the model is paged out to
+    """
+    if self._checkpointDir is None:
+      raise RuntimeError("ModelCache has no checkpointDir")
+    if isinstance(name, unicode):
+      name = name.encode("utf-8")
+    return os.path.join(self._checkpointDir, urllib.quote(name, safe=""))
+
+
+  def predictNextUse(self, name):
+    """ Predict when a model will be used next, from the smoothed interval
+    between its past uses.
+
+    :param name: (string) model name
+    :returns: (float) predicted time (as returned by ``time.time()``) or None
+              if the model has not been used at least twice
+    """
+    lastUse, interval = self._arrivals.get(name, (None, None))
+    if interval is None:
+      return None
+    return lastUse + interval
+
+
+  def prefetch(self, horizon, maxModels=None):
+    """ Load evicted models that are predicted to be used within ``horizon``
+    seconds, soonest first. Prefetching never evicts a model that is itself
+    predicted to be used before the model being loaded.
+
+    :param horizon: (float) look-ahead in seconds
+    :param maxModels: (int) maximum number of models to load; defaults to the
+           cache's capacity
+    :returns: (list) names of the models that were loaded
+    """
+    if self._maxResident is None:
+      # Nothing is ever evicted
+      return []
+    if maxModels is None:
+      maxModels = self._maxResident
+    deadline = time.time() + horizon
+
+    candidates = []
+    for name in self._modelClasses:
+      if name in self._resident:
+        continue
+      nextUse = self.predictNextUse(name)
+      if nextUse is not None and nextUse <= deadline:
+        candidates.append((nextUse, name))
+    candidates.sort()
+
+    loaded = []
+    for nextUse, name in candidates[:maxModels]:
+      if len(self._resident) >= self._maxResident:
+        victim = next(iter(self._resident))
+        victimNextUse = self.predictNextUse(victim)
+        if victimNextUse is not None and victimNextUse <= nextUse:
+          break
+      self._insert(name, self._load(name))
+      self._prefetched.add(name)
+      self._prefetches += 1
+      loaded.append(name)
+
+    return loaded
+
+
+  def getStats(self):
+    """ Return residency counters.
+
+    :returns: (dict) of counters
+    """
+    accesses = self._hits + self._misses
+    return {
+      "numModels": len(self._modelClasses),
+      "numResident": len(self._resident),
+      "maxResident": self._maxResident,
+      "hits": self._hits,
+      "misses": self._misses,
+      "hitRate": float(self._hits) / accesses if accesses else 0.0,
+      "evictions": self._evictions,
+      "loads": self._loads,
+      "loadSecondsMean": self._loadSeconds / self._loads if self._loads else 0.0,
+      "loadSecondsMax": self._maxLoadSeconds,
+      "prefetches": self._prefetches,
+      "prefetchHits": self._prefetchHits,
+    }
+
+
+  def _insert(self, name, model):
+    """ Make a model the most recently used resident entry, evicting the
+    least recently used ones if the cache is over capacity.
+    """
+    self._resident[name] = model
+    if self._maxResident is None:
+      return
+    while len(self._resident) > self._maxResident:
+      self.evict(next(iter(self._resident)))
+
+
+  def _recordArrival(self, name):
+    now = time.time()
+    lastUse, interval = self._arrivals.get(name, (None, None))
+    if lastUse is not None:
+      elapsed = now - lastUse
+      if interval is None:
+        interval = elapsed
+      else:
+        interval += ARRIVAL_SMOOTHING * (elapsed - interval)
+    self._arrivals[name] = (now, interval)
+
+
+  def _save(self, name, model):
+    checkpointDir = self.getCheckpointDir(name)
+    if self._deltaCheckpoints:
+      model.writeToDeltaCheckpoint(checkpointDir, self._newSerialization)
+    elif self._newSerialization:
+      model.writeToCheckpoint(checkpointDir)
+    else:
+      model.save(checkpointDir, mmapArrays=self._mmapArrays)
+
+
+  def _load(self, name):
+    checkpointDir = self.getCheckpointDir(name)
+    startTime = time.time()
+
+    if self._deltaCheckpoints:
+      model = self._modelClasses[name].readFromDeltaCheckpoint(checkpointDir)
+    elif self._newSerialization:
+      model = self._modelClasses[name].readFromCheckpoint(checkpointDir)
+    else:
+      model = Model.load(checkpointDir)
+
+    elapsed = time.time() - startTime
+    self._loads += 1
+    self._loadSeconds += elapsed
+    self._maxLoadSeconds = max(self._maxLoadSeconds, elapsed)
+    self._logger.debug("Loaded model %r from %r in %.3fs",
+                       name, checkpointDir, elapsed)
+    return model
@@ -0,0 +1,689 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Serving engine that hosts many OPF models in a pool of worker processes.
+
+Models are sharded across the workers by a stable hash of the model name, so
+every command for a given model is executed by the same worker. Commands for a
+model are queued in the coordinator and dispatched one batch at a time, which
+preserves per-model ordering and lets records that arrive while a batch is in
+flight be coalesced into the next batch.
+
+Each worker keeps its models in a
+:class:`~nupic.frameworks.opf.model_cache.ModelCache`, so the number of
+models resident in memory can be bounded, with the others paged out to
+checkpoints.
+
+.. code-block:: python
+
+   with ModelPool(numWorkers=4) as pool:
+     pool.createModel("cpu", modelConfig, {"predictedField": "cpu"})
+     futures = [pool.run("cpu", record) for record in records]
+     results = [future.get() for future in futures]
+     print pool.getStats()
+"""
+
+import collections
+import itertools
+import multiprocessing
+import Queue
+import threading
+import time
+import traceback
+import zlib
+
+import numpy
+
+from nupic.frameworks.opf.model_cache import ModelCache
+from nupic.frameworks.opf.model_factory import ModelFactory
+from nupic.frameworks.opf import opf_utils
+
+
+
+DEFAULT_MAX_BATCH_SIZE = 32
+
+# Number of most recent record latencies kept for the latency percentiles
+LATENCY_WINDOW_SIZE = 10000
+
+# How often (seconds) the collector thread checks that the workers are alive,
+# whether or not replies keep arriving
+_WORKER_POLL_INTERVAL = 1.0
+
+# How long (seconds) a worker waits for commands before it prefetches models
+_WORKER_IDLE_INTERVAL = 0.1
+
+# Command names understood by the workers
+_CMD_CREATE = "create"
+_CMD_LOAD = "load"
+_CMD_SAVE = "save"
+_CMD_REMOVE = "remove"
+_CMD_RUN = "run"
+
+
+
+class ModelPoolError(Exception):
+  """ Raised by :meth:`ModelPoolFuture.get` when the worker failed to execute
+  the command; the message contains the worker's traceback.
+  """
+  pass
+
+
+
+class ModelPoolFuture(object):
+  """ Pending result of a command submitted to a :class:`ModelPool`. """
+
+  __slots__ = ("_event", "_value", "_error")
+
+  def __init__(self):
+    self._event = threading.Event()
+    self._value = None
+    self._error = None
+
+
+  def ready(self):
+    """
+    :returns: (bool) True once the command has completed
+    """
+    return self._event.is_set()
+
+
+  def get(self, timeout=None):
+    """ Wait for the command to complete and return its result.
+
+    :param timeout: (float) seconds to wait, or None to wait forever
+    :returns: the command's result (a
+              :class:`~nupic.frameworks.opf.opf_utils.ModelResult` for
+              :meth:`ModelPool.run`)
+    :raises ModelPoolError: if the command failed in the worker
+    :raises RuntimeError: if the timeout expired
+    """
+    if not self._event.wait(timeout):
+      raise RuntimeError("Timed out waiting for model pool result")
+    if self._error is not None:
+      raise ModelPoolError(self._error)
+    return self._value
+
+
+  def _resolve(self, value=None, error=None):
+    self._value = value
+    self._error = error
+    self._event.set()
+
+
+
+def _workerMain(commandQueue, resultQueue, cacheArgs, prefetchHorizon):
+  """ Main loop of a worker process. Owns the models routed to this worker and
+  executes the command batches sent by the coordinator.
+
+  Each command batch is a tuple ``(modelName, command, [(requestId, arg)])``;
+  the reply is ``(modelName, [(requestId, ok, value)], computeSeconds,
+  cacheStats)``. A None batch stops the worker.
+  """
+  models = ModelCache(**cacheArgs)
+
+  while True:
+    if prefetchHorizon is None:
+      batch = commandQueue.get()
+    else:
+      try:
+        batch = commandQueue.get(timeout=_WORKER_IDLE_INTERVAL)
+      except Queue.Empty:
+        models.prefetch(prefetchHorizon)
+        continue
+    if batch is None:
+      break
+
+    name, command, requests = batch
+    replies = []
+    startTime = time.time()
+
+    for requestId, arg in requests:
+      try:
+        if command == _CMD_RUN:
+          value = models.run(name, arg)
+        elif command == _CMD_CREATE:
+          modelConfig, inferenceArgs = arg
+          model = ModelFactory.create(modelConfig)
+          if inferenceArgs is not None:
+            model.enableInference(inferenceArgs)
+          models.add(name, model)
+          value = None
+        elif command == _CMD_LOAD:
+          checkpointDir, newSerialization = arg
+          models.add(name, ModelFactory.loadFromCheckpoint(
+            checkpointDir, newSerialization=newSerialization))
+          value = None
+        elif command == _CMD_SAVE:
+          checkpointDir, newSerialization = arg
+          if newSerialization:
+            models.get(name).writeToCheckpoint(checkpointDir)
+          else:
+            models.get(name).save(checkpointDir)
+          value = None
+        elif command == _CMD_REMOVE:
+          models.remove(name)
+          value = None
+        else:
+          raise ValueError("Unknown model pool command %r" % command)
+      except Exception:
+        replies.append((requestId, False, traceback.format_exc()))
+      else:
+        replies.append((requestId, True, value))
+
+    resultQueue.put((name, replies, time.time() - startTime,
+                     models.getStats()))
+
+
+
+class _PendingRequest(object):
+  """ A command waiting in the coordinator for dispatch to a worker. """
+
+  __slots__ = ("requestId", "command", "arg", "future", "submitTime")
+
+  def __init__(self, requestId, command, arg, future):
+    self.requestId = requestId
+    self.command = command
+    self.arg = arg
+    self.future = future
+    self.submitTime = time.time()
+
+
+
+class ModelPool(object):
+  """
+  Hosts many OPF models in a pool of worker processes.
+
+  Model lifecycle (:meth:`createModel`, :meth:`loadModel`, :meth:`saveModel`,
+  :meth:`removeModel`) and :meth:`run` all return a :class:`ModelPoolFuture`
+  immediately. Commands for one model are executed in submission order.
+
+  :param numWorkers: (int) number of worker processes; defaults to the number
+         of CPUs
+  :param maxBatchSize: (int) maximum number of records of one model sent to
+         its worker in a single dispatch
+  :param maxResidentModels: (int) maximum number of models each worker keeps
+         in memory, or None for no limit; see
+         :class:`~nupic.frameworks.opf.model_cache.ModelCache`
+  :param checkpointDir: (string) directory evicted models are paged out to;
+         required with ``maxResidentModels``
+  :param newSerialization: (bool) True to page models out as capnp
+         checkpoints, False to pickle them
+  :param prefetchHorizon: (float) if not None, idle workers load evicted
+         models predicted to be used within this many seconds
+  """
+
+  def __init__(self, numWorkers=None, maxBatchSize=DEFAULT_MAX_BATCH_SIZE,
+               maxResidentModels=None, checkpointDir=None,
+               newSerialization=True, prefetchHorizon=None):
+    if numWorkers is None:
+      numWorkers = multiprocessing.cpu_count()
+    if numWorkers < 1:
+      raise ValueError("numWorkers must be >= 1, got %r" % numWorkers)
+    if maxBatchSize < 1:
+      raise ValueError("maxBatchSize must be >= 1, got %r" % maxBatchSize)
+
+    self._logger = opf_utils.initLogger(self)
+    self._numWorkers = numWorkers
+    self._maxBatchSize = maxBatchSize
+    if maxResidentModels is not None and checkpointDir is None:
+      raise ValueError("maxResidentModels requires a checkpointDir")
+    self._cacheArgs = dict(checkpointDir=checkpointDir,
+                           maxResident=maxResidentModels,
+                           newSerialization=newSerialization)
+    self._prefetchHorizon = prefetchHorizon
+
+    self._lock = threading.Lock()
+    self._requestIds = itertools.count()
+    self._workers = []
+    self._commandQueues = []
+    self._resultQueue = None
+    self._collector = None
+    self._started = False
+    self._closing = False
+
+    # model name -> deque of _PendingRequest not yet sent to the worker
+    self._pending = collections.defaultdict(collections.deque)
+    # model name -> {requestId: _PendingRequest} of the batch in flight
+    self._inFlight = {}
+    # Names of models created or loaded through this pool
+    self._modelNames = set()
+
+    self._startTime = None
+    self._recordsSubmitted = 0
+    self._recordsCompleted = 0
+    self._recordsFailed = 0
+    self._batchesDispatched = 0
+    self._recordsDispatched = 0
+    self._computeSeconds = 0.0
+    self._latencySum = 0.0
+    self._latencyMax = 0.0
+    self._latencies = collections.deque(maxlen=LATENCY_WINDOW_SIZE)
+    self._workerRecords = [0] * numWorkers
+    self._workerCacheStats = [None] * numWorkers
+
+
+  def __enter__(self):
+    self.start()
+    return self
+
+
+  def __exit__(self, *args):
+    self.close()
+
+
+  def start(self):
+    """ Start the worker processes. Called implicitly by the first command. """
+    with self._lock:
+      self._startLocked()
+
+
+  def _startLocked(self):
+    if self._started:
+      return
+    if self._closing:
+      raise RuntimeError("ModelPool has been closed")
+
+    self._resultQueue = multiprocessing.Queue()
+    for _ in xrange(self._numWorkers):
+      commandQueue = multiprocessing.Queue()
+      worker = multiprocessing.Process(target=_workerMain,
+                                       args=(commandQueue, self._resultQueue,
+                                             self._cacheArgs,
+                                             self._prefetchHorizon))
+      worker.daemon = True
+      worker.start()
+      self._commandQueues.append(commandQueue)
+      self._workers.append(worker)
+
+    self._collector = threading.Thread(target=self._collectResults,
+                                       name="ModelPoolCollector")
+    self._collector.daemon = True
+    self._collector.start()
+
+    self._startTime = time.time()
+    self._started = True
+
+
+  def close(self, timeout=None):
+    """ Stop the worker processes. Commands still queued are discarded and
+    their futures fail; models are not saved.
+
+    :param timeout: (float) seconds to wait for each worker to exit
+    """
+    with self._lock:
+      if self._closing:
+        return
+      self._closing = True
+      started = self._started
+
+      for requests in self._pending.itervalues():
+        for request in requests:
+          self._failLocked(request, "ModelPool closed")
+      self._pending.clear()
+
+    if not started:
+      return
+
+    for commandQueue in self._commandQueues:
+      commandQueue.put(None)
+    for worker in self._workers:
+      worker.join(timeout)
+      if worker.is_alive():
+        worker.terminate()
+
+    self._collector.join(timeout)
+
+    with self._lock:
+      for batch in self._inFlight.itervalues():
+        for request in batch.itervalues():
+          self._failLocked(request, "ModelPool closed")
+      self._inFlight.clear()
+
+
+  def getWorkerIndex(self, name):
+    """ Return the index of the worker that owns the given model. The routing
+    only depends on the model name and the number of workers.
+
+    :param name: (string) model name
+    :returns: (int) worker index
+    """
+    if isinstance(name, unicode):
+      name = name.encode("utf-8")
+    return (zlib.crc32(name) & 0xffffffff) % self._numWorkers
+
+
+  def getModelNames(self):
+    """
+    :returns: (list) names of the models hosted by the pool
+    """
+    with self._lock:
+      return sorted(self._modelNames)
+
+
+  def hasModel(self, name):
+    """
+    :param name: (string) model name
+    :returns: (bool) True if a model with the given name is hosted by the pool
+    """
+    with self._lock:
+      return name in self._modelNames
+
+
+  def createModel(self, name, modelConfig, inferenceArgs=None):
+    """ Create a model in its worker via
+    :meth:`~nupic.frameworks.opf.model_factory.ModelFactory.create`.
+
+    :param name: (string) unique model name
+    :param modelConfig: (dict) model description
+    :param inferenceArgs: (dict) if not None, passed to
+           :meth:`~nupic.frameworks.opf.model.Model.enableInference`
+    :returns: (:class:`ModelPoolFuture`)
+    """
+    return self._submitLifecycle(name, _CMD_CREATE,
+                                 (modelConfig, inferenceArgs), isNew=True)
+
+
+  def loadModel(self, name, checkpointDir, newSerialization=False):
+    """ Load a model in its worker via
+    :meth:`~nupic.frameworks.opf.model_factory.ModelFactory.loadFromCheckpoint`.
+
+    :param name: (string) unique model name
+    :param checkpointDir: (string) directory the model was saved to
+    :param newSerialization: (bool) True for capnp checkpoints
+    :returns: (:class:`ModelPoolFuture`)
+    """
+    return self._submitLifecycle(name, _CMD_LOAD,
+                                 (checkpointDir, newSerialization), isNew=True)
+
+
+  def saveModel(self, name, checkpointDir, newSerialization=False):
+    """ Save a model from within its worker, after all the records submitted
+    before this call have been run.
+
+    :param name: (string) model name
+    :param checkpointDir: (string) directory to save the model to
+    :param newSerialization: (bool) True to write a capnp checkpoint via
+           :meth:`~nupic.frameworks.opf.model.Model.writeToCheckpoint`,
+           False to use :meth:`~nupic.frameworks.opf.model.Model.save`
+    :returns: (:class:`ModelPoolFuture`)
+    """
+    return self._submitLifecycle(name, _CMD_SAVE,
+                                 (checkpointDir, newSerialization))
+
+
+  def removeModel(self, name):
+    """ Drop a model from its worker without saving it.
+
+    :param name: (string) model name
+    :returns: (:class:`ModelPoolFuture`)
+    """
+    future = self._submitLifecycle(name, _CMD_REMOVE, None)
+    with self._lock:
+      self._modelNames.discard(name)
+    return future
+
+
+  def run(self, name, inputRecord):
+    """ Queue one record for the given model.
+
+    :param name: (string) model name
+    :param inputRecord: (dict) record passed to
+           :meth:`~nupic.frameworks.opf.model.Model.run`
+    :returns: (:class:`ModelPoolFuture`) resolving to the
+              :class:`~nupic.frameworks.opf.opf_utils.ModelResult`
+    """
+    return self.runMany(name, [inputRecord])[0]
+
+
+  def runMany(self, name, inputRecords):
+    """ Queue several records for the given model, in order.
+
+    :param name: (string) model name
+    :param inputRecords: (list) records passed to
+           :meth:`~nupic.frameworks.opf.model.Model.run`
+    :returns: (list) of :class:`ModelPoolFuture`, one per record
+    """
+    with self._lock:
+      if name not in self._modelNames:
+        raise KeyError("Model with name <%s> does not exist" % name)
+      futures = [self._enqueueLocked(name, _CMD_RUN, record)
+                 for record in inputRecords]
+      self._recordsSubmitted += len(futures)
+      self._dispatchLocked(name)
+    return futures
+
+
+  def getStats(self):
+    """ Return throughput and latency counters.
+
+    Latencies are measured from submission to completion of a record, in
+    seconds; the percentiles cover the most recent
+    :data:`LATENCY_WINDOW_SIZE` records.
+
+    :returns: (dict) of counters
+    """
+    with self._lock:
+      elapsed = (time.time() - self._startTime) if self._started else 0.0
+      completed = self._recordsCompleted + self._recordsFailed
+      latencies = numpy.array(self._latencies, dtype=numpy.float64)
+
+      stats = {
+        "numWorkers": self._numWorkers,
+        "numModels": len(self._modelNames),
+        "recordsSubmitted": self._recordsSubmitted,
+        "recordsCompleted": self._recordsCompleted,
+        "recordsFailed": self._recordsFailed,
+        "recordsPending": self._recordsSubmitted - completed,
+        "batchesDispatched": self._batchesDispatched,
+        "meanBatchSize": (float(self._recordsDispatched) /
+                          self._batchesDispatched
+                          if self._batchesDispatched else 0.0),
+        "elapsedSeconds": elapsed,
+        "recordsPerSecond": completed / elapsed if elapsed > 0 else 0.0,
+        "computeSeconds": self._computeSeconds,
+        "workerRecords": list(self._workerRecords),
+        "latencyMean": self._latencySum / completed if completed else 0.0,
+        "latencyMax": self._latencyMax,
+        "cache": self._aggregateCacheStatsLocked(),
+      }
+      for percentile in (50, 95, 99):
+        key = "latencyP%d" % percentile
+        if len(latencies):
+          stats[key] = float(numpy.percentile(latencies, percentile))
+        else:
+          stats[key] = 0.0
+
+    return stats
+
+
+  def _aggregateCacheStatsLocked(self):
+    """ Sum the latest model cache counters reported by the workers. """
+    totals = collections.Counter()
+    maxLoadSeconds = 0.0
+    for cacheStats in self._workerCacheStats:
+      if cacheStats is None:
+        continue
+      for key in ("numModels", "numResident", "hits", "misses", "evictions",
+                  "loads", "prefetches", "prefetchHits"):
+        totals[key] += cacheStats[key]
+      totals["loadSeconds"] += (cacheStats["loadSecondsMean"] *
+                                cacheStats["loads"])
+      maxLoadSeconds = max(maxLoadSeconds, cacheStats["loadSecondsMax"])
+
+    accesses = totals["hits"] + totals["misses"]
+    stats = dict(totals)
+    stats["hitRate"] = float(totals["hits"]) / accesses if accesses else 0.0
+    stats["loadSecondsMean"] = (totals["loadSeconds"] / totals["loads"]
+                                if totals["loads"] else 0.0)
+    stats["loadSecondsMax"] = maxLoadSeconds
+    stats.pop("loadSeconds", None)
+    return stats
+
+
+  def _submitLifecycle(self, name, command, arg, isNew=False):
+    with self._lock:
+      if isNew:
+        if name in self._modelNames:
+          raise ValueError("Model with name <%s> already exists" % name)
+        self._modelNames.add(name)
+      elif name not in self._modelNames:
+        raise KeyError("Model with name <%s> does not exist" % name)
+
+      future = self._enqueueLocked(name, command, arg)
+      self._dispatchLocked(name)
+    return future
+
+
+  def _enqueueLocked(self, name, command, arg):
+    self._startLocked()
+    future = ModelPoolFuture()
+    self._pending[name].append(
+      _PendingRequest(next(self._requestIds), command, arg, future))
+    return future
+
+
+  def _dispatchLocked(self, name):
+    """ Send the next batch of the model's pending requests to its worker,
+    unless a batch of that model is already in flight. Consecutive run
+    requests are batched; lifecycle commands are always sent alone. The
+    requests of a model whose worker died fail right away.
+    """
+    if name in self._inFlight or self._closing:
+      return
+    pending = self._pending.get(name)
+    if not pending:
+      self._pending.pop(name, None)
+      return
+
+    workerIdx = self.getWorkerIndex(name)
+    if not self._workers[workerIdx].is_alive():
+      self._failModelLocked(name, workerIdx)
+      return
+
+    command = pending[0].command
+    batch = [pending.popleft()]
+    if command == _CMD_RUN:
+      while (pending and pending[0].command == _CMD_RUN and
+             len(batch) < self._maxBatchSize):
+        batch.append(pending.popleft())
+    if not pending:
+      del self._pending[name]
+
+    self._inFlight[name] = dict((r.requestId, r) for r in batch)
+    if command == _CMD_RUN:
+      self._batchesDispatched += 1
+      self._recordsDispatched += len(batch)
+
+    self._commandQueues[workerIdx].put(
+      (name, command, [(r.requestId, r.arg) for r in batch]))
+
+
+  def _collectResults(self):
+    """ Collector thread: resolves futures from the worker replies and
+    dispatches the next batch of each model. Checks that the workers are alive
+    every :data:`_WORKER_POLL_INTERVAL` seconds, also while other workers keep
+    replying.
+    """
+    nextCheckTime = time.time() + _WORKER_POLL_INTERVAL
+    while True:
+      now = time.time()
+      if now >= nextCheckTime:
+        if self._closing:
+          return
+        self._checkWorkers()
+        nextCheckTime = now + _WORKER_POLL_INTERVAL
+
+      try:
+        reply = self._resultQueue.get(timeout=max(nextCheckTime - now, 0.0))
+      except Queue.Empty:
+        continue
+      except (EOFError, IOError):
+        return
+
+      name, replies, computeSeconds, cacheStats = reply
+      now = time.time()
+
+      with self._lock:
+        batch = self._inFlight.pop(name, {})
+        self._computeSeconds += computeSeconds
+        self._workerCacheStats[self.getWorkerIndex(name)] = cacheStats
+
+        for requestId, ok, value in replies:
+          request = batch.get(requestId)
+          if request is None:
+            continue
+
+          if request.command == _CMD_RUN:
+            latency = now - request.submitTime
+            self._latencySum += latency
+            self._latencyMax = max(self._latencyMax, latency)
+            self._latencies.append(latency)
+            self._workerRecords[self.getWorkerIndex(name)] += 1
+            if ok:
+              self._recordsCompleted += 1
+            else:
+              self._recordsFailed += 1
+          elif not ok and request.command in (_CMD_CREATE, _CMD_LOAD):
+            self._modelNames.discard(name)
+
+          if ok:
+            request.future._resolve(value=value)
+          else:
+            self._logger.warning("Model pool command %r for model %r "
+                                 "failed:\n%s", request.command, name, value)
+            request.future._resolve(error=value)
+
+        self._dispatchLocked(name)
+
+
+  def _checkWorkers(self):
+    """ Fail the in-flight and pending requests of models whose worker died.
+    """
+    with self._lock:
+      dead = set(idx for idx, worker in enumerate(self._workers)
+                 if not worker.is_alive())
+      if not dead:
+        return
+
+      names = set(self._inFlight.keys()) | set(self._pending.keys())
+      for name in names:
+        workerIdx = self.getWorkerIndex(name)
+        if workerIdx in dead:
+          self._failModelLocked(name, workerIdx)
+
+
+  def _failModelLocked(self, name, workerIdx):
+    """ Fail the in-flight and pending requests of a model whose worker died.
+    """
+    self._logger.error("Model pool worker %d died; failing requests of "
+                       "model %r", workerIdx, name)
+    requests = self._inFlight.pop(name, {}).values()
+    requests.extend(self._pending.pop(name, ()))
+    for request in requests:
+      self._failLocked(request, "Worker %d died" % workerIdx)
+
+
+  def _failLocked(self, request, error):
+    """ Fail a request that will never reach or come back from a worker. """
+    if request.command == _CMD_RUN:
+      self._recordsFailed += 1
+    request.future._resolve(error=error)
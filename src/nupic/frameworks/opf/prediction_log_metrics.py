@@ -0,0 +1,483 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Offline evaluation of metrics over the prediction logs written by
+:class:`~nupic.frameworks.opf.opf_basic_environment.BasicPredictionLogger`.
+
+Archived runs can be re-scored with new metric specs without replaying the
+model. The ground truth and prediction columns of the log are loaded as arrays
+and the common metrics are computed for every record at once:
+
+.. code-block:: python
+
+   from nupic.frameworks.opf.metrics import MetricSpec
+   from nupic.frameworks.opf.prediction_log_metrics import (
+       PredictionLog, computeMetrics)
+
+   log = PredictionLog("inference/DefaultTask.TemporalMultiStep"
+                       ".predictionLog.csv")
+   spec = MetricSpec(field="kw_energy_consumption", metric="multiStep",
+                     inferenceElement="multiStepBestPredictions",
+                     params={"errorMetric": "aae", "window": 1000, "steps": 1})
+   values = computeMetrics([spec], log)[spec.getLabel()]
+   print values[-1]
+
+The values match the ones :class:`~nupic.frameworks.opf.prediction_metrics_manager.MetricsManager`
+reports record by record.
+"""
+
+import ast
+import copy
+import csv
+import os
+
+import numpy as np
+
+from nupic.data import SENTINEL_VALUE_FOR_MISSING_DATA
+from nupic.frameworks.opf import metrics
+from nupic.frameworks.opf.opf_utils import InferenceElement, InferenceType
+
+
+
+# Number of header lines of a prediction log (names, types, specials)
+_NUM_HEADER_LINES = 3
+
+_PREDICTION_LOG_SUFFIX = ".predictionLog.csv"
+
+# Base metrics computed in vectorized form. Any other metric is replayed record
+# by record through its metrics module.
+_VECTORIZED_METRICS = ("rmse", "nrmse", "aae", "acc", "avg_err", "altMAPE",
+                       "MAPE")
+
+# Metrics that need the complete ModelResult, which is not in the log
+_UNSUPPORTED_METRICS = ("negativeLogLikelihood",)
+
+
+
+class PredictionLog(object):
+  """
+  The columns of a prediction log, loaded as arrays.
+
+  Numeric columns are returned as float arrays, with ``NaN`` where the log has
+  no value. Other columns are returned as object arrays of the logged Python
+  values, with ``None`` where the log has no value.
+
+  :param path: (string) path of the ``.predictionLog.csv`` file
+  :param shifted: (bool) whether the inferences in the log are already aligned
+         with the records they predict. Logs of temporal models are shifted by
+         the logger, so by default this is derived from the inference type in
+         the file name.
+  """
+
+  def __init__(self, path, shifted=None):
+    self.path = path
+    self.inferenceType = _getInferenceTypeFromPath(path)
+
+    if shifted is None:
+      shifted = (self.inferenceType is not None and
+                 InferenceType.isTemporal(self.inferenceType))
+    self.isShifted = shifted
+
+    with open(path, "rb") as logFile:
+      reader = csv.reader(logFile)
+      header = [reader.next() for _ in xrange(_NUM_HEADER_LINES)]
+      rows = list(reader)
+
+    self._fieldNames = header[0]
+    self._rawColumns = {}
+    for i, name in enumerate(self._fieldNames):
+      # Keep the first of duplicated names (e.g. ".actual" of list inferences)
+      if name not in self._rawColumns:
+        self._rawColumns[name] = [row[i] for row in rows]
+    self._numRecords = len(rows)
+    self._columns = {}
+
+
+  def __len__(self):
+    return self._numRecords
+
+
+  def getFieldNames(self):
+    """
+    :returns: (list) names of the columns of the log
+    """
+    return list(self._fieldNames)
+
+
+  def getColumn(self, name):
+    """
+    :param name: (string) column name
+    :returns: (numpy.ndarray) the parsed column
+    """
+    if name not in self._columns:
+      if name not in self._rawColumns:
+        raise KeyError("Prediction log %r has no column %r" % (self.path, name))
+      self._columns[name] = _parseColumn(self._rawColumns[name])
+    return self._columns[name]
+
+
+  def getRawInputNames(self):
+    """
+    :returns: (list) names of the columns holding the raw input record
+    """
+    return [name for name in self._fieldNames
+            if name != "reset" and "." not in name and ":" not in name]
+
+
+  def getGroundTruth(self, inferenceElement, field=None):
+    """ Return the actual values an inference element is scored against.
+
+    :param inferenceElement: (string) the inference element
+    :param field: (string) field name for inference elements that have one
+           column per input field
+    :returns: (numpy.ndarray) one value per record
+    """
+    label = InferenceElement.getLabel(inferenceElement)
+    name = label + ".actual"
+    if name not in self._rawColumns and field is not None:
+      name = field + ".actual"
+    return self.getColumn(name)
+
+
+  def getInference(self, inferenceElement, field=None, key=None):
+    """ Return an inference, aligned so that each record holds the inference
+    made for it, as :class:`~nupic.data.inference_shifter.InferenceShifter`
+    does.
+
+    :param inferenceElement: (string) the inference element
+    :param field: (string) field name for inference elements that have one
+           column per input field
+    :param key: key of dict inference elements, e.g. the number of steps of a
+           multi-step prediction
+    :returns: (numpy.ndarray) one value per record
+    """
+    label = InferenceElement.getLabel(inferenceElement)
+    if key is not None:
+      name = "%s.%s" % (label, key)
+    elif field is not None and "%s.%s" % (field, label) in self._rawColumns:
+      name = "%s.%s" % (field, label)
+    else:
+      name = label
+    values = self.getColumn(name)
+
+    if self.isShifted:
+      return values
+    return shiftValues(values,
+                       InferenceElement.getTemporalDelay(inferenceElement, key))
+
+
+
+def shiftValues(values, delay):
+  """ Delay an array of inferences by ``delay`` records, filling the first
+  ``delay`` records with missing values.
+
+  :param values: (numpy.ndarray) one inference per record
+  :param delay: (int) number of records
+  :returns: (numpy.ndarray) the shifted inferences
+  """
+  if delay == 0:
+    return values
+  shifted = np.empty_like(values)
+  shifted[:delay] = np.nan if values.dtype.kind == "f" else None
+  if delay < len(values):
+    shifted[delay:] = values[:-delay]
+  return shifted
+
+
+
+def computeMetrics(metricSpecs, predictionLog):
+  """ Compute metrics over a prediction log.
+
+  :param metricSpecs: (list) of
+         :class:`~nupic.frameworks.opf.metrics.MetricSpec` objects
+  :param predictionLog: (:class:`PredictionLog`) the log to score
+  :returns: (dict) mapping each metric label to a float array holding the
+            metric value after each record, ``NaN`` where the metric has no
+            value yet
+  """
+  results = {}
+  for spec in metricSpecs:
+    results[spec.getLabel()] = _computeMetric(spec, predictionLog)
+  return results
+
+
+
+def _computeMetric(spec, predictionLog):
+  params = spec.params or {}
+
+  if spec.metric in _UNSUPPORTED_METRICS:
+    raise ValueError("Metric %r can not be computed from a prediction log"
+                     % spec.metric)
+
+  groundTruth = predictionLog.getGroundTruth(spec.inferenceElement, spec.field)
+  errorMetric = params.get("errorMetric")
+
+  if spec.metric in _VECTORIZED_METRICS:
+    prediction = predictionLog.getInference(spec.inferenceElement, spec.field)
+    return _computeBaseMetric(spec.metric, params, groundTruth, prediction)
+
+  if spec.metric == "trivial" and errorMetric in _VECTORIZED_METRICS:
+    steps = _getSteps(params, 1)[0]
+    return _computeBaseMetric(errorMetric, _getSubParams(params), groundTruth,
+                              shiftValues(groundTruth, steps))
+
+  if spec.metric == "multiStep" and errorMetric in _VECTORIZED_METRICS:
+    stepValues = []
+    for step in _getSteps(params, 0):
+      prediction = _getMostLikely(predictionLog.getInference(
+        spec.inferenceElement, key=step))
+      stepValues.append(_computeBaseMetric(errorMetric, _getSubParams(params),
+                                           groundTruth, prediction))
+    return _combineSteps(stepValues, _isMissing(groundTruth))
+
+  return _replayMetric(spec, predictionLog, groundTruth)
+
+
+
+def _computeBaseMetric(metricName, params, groundTruth, prediction):
+  """ Vectorized equivalent of feeding every record to the metrics module. """
+  window = params.get("window")
+  valid = ~(_isMissing(groundTruth) | _isMissing(prediction))
+  actual = groundTruth[valid]
+  predicted = prediction[valid]
+
+  if metricName in ("acc", "avg_err"):
+    matches = _equal(actual, predicted)
+    errors = matches if metricName == "acc" else ~matches
+    values = _windowedMeans(errors.astype(float), window)
+
+  elif metricName == "MAPE":
+    actual = actual.astype(float)
+    # Samples with a ground truth of 0 are ignored
+    nonzero = actual != 0
+    pctErrors = (np.abs(actual - predicted.astype(float))[nonzero] /
+                 actual[nonzero])
+    values = _expand(100.0 * _windowedMeans(pctErrors, window), nonzero)
+
+  else:
+    actual = actual.astype(float)
+    errors = actual - predicted.astype(float)
+
+    if metricName == "aae":
+      values = _windowedMeans(np.abs(errors), window)
+
+    elif metricName == "altMAPE":
+      errorSums = _windowedSums(np.abs(errors), window)
+      groundTruthSums = _windowedSums(np.abs(actual), window)
+      values = np.zeros(len(actual))
+      positive = groundTruthSums > 0
+      values[positive] = (100.0 * errorSums[positive] /
+                          groundTruthSums[positive])
+
+    else:
+      values = np.sqrt(_windowedMeans(errors ** 2, window))
+
+      if metricName == "nrmse":
+        # Normalized by the standard deviation of all the ground truths so
+        #  far. Centering on the first one keeps the running sums small.
+        centered = actual - actual[0] if len(actual) else actual
+        counts = np.arange(1, len(actual) + 1, dtype=float)
+        means = np.cumsum(centered) / counts
+        variances = np.maximum(np.cumsum(centered ** 2) / counts - means ** 2,
+                               0)
+        stds = np.sqrt(variances)
+        with np.errstate(divide="ignore", invalid="ignore"):
+          values = np.where(stds > 0, values / stds, float("inf"))
+
+  return _expand(values, valid)
+
+
+
+def _replayMetric(spec, predictionLog, groundTruth):
+  """ Feed each record of the log through the metric's module. """
+  params = spec.params or {}
+  metric = metrics.getModule(copy.deepcopy(spec))
+
+  if spec.metric in ("multiStep", "multiStepProbability"):
+    steps = _getSteps(params, 0)
+    stepPredictions = [predictionLog.getInference(spec.inferenceElement,
+                                                  key=step)
+                       for step in steps]
+    predictions = [dict(zip(steps, [_toMetricValue(value)
+                                    for value in values]))
+                   for values in zip(*stepPredictions)]
+  else:
+    predictions = predictionLog.getInference(spec.inferenceElement, spec.field)
+
+  rawInputNames = predictionLog.getRawInputNames()
+  rawInputs = zip(*[predictionLog.getColumn(name) for name in rawInputNames])
+
+  values = np.empty(len(predictionLog))
+  for i in xrange(len(predictionLog)):
+    record = dict(zip(rawInputNames, rawInputs[i])) if rawInputNames else None
+    metric.addInstance(_toMetricValue(groundTruth[i]),
+                       _toMetricValue(predictions[i]),
+                       record=record)
+    value = metric.getMetric()["value"]
+    values[i] = np.nan if value is None else value
+
+  return values
+
+
+
+def _combineSteps(stepValues, missingGroundTruth):
+  """ Average the per-step values of a multiStep metric the way
+  :class:`~nupic.frameworks.opf.metrics.MetricMultiStep` does: steps are summed
+  in order until the first one without a value, the sum is divided by the
+  number of steps, and records without ground truth keep the previous value.
+  """
+  stepValues = np.array(stepValues)
+  defined = np.cumprod(~np.isnan(stepValues), axis=0).astype(bool)
+  values = np.where(defined, stepValues, 0).sum(axis=0) / len(stepValues)
+  return _expand(values[~missingGroundTruth], ~missingGroundTruth)
+
+
+
+def _windowedSums(values, window):
+  """ Sum of each value and the ``window - 1`` values before it. """
+  sums = np.cumsum(values)
+  if window is not None and window < len(values):
+    sums[window:] -= sums[:-window].copy()
+  return sums
+
+
+
+def _windowedMeans(values, window):
+  counts = np.arange(1, len(values) + 1, dtype=float)
+  if window is not None:
+    counts = np.minimum(counts, window)
+  return _windowedSums(values, window) / counts
+
+
+
+def _expand(values, mask):
+  """ Spread the values computed at the records selected by ``mask`` over all
+  the records, each record holding the latest value so far (``NaN`` before the
+  first one).
+  """
+  positions = np.cumsum(mask) - 1
+  expanded = np.full(len(mask), np.nan)
+  hasValue = positions >= 0
+  expanded[hasValue] = values[positions[hasValue]]
+  return expanded
+
+
+
+def _getMostLikely(predictions):
+  """ Replace probability distributions by their most likely value, as
+  :class:`~nupic.frameworks.opf.metrics.MetricMultiStep` does. """
+  if predictions.dtype.kind == "f":
+    return predictions
+
+  mostLikely = np.empty(len(predictions), dtype=object)
+  for i, prediction in enumerate(predictions):
+    if isinstance(prediction, dict):
+      prediction = max(prediction.iteritems(),
+                       key=lambda item: (item[1], item[0]))[0]
+    mostLikely[i] = prediction
+  return _toFloatIfNumeric(mostLikely)
+
+
+
+def _isMissing(values):
+  if values.dtype.kind == "f":
+    return np.isnan(values)
+  return np.fromiter((value is SENTINEL_VALUE_FOR_MISSING_DATA
+                      for value in values), dtype=bool, count=len(values))
+
+
+
+def _equal(actual, predicted):
+  if actual.dtype.kind == "f" and predicted.dtype.kind == "f":
+    return actual == predicted
+  return np.fromiter((a == p for a, p in zip(actual, predicted)), dtype=bool,
+                     count=len(actual))
+
+
+
+def _getSteps(params, default):
+  steps = params.get("steps", default)
+  if not hasattr(steps, "__iter__"):
+    steps = [steps]
+  return list(steps)
+
+
+
+def _getSubParams(params):
+  subParams = dict(params)
+  subParams.pop("steps", None)
+  subParams.pop("errorMetric", None)
+  return subParams
+
+
+
+def _toMetricValue(value):
+  if isinstance(value, float) and np.isnan(value):
+    return SENTINEL_VALUE_FOR_MISSING_DATA
+  return value
+
+
+
+def _parseColumn(strings):
+  """ Parse the string cells of a column into a float array if they are all
+  numbers (or missing), else into an object array of Python values. """
+  strings = np.array(strings, dtype=object)
+  missing = (strings == "None") | (strings == "")
+  try:
+    values = np.full(len(strings), np.nan)
+    values[~missing] = strings[~missing].astype(float)
+    return values
+  except ValueError:
+    pass
+
+  values = np.empty(len(strings), dtype=object)
+  for i, cell in enumerate(strings):
+    if missing[i]:
+      values[i] = None
+      continue
+    try:
+      values[i] = ast.literal_eval(cell)
+    except (ValueError, SyntaxError):
+      values[i] = cell
+  return values
+
+
+
+def _toFloatIfNumeric(values):
+  try:
+    return np.array([np.nan if value is None else float(value)
+                     for value in values])
+  except (TypeError, ValueError):
+    return values
+
+
+
+def _getInferenceTypeFromPath(path):
+  """ Return the inference type from a log file name of the form
+  ``<label>.<inferenceType>.predictionLog.csv``, or None. """
+  filename = os.path.basename(path)
+  if not filename.endswith(_PREDICTION_LOG_SUFFIX):
+    return None
+  inferenceType = filename[:-len(_PREDICTION_LOG_SUFFIX)].rpartition(".")[2]
+  if not InferenceType.validate(inferenceType):
+    return None
+  return inferenceType
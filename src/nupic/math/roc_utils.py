@@ -22,6 +22,9 @@
 Utility functions to compute ROC (Receiver Operator Characteristic) curves
 and AUC (Area Under the Curve).
 
+AreaUnderROC() computes the AUC of a set of samples directly, and SlidingAUC
+maintains the AUC of a sliding window of samples incrementally.
+
 The ROCCurve() and AreaUnderCurve() functions are based on the roc_curve()
 and auc() functions found in metrics.py module of scikit-learn
 (http://scikit-learn.org/stable/). Scikit-learn has a BSD license (3 clause).
@@ -36,6 +39,8 @@ metrics.py file:
 
 """
 
+import bisect
+
 import numpy as np
 
 
@@ -94,35 +99,16 @@ def ROCCurve(y_true, y_score):
     n_neg = float(np.sum(y_true == classes[0]))  # nb of true negative
 
     thresholds = np.unique(y_score)
-    neg_value, pos_value = classes[0], classes[1]
-
-    tpr = np.empty(thresholds.size, dtype=np.float)  # True positive rate
-    fpr = np.empty(thresholds.size, dtype=np.float)  # False positive rate
-
-    # Build tpr/fpr vector
-    current_pos_count = current_neg_count = sum_pos = sum_neg = idx = 0
-
-    signal = np.c_[y_score, y_true]
-    sorted_signal = signal[signal[:, 0].argsort(), :][::-1]
-    last_score = sorted_signal[0][0]
-    for score, value in sorted_signal:
-        if score == last_score:
-            if value == pos_value:
-                current_pos_count += 1
-            else:
-                current_neg_count += 1
-        else:
-            tpr[idx] = (sum_pos + current_pos_count) / n_pos
-            fpr[idx] = (sum_neg + current_neg_count) / n_neg
-            sum_pos += current_pos_count
-            sum_neg += current_neg_count
-            current_pos_count = 1 if value == pos_value else 0
-            current_neg_count = 1 if value == neg_value else 0
-            idx += 1
-            last_score = score
-    else:
-        tpr[-1] = (sum_pos + current_pos_count) / n_pos
-        fpr[-1] = (sum_neg + current_neg_count) / n_neg
+
+    # Sort by decreasing score, then count the positives and negatives above
+    # the last sample of each distinct score
+    order = np.argsort(y_score, kind="mergesort")[::-1]
+    sorted_score = y_score[order]
+    is_pos = y_true[order] == classes[1]
+    last = np.r_[np.flatnonzero(np.diff(sorted_score)), sorted_score.size - 1]
+    pos_counts = np.cumsum(is_pos)[last]
+    tpr = pos_counts / n_pos
+    fpr = (last + 1 - pos_counts) / n_neg
 
     # hard decisions, add (0,0)
     if fpr.shape[0] == 2:
@@ -173,8 +159,9 @@ def AreaUnderCurve(x, y):
         raise ValueError('At least 2 points are needed to compute'
                          ' area under curve, but x.shape = %s' % x.shape)
 
-    # reorder the data points according to the x axis
-    order = np.argsort(x)
+    # reorder the data points according to the x axis; the sort is stable so
+    # that points sharing an x coordinate keep their order along the curve
+    order = np.argsort(x, kind="mergesort")
     x = x[order]
     y = y[order]
 
@@ -184,6 +171,121 @@ def AreaUnderCurve(x, y):
 
 
 
+def AreaUnderROC(yTrue, yScore):
+  """
+  Area under the ROC curve of binary samples, in O(n log n).
+
+  The AUC equals the Mann-Whitney statistic: the fraction of (positive,
+  negative) pairs in which the positive sample scores higher, ties counting
+  as half. It is computed from the ranks of the scores, without building the
+  curve. Unlike ``AreaUnderCurve(*ROCCurve(yTrue, yScore)[:2])``, it does not
+  depend on whether the curve starts at (0, 0) when the top score is tied.
+
+  :param yTrue: (array) binary labels, the larger one being positive
+  :param yScore: (array) scores of the positive class
+  :returns: (float) the AUC
+  :raises: ValueError unless there are exactly two classes
+  """
+  yTrue = np.ravel(yTrue)
+  yScore = np.ravel(yScore)
+  classes = np.unique(yTrue)
+  if classes.shape[0] != 2:
+    raise ValueError("ROC is defined for binary classification only")
+
+  # Average 1-based rank of each score, ties sharing the mean of their ranks
+  order = np.argsort(yScore, kind="mergesort")
+  sortedScore = yScore[order]
+  starts = np.r_[0, np.flatnonzero(np.diff(sortedScore)) + 1]
+  ends = np.r_[starts[1:], sortedScore.size]
+  ranks = np.empty(sortedScore.size)
+  ranks[order] = np.repeat((starts + ends + 1) / 2.0, ends - starts)
+
+  isPositive = yTrue == classes[1]
+  numPositives = float(np.count_nonzero(isPositive))
+  numNegatives = yTrue.size - numPositives
+  u = ranks[isPositive].sum() - numPositives * (numPositives + 1) / 2.0
+  return u / (numPositives * numNegatives)
+
+
+
+class SlidingAUC(object):
+  """
+  Area under the ROC curve of a sliding window of (label, score) samples,
+  maintained incrementally.
+
+  This is the Mann-Whitney statistic of :func:`AreaUnderROC`. Keeping the
+  scores of each class sorted lets every add/remove update the pair count
+  with two bisections, O(log n) comparisons, instead of recomputing the AUC
+  of the whole window.
+  """
+
+  def __init__(self):
+    # Sorted scores of the positive (1) and negative (0) samples
+    self._positives = []
+    self._negatives = []
+    # Twice the Mann-Whitney U statistic, kept integral so that removals cancel
+    # additions exactly
+    self._twiceU = 0
+
+
+  def __len__(self):
+    return len(self._positives) + len(self._negatives)
+
+
+  def add(self, label, score):
+    """
+    :param label: (int) 1 for a positive sample, 0 for a negative one
+    :param score: (float) classifier score of the positive class
+    """
+    if label:
+      self._twiceU += self._pairsBelow(self._negatives, score)
+      bisect.insort(self._positives, score)
+    else:
+      self._twiceU += self._pairsAbove(self._positives, score)
+      bisect.insort(self._negatives, score)
+
+
+  def remove(self, label, score):
+    """ Remove a sample previously passed to :meth:`add`.
+
+    :param label: (int) 1 for a positive sample, 0 for a negative one
+    :param score: (float) classifier score of the positive class
+    """
+    if label:
+      del self._positives[bisect.bisect_left(self._positives, score)]
+      self._twiceU -= self._pairsBelow(self._negatives, score)
+    else:
+      del self._negatives[bisect.bisect_left(self._negatives, score)]
+      self._twiceU -= self._pairsAbove(self._positives, score)
+
+
+  def getAUC(self):
+    """
+    :returns: (float) the AUC, or None unless both classes are present
+    """
+    numPairs = len(self._positives) * len(self._negatives)
+    if numPairs == 0:
+      return None
+    return self._twiceU / (2.0 * numPairs)
+
+
+  @staticmethod
+  def _pairsBelow(scores, score):
+    """ Twice the number of ``scores`` below ``score``, plus the ties. """
+    lo = bisect.bisect_left(scores, score)
+    hi = bisect.bisect_right(scores, score)
+    return 2 * lo + (hi - lo)
+
+
+  @staticmethod
+  def _pairsAbove(scores, score):
+    """ Twice the number of ``scores`` above ``score``, plus the ties. """
+    lo = bisect.bisect_left(scores, score)
+    hi = bisect.bisect_right(scores, score)
+    return 2 * (len(scores) - hi) + (hi - lo)
+
+
+
 def _printNPArray(x, precision=2):
   format = "%%.%df" % (precision)
   for elem in x:
@@ -43,6 +43,14 @@ if capnp:
     KNNAnomalyClassifierRegionProto
 
 
+# KNN distance methods that can be computed from overlaps of binary vectors
+_BATCH_DISTANCE_METHODS = ("rawOverlap", "pctOverlapOfInput",
+                           "pctOverlapOfProto", "pctOverlapOfLarger", "norm")
+
+# Default category of _classifyState: recompute it from the KNN classifier
+_UNKNOWN_CATEGORY = object()
+
+
 
 class KNNAnomalyClassifierRegion(PyRegion):
   """
@@ -218,6 +226,9 @@ class KNNAnomalyClassifierRegion(PyRegion):
 
   AUTO_TAG = " (auto)"
 
+  # Number of states reclassified with a single distance computation
+  _CLASSIFY_BATCH_SIZE = 128
+
 
   def __init__(self,
                trainRecords,
@@ -248,7 +259,7 @@ class KNNAnomalyClassifierRegion(PyRegion):
     self._knnclassifier = KNNClassifierRegion(**self._knnclassifierArgs)
     self.labelResults = []
     self.saved_categories = []
-    self._recordsCache = []
+    self._recordsCache = _RecordsCache(cacheSize)
 
     self._version = KNNAnomalyClassifierRegion.__VERSION__
 
@@ -286,14 +297,15 @@ class KNNAnomalyClassifierRegion(PyRegion):
         raise HTMPredictionModelInvalidArgument("Invalid argument type \'%s\'. threshold "
           "must be a number." % (type(value)))
 
-      if len(self._recordsCache) > 0 and value < self._recordsCache[0].ROWID:
+      recordsCache = self._getRecordsCache()
+      if len(recordsCache) > 0 and value < recordsCache[0].ROWID:
         raise HTMPredictionModelInvalidArgument("Invalid value. autoDetectWaitRecord "
           "value must be valid record within output stream. Current minimum "
-          " ROWID in output stream is %d." % (self._recordsCache[0].ROWID))
+          " ROWID in output stream is %d." % (recordsCache[0].ROWID))
 
       self.trainRecords = value
       # Remove any labels before the first cached record (wont be used anymore)
-      self._deleteRangeFromKNN(0, self._recordsCache[0].ROWID)
+      self._deleteRangeFromKNN(0, recordsCache[0].ROWID)
       # Reclassify all states
       self._classifyStates()
     elif name == "anomalyThreshold":
@@ -326,9 +338,7 @@ class KNNAnomalyClassifierRegion(PyRegion):
       self._classifyState(record)
 
     #Save new classification record and keep history as moving window
-    self._recordsCache.append(record)
-    while len(self._recordsCache) > self.cacheSize:
-      self._recordsCache.pop(0)
+    self._getRecordsCache().append(record)
 
     self.labelResults = record.anomalyLabel
 
@@ -344,17 +354,165 @@ class KNNAnomalyClassifierRegion(PyRegion):
     return self.labelResults
 
 
-  def _classifyStates(self):
+  def _getRecordsCache(self):
+    """
+    Returns the cache of classification records, converting a list of records
+    (e.g. restored from an older model) into a :class:`_RecordsCache`, and
+    resizing it when ``cacheSize`` changed.
+    """
+    if (not isinstance(self._recordsCache, _RecordsCache) or
+        self._recordsCache.maxSize != self.cacheSize):
+      self._recordsCache = _RecordsCache(self.cacheSize, self._recordsCache)
+    return self._recordsCache
+
+
+  def _classifyStates(self, states=None):
+    """
+    Reclassifies the given states, in ROWID order; all the cached states by
+    default. The states are classified in batches of
+    ``_CLASSIFY_BATCH_SIZE`` when the classifier configuration allows it.
     """
-    Reclassifies all internal state
+    if states is None:
+      states = self._getRecordsCache()[:]
+
+    if not self._canClassifyInBatch():
+      for state in states:
+        self._classifyState(state)
+      return
+
+    batchSize = KNNAnomalyClassifierRegion._CLASSIFY_BATCH_SIZE
+    for start in xrange(0, len(states), batchSize):
+      self._classifyBatch(states[start:start + batchSize])
+
+
+  def _canClassifyInBatch(self):
     """
-    for state in self._recordsCache:
-      self._classifyState(state)
+    Returns True if the distances computed by :meth:`_classifyBatch` match the
+    ones of the KNN classifier: sparse memory, binary input and prototypes,
+    and a distance method computed from overlaps.
+    """
+    knnRegion = self._knnclassifier
+    knn = knnRegion._knn
+    return (self._anomalyVectorLength is not None and
+            knn.useSparseMemory and
+            knn.distanceMethod in _BATCH_DISTANCE_METHODS and
+            (knn.distanceMethod != "norm" or knn.distanceNorm > 0) and
+            knn.sparseThreshold < 1.0 and
+            (not knn.doBinarization or knn.binarizationThreshold < 1.0) and
+            knn.minSparsity == 0.0 and
+            knn.numSVDDims is None and
+            not knn._specificIndexTraining and
+            not knnRegion._doSphering and
+            not knnRegion._useAuxiliary)
+
+
+  def _classifyBatch(self, states):
+    """
+    Reclassifies consecutive states like :meth:`_classifyState`, computing the
+    overlaps of all of them with the stored prototypes, and with each other,
+    in two matrix products.
+
+    Each state is classified against the prototypes stored before it, as when
+    reclassifying the states one at a time: states whose labeling changes are
+    learned or removed in order, and become candidates for the following
+    states.
+    """
+    knn = self._knnclassifier._knn
+    trainRecords = self.getParameter('trainRecords')
+    maxDist = self._classificationMaxDist
+
+    # Candidates: the stored prototypes, in recency order, then the states
+    protoRowIDs = list(self._knnclassifier.getParameter('categoryRecencyList'))
+    numProtos = len(protoRowIDs)
+    numStates = len(states)
+    protoIndex = dict((rowID, i) for i, rowID in enumerate(protoRowIDs))
+
+    vectors = numpy.zeros((self._anomalyVectorLength, numStates),
+                          dtype=numpy.float32)
+    for i, state in enumerate(states):
+      vectors[state.anomalyVector, i] = 1
+    activeRows = vectors.any(axis=1).nonzero()[0]
+    activeVectors = vectors[activeRows]
+
+    if numProtos > 0:
+      protoOverlaps = knn._Memory.rightDenseMatProd(vectors)[:numProtos]
+      protoSizes = knn._Memory.rowSums()[:numProtos]
+    else:
+      protoOverlaps = numpy.zeros((0, numStates), dtype=numpy.float32)
+      protoSizes = numpy.zeros(0, dtype=numpy.float32)
+    overlaps = numpy.vstack((protoOverlaps,
+                             activeVectors.T.dot(activeVectors)))
+    sizes = numpy.concatenate((protoSizes, activeVectors.sum(axis=0)))
+
+    rowIDs = numpy.array(protoRowIDs + [state.ROWID for state in states])
+    categories = numpy.array(list(knn._categoryList) + [0] * numStates)
+    present = numpy.zeros(numProtos + numStates, dtype=bool)
+    present[:numProtos] = True
+
+    for i, state in enumerate(states):
+      if state.ROWID >= trainRecords:
+        candidates = present.nonzero()[0]
+        valid = ((rowIDs[candidates] >= trainRecords) &
+                 (rowIDs[candidates] < state.ROWID)).nonzero()[0]
+        newCategory = None
+        if len(valid) > 0:
+          distances = self._getBatchDistances(overlaps[candidates, i],
+                                              sizes[numProtos + i],
+                                              sizes[candidates])
+          validDistances = distances[valid]
+          if validDistances.min() <= maxDist:
+            newCategory = int(categories[candidates[valid[
+              validDistances.argmin()]]])
+        self._classifyState(state, newCategory)
+      else:
+        self._classifyState(state)
+
+      # Follow the changes of the classifier
+      candidate = protoIndex.get(state.ROWID, numProtos + i)
+      recencyList = knn._categoryRecencyList
+      present[candidate] = state.ROWID in recencyList
+      if present[candidate]:
+        categories[candidate] = knn._categoryList[
+          recencyList.index(state.ROWID)]
+
+
+  def _getBatchDistances(self, overlaps, inputSize, protoSizes):
+    """
+    Returns the distances computed by the KNN classifier between a binary
+    input and binary prototypes, from their overlaps.
+    """
+    knn = self._knnclassifier._knn
+    distanceMethod = knn.distanceMethod
+    if distanceMethod == "rawOverlap":
+      dist = inputSize - overlaps
+    elif distanceMethod == "pctOverlapOfInput":
+      dist = inputSize - overlaps
+      if inputSize > 0:
+        dist /= inputSize
+    elif distanceMethod == "pctOverlapOfProto":
+      dist = 1.0 - overlaps / protoSizes
+    elif distanceMethod == "pctOverlapOfLarger":
+      maxVal = numpy.maximum(protoSizes, inputSize)
+      if maxVal.all() > 0:
+        overlaps = overlaps / maxVal
+      dist = 1.0 - overlaps
+    else:
+      # The Lp distance between binary vectors is a power of their Hamming
+      # distance
+      dist = numpy.power(inputSize + protoSizes - 2 * overlaps,
+                         numpy.float32(1.0 / knn.distanceNorm))
+      distMax = dist.max()
+      if distMax > 0:
+        dist /= distMax
+    return dist
 
 
-  def _classifyState(self, state):
+  def _classifyState(self, state, newCategory=_UNKNOWN_CATEGORY):
     """
     Reclassifies given state.
+
+    :param newCategory: category of the state's nearest prototype, if already
+           computed
     """
     # Record is before wait period do not classifiy
     if state.ROWID < self.getParameter('trainRecords'):
@@ -367,7 +525,8 @@ class KNNAnomalyClassifierRegion(PyRegion):
     autoLabel = label + KNNAnomalyClassifierRegion.AUTO_TAG
 
     # Update the label based on classifications
-    newCategory = self._recomputeRecordFromKNN(state)
+    if newCategory is _UNKNOWN_CATEGORY:
+      newCategory = self._recomputeRecordFromKNN(state)
     labelList = self._categoryToLabelList(newCategory)
 
     if state.setByUser:
@@ -651,7 +810,8 @@ class KNNAnomalyClassifierRegion(PyRegion):
         }
 
     """
-    if len(self._recordsCache) == 0:
+    recordsCache = self._getRecordsCache()
+    if len(recordsCache) == 0:
       return {
         'isProcessing': False,
         'recordLabels': []
@@ -664,7 +824,7 @@ class KNNAnomalyClassifierRegion(PyRegion):
     try:
       end = int(end)
     except Exception:
-      end = self._recordsCache[-1].ROWID
+      end = recordsCache[-1].ROWID
 
     if end <= start:
       raise HTMPredictionModelInvalidRangeError("Invalid supplied range for 'getLabels'.",
@@ -673,7 +833,7 @@ class KNNAnomalyClassifierRegion(PyRegion):
             'startRecordID': start,
             'endRecordID': end
           },
-          'numRecordsStored': len(self._recordsCache)
+          'numRecordsStored': len(recordsCache)
         })
 
     results = {
@@ -706,7 +866,8 @@ class KNNAnomalyClassifierRegion(PyRegion):
     :param end: (int) end index (noninclusive)
     :param labelName: (string) label name
     """
-    if len(self._recordsCache) == 0:
+    recordsCache = self._getRecordsCache()
+    if len(recordsCache) == 0:
       raise HTMPredictionModelInvalidRangeError("Invalid supplied range for 'addLabel'. "
         "Model has no saved records.")
 
@@ -718,12 +879,12 @@ class KNNAnomalyClassifierRegion(PyRegion):
     try:
       end = int(end)
     except Exception:
-      end = int(self._recordsCache[-1].ROWID)
+      end = int(recordsCache[-1].ROWID)
 
-    startID = self._recordsCache[0].ROWID
+    startID = recordsCache[0].ROWID
 
-    clippedStart = max(0, start - startID)
-    clippedEnd = max(0, min( len( self._recordsCache) , end - startID))
+    clippedStart = recordsCache.getIndex(start)
+    clippedEnd = recordsCache.getIndex(end)
 
     if clippedEnd <= clippedStart:
       raise HTMPredictionModelInvalidRangeError("Invalid supplied range for 'addLabel'.",
@@ -738,13 +899,13 @@ class KNNAnomalyClassifierRegion(PyRegion):
           },
           'validRange': {
             'startRecordID': startID,
-            'endRecordID': self._recordsCache[len(self._recordsCache)-1].ROWID
+            'endRecordID': recordsCache[-1].ROWID
           },
-          'numRecordsStored': len(self._recordsCache)
+          'numRecordsStored': len(recordsCache)
         })
 
     # Add label to range [clippedStart, clippedEnd)
-    for state in self._recordsCache[clippedStart:clippedEnd]:
+    for state in recordsCache[clippedStart:clippedEnd]:
       if labelName not in state.anomalyLabel:
         state.anomalyLabel.append(labelName)
         state.setByUser = True
@@ -753,8 +914,7 @@ class KNNAnomalyClassifierRegion(PyRegion):
     assert len(self.saved_categories) > 0
 
     # Recompute [end, ...)
-    for state in self._recordsCache[clippedEnd:]:
-      self._classifyState(state)
+    self._classifyStates(recordsCache[clippedEnd:])
 
 
   def removeLabels(self, start=None, end=None, labelFilter=None):
@@ -771,7 +931,8 @@ class KNNAnomalyClassifierRegion(PyRegion):
     :param end: (int) end index (noninclusive)
     :param labelFilter: (string) label filter
     """
-    if len(self._recordsCache) == 0:
+    recordsCache = self._getRecordsCache()
+    if len(recordsCache) == 0:
       raise HTMPredictionModelInvalidRangeError("Invalid supplied range for "
         "'removeLabels'. Model has no saved records.")
 
@@ -783,13 +944,12 @@ class KNNAnomalyClassifierRegion(PyRegion):
     try:
       end = int(end)
     except Exception:
-      end = self._recordsCache[-1].ROWID
+      end = recordsCache[-1].ROWID
 
-    startID = self._recordsCache[0].ROWID
+    startID = recordsCache[0].ROWID
 
-    clippedStart = 0 if start is None else max(0, start - startID)
-    clippedEnd = len(self._recordsCache) if end is None else \
-      max(0, min( len( self._recordsCache) , end - startID))
+    clippedStart = recordsCache.getIndex(start)
+    clippedEnd = recordsCache.getIndex(end)
 
     if clippedEnd <= clippedStart:
       raise HTMPredictionModelInvalidRangeError("Invalid supplied range for "
@@ -804,14 +964,14 @@ class KNNAnomalyClassifierRegion(PyRegion):
           },
           'validRange': {
             'startRecordID': startID,
-            'endRecordID': self._recordsCache[len(self._recordsCache)-1].ROWID
+            'endRecordID': recordsCache[-1].ROWID
           },
-          'numRecordsStored': len(self._recordsCache)
+          'numRecordsStored': len(recordsCache)
         })
 
     # Remove records within the cache
     recordsToDelete = []
-    for state in self._recordsCache[clippedStart:clippedEnd]:
+    for state in recordsCache[clippedStart:clippedEnd]:
       if labelFilter is not None:
         if labelFilter in state.anomalyLabel:
           state.anomalyLabel.remove(labelFilter)
@@ -825,8 +985,7 @@ class KNNAnomalyClassifierRegion(PyRegion):
     self._deleteRangeFromKNN(start, end)
 
     # Recompute [clippedEnd, ...)
-    for state in self._recordsCache[clippedEnd:]:
-      self._classifyState(state)
+    self._classifyStates(recordsCache[clippedEnd:])
 
 
   #############################################################################
@@ -891,8 +1050,9 @@ class KNNAnomalyClassifierRegion(PyRegion):
     if self.saved_categories is not None:
       proto.savedCategories = self.saved_categories
     if self._recordsCache is not None:
-      recordsCache = proto.init("recordsCache", len(self._recordsCache))
-      for i, item in enumerate(self._recordsCache):
+      cachedRecords = self._getRecordsCache()
+      recordsCache = proto.init("recordsCache", len(cachedRecords))
+      for i, item in enumerate(cachedRecords):
         record = recordsCache[i]
         record.rowid = int(item.ROWID)
         record.anomalyScore = float(item.anomalyScore)
@@ -937,7 +1097,7 @@ class KNNAnomalyClassifierRegion(PyRegion):
     instance.labelResults = list(proto.labelResults)
     instance.saved_categories = list(proto.savedCategories)
 
-    instance._recordsCache = []
+    instance._recordsCache = _RecordsCache(instance.cacheSize)
     for item in proto.recordsCache:
       instance._recordsCache.append(_CLAClassificationRecord(
         ROWID=item.rowid,
@@ -1101,3 +1261,73 @@ class _CLAClassificationRecord(object):
             self.setByUser == other.setByUser and
             numpy.array_equal(self.anomalyVector, other.anomalyVector))
 
+
+
+class _RecordsCache(object):
+  """
+  Ring buffer of the most recent classification records, oldest first.
+  Appending a record to a full cache evicts the oldest record in constant
+  time. Records are indexed by position, or by ROWID with :meth:`getIndex`
+  since the cached records have consecutive ROWIDs.
+
+  :param maxSize: (int) maximum number of records kept
+  :param records: (list) initial records, oldest first
+  """
+
+  def __init__(self, maxSize, records=()):
+    self.maxSize = maxSize
+    self._records = []
+    self._start = 0
+    for record in records:
+      self.append(record)
+
+
+  def append(self, record):
+    """
+    Adds a record, evicting the oldest one if the cache is full.
+    """
+    if len(self._records) < self.maxSize:
+      self._records.append(record)
+    elif self.maxSize > 0:
+      self._records[self._start] = record
+      self._start = (self._start + 1) % self.maxSize
+
+
+  def getIndex(self, rowID):
+    """
+    :param rowID: (int) ROWID of a record
+    :returns: (int) position of the record with this ROWID, clipped to the
+              positions of the cache: 0 for older records, and the number of
+              records for newer ones
+    """
+    if len(self._records) == 0:
+      return 0
+    return max(0, min(len(self._records), rowID - self[0].ROWID))
+
+
+  def __len__(self):
+    return len(self._records)
+
+
+  def __iter__(self):
+    for i in xrange(len(self._records)):
+      yield self[i]
+
+
+  def __getitem__(self, index):
+    size = len(self._records)
+    if isinstance(index, slice):
+      return [self[i] for i in xrange(*index.indices(size))]
+    if index < 0:
+      index += size
+    if not 0 <= index < size:
+      raise IndexError("Records cache index out of range")
+    return self._records[(self._start + index) % size]
+
+
+  def __getstate__(self):
+    return {"maxSize": self.maxSize, "records": list(self)}
+
+
+  def __setstate__(self, state):
+    self.__init__(state["maxSize"], state["records"])
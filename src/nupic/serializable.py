@@ -19,6 +19,7 @@
 # http://numenta.org/licenses/
 # ----------------------------------------------------------------------
 
+import mmap
 from abc import ABCMeta, abstractmethod
 
 
@@ -83,7 +84,9 @@ class Serializable(object):
     Read serialized object from file.
 
     :param f: input file
-    :param packed: If true, will assume content is packed
+    :param packed: If true, will assume content is packed. Unpacked content
+                   is read from a memory map of the file, see
+                   :func:`readMappedProto`.
     :return: first-class instance initialized from proto obj
     """
     # Get capnproto schema from instance
@@ -93,7 +96,7 @@ class Serializable(object):
     if packed:
       proto = schema.read_packed(f)
     else:
-      proto = schema.read(f)
+      proto = readMappedProto(schema, f)
 
     # Return first-class instance initialized from proto obj
     return cls.read(proto)
@@ -120,3 +123,32 @@ class Serializable(object):
       proto.write_packed(f)
     else:
       proto.write(f)
+
+
+
+def readMappedProto(schema, f):
+  """
+  Read an unpacked Cap'n Proto message from a read-only memory map of a file.
+
+  The message is not copied into memory: its segments are read in place, and
+  only the pages of the file that are visited are read from disk. The map is
+  released along with the returned message.
+
+  The message is read from the current position of the file, which must be a
+  multiple of ``mmap.ALLOCATIONGRANULARITY`` to be mapped, e.g. the start of
+  the file. The position of the file is left unchanged.
+
+  :param schema: Cap'n Proto schema of the message
+  :param f: input file; read with ``schema.read`` if it has no file
+            descriptor or isn't at a position that can be mapped
+  :return: Cap'n Proto obj
+  """
+  try:
+    fileno = f.fileno()
+    offset = f.tell()
+  except (AttributeError, IOError, ValueError):
+    return schema.read(f)
+  if offset % mmap.ALLOCATIONGRANULARITY != 0:
+    return schema.read(f)
+  return schema.from_bytes(mmap.mmap(fileno, 0, access=mmap.ACCESS_READ,
+                                     offset=offset))
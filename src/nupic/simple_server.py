@@ -38,11 +38,13 @@ import datetime
 import json
 import web
 
-from nupic.frameworks.opf.model_factory import ModelFactory
+from nupic.frameworks.opf.model_pool import ModelPool
 
 
 
-g_models = {}
+# Models are hosted in worker processes so that runs of different models
+# don't serialize on the web thread
+g_modelPool = ModelPool()
 
 
 
@@ -64,8 +66,8 @@ class ModelHandler(object):
     returns:
     [model1, model2, model3, ...] list of model names
     """
-    global g_models
-    return json.dumps({"models": g_models.keys()})
+    global g_modelPool
+    return json.dumps({"models": g_modelPool.getModelNames()})
 
 
   def POST(self, name):
@@ -81,18 +83,17 @@ class ModelHandler(object):
     returns:
     {"success":name}
     """
-    global g_models
+    global g_modelPool
 
     data = json.loads(web.data())
     modelParams = data["modelParams"]
     predictedFieldName = data["predictedFieldName"]
 
-    if name in g_models.keys():
+    if g_modelPool.hasModel(name):
       raise web.badrequest("Model with name <%s> already exists" % name)
 
-    model = ModelFactory.create(modelParams)
-    model.enableInference({'predictedField': predictedFieldName})
-    g_models[name] = model
+    g_modelPool.createModel(name, modelParams,
+                            {'predictedField': predictedFieldName}).get()
 
     return json.dumps({"success": name})
 
@@ -118,16 +119,16 @@ class ModelRunner(object):
       "anomalyScore":anomalyScore
     }
     """
-    global g_models
+    global g_modelPool
 
     data = json.loads(web.data())
     data["timestamp"] = datetime.datetime.strptime(
         data["timestamp"], "%m/%d/%y %H:%M")
 
-    if name not in g_models.keys():
+    if not g_modelPool.hasModel(name):
       raise web.notfound("Model with name <%s> does not exist." % name)
 
-    modelResult = g_models[name].run(data)
+    modelResult = g_modelPool.run(name, data).get()
     predictionNumber = modelResult.predictionNumber
     anomalyScore = modelResult.inferences["anomalyScore"]
 
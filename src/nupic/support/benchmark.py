@@ -0,0 +1,307 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Performance benchmarks with stored baselines.
+
+A benchmark is a setup function that builds its inputs for one set of
+parameters and returns a function performing ``numOps`` operations, e.g. 100
+calls to ``SpatialPooler.compute``, or a (function, teardown function) tuple
+when the setup creates files. Each parameter set is a separate case,
+named like ``SpatialPooler.compute[columns=2048]``. A case is timed over
+``repeats`` calls after a warm-up call; its throughput is computed from the
+median call, which is less sensitive than the fastest one to the load of a
+shared host, and its peak memory is the growth of the maximum resident set
+size of the process over setup and calls. By default each case runs in its
+own process, so that its peak memory is not hidden by the previous cases.
+
+Example::
+
+    suite = BenchmarkSuite()
+
+    @suite.add("SpatialPooler.compute", params=[{"columns": 1024},
+                                                {"columns": 2048}],
+               numOps=100)
+    def spCompute(columns):
+      sp = SpatialPooler(...)
+      def run():
+        for inputVector in inputVectors:
+          sp.compute(inputVector, True, activeArray)
+      return run
+
+    results = suite.run()
+    writeResults("benchmarks.json", results)
+    for regression in findRegressions(results, readResults("baseline.json")):
+      print regression
+
+Results files are JSON::
+
+    {"version": 1,
+     "environment": {"python": ..., "platform": ..., "numpy": ...},
+     "results": {"SpatialPooler.compute[columns=1024]":
+                   {"opsPerSec": ..., "secondsPerOp": ..., "peakMemoryMB": ...,
+                    "numOps": ..., "repeats": ...},
+                 ...}}
+"""
+
+import gc
+import json
+import multiprocessing
+import platform
+import re
+import resource
+import sys
+import time
+import timeit
+import traceback
+
+import numpy
+
+
+
+# Peak memory growth, in MB, below which a case is never reported as a memory
+# regression: the resident set size only grows by whole pages, and allocators
+# keep freed memory around
+MIN_MEMORY_REGRESSION_MB = 1.0
+
+# Relative slowdown or memory growth accepted by findRegressions(): the
+# median throughput of a case varies by up to about 30% between runs on a
+# shared host
+DEFAULT_TOLERANCE = 0.35
+
+
+
+class BenchmarkError(Exception):
+  """ Raised when a benchmark case fails. """
+  pass
+
+
+
+class BenchmarkSuite(object):
+  """ A set of benchmarks, see the module documentation. """
+
+  def __init__(self):
+    # [(name, setup, params, numOps)]
+    self._benchmarks = []
+
+
+  def add(self, name, params=None, numOps=1):
+    """ Decorator registering a benchmark setup function.
+
+    :param name: (string) name of the benchmark
+    :param params: (list) dicts of keyword arguments of the setup function,
+           one per case; None for a single case without arguments
+    :param numOps: (int) number of operations performed by each call to the
+           function returned by the setup function
+    """
+    def decorator(setup):
+      self._benchmarks.append((name, setup, params or [dict()], numOps))
+      return setup
+    return decorator
+
+
+  def getCases(self, pattern=None):
+    """
+    :param pattern: (string) regular expression; only the cases whose name it
+           matches are returned
+    :returns: (list) (caseName, setup, params, numOps) tuples, in the order
+              the benchmarks were added
+    """
+    cases = []
+    for name, setup, paramsList, numOps in self._benchmarks:
+      for params in paramsList:
+        caseName = getCaseName(name, params)
+        if pattern is None or re.search(pattern, caseName):
+          cases.append((caseName, setup, params, numOps))
+    return cases
+
+
+  def run(self, pattern=None, repeats=3, isolate=True, log=None):
+    """ Run the benchmark cases.
+
+    :param pattern: (string) regular expression selecting the cases to run
+    :param repeats: (int) number of timed calls of each case
+    :param isolate: (bool) True to run each case in its own process
+    :param log: (function) called with a message after each case, or None
+    :returns: (dict) case name -> result dict
+    """
+    results = dict()
+    for caseName, setup, params, numOps in self.getCases(pattern):
+      if isolate:
+        result = _runIsolatedCase(setup, params, numOps, repeats)
+      else:
+        result = runCase(setup, params, numOps, repeats)
+      results[caseName] = result
+      if log is not None:
+        log("%s: %.1f ops/sec, %.1f MB" % (caseName, result["opsPerSec"],
+                                           result["peakMemoryMB"]))
+    return results
+
+
+
+def getCaseName(name, params):
+  """
+  :returns: (string) name of the case of benchmark ``name`` for ``params``
+  """
+  if not params:
+    return name
+  return "%s[%s]" % (name, ",".join("%s=%s" % (key, params[key])
+                                    for key in sorted(params)))
+
+
+
+def runCase(setup, params, numOps, repeats):
+  """ Run one benchmark case in the current process.
+
+  :param setup: (function) setup function of the benchmark
+  :param params: (dict) keyword arguments of ``setup``
+  :param numOps: (int) number of operations of each call
+  :param repeats: (int) number of timed calls
+  :returns: (dict) result of the case
+  """
+  gc.collect()
+  initialMemory = _getMaxRSSMB()
+
+  run = setup(**params)
+  teardown = None
+  if isinstance(run, tuple):
+    run, teardown = run
+
+  try:
+    run()
+    times = []
+    for _ in xrange(repeats):
+      startTime = timeit.default_timer()
+      run()
+      times.append(timeit.default_timer() - startTime)
+  finally:
+    if teardown is not None:
+      teardown()
+
+  secondsPerOp = max(float(numpy.median(times)), 1e-9) / numOps
+  return dict(opsPerSec=1.0 / secondsPerOp,
+              secondsPerOp=secondsPerOp,
+              peakMemoryMB=max(_getMaxRSSMB() - initialMemory, 0.0),
+              numOps=numOps,
+              repeats=repeats)
+
+
+
+def findRegressions(results, baseline, tolerance=DEFAULT_TOLERANCE):
+  """ Compare results to a baseline.
+
+  :param results: (dict) case name -> result dict
+  :param baseline: (dict) case name -> result dict of the baseline; cases
+         missing from it are not compared
+  :param tolerance: (float) relative slowdown, or growth of the peak memory,
+         that is accepted
+  :returns: (list) (caseName, metric, baselineValue, value) tuple of each
+            regression, sorted by case name
+  """
+  regressions = []
+  for caseName in sorted(results):
+    if caseName not in baseline:
+      continue
+    result = results[caseName]
+    expected = baseline[caseName]
+    if result["opsPerSec"] < expected["opsPerSec"] * (1.0 - tolerance):
+      regressions.append((caseName, "opsPerSec", expected["opsPerSec"],
+                          result["opsPerSec"]))
+    maxMemory = max(expected["peakMemoryMB"] * (1.0 + tolerance),
+                    expected["peakMemoryMB"] + MIN_MEMORY_REGRESSION_MB)
+    if result["peakMemoryMB"] > maxMemory:
+      regressions.append((caseName, "peakMemoryMB", expected["peakMemoryMB"],
+                          result["peakMemoryMB"]))
+  return regressions
+
+
+
+def writeResults(path, results):
+  """ Write results, along with a description of the environment, to a JSON
+  file.
+  """
+  with open(path, "w") as f:
+    json.dump(dict(version=1,
+                   environment=getEnvironment(),
+                   results=results),
+              f, indent=2, sort_keys=True)
+    f.write("\n")
+
+
+
+def readResults(path):
+  """
+  :returns: (dict) case name -> result dict, read from a file written by
+            :func:`writeResults`
+  """
+  with open(path) as f:
+    return json.load(f)["results"]
+
+
+
+def getEnvironment():
+  """
+  :returns: (dict) versions of Python and numpy, platform and time, recorded
+            along with results so that they can be compared
+  """
+  return dict(python=platform.python_version(),
+              platform=platform.platform(),
+              processor=platform.processor(),
+              numpy=numpy.__version__,
+              time=time.strftime("%Y-%m-%dT%H:%M:%S"))
+
+
+
+def _runIsolatedCase(setup, params, numOps, repeats):
+  parentConnection, childConnection = multiprocessing.Pipe(duplex=False)
+  process = multiprocessing.Process(
+    target=_runChildCase,
+    args=(childConnection, setup, params, numOps, repeats))
+  process.start()
+  childConnection.close()
+  try:
+    succeeded, result = parentConnection.recv()
+  except EOFError:
+    succeeded, result = False, "exit code %s" % process.exitcode
+  process.join()
+  if not succeeded:
+    raise BenchmarkError("Benchmark %s failed: %s" % (getCaseName(
+      setup.__name__, params), result))
+  return result
+
+
+
+def _runChildCase(connection, setup, params, numOps, repeats):
+  try:
+    connection.send((True, runCase(setup, params, numOps, repeats)))
+  except Exception:
+    connection.send((False, traceback.format_exc()))
+  finally:
+    connection.close()
+
+
+
+def _getMaxRSSMB():
+  maxRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # Bytes on OS X, kilobytes elsewhere
+  if sys.platform == "darwin":
+    return maxRSS / (1024.0 * 1024.0)
+  return maxRSS / 1024.0
@@ -0,0 +1,129 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Fixed-size latency histograms with percentiles.
+"""
+
+import math
+
+
+
+class LatencyHistogram(object):
+  """
+  Histogram of durations in logarithmic buckets: ``bucketsPerOctave`` buckets
+  between each power of two above ``minSecs``. Recording a duration is O(1)
+  and the memory used does not grow with the number of durations; percentiles
+  are accurate to the width of a bucket, about 9% with the default 8 buckets
+  per octave.
+
+  :param minSecs: (float) durations up to this value fall in the first bucket
+  :param maxSecs: (float) durations from this value fall in the last bucket
+  :param bucketsPerOctave: (int) buckets per doubling of the duration
+  """
+
+  def __init__(self, minSecs=1e-6, maxSecs=100.0, bucketsPerOctave=8):
+    self._minSecs = minSecs
+    self._bucketsPerOctave = bucketsPerOctave
+    self._scale = bucketsPerOctave / math.log(2.0)
+    numBuckets = int(math.ceil(math.log(maxSecs / minSecs, 2.0) *
+                               bucketsPerOctave)) + 1
+    self._buckets = [0] * numBuckets
+    self.reset()
+
+
+  def reset(self):
+    """ Forget the recorded durations. """
+    self._buckets = [0] * len(self._buckets)
+    self._count = 0
+    self._totalSecs = 0.0
+    self._minRecordedSecs = float("inf")
+    self._maxRecordedSecs = 0.0
+
+
+  def record(self, secs):
+    """ Record a duration.
+
+    :param secs: (float) duration, in seconds
+    """
+    if secs > self._minSecs:
+      index = min(int(math.log(secs / self._minSecs) * self._scale) + 1,
+                  len(self._buckets) - 1)
+    else:
+      index = 0
+    self._buckets[index] += 1
+    self._count += 1
+    self._totalSecs += secs
+    if secs < self._minRecordedSecs:
+      self._minRecordedSecs = secs
+    if secs > self._maxRecordedSecs:
+      self._maxRecordedSecs = secs
+
+
+  def getCount(self):
+    """
+    :returns: (int) number of recorded durations
+    """
+    return self._count
+
+
+  def getPercentile(self, percent):
+    """
+    :param percent: (float) percentile, between 0 and 100
+    :returns: (float) duration, in seconds, that ``percent`` percent of the
+              recorded durations do not exceed; the upper bound of its
+              bucket, clamped to the recorded durations. None if no duration
+              was recorded.
+    """
+    if self._count == 0:
+      return None
+    rank = max(int(math.ceil(percent / 100.0 * self._count)), 1)
+    seen = 0
+    # The last bucket is unbounded: it reports the largest recorded duration
+    for index, count in enumerate(self._buckets[:-1]):
+      seen += count
+      if seen >= rank:
+        upperBound = self._minSecs * 2.0 ** (float(index) /
+                                             self._bucketsPerOctave)
+        return min(max(upperBound, self._minRecordedSecs),
+                   self._maxRecordedSecs)
+    return self._maxRecordedSecs
+
+
+  def getStats(self):
+    """
+    :returns: (dict) ``count``, ``totalSecs``, ``meanSecs``, ``minSecs``,
+              ``maxSecs``, ``p50Secs``, ``p90Secs``, ``p99Secs`` and
+              ``p999Secs``
+    """
+    if self._count == 0:
+      return dict(count=0, totalSecs=0.0, meanSecs=0.0, minSecs=0.0,
+                  maxSecs=0.0, p50Secs=0.0, p90Secs=0.0, p99Secs=0.0,
+                  p999Secs=0.0)
+    return dict(count=self._count,
+                totalSecs=self._totalSecs,
+                meanSecs=self._totalSecs / self._count,
+                minSecs=self._minRecordedSecs,
+                maxSecs=self._maxRecordedSecs,
+                p50Secs=self.getPercentile(50),
+                p90Secs=self.getPercentile(90),
+                p99Secs=self.getPercentile(99),
+                p999Secs=self.getPercentile(99.9))
@@ -0,0 +1,170 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Pickling of large numpy arrays to memory-mapped files.
+
+Within :func:`externalArrays`, the numpy arrays pickled by the current thread
+that hold at least ``minArrayBytes`` bytes are written to their own unpacked
+``.npy`` file, and the pickle only refers to the file by name. This covers
+the pickles written by the network engine for the Python regions, e.g. the
+SDR classifier weight matrices.
+
+Within :func:`mappedArrays`, unpickling such a reference returns a
+copy-on-write memory map of the file: nothing is read until the array is
+used, only the pages that are used are read, and a page is only copied into
+private memory when the array is modified. The file itself is never written
+to.
+
+The pickling of numpy arrays is only customized while some thread is within
+:func:`externalArrays`; other pickles are not affected by this module.
+
+Example::
+
+    with mapped_arrays.externalArrays(arrayDir):
+      pickle.dump(obj, f)
+
+    with mapped_arrays.mappedArrays(arrayDir):
+      obj = pickle.load(f)
+"""
+
+import copy_reg
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy
+
+from nupic.support.configuration import Configuration
+
+
+
+_state = threading.local()
+
+# Number of externalArrays() contexts currently open in any thread, and the
+# copy_reg reducers of the numpy array types they replaced
+_reducersLock = threading.Lock()
+_numReducerUsers = 0
+_previousReducers = dict()
+
+
+
+@contextmanager
+def externalArrays(arrayDir, minArrayBytes=None):
+  """ Write the large numpy arrays pickled by the current thread to files.
+
+  :param arrayDir: (string) directory of the array files; created if needed.
+         If None, arrays are pickled as usual.
+  :param minArrayBytes: (int) size, in bytes, from which an array is written
+         to a file; defaults to ``nupic.model.checkpoint.minMappedArrayBytes``
+  """
+  if arrayDir is None:
+    yield
+    return
+  if minArrayBytes is None:
+    minArrayBytes = Configuration.getInt(
+      "nupic.model.checkpoint.minMappedArrayBytes")
+  if not os.path.isdir(arrayDir):
+    os.makedirs(arrayDir)
+
+  previous = getattr(_state, "writer", None)
+  _state.writer = _ArrayWriter(os.path.abspath(arrayDir), minArrayBytes)
+  _registerReducers()
+  try:
+    yield
+  finally:
+    _unregisterReducers()
+    _state.writer = previous
+
+
+
+@contextmanager
+def mappedArrays(arrayDir):
+  """ Map the arrays written by :func:`externalArrays` when the current thread
+  unpickles them.
+
+  :param arrayDir: (string) directory of the array files
+  """
+  previous = getattr(_state, "arrayDir", None)
+  _state.arrayDir = os.path.abspath(arrayDir)
+  try:
+    yield
+  finally:
+    _state.arrayDir = previous
+
+
+
+class _ArrayWriter(object):
+
+  def __init__(self, arrayDir, minArrayBytes):
+    self.arrayDir = arrayDir
+    self.minArrayBytes = minArrayBytes
+    self._numArrays = len(os.listdir(arrayDir))
+
+
+  def write(self, array):
+    fileName = "array-%06d.npy" % self._numArrays
+    self._numArrays += 1
+    numpy.save(os.path.join(self.arrayDir, fileName), array)
+    return fileName
+
+
+
+def _registerReducers():
+  global _numReducerUsers
+  with _reducersLock:
+    if _numReducerUsers == 0:
+      for arrayType in (numpy.ndarray, numpy.memmap):
+        _previousReducers[arrayType] = copy_reg.dispatch_table.get(arrayType)
+        copy_reg.pickle(arrayType, _reduceArray)
+    _numReducerUsers += 1
+
+
+
+def _unregisterReducers():
+  global _numReducerUsers
+  with _reducersLock:
+    _numReducerUsers -= 1
+    if _numReducerUsers == 0:
+      for arrayType, reducer in _previousReducers.iteritems():
+        if reducer is None:
+          del copy_reg.dispatch_table[arrayType]
+        else:
+          copy_reg.dispatch_table[arrayType] = reducer
+      _previousReducers.clear()
+
+
+
+def _reduceArray(array):
+  writer = getattr(_state, "writer", None)
+  if (writer is None or array.nbytes < writer.minArrayBytes or
+      array.dtype.hasobject):
+    return array.__reduce__()
+  return _loadMappedArray, (writer.write(array),)
+
+
+
+def _loadMappedArray(fileName):
+  arrayDir = getattr(_state, "arrayDir", None)
+  if arrayDir is None:
+    raise RuntimeError("Array file %r can only be unpickled within "
+                       "mapped_arrays.mappedArrays()" % fileName)
+  return numpy.load(os.path.join(arrayDir, fileName), mmap_mode="c")
@@ -0,0 +1,119 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Helpers for the ``getMemoryUsage()`` methods of the algorithms, encoders and
+models. A memory usage is a dict mapping each component of an object to the
+number of bytes it uses, or to the memory usage of a sub-object.
+"""
+
+import sys
+import types
+from collections import deque
+
+import numpy
+
+
+
+# Objects that are shared by the whole process rather than owned by the
+# object being measured
+_SHARED_TYPES = (type, types.ClassType, types.ModuleType, types.FunctionType,
+                 types.BuiltinFunctionType, types.MethodType, types.NoneType,
+                 bool)
+
+
+
+def getObjectSize(obj, exclude=()):
+  """
+  Size, in bytes, of an object and of the objects it references: items of
+  containers, instance attributes, the data of numpy arrays, and the
+  ``nBytes()`` of the nupic.bindings sparse matrices. Each object is counted
+  once. Classes, functions and modules are not counted.
+
+  :param obj: object to measure
+  :param exclude: (list) objects that are not counted, e.g. because they are
+         reported as a separate component
+  :returns: (int) number of bytes
+  """
+  seen = set(id(excluded) for excluded in exclude)
+  pending = [obj]
+  size = 0
+  while pending:
+    current = pending.pop()
+    if id(current) in seen or isinstance(current, _SHARED_TYPES):
+      continue
+    seen.add(id(current))
+
+    if isinstance(current, numpy.ndarray):
+      # Arrays that own their data include it in their size; views reference
+      # the array owning it
+      size += sys.getsizeof(current)
+      if current.base is not None:
+        pending.append(current.base)
+      continue
+    if hasattr(current, "nBytes") and hasattr(current, "nRows"):
+      size += current.nBytes()
+      continue
+
+    size += sys.getsizeof(current)
+    if isinstance(current, dict):
+      pending.extend(current.iterkeys())
+      pending.extend(current.itervalues())
+    elif isinstance(current, (list, tuple, set, frozenset, deque)):
+      pending.extend(current)
+    elif not isinstance(current, (basestring, int, long, float, complex)):
+      if hasattr(current, "__dict__"):
+        pending.append(current.__dict__)
+      for slot in _getSlots(type(current)):
+        if hasattr(current, slot):
+          pending.append(getattr(current, slot))
+  return size
+
+
+
+def getArraysSize(*arrays):
+  """
+  :param arrays: numpy arrays, or None
+  :returns: (int) number of bytes of the data of the arrays
+  """
+  return sum(array.nbytes for array in arrays if array is not None)
+
+
+
+def getTotal(usage):
+  """
+  :param usage: (dict) memory usage, as returned by ``getMemoryUsage()``
+  :returns: (int) total number of bytes of the usage
+  """
+  return sum(getTotal(value) if isinstance(value, dict) else value
+             for value in usage.itervalues())
+
+
+
+def _getSlots(cls):
+  slots = []
+  for klass in cls.__mro__:
+    classSlots = klass.__dict__.get("__slots__", ())
+    if isinstance(classSlots, basestring):
+      classSlots = (classSlots,)
+    slots.extend(slot for slot in classSlots
+                 if slot not in ("__dict__", "__weakref__"))
+  return slots
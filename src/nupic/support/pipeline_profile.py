@@ -0,0 +1,328 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""
+Long-running profiles of spatial pooler, temporal memory and classifier
+pipelines.
+
+A profile feeds a stream of patterns, e.g. from
+:class:`~nupic.data.generators.high_order_sequence_generator.HighOrderSequenceGenerator`,
+through the pipeline, learning at every step, and records at regular
+checkpoints the throughput, resident memory, number of segments and synapses
+and prediction accuracy of the steps since the previous checkpoint. The
+latency of each stage is recorded over the whole run.
+
+Example::
+
+    generator = HighOrderSequenceGenerator(alphabetSize=500, n=2048)
+    profile = runPipelineProfile(generator, numSteps=1000000,
+                                 checkpointInterval=10000)
+    writeProfile("profile.json", profile)
+
+Profile files are JSON::
+
+    {"version": 1,
+     "environment": {"python": ..., "platform": ..., "numpy": ...},
+     "profile": {"config": {...},
+                 "checkpoints": [{"step": ..., "stepsPerSec": ...,
+                                  "rssMB": ..., "numSegments": ...,
+                                  "numSynapses": ...,
+                                  "predictedColumnsFraction": ...,
+                                  "classifierAccuracy": ...}, ...],
+                 "latency": {"sp": {...}, "tm": {...}, "classifier": {...},
+                             "step": {...}},
+                 "summary": {"steadyStateStepsPerSec": ...,
+                             "memoryGrowthMBPerMillionSteps": ...,
+                             "numSegments": ..., "numSynapses": ...}}}
+"""
+
+import json
+import os
+import resource
+import sys
+import timeit
+
+import numpy
+
+from nupic.support.benchmark import getEnvironment
+from nupic.support.latency_histogram import LatencyHistogram
+
+
+STAGES = ("sp", "tm", "classifier", "step")
+
+
+
+def runPipelineProfile(generator,
+                       numSteps,
+                       checkpointInterval=10000,
+                       columnCount=2048,
+                       cellsPerColumn=32,
+                       useSpatialPooler=False,
+                       useClassifier=True,
+                       useResets=False,
+                       implementation="cpp",
+                       tmParams=None,
+                       warmupFraction=0.5,
+                       log=None):
+  """ Profile a pipeline over a stream of patterns.
+
+  :param generator: the source of the stream: it has an ``n`` attribute, the
+         number of bits of the patterns, and a ``generate(numSteps)`` method
+         returning (symbol, pattern, reset) tuples, pattern being the sorted
+         indices of its on bits
+  :param numSteps: (int) number of steps of the profile
+  :param checkpointInterval: (int) number of steps between checkpoints
+  :param columnCount: (int) number of columns of the spatial pooler; without
+         it, the temporal memory has one column per bit of the patterns
+  :param cellsPerColumn: (int) number of cells per column of the temporal
+         memory
+  :param useSpatialPooler: (bool) True to feed the patterns to a spatial
+         pooler rather than directly to the temporal memory
+  :param useClassifier: (bool) True to predict the next symbol from the
+         active cells with an SDR classifier
+  :param useResets: (bool) True to reset the temporal memory at the start of
+         each sequence. A stream without resets is closer to production, and
+         grows more segments.
+  :param implementation: (string) "cpp" or "py"
+  :param tmParams: (dict) parameters of the temporal memory overriding the
+         defaults
+  :param warmupFraction: (float) fraction of the checkpoints excluded from
+         the steady state
+  :param log: (function) called with a message after each checkpoint, or
+         None
+  :returns: (dict) the profile
+  """
+  if checkpointInterval < 1:
+    raise ValueError("checkpointInterval must be >= 1, got %r"
+                     % checkpointInterval)
+
+  if implementation == "py":
+    from nupic.algorithms.spatial_pooler import SpatialPooler
+    from nupic.algorithms.temporal_memory import TemporalMemory
+  elif implementation == "cpp":
+    from nupic.bindings.algorithms import SpatialPooler, TemporalMemory
+  else:
+    raise ValueError("Unknown implementation %r" % implementation)
+  from nupic.algorithms.sdr_classifier_factory import SDRClassifierFactory
+
+  sp = None
+  if useSpatialPooler:
+    sp = SpatialPooler(inputDimensions=[generator.n],
+                       columnDimensions=[columnCount],
+                       potentialPct=0.85, globalInhibition=True,
+                       numActiveColumnsPerInhArea=0.02 * columnCount,
+                       synPermActiveInc=0.04, synPermInactiveDec=0.005,
+                       boostStrength=3.0, seed=1956)
+    inputVector = numpy.zeros(generator.n, dtype="uint32")
+    activeArray = numpy.zeros(columnCount, dtype="uint32")
+  else:
+    columnCount = generator.n
+
+  params = dict(columnDimensions=[columnCount], cellsPerColumn=cellsPerColumn,
+                activationThreshold=13, minThreshold=10,
+                maxNewSynapseCount=20, permanenceIncrement=0.1,
+                permanenceDecrement=0.1, seed=1960)
+  params.update(tmParams or {})
+  tm = TemporalMemory(**params)
+
+  classifier = None
+  if useClassifier:
+    classifier = SDRClassifierFactory.create(steps=[1], alpha=0.1,
+                                             implementation=implementation)
+
+  config = dict(numSteps=numSteps,
+                checkpointInterval=checkpointInterval,
+                columnCount=columnCount,
+                useSpatialPooler=useSpatialPooler,
+                useClassifier=useClassifier,
+                useResets=useResets,
+                implementation=implementation,
+                tmParams=params,
+                generator=_getGeneratorConfig(generator))
+
+  histograms = dict((stage, LatencyHistogram()) for stage in STAGES)
+  checkpoints = []
+  timer = timeit.default_timer
+  intervalSecs = 0.0
+  numPredictedColumns = numActiveColumns = 0
+  numCorrect = numClassified = 0
+  predictedSymbol = None
+
+  for step, (symbol, pattern, reset) in enumerate(
+      generator.generate(numSteps)):
+    startTime = timer()
+
+    if sp is not None:
+      inputVector.fill(0)
+      inputVector[pattern] = 1
+      sp.compute(inputVector, True, activeArray)
+      activeColumns = activeArray.nonzero()[0]
+    else:
+      activeColumns = pattern
+    spTime = timer()
+
+    if useResets and reset:
+      tm.reset()
+      predictedSymbol = None
+    predictedColumns = numpy.asarray(tm.getPredictiveCells(),
+                                     dtype="uint32") // cellsPerColumn
+    tm.compute(activeColumns, learn=True)
+    tmTime = timer()
+
+    if classifier is not None:
+      if predictedSymbol is not None:
+        numClassified += 1
+        numCorrect += predictedSymbol == symbol
+      result = classifier.compute(step, list(tm.getActiveCells()),
+                                  {"bucketIdx": symbol, "actValue": symbol},
+                                  learn=True, infer=True)
+      predictedSymbol = int(numpy.argmax(result[1]))
+    endTime = timer()
+
+    histograms["sp"].record(spTime - startTime)
+    histograms["tm"].record(tmTime - spTime)
+    histograms["classifier"].record(endTime - tmTime)
+    histograms["step"].record(endTime - startTime)
+    intervalSecs += endTime - startTime
+    numPredictedColumns += numpy.in1d(activeColumns, predictedColumns).sum()
+    numActiveColumns += len(activeColumns)
+
+    if (step + 1) % checkpointInterval == 0 or step + 1 == numSteps:
+      previous = checkpoints[-1] if checkpoints else dict(step=0,
+                                                          elapsedSecs=0.0)
+      checkpoint = dict(
+        step=step + 1,
+        elapsedSecs=previous["elapsedSecs"] + intervalSecs,
+        stepsPerSec=(step + 1 - previous["step"]) / max(intervalSecs, 1e-9),
+        rssMB=getRSSMB(),
+        numSegments=tm.connections.numSegments(),
+        numSynapses=tm.connections.numSynapses(),
+        predictedColumnsFraction=(float(numPredictedColumns) /
+                                  max(numActiveColumns, 1)),
+        classifierAccuracy=(float(numCorrect) / numClassified
+                            if numClassified else None))
+      checkpoints.append(checkpoint)
+      intervalSecs = 0.0
+      numPredictedColumns = numActiveColumns = 0
+      numCorrect = numClassified = 0
+      if log is not None:
+        log("step %d: %.1f steps/sec, %.1f MB, %d segments, %d synapses" %
+            (checkpoint["step"], checkpoint["stepsPerSec"],
+             checkpoint["rssMB"], checkpoint["numSegments"],
+             checkpoint["numSynapses"]))
+
+  latency = dict((stage, histogram.getStats())
+                 for stage, histogram in histograms.iteritems())
+  if sp is None:
+    del latency["sp"]
+  if classifier is None:
+    del latency["classifier"]
+
+  return dict(config=config,
+              checkpoints=checkpoints,
+              latency=latency,
+              summary=summarize(checkpoints, warmupFraction))
+
+
+
+def summarize(checkpoints, warmupFraction=0.5):
+  """ Summarize the steady state of a profile.
+
+  :param checkpoints: (list) checkpoints of the profile
+  :param warmupFraction: (float) fraction of the checkpoints, the first ones,
+         excluded from the steady state; the last checkpoint is always
+         included
+  :returns: (dict) ``steadyStateStepsPerSec``, the throughput over the steady
+            state checkpoints; ``memoryGrowthMBPerMillionSteps``, the slope
+            of the least-squares line through their resident memory;
+            ``numSegments``, ``numSynapses`` and ``rssMB`` at the last
+            checkpoint
+  """
+  if not checkpoints:
+    return dict(steadyStateStepsPerSec=0.0, memoryGrowthMBPerMillionSteps=0.0,
+                numSegments=0, numSynapses=0, rssMB=getRSSMB())
+
+  first = min(int(len(checkpoints) * warmupFraction), len(checkpoints) - 1)
+  steady = checkpoints[first:]
+  start = checkpoints[first - 1] if first > 0 else dict(step=0,
+                                                       elapsedSecs=0.0)
+  last = checkpoints[-1]
+  steadySecs = max(last["elapsedSecs"] - start["elapsedSecs"], 1e-9)
+
+  memoryGrowth = 0.0
+  if len(steady) > 1:
+    steps = numpy.array([checkpoint["step"] for checkpoint in steady],
+                        dtype="float64")
+    memory = numpy.array([checkpoint["rssMB"] for checkpoint in steady])
+    memoryGrowth = numpy.polyfit(steps, memory, 1)[0] * 1e6
+
+  return dict(steadyStateStepsPerSec=(last["step"] - start["step"]) /
+                                     steadySecs,
+              memoryGrowthMBPerMillionSteps=memoryGrowth,
+              numSegments=last["numSegments"],
+              numSynapses=last["numSynapses"],
+              rssMB=last["rssMB"])
+
+
+
+def writeProfile(path, profile):
+  """ Write a profile, along with a description of the environment, to a
+  JSON file.
+  """
+  with open(path, "w") as f:
+    json.dump(dict(version=1, environment=getEnvironment(), profile=profile),
+              f, indent=2, sort_keys=True)
+    f.write("\n")
+
+
+
+def readProfile(path):
+  """
+  :returns: (dict) the profile written to ``path`` by :func:`writeProfile`
+  """
+  with open(path) as f:
+    return json.load(f)["profile"]
+
+
+
+def getRSSMB():
+  """
+  :returns: (float) current resident set size of the process, in MB; its
+            maximum so far where the current one is not available
+  """
+  try:
+    with open("/proc/self/statm") as f:
+      residentPages = int(f.read().split()[1])
+    return residentPages * os.sysconf("SC_PAGE_SIZE") / (1024.0 * 1024.0)
+  except (IOError, OSError, ValueError):
+    maxRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on OS X, kilobytes elsewhere
+    if sys.platform == "darwin":
+      return maxRSS / (1024.0 * 1024.0)
+    return maxRSS / 1024.0
+
+
+
+def _getGeneratorConfig(generator):
+  return dict((name, value) for name, value in vars(generator).iteritems()
+              if not name.startswith("_") and
+              isinstance(value, (int, long, float, basestring, bool)))
@@ -34,6 +34,7 @@ from nupic.swarming.hypersearch import regression
 from nupic.swarming.hypersearch.error_codes import ErrorCodes
 
 from nupic.database.client_jobs_dao import ClientJobsDAO
+from nupic.database.model_update_buffer import ModelUpdateBuffer
 from nupic.frameworks.opf import helpers
 from nupic.frameworks.opf.model_factory import ModelFactory
 from nupic.frameworks.opf.opf_basic_environment import BasicPredictionLogger
@@ -42,7 +43,9 @@ from nupic.frameworks.opf.periodic import (PeriodicActivityMgr,
                                            PeriodicActivityRequest)
 from nupic.frameworks.opf.prediction_metrics_manager import MetricsManager
 from nupic.support.configuration import Configuration
+from nupic.swarming.dataset_cache import DatasetCache
 from nupic.swarming.experiment_utils import InferenceElement
+from nupic.swarming.model_fork import SpatialPoolerForks
 from nupic.swarming import utils
 
 
@@ -157,6 +160,9 @@ class OPFModelRunner(object):
     # Will be set to new InputSource by __runTask()
     self._inputSource = None
 
+    # Spatial pooler recording or fork of the model, if forking is enabled
+    self._spFork = None
+
     # 0-based index of the record being processed;
     # Initialized and updated by __runTask()
     self._currentRecordIndex = None
@@ -164,6 +170,10 @@ class OPFModelRunner(object):
     # Interface to write predictions to a persistent storage
     self._predictionLogger = None
 
+    # Write-behind buffer for the heartbeat, metric and result updates of our
+    # model record. It must be flushed before the model is completed.
+    self._modelUpdates = ModelUpdateBuffer(jobsDAO)
+
     # In-memory cache for predictions. Predictions are written here for speed
     # when they don't need to be written to a persistent store
     self.__predictionCache = deque()
@@ -233,8 +243,17 @@ class OPFModelRunner(object):
     from nupic.data.stream_reader import StreamReader
     readTimeout = 0
 
-    self._inputSource = StreamReader(streamDef, isBlocking=False,
-                                     maxTimeout=readTimeout)
+    # Share the parsed dataset with the other models of the swarm, if enabled
+    datasetCache = None
+    datasetCacheDir = Configuration.get('nupic.hypersearch.datasetCacheDir')
+    if datasetCacheDir:
+      datasetCache = DatasetCache(datasetCacheDir)
+      self._inputSource = datasetCache.openStream(streamDef)
+
+    if self._inputSource is None:
+      datasetCache = None
+      self._inputSource = StreamReader(streamDef, isBlocking=False,
+                                       maxTimeout=readTimeout)
 
 
     # -----------------------------------------------------------------------
@@ -244,6 +263,16 @@ class OPFModelRunner(object):
     # Construct the model instance
     self._model = ModelFactory.create(modelDescription)
     self._model.setFieldStatistics(fieldStats)
+    if datasetCache is not None and \
+        bool(int(Configuration.get('nupic.hypersearch.enableEncodingCache'))):
+      datasetCache.attachEncodingCache(
+        self._model, modelDescription, self._inputSource,
+        numRecords=self._modelControl.get('iterationCount', -1))
+    if datasetCache is not None and \
+        bool(int(Configuration.get('nupic.hypersearch.enableModelForking'))):
+      forks = SpatialPoolerForks(os.path.join(self._inputSource.datasetDir,
+                                              "forks"))
+      self._spFork = forks.attach(self._model, modelDescription)
     self._model.enableLearning()
     self._model.enableInference(self._modelControl.get("inferenceArgs", None))
 
@@ -280,11 +309,26 @@ class OPFModelRunner(object):
         "iterationCountInferOnly."
       learningOffAt = numIters - iterationCountInferOnly
 
-    self.__runTaskMainLoop(numIters, learningOffAt=learningOffAt)
+    try:
+      self.__runTaskMainLoop(numIters, learningOffAt=learningOffAt)
+
+      # ---------------------------------------------------------------------
+      # Perform final operations for model
+      self._finalize()
+    except:
+      excInfo = sys.exc_info()
 
-    # -----------------------------------------------------------------------
-    # Perform final operations for model
-    self._finalize()
+      # Don't leave a partial spatial pooler recording behind
+      if self._spFork is not None:
+        self._spFork.abort()
+
+      # Report the progress made before the failure, without hiding it
+      try:
+        self._modelUpdates.flush()
+      except Exception:
+        self._logger.exception("Failed to write the buffered model updates "
+                               "of modelID=%r", self._modelID)
+      raise excInfo[0], excInfo[1], excInfo[2]
 
     return (self._cmpReason, None)
 
@@ -400,9 +444,17 @@ class OPFModelRunner(object):
       self._modelID, self._currentRecordIndex + 1)
 
     # =========================================================================
-    # Dump the experiment metrics at the end of the task
+    # Publish the spatial pooler run for the models that fork from it
+    # =========================================================================
+    if self._spFork is not None:
+      self._spFork.finish()
+
+    # =========================================================================
+    # Dump the experiment metrics at the end of the task. Write them right
+    # away, since the job results may name this model as the best one below.
     # =========================================================================
     self._updateModelDBResults()
+    self._modelUpdates.flush()
 
     # =========================================================================
     # Check if the current model is the best. Create a milestone if necessary
@@ -420,6 +472,11 @@ class OPFModelRunner(object):
     if self._predictionLogger:
       self._predictionLogger.close()
 
+    # =========================================================================
+    # Write the last heartbeats before the model gets completed
+    # =========================================================================
+    self._modelUpdates.flush()
+
 
   def __createModelCheckpoint(self):
     """ Create a checkpoint from the current model, and store it in a dir named
@@ -585,7 +642,7 @@ class OPFModelRunner(object):
     # -----------------------------------------------------------------------
     # Update model results
     results = json.dumps((metrics , optimizeDict))
-    self._jobsDAO.modelUpdateResults(self._modelID,  results=results,
+    self._modelUpdates.updateResults(self._modelID,  results=results,
                               metricValue=optimizeDict.values()[0],
                               numRecords=(self._currentRecordIndex + 1))
 
@@ -630,7 +687,7 @@ class OPFModelRunner(object):
       # as "bestModel"; sometimes this takes a long time, so update the model's
       # timestamp to help avoid getting orphaned
       self.__flushPredictionCache()
-      self._jobsDAO.modelUpdateTimestamp(self._modelID)
+      self._modelUpdates.updateTimestamp(self._modelID)
 
       metrics = self._getMetrics()
 
@@ -710,9 +767,9 @@ class OPFModelRunner(object):
         # Save the current model and its results
         if not isSaved:
           self.__flushPredictionCache()
-          self._jobsDAO.modelUpdateTimestamp(self._modelID)
+          self._modelUpdates.updateTimestamp(self._modelID)
           self.__createModelCheckpoint()
-          self._jobsDAO.modelUpdateTimestamp(self._modelID)
+          self._modelUpdates.updateTimestamp(self._modelID)
           isSaved = True
 
         # Now record the model as the best for the job
@@ -737,9 +794,9 @@ class OPFModelRunner(object):
         if isUpdated:
           if prevWasSaved:
             self.__deleteOutputCache(prevBest)
-            self._jobsDAO.modelUpdateTimestamp(self._modelID)
+            self._modelUpdates.updateTimestamp(self._modelID)
             self.__deleteModelCheckpoint(prevBest)
-            self._jobsDAO.modelUpdateTimestamp(self._modelID)
+            self._modelUpdates.updateTimestamp(self._modelID)
 
           self._logger.info("Model %d chosen as best model", self._modelID)
           break
@@ -750,9 +807,9 @@ class OPFModelRunner(object):
         # NOTE: we update model timestamp around these occasionally-lengthy
         #  operations to help prevent the model from becoming orphaned
         self.__deleteOutputCache(self._modelID)
-        self._jobsDAO.modelUpdateTimestamp(self._modelID)
+        self._modelUpdates.updateTimestamp(self._modelID)
         self.__deleteModelCheckpoint(self._modelID)
-        self._jobsDAO.modelUpdateTimestamp(self._modelID)
+        self._modelUpdates.updateTimestamp(self._modelID)
         break
 
 
@@ -783,7 +840,7 @@ class OPFModelRunner(object):
 
     # This updates the engLastUpdateTime of the model record so that other
     #  worker's don't think that this model is orphaned.
-    self._jobsDAO.modelUpdateResults(self._modelID)
+    self._modelUpdates.updateTimestamp(self._modelID)
 
 
   def __flushPredictionCache(self):
@@ -916,8 +973,9 @@ class OPFModelRunner(object):
     if self._currentRecordIndex+1 < self._MIN_RECORDS_TO_BE_BEST:
       return
 
-    # If we are already mature, don't need to check anything
-    if self._isMature:
+    # If we are already mature, don't need to check anything. A killed model
+    #  stays killed: its partial results must not be reported as final
+    if self._isMature or self._isKilled:
       return
 
     metric = self._getMetrics()[self._optimizedMetricLabel]
@@ -967,4 +1025,5 @@ class OPFModelRunner(object):
     """
     cmplReason = ClientJobsDAO.CMPL_REASON_ORPHAN
     cmplMessage = "Killed by Scheduler"
+    self._modelUpdates.flush()
     self._jobsDAO.modelSetCompleted(self._modelID, cmplReason, cmplMessage)
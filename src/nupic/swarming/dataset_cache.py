@@ -0,0 +1,590 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Dataset cache shared by the models of a swarm.
+
+Every model of a swarm reads the same dataset, so instead of having each
+:class:`~nupic.swarming.ModelRunner.OPFModelRunner` parse and aggregate the
+input file again, :class:`DatasetCache` does it once and stores the aggregated
+records as one ``.npy`` file per column. Workers memory-map these files, so the
+operating system's page cache shares them between all worker processes on a
+host.
+
+The cache can also hold the encodings of a field for a given encoder
+configuration, as sparse indices per record. Models whose encoders match a
+cached configuration then copy the cached bits instead of encoding the field
+again (see :meth:`DatasetCache.attachEncodingCache`).
+
+All cache files are written under a temporary name and renamed into place, so
+concurrent workers may build the same entry; the last rename wins and readers
+never see a partial file.
+"""
+
+import copy
+import datetime
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+
+import numpy
+
+from nupic.data.field_meta import FieldMetaInfo, FieldMetaType
+from nupic.data.record_stream import RecordStreamIface
+from nupic.data.stream_reader import StreamReader
+from nupic.encoders.category import CategoryEncoder
+from nupic.encoders.date import DateEncoder
+from nupic.encoders.scalar import ScalarEncoder
+
+
+
+# Bump when the layout of the cache files changes
+_CACHE_FORMAT_VERSION = 1
+
+# Number of records decoded from the column files at a time
+_BLOCK_SIZE = 1024
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+# Encoders whose output only depends on their constructor parameters and the
+# value being encoded. Subclasses, like AdaptiveScalarEncoder, are stateful and
+# are deliberately not included.
+_STATELESS_ENCODERS = (ScalarEncoder, DateEncoder, CategoryEncoder)
+
+_FILE_PREFIX = "file://"
+
+
+
+class _UncacheableDatasetError(Exception):
+  """ The records of a dataset can't be stored in columns. """
+  pass
+
+
+
+def _datetimeToMicroseconds(value):
+  delta = value - _EPOCH
+  return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+
+def _microsecondsToDatetime(value):
+  return _EPOCH + datetime.timedelta(microseconds=value)
+
+
+
+def _toColumn(fieldType, values):
+  """ Convert the values of one field to an array and a missing-value mask.
+
+  :param fieldType: (string) one of the :class:`FieldMetaType` types
+  :param values: (list) the field's value in each record
+  :returns: (column, mask) where mask is None if no value is missing
+  :raises: _UncacheableDatasetError if the values can't be stored in an array
+  """
+  mask = numpy.array([v is None for v in values], dtype=bool)
+  present = [v for v in values if v is not None]
+
+  if fieldType == FieldMetaType.float:
+    fill, dtype, convert = 0.0, numpy.float64, float
+  elif fieldType == FieldMetaType.integer:
+    fill, dtype, convert = 0, numpy.int64, int
+  elif fieldType == FieldMetaType.boolean:
+    fill, dtype, convert = False, bool, bool
+  elif fieldType == FieldMetaType.datetime:
+    if any(v.tzinfo is not None for v in present):
+      raise _UncacheableDatasetError("timezone-aware timestamps")
+    fill, dtype, convert = 0, numpy.int64, _datetimeToMicroseconds
+  elif fieldType == FieldMetaType.string:
+    if any(not isinstance(v, str) or v.endswith("\0") for v in present):
+      raise _UncacheableDatasetError("non-byte string values")
+    width = max([len(v) for v in present] + [1])
+    fill, dtype, convert = "", "S%d" % width, str
+  else:
+    raise _UncacheableDatasetError("field type %r" % fieldType)
+
+  column = numpy.array([fill if v is None else convert(v) for v in values],
+                       dtype=dtype)
+  return column, (mask if mask.any() else None)
+
+
+
+def _saveArray(path, array):
+  """ Atomically write an array to a ``.npy`` file. """
+  tmpPath = "%s.%s.tmp" % (path, uuid.uuid4().hex)
+  with open(tmpPath, "wb") as outFile:
+    numpy.save(outFile, array)
+  os.rename(tmpPath, path)
+
+
+
+def _loadArray(path):
+  """ Memory-map a ``.npy`` file read-only. """
+  try:
+    return numpy.load(path, mmap_mode="r")
+  except ValueError:
+    # Empty arrays can't be memory-mapped
+    return numpy.load(path)
+
+
+
+def _splitEncodings(encodings):
+  """ Split the array of a cached encoding into its offsets and indices: the
+  number of offsets, followed by the offsets and then the indices.
+
+  :returns: (offsets, indices), or None if the array is not consistent
+  """
+  if len(encodings) < 2:
+    return None
+  numOffsets = int(encodings[0])
+  if numOffsets < 1 or len(encodings) < 1 + numOffsets:
+    return None
+  offsets = encodings[1:1 + numOffsets]
+  indices = encodings[1 + numOffsets:]
+  if offsets[0] != 0 or offsets[-1] != len(indices):
+    return None
+  return offsets, indices
+
+
+
+def _getEnabledEncoderSpecs(encoderSpecs):
+  """ Get the encoder specs in the order MultiEncoder.addMultipleEncoders
+  creates their encoders, leaving out the classifier-only encoders the same
+  way HTMPredictionModel does.
+  """
+  specs = []
+  for key, spec in sorted(encoderSpecs.items()):
+    if ':' in key or spec is None or spec.get('classifierOnly', False):
+      continue
+    specs.append(spec)
+  return specs
+
+
+
+class CachedStreamReader(RecordStreamIface):
+  """
+  Record stream over the aggregated records of a dataset in a
+  :class:`DatasetCache`. It returns the same records, fields, stats and
+  aggregation period as the :class:`~nupic.data.stream_reader.StreamReader`
+  it was built from.
+
+  :param datasetDir: (string) directory of the cached dataset
+  """
+
+  def __init__(self, datasetDir):
+    super(CachedStreamReader, self).__init__()
+
+    self._datasetDir = datasetDir
+    with open(os.path.join(datasetDir, "meta.json")) as metaFile:
+      meta = json.load(metaFile)
+
+    self._fields = [FieldMetaInfo(str(name), str(fieldType), str(special))
+                    for name, fieldType, special in meta["fields"]]
+    self._aggMonthsAndSeconds = meta["aggregation"]
+    self._stats = meta["stats"]
+    self._numRecords = meta["numRecords"]
+
+    self._columns = []
+    for i, field in enumerate(self._fields):
+      column = _loadArray(os.path.join(datasetDir, "column%d.npy" % i))
+      maskPath = os.path.join(datasetDir, "mask%d.npy" % i)
+      mask = _loadArray(maskPath) if os.path.exists(maskPath) else None
+      if field.type == FieldMetaType.datetime:
+        decode = _microsecondsToDatetime
+      else:
+        decode = None
+      self._columns.append((column, mask, decode))
+
+    self._nextIdx = 0
+    self._block = []
+    self._blockStart = 0
+    self._lastRecord = None
+    self._error = None
+
+
+  @property
+  def datasetDir(self):
+    """ Directory of the cached dataset """
+    return self._datasetDir
+
+
+  def getColumnValues(self, fieldIdx, start, end):
+    """
+    :param fieldIdx: (int) index of the field
+    :param start: (int) index of the first record
+    :param end: (int) index after the last record
+    :returns: (list) the field's values in records ``start`` to ``end``
+    """
+    column, mask, decode = self._columns[fieldIdx]
+    values = column[start:end].tolist()
+    if decode is not None:
+      values = [decode(v) for v in values]
+    if mask is not None:
+      values = [None if isMissing else v
+                for v, isMissing in zip(values, mask[start:end].tolist())]
+    return values
+
+
+  def getLastRecord(self):
+    """
+    :returns: the values of the record last returned by :meth:`getNextRecord`
+    """
+    return self._lastRecord
+
+
+  def close(self):
+    self._columns = []
+    self._block = []
+
+
+  def rewind(self):
+    super(CachedStreamReader, self).rewind()
+    self._nextIdx = 0
+    self._lastRecord = None
+
+
+  def getNextRecord(self, useCache=True):
+    idx = self._nextIdx
+    if idx >= self._numRecords:
+      return None
+
+    blockOffset = idx - self._blockStart
+    if not 0 <= blockOffset < len(self._block):
+      end = min(idx + _BLOCK_SIZE, self._numRecords)
+      columns = [self.getColumnValues(i, idx, end)
+                 for i in xrange(len(self._columns))]
+      self._block = [list(values) for values in zip(*columns)]
+      self._blockStart = idx
+      blockOffset = 0
+
+    self._lastRecord = self._block[blockOffset]
+    self._nextIdx += 1
+    return self._lastRecord
+
+
+  def getDataRowCount(self):
+    """
+    :returns: (int) number of aggregated records in the dataset
+    """
+    return self._numRecords
+
+
+  def getNextRecordIdx(self):
+    return self._nextIdx
+
+
+  def getAggregationMonthsAndSeconds(self):
+    return self._aggMonthsAndSeconds
+
+
+  def appendRecord(self, record):
+    raise RuntimeError("Not implemented in CachedStreamReader")
+
+
+  def appendRecords(self, records, progressCB=None):
+    raise RuntimeError("Not implemented in CachedStreamReader")
+
+
+  def getBookmark(self):
+    return None
+
+
+  def recordsExistAfter(self, bookmark):
+    raise RuntimeError("Not implemented in CachedStreamReader")
+
+
+  def seekFromEnd(self, numRecords):
+    raise RuntimeError("Not implemented in CachedStreamReader")
+
+
+  def getStats(self):
+    return copy.deepcopy(self._stats)
+
+
+  def clearStats(self):
+    pass
+
+
+  def getError(self):
+    return self._error
+
+
+  def setError(self, error):
+    self._error = error
+
+
+  def isCompleted(self):
+    return True
+
+
+  def setCompleted(self, completed=True):
+    pass
+
+
+  def getFieldNames(self):
+    return [f.name for f in self._fields]
+
+
+  def getFields(self):
+    return self._fields
+
+
+  def setTimeout(self, timeout):
+    pass
+
+
+  def flush(self):
+    raise RuntimeError("Not implemented in CachedStreamReader")
+
+
+
+class _CachedEncoder(object):
+  """ Wraps a sub-encoder of a MultiEncoder, serving encodeIntoArray from the
+  cached encodings of the current record of a :class:`CachedStreamReader`.
+  Everything else is delegated to the wrapped encoder, and pickling stores the
+  wrapped encoder itself.
+  """
+
+  def __init__(self, encoder, stream, fieldIdx, offsets, indices):
+    self._encoder = encoder
+    self._stream = stream
+    self._fieldIdx = fieldIdx
+    self._offsets = offsets
+    self._indices = indices
+    self._numRecords = len(offsets) - 1
+    self._width = encoder.getWidth()
+
+
+  def __getattr__(self, name):
+    return getattr(object.__getattribute__(self, "_encoder"), name)
+
+
+  def __reduce__(self):
+    return self._encoder.__reduce_ex__(2)
+
+
+  def encodeIntoArray(self, inputData, output):
+    recordIdx = self._stream.getNextRecordIdx() - 1
+    lastRecord = self._stream.getLastRecord()
+    if (0 <= recordIdx < self._numRecords and lastRecord is not None and
+        lastRecord[self._fieldIdx] == inputData):
+      output[:self._width] = 0
+      output[self._indices[self._offsets[recordIdx]:
+                           self._offsets[recordIdx + 1]]] = 1
+    else:
+      self._encoder.encodeIntoArray(inputData, output)
+
+
+
+class DatasetCache(object):
+  """
+  Cache of aggregated datasets and their field encodings, shared by the models
+  of a swarm through a directory.
+
+  Datasets are keyed on their stream definition and on the size and
+  modification time of their source files, so editing a dataset invalidates
+  its cache entry.
+
+  :param cacheDir: (string) directory holding the cache; created if missing
+  """
+
+  def __init__(self, cacheDir):
+    self._cacheDir = os.path.abspath(cacheDir)
+    self._logger = logging.getLogger(".".join(["com.numenta",
+                                               self.__class__.__module__,
+                                               self.__class__.__name__]))
+    if not os.path.isdir(self._cacheDir):
+      try:
+        os.makedirs(self._cacheDir)
+      except OSError:
+        # Created by another worker in the meantime
+        if not os.path.isdir(self._cacheDir):
+          raise
+
+
+  def _getDatasetKey(self, streamDef):
+    sources = []
+    for stream in streamDef['streams']:
+      source = stream.get('source', "")
+      if source.startswith(_FILE_PREFIX):
+        path = os.path.abspath(source[len(_FILE_PREFIX):])
+        stat = os.stat(path)
+        sources.append([path, stat.st_size, stat.st_mtime])
+    keyData = json.dumps([_CACHE_FORMAT_VERSION, streamDef, sources],
+                         sort_keys=True)
+    return hashlib.md5(keyData).hexdigest()
+
+
+  def openStream(self, streamDef):
+    """ Open a record stream over the aggregated records of a dataset, building
+    its cache entry first if needed.
+
+    :param streamDef: (dict) stream definition, as passed to
+           :class:`~nupic.data.stream_reader.StreamReader`
+    :returns: (:class:`CachedStreamReader`) the cached stream, or None if the
+              dataset's fields can't be cached
+    """
+    datasetDir = os.path.join(self._cacheDir, self._getDatasetKey(streamDef))
+    if not os.path.exists(os.path.join(datasetDir, "meta.json")):
+      try:
+        self._buildDataset(streamDef, datasetDir)
+      except _UncacheableDatasetError, e:
+        self._logger.info("Not caching dataset %r: %s", streamDef, e)
+        return None
+    return CachedStreamReader(datasetDir)
+
+
+  def _buildDataset(self, streamDef, datasetDir):
+    """ Read the dataset through a StreamReader and store its records in
+    columns under datasetDir.
+    """
+    self._logger.info("Building dataset cache %r", datasetDir)
+    reader = StreamReader(streamDef, isBlocking=False, maxTimeout=0)
+    try:
+      fields = reader.getFields()
+      records = []
+      while True:
+        values = reader.getNextRecord()
+        if values is None:
+          break
+        if not values:
+          raise _UncacheableDatasetError("stream timed out")
+        records.append(values)
+      meta = dict(fields=[list(f) for f in fields],
+                  aggregation=reader.getAggregationMonthsAndSeconds(),
+                  stats=reader.getStats(),
+                  numRecords=len(records))
+    finally:
+      reader.close()
+
+    columns = []
+    for i, field in enumerate(fields):
+      columns.append(_toColumn(field.type, [values[i] for values in records]))
+
+    tmpDir = tempfile.mkdtemp(dir=self._cacheDir, prefix=".building-")
+    try:
+      for i, (column, mask) in enumerate(columns):
+        numpy.save(os.path.join(tmpDir, "column%d.npy" % i), column)
+        if mask is not None:
+          numpy.save(os.path.join(tmpDir, "mask%d.npy" % i), mask)
+      os.mkdir(os.path.join(tmpDir, "encodings"))
+      with open(os.path.join(tmpDir, "meta.json"), "w") as metaFile:
+        json.dump(meta, metaFile)
+
+      try:
+        os.rename(tmpDir, datasetDir)
+      except OSError:
+        # Another worker built the same dataset first
+        if not os.path.exists(os.path.join(datasetDir, "meta.json")):
+          raise
+    finally:
+      if os.path.exists(tmpDir):
+        shutil.rmtree(tmpDir)
+
+
+  def attachEncodingCache(self, model, modelDescription, stream,
+                          numRecords=-1):
+    """ Serve the encodings of a model's stateless field encoders from the
+    cache. The model must be fed the records of ``stream`` in order; any other
+    input falls back to the model's own encoders.
+
+    :param model: (:class:`~nupic.frameworks.opf.model.Model`) the model; only
+           HTMPrediction models are supported
+    :param modelDescription: (dict) the description the model was created from
+    :param stream: (:class:`CachedStreamReader`) stream the model is fed from
+    :param numRecords: (int) number of records the model will run; -1 for all
+    :returns: (int) number of encoders served from the cache
+    """
+    if modelDescription.get('model') != 'HTMPrediction':
+      return 0
+
+    multiEncoder = model._getEncoder()
+    specs = _getEnabledEncoderSpecs(
+      modelDescription['modelParams']['sensorParams']['encoders'])
+    if len(specs) != len(multiEncoder.encoders):
+      return 0
+
+    if numRecords < 0:
+      numRecords = stream.getDataRowCount()
+    numRecords = min(numRecords, stream.getDataRowCount())
+
+    fieldNames = stream.getFieldNames()
+    numCached = 0
+    for i, ((name, encoder, offset), spec) in enumerate(
+        zip(multiEncoder.encoders, specs)):
+      if type(encoder) not in _STATELESS_ENCODERS or name not in fieldNames:
+        continue
+
+      fieldIdx = fieldNames.index(name)
+      offsets, indices = self._getEncodings(stream, fieldIdx, encoder, spec,
+                                            numRecords)
+      multiEncoder.encoders[i] = (
+        name, _CachedEncoder(encoder, stream, fieldIdx, offsets, indices),
+        offset)
+      numCached += 1
+
+    return numCached
+
+
+  def _getEncodings(self, stream, fieldIdx, encoder, spec, numRecords):
+    """ Load the encodings of a field for an encoder spec, (re)building them if
+    the cached ones cover fewer than numRecords records.
+
+    :returns: (offsets, indices) such that the active bits of record i are
+              ``indices[offsets[i]:offsets[i + 1]]``
+    """
+    key = hashlib.md5(json.dumps([encoder.__class__.__name__, spec],
+                                 sort_keys=True, default=repr)).hexdigest()
+    path = os.path.join(stream.datasetDir, "encodings", key + ".npy")
+
+    # The offsets and indices share one file, renamed into place at once, so
+    # that concurrent builders can't pair the offsets of one build with the
+    # indices of another
+    if os.path.exists(path):
+      encodings = _splitEncodings(_loadArray(path))
+      if encodings is not None and len(encodings[0]) - 1 >= numRecords:
+        return encodings
+
+    offsets = [0]
+    indices = []
+    output = numpy.zeros(encoder.getWidth(), dtype=numpy.uint8)
+    for start in xrange(0, numRecords, _BLOCK_SIZE):
+      end = min(start + _BLOCK_SIZE, numRecords)
+      for value in stream.getColumnValues(fieldIdx, start, end):
+        try:
+          encoder.encodeIntoArray(value, output)
+        except Exception:
+          # Leave this and later records to the model's encoder, which will
+          # fail the same way when it gets there
+          numRecords = len(offsets) - 1
+          break
+        activeBits = output.nonzero()[0]
+        indices.extend(activeBits.tolist())
+        offsets.append(len(indices))
+      if len(offsets) - 1 < end:
+        break
+
+    offsets = numpy.array(offsets, dtype=numpy.int64)
+    indices = numpy.array(indices, dtype=numpy.int64)
+    _saveArray(path, numpy.concatenate(([len(offsets)], offsets, indices)))
+    return offsets, indices
@@ -546,6 +546,9 @@ class OPFDummyModelRunner(OPFModelRunner):
 
       self._finalize()
 
+    # Write any results the periodic activities left in the buffer
+    self._modelUpdates.flush()
+
     self._logger.info("Finished: modelID=%r "% (self._modelID))
 
     return (self._cmpReason, None)
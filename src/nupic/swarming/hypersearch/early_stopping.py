@@ -0,0 +1,154 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+import logging
+import math
+
+import numpy
+
+from nupic.swarming.hypersearch.support import Configuration
+
+
+
+class EarlyStopper(object):
+  """Compares the running models of a swarm against each other at fixed record
+  milestones and decides which ones should stop early.
+
+  Milestones are at ``minRecords * reductionFactor ** k`` records. The first
+  time a model reports a metric at or past a milestone, its errScore is
+  recorded for that milestone and compared against the errScores its swarm's
+  other models recorded there:
+
+  - ``halving``: asynchronous successive halving (ASHA). The model keeps
+    running only if it is in the best ``1 / reductionFactor`` of the models
+    that reached the milestone so far.
+  - ``median``: median stopping. The model stops if it is worse than the median
+    of the other models at the milestone.
+
+  No decision is made until at least ``minPeers`` other models have reached the
+  milestone. Models only report their metrics every so often, so a report that
+  skips over milestones is only recorded at the highest of them.
+  """
+
+  POLICIES = ('none', 'halving', 'median')
+
+  def __init__(self, policy=None, minRecords=None, reductionFactor=None,
+               minPeers=None, logLevel=None):
+    if policy is None:
+      policy = Configuration.get('nupic.hypersearch.earlyStopping.policy')
+    if minRecords is None:
+      minRecords = int(Configuration.get(
+                              'nupic.hypersearch.earlyStopping.minRecords'))
+    if reductionFactor is None:
+      reductionFactor = float(Configuration.get(
+                              'nupic.hypersearch.earlyStopping.reductionFactor'))
+    if minPeers is None:
+      minPeers = int(Configuration.get(
+                              'nupic.hypersearch.earlyStopping.minPeers'))
+
+    if policy not in self.POLICIES:
+      raise ValueError("Unknown early stopping policy %r. Must be one of %s"
+                       % (policy, self.POLICIES))
+    if minRecords < 1 or reductionFactor <= 1:
+      raise ValueError("minRecords must be positive and reductionFactor "
+                       "greater than 1")
+
+    self.policy = policy
+    self.minRecords = minRecords
+    self.reductionFactor = reductionFactor
+    self.minPeers = minPeers
+
+    # errScores at each milestone: {swarmId: [{modelId: errScore}, ...]}
+    self.milestoneScores = dict()
+
+    # Index of the next milestone to record for each model
+    self._nextMilestone = dict()
+
+    self.stoppedModels = set()
+
+    self._logger = logging.getLogger(".".join(
+        ['com.numenta', self.__class__.__module__, self.__class__.__name__]))
+    if logLevel is not None:
+      self._logger.setLevel(logLevel)
+
+
+  def isEnabled(self):
+    return self.policy != 'none'
+
+
+  def getMilestone(self, index):
+    """Return the number of records at milestone ``index``."""
+    return int(round(self.minRecords * self.reductionFactor ** index))
+
+
+  def recordDataPoint(self, modelId, swarmId, numRecords, errScore,
+                      completed=False):
+    """Record the errScore a model reported after numRecords records.
+
+    Parameters:
+    ----------------------------------------------------------------------
+    modelId:      ID of the model
+    swarmId:      ID of the model's swarm; models are only compared against
+                    models of the same swarm
+    numRecords:   number of records the model has processed
+    errScore:     the model's errScore (lower is better), or None if it
+                    hasn't computed one yet
+    completed:    True if the model already completed. Its score is still
+                    recorded for its peers, but it is never stopped.
+    retval:       True if the model should stop
+    """
+    if not self.isEnabled() or errScore is None or numpy.isinf(errScore) or \
+       modelId in self.stoppedModels:
+      return False
+
+    # Find the highest milestone this report passed
+    milestoneIdx = self._nextMilestone.get(modelId, 0)
+    if numRecords < self.getMilestone(milestoneIdx):
+      return False
+    while numRecords >= self.getMilestone(milestoneIdx + 1):
+      milestoneIdx += 1
+    self._nextMilestone[modelId] = milestoneIdx + 1
+
+    swarmScores = self.milestoneScores.setdefault(swarmId, [])
+    while milestoneIdx >= len(swarmScores):
+      swarmScores.append(dict())
+    scores = swarmScores[milestoneIdx]
+    scores[modelId] = errScore
+
+    if completed or len(scores) - 1 < self.minPeers:
+      return False
+
+    if self.policy == 'halving':
+      numKept = int(math.ceil(len(scores) / self.reductionFactor))
+      rank = sum(1 for score in scores.itervalues() if score < errScore)
+      stop = rank >= numKept
+    else:
+      peerScores = [score for peerId, score in scores.iteritems()
+                    if peerId != modelId]
+      stop = errScore > numpy.median(peerScores)
+
+    if stop:
+      self._logger.info("Stopping model %s of swarm %s early: errScore %s at "
+                        "milestone %d (%d records) is behind its %d peers",
+                        modelId, swarmId, errScore, milestoneIdx,
+                        self.getMilestone(milestoneIdx), len(scores) - 1)
+      self.stoppedModels.add(modelId)
+    return stop
@@ -395,6 +395,28 @@ class Particle(object):
 
     return result
 
+  def _getSwarmResults(self, maxGenIdx):
+    """Return the positions evaluated so far in this particle's swarm and their
+    errScores.
+
+    Parameters:
+    --------------------------------------------------------------
+    maxGenIdx:      only return models at or below this generation index
+    retval:         (positions, errScores)
+    """
+    (particleStates, _, errScores, _, _) = self._resultsDB.getParticleInfos(
+      self.swarmId, matured=True)
+
+    positions = []
+    results = []
+    for (particleState, errScore) in zip(particleStates, errScores):
+      if particleState['genIdx'] > maxGenIdx:
+        continue
+      positions.append(Particle.getPositionFromState(particleState))
+      results.append(errScore)
+
+    return (positions, results)
+
   def agitate(self):
     """Agitate this particle so that it is likely to go to a new position.
     Every time agitate is called, the particle is jiggled an even greater
@@ -440,13 +462,27 @@ class Particle(object):
         globalBestPosition = Particle.getPositionFromState(particleState)
 
     # Update each variable
-    for (varName, var) in self.permuteVars.iteritems():
-      if whichVars is not None and varName not in whichVars:
-        continue
-      if globalBestPosition is None:
-        var.newPosition(None, self._rng)
-      else:
-        var.newPosition(globalBestPosition[varName], self._rng)
+    def psoMove():
+      for (varName, var) in self.permuteVars.iteritems():
+        if whichVars is not None and varName not in whichVars:
+          continue
+        if globalBestPosition is None:
+          var.newPosition(None, self._rng)
+        else:
+          var.newPosition(globalBestPosition[varName], self._rng)
+
+    # Let the surrogate model choose among several candidate moves, if enabled
+    #  and there are enough results in the swarm yet
+    proposer = self._hsObj._particleProposer
+    if proposer.isEnabled():
+      (positions, errScores) = self._getSwarmResults(genIdx)
+      proposed = proposer.proposePosition(self.permuteVars, positions,
+                                          errScores, psoMove, self._rng,
+                                          whichVars=whichVars)
+    else:
+      proposed = False
+    if not proposed:
+      psoMove()
 
     # get the new position
     position = self.getPosition()
@@ -0,0 +1,294 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+import logging
+import math
+
+import numpy
+
+from nupic.swarming.hypersearch.permutation_helpers import (PermuteChoices,
+                                                            PermuteFloat)
+from nupic.swarming.hypersearch.support import Configuration
+
+
+
+class ParticleProposer(object):
+  """Chooses the next position of a particle that is moved to a new
+  generation.
+
+  - ``pso``: the classic particle swarm update (see PermuteFloat.newPosition
+    and PermuteChoices.newPosition).
+  - ``tpe``: a Tree-structured Parzen Estimator fitted over all the results of
+    the particle's swarm. The results are split into the best ``gamma``
+    fraction and the rest, and each permutation variable gets a Parzen density
+    estimate over the positions of either group: ``l(x)`` for the best results
+    and ``g(x)`` for the others. Of ``numCandidates`` candidate positions,
+    half drawn with the PSO update and half sampled from ``l(x)``, the
+    particle moves to the one that maximizes ``l(x) / g(x)``, which is
+    monotonic in the expected improvement of the error score.
+
+  Until a swarm has ``minResults`` results, the ``tpe`` strategy falls back
+  to the PSO update.
+  """
+
+  STRATEGIES = ('pso', 'tpe')
+
+  def __init__(self, strategy=None, numCandidates=None, minResults=None,
+               gamma=None, logLevel=None):
+    if strategy is None:
+      strategy = Configuration.get('nupic.hypersearch.particleProposal.strategy')
+    if numCandidates is None:
+      numCandidates = int(Configuration.get(
+                          'nupic.hypersearch.particleProposal.numCandidates'))
+    if minResults is None:
+      minResults = int(Configuration.get(
+                          'nupic.hypersearch.particleProposal.minResults'))
+    if gamma is None:
+      gamma = float(Configuration.get(
+                          'nupic.hypersearch.particleProposal.gamma'))
+
+    if strategy not in self.STRATEGIES:
+      raise ValueError("Unknown particle proposal strategy %r. Must be one of "
+                       "%s" % (strategy, self.STRATEGIES))
+    if numCandidates < 1 or minResults < 2 or not 0 < gamma < 1:
+      raise ValueError("numCandidates must be positive, minResults at least 2 "
+                       "and gamma between 0 and 1")
+
+    self.strategy = strategy
+    self.numCandidates = numCandidates
+    self.minResults = minResults
+    self.gamma = gamma
+
+    self._logger = logging.getLogger(".".join(
+        ['com.numenta', self.__class__.__module__, self.__class__.__name__]))
+    if logLevel is not None:
+      self._logger.setLevel(logLevel)
+
+
+  def isEnabled(self):
+    return self.strategy != 'pso'
+
+
+  def fitSurrogate(self, permuteVars, positions, errScores):
+    """Fit the TPE surrogate over the evaluated positions of a swarm.
+
+    Parameters:
+    ----------------------------------------------------------------------
+    permuteVars:  dict() of the swarm's (varName, PermuteVariable) pairs
+    positions:    list of evaluated positions, each a dict() of
+                    (varName, position) pairs as returned by
+                    Particle.getPositionFromState()
+    errScores:    list of the errScores of these positions (lower is better).
+                    Positions with an infinite errScore are ignored.
+    retval:       a ParzenSurrogate, or None if there are too few results
+    """
+    results = [(errScore, position)
+               for (errScore, position) in zip(errScores, positions)
+               if not numpy.isinf(errScore)]
+    if len(results) < self.minResults:
+      return None
+
+    results.sort(key=lambda result: result[0])
+    numGood = max(1, int(math.ceil(self.gamma * len(results))))
+    goodPositions = [position for (_, position) in results[:numGood]]
+    badPositions = [position for (_, position) in results[numGood:]]
+    return ParzenSurrogate(permuteVars, goodPositions, badPositions)
+
+
+  def proposePosition(self, permuteVars, positions, errScores, psoMove, rng,
+                      whichVars=None):
+    """Move the variables of a particle to the most promising of
+    ``numCandidates`` candidate positions.
+
+    Parameters:
+    ----------------------------------------------------------------------
+    permuteVars:  dict() of the particle's (varName, PermuteVariable) pairs.
+                    They are left at the chosen position.
+    positions:    list of the positions evaluated so far in the swarm, see
+                    fitSurrogate()
+    errScores:    list of the errScores of these positions
+    psoMove:      function that moves permuteVars with one PSO update
+    rng:          instance of random.Random() used for generating random
+                    numbers
+    whichVars:    If not None, only move these variables
+    retval:       False if there are too few results to fit a surrogate, in
+                    which case permuteVars are not changed.
+    """
+    surrogate = self.fitSurrogate(permuteVars, positions, errScores)
+    if surrogate is None:
+      return False
+
+    if whichVars is None:
+      whichVars = permuteVars.keys()
+    startStates = dict((varName, var.getState())
+                       for (varName, var) in permuteVars.iteritems())
+    evaluated = set(_positionKey(position) for position in positions)
+
+    bestScore = None
+    bestStates = None
+    for candidateIdx in xrange(self.numCandidates):
+      for (varName, var) in permuteVars.iteritems():
+        var.setState(dict(startStates[varName]))
+
+      if candidateIdx % 2 == 0:
+        psoMove()
+      else:
+        for varName in whichVars:
+          var = permuteVars[varName]
+          state = dict(startStates[varName])
+          position = surrogate.sample(varName, rng)
+          if position is None:
+            continue
+          state['_position'] = position
+          if isinstance(var, PermuteFloat):
+            state['velocity'] = position - startStates[varName]['_position']
+          var.setState(state)
+
+      position = dict((varName, var.getPosition())
+                      for (varName, var) in permuteVars.iteritems())
+      score = surrogate.score(position)
+      # Rather re-evaluate a position than not move at all, but prefer
+      #  unexplored ones
+      if _positionKey(position) in evaluated:
+        score -= 1e6
+
+      if bestScore is None or score > bestScore:
+        bestScore = score
+        bestStates = dict((varName, var.getState())
+                          for (varName, var) in permuteVars.iteritems())
+
+    for (varName, var) in permuteVars.iteritems():
+      var.setState(bestStates[varName])
+
+    self._logger.debug("Proposed position with log(l/g)=%g out of %d "
+                       "candidates", bestScore, self.numCandidates)
+    return True
+
+
+
+class ParzenSurrogate(object):
+  """The ``l(x)`` and ``g(x)`` densities of a TPE surrogate. Each variable is
+  modeled independently: PermuteFloat and PermuteInt variables with a mixture
+  of a uniform prior over [min, max] and a gaussian kernel at each position,
+  PermuteChoices variables with the smoothed frequency of each choice.
+
+  Parameters:
+  ----------------------------------------------------------------------
+  permuteVars:    dict() of the (varName, PermuteVariable) pairs to model
+  goodPositions:  list of the best positions, see ParticleProposer
+  badPositions:   list of the other positions
+  """
+
+  def __init__(self, permuteVars, goodPositions, badPositions):
+    self.good = dict()
+    self.bad = dict()
+    for (varName, var) in permuteVars.iteritems():
+      if isinstance(var, PermuteFloat):
+        if var.max <= var.min:
+          continue
+        densityClass = _NumericDensity
+      elif isinstance(var, PermuteChoices):
+        densityClass = _ChoiceDensity
+      else:
+        continue
+
+      self.good[varName] = densityClass(
+        var, [position[varName] for position in goodPositions])
+      self.bad[varName] = densityClass(
+        var, [position[varName] for position in badPositions])
+
+
+  def score(self, position):
+    """Return log(l(x) / g(x)) of a position, a dict() of
+    (varName, position) pairs."""
+    score = 0.0
+    for (varName, good) in self.good.iteritems():
+      score += good.logDensity(position[varName])
+      score -= self.bad[varName].logDensity(position[varName])
+    return score
+
+
+  def sample(self, varName, rng):
+    """Return a position of a variable drawn from l(x), or None if the
+    variable isn't modeled."""
+    density = self.good.get(varName)
+    if density is None:
+      return None
+    return density.sample(rng)
+
+
+
+class _NumericDensity(object):
+  """Mixture of a uniform prior over [min, max] and gaussian kernels."""
+
+  def __init__(self, var, positions):
+    self.min = float(var.min)
+    self.max = float(var.max)
+    self.positions = numpy.array(positions, dtype=float)
+
+    # Scott's rule over the full range, so that few positions still cover it
+    numPositions = len(self.positions) + 1
+    self.bandwidth = max((self.max - self.min) * numPositions ** -0.2 / 4.0,
+                         var.stepSize or 0.0)
+
+
+  def logDensity(self, position):
+    kernels = numpy.exp(-0.5 * ((position - self.positions) /
+                                self.bandwidth) ** 2)
+    kernels /= self.bandwidth * math.sqrt(2.0 * math.pi)
+    density = (kernels.sum() + 1.0 / (self.max - self.min)) / \
+              (len(self.positions) + 1)
+    return math.log(density)
+
+
+  def sample(self, rng):
+    componentIdx = rng.randint(0, len(self.positions))
+    if componentIdx == len(self.positions):
+      return rng.uniform(self.min, self.max)
+    position = rng.gauss(self.positions[componentIdx], self.bandwidth)
+    return min(self.max, max(self.min, position))
+
+
+
+class _ChoiceDensity(object):
+  """Frequency of each choice, with a count of one added to each."""
+
+  def __init__(self, var, positions):
+    self.choices = var.choices
+    self.counts = numpy.ones(len(self.choices))
+    for position in positions:
+      self.counts[self.choices.index(position)] += 1
+
+
+  def logDensity(self, position):
+    return math.log(self.counts[self.choices.index(position)] /
+                    self.counts.sum())
+
+
+  def sample(self, rng):
+    r = rng.random() * self.counts.sum()
+    choiceIdx = numpy.where(r < self.counts.cumsum())[0][0]
+    return self.choices[choiceIdx]
+
+
+
+def _positionKey(position):
+  return repr(sorted(position.items()))
@@ -35,6 +35,8 @@ import pprint
 from nupic.swarming.hypersearch.permutation_helpers import *
 from nupic.swarming.hypersearch.particle import Particle
 from nupic.swarming.hypersearch.error_codes import ErrorCodes
+from nupic.swarming.hypersearch.early_stopping import EarlyStopper
+from nupic.swarming.hypersearch.particle_proposal import ParticleProposer
 from nupic.swarming.hypersearch.swarm_terminator import SwarmTerminator
 from nupic.swarming.hypersearch.hs_state import HsState, HsSearchType
 
@@ -94,6 +96,11 @@ class ResultsDB(object):
     # Each entry is a dict of genIdx: (modelId, errScore) entries.
     self._swarmBestOverall = dict()
 
+    # For each swarm, the running best of _swarmBestOverall: entry genIdx is
+    # the (modelId, errScore) of the best model in generations 0 to genIdx.
+    # Lets bestModelIdAndErrScore() answer without scanning the generations.
+    self._swarmBestUpToGeneration = dict()
+
     # For each swarm, we keep track of how many particles we have per generation
     # The key is the swarmId, the value is a list of the number of particles
     # at each generation
@@ -130,6 +137,33 @@ class ResultsDB(object):
     # ParamsHash to index mapping
     self._paramsHashToIndexes = dict()
 
+    # Secondary indexes into self._allResults, used by getParticleInfos() and
+    # getOrphanParticleInfos() to avoid scanning every result. Like
+    # _swarmIdToIndexes, the per-swarm indexes exclude hidden models:
+    #  _swarmGenToIndexes:  (swarmId, genIdx) -> list of indexes
+    #  _swarmParticleGenToIndexes: (swarmId, particleId, genIdx) -> list of
+    #                        indexes
+    #  _swarmIdToParticleIds: swarmId -> set of particleIds
+    #  _swarmIdToRunningIndexes: swarmId -> set of indexes of models that
+    #                        have not completed
+    #  _swarmIdToUnmaturedIndexes: swarmId -> set of indexes of models that
+    #                        have not matured
+    #  _swarmIdToHiddenIndexes: swarmId -> set of indexes of hidden models
+    #  _swarmIndexedEntries: set of the indexes in the per-swarm indexes
+    # The following cover all models, including hidden ones
+    #  _runningIndexes:     set of indexes of models that have not completed
+    #  _unmaturedIndexes:   set of indexes of models that have not matured
+    self._swarmGenToIndexes = dict()
+    self._swarmParticleGenToIndexes = dict()
+    self._swarmIdToParticleIds = dict()
+    self._swarmIdToRunningIndexes = dict()
+    self._swarmIdToUnmaturedIndexes = dict()
+    self._swarmIdToHiddenIndexes = dict()
+    self._swarmIndexedEntries = set()
+    self._runningIndexes = set()
+    self._unmaturedIndexes = set()
+    self._numHidden = 0
+
 
   def update(self, modelID, modelParams, modelParamsHash, metricResult,
              completed, completionReason, matured, numRecords):
@@ -228,6 +262,7 @@ class ResultsDB(object):
           self._swarmIdToIndexes[swarmId].append(entryIdx)
         else:
           self._swarmIdToIndexes[swarmId] = [entryIdx]
+        self._addToSwarmIndexes(entryIdx)
 
         # Update number of particles at each generation in this swarm
         genIdx = modelParams['particleState']['genIdx']
@@ -236,6 +271,9 @@ class ResultsDB(object):
           numPsEntry.append(0)
         numPsEntry[genIdx] += 1
         self._swarmNumParticlesPerGeneration[swarmId] = numPsEntry
+      else:
+        self._numHidden += 1
+        self._swarmIdToHiddenIndexes.setdefault(swarmId, set()).add(entryIdx)
 
     # Replacing an existing one
     else:
@@ -262,6 +300,12 @@ class ResultsDB(object):
         assert (entryIdx in self._swarmIdToIndexes[swarmId])
         self._swarmIdToIndexes[swarmId].remove(entryIdx)
         self._swarmNumParticlesPerGeneration[swarmId][genIdx] -= 1
+        self._removeFromSwarmIndexes(entryIdx)
+        self._numHidden += 1
+        self._swarmIdToHiddenIndexes.setdefault(swarmId, set()).add(entryIdx)
+      elif wasHidden and not hidden:
+        self._numHidden -= 1
+        self._swarmIdToHiddenIndexes[swarmId].discard(entryIdx)
 
       # Update the entry for the latest info
       entry['errScore']  = errScore
@@ -270,6 +314,16 @@ class ResultsDB(object):
       entry['numRecords'] = numRecords
       entry['hidden'] = hidden
 
+      # Move it between the completion/maturity state indexes
+      if entryIdx in self._swarmIndexedEntries:
+        self._updateStateIndex(self._swarmIdToRunningIndexes[swarmId],
+                               entryIdx, not completed)
+        self._updateStateIndex(self._swarmIdToUnmaturedIndexes[swarmId],
+                               entryIdx, not matured)
+
+    self._updateStateIndex(self._runningIndexes, entryIdx, not completed)
+    self._updateStateIndex(self._unmaturedIndexes, entryIdx, not matured)
+
     # Update the particle best errScore
     particleId = modelParams['particleState']['id']
     genIdx = modelParams['particleState']['genIdx']
@@ -293,11 +347,24 @@ class ResultsDB(object):
         self._swarmBestOverall[swarmId] = []
 
       bestScores = self._swarmBestOverall[swarmId]
+      bestUpTo = self._swarmBestUpToGeneration.setdefault(swarmId, [])
       while genIdx >= len(bestScores):
         bestScores.append((None, numpy.inf))
+        bestUpTo.append(bestUpTo[-1] if bestUpTo else (None, numpy.inf))
       if errScore < bestScores[genIdx][1]:
         bestScores[genIdx] = (modelID, errScore)
 
+        # The earliest generation wins ties, like a scan through bestScores
+        for i in xrange(genIdx, len(bestUpTo)):
+          (bestID, bestScore) = bestUpTo[i]
+          if errScore > bestScore:
+            break
+          if errScore == bestScore:
+            bestEntry = self._allResults[self._modelIDToIdx[bestID]]
+            if bestEntry['modelParams']['particleState']['genIdx'] <= genIdx:
+              break
+          bestUpTo[i] = (modelID, errScore)
+
     # Update the self._modifiedSwarmGens flags to support the
     #   getMaturedSwarmGenerations() call.
     if not hidden:
@@ -307,6 +374,46 @@ class ResultsDB(object):
 
     return errScore
 
+  def _addToSwarmIndexes(self, entryIdx):
+    """ Add a non-hidden entry to the per-swarm secondary indexes. """
+    entry = self._allResults[entryIdx]
+    particleState = entry['modelParams']['particleState']
+    swarmId = particleState['swarmId']
+    particleId = particleState['id']
+    genIdx = particleState['genIdx']
+
+    self._swarmGenToIndexes.setdefault((swarmId, genIdx), []).append(entryIdx)
+    self._swarmParticleGenToIndexes.setdefault(
+        (swarmId, particleId, genIdx), []).append(entryIdx)
+    self._swarmIdToParticleIds.setdefault(swarmId, set()).add(particleId)
+    self._swarmIndexedEntries.add(entryIdx)
+    running = self._swarmIdToRunningIndexes.setdefault(swarmId, set())
+    self._updateStateIndex(running, entryIdx, not entry['completed'])
+    unmatured = self._swarmIdToUnmaturedIndexes.setdefault(swarmId, set())
+    self._updateStateIndex(unmatured, entryIdx, not entry['matured'])
+
+  def _removeFromSwarmIndexes(self, entryIdx):
+    """ Remove an entry that became hidden from the per-swarm secondary
+    indexes. """
+    particleState = self._allResults[entryIdx]['modelParams']['particleState']
+    swarmId = particleState['swarmId']
+    particleId = particleState['id']
+    genIdx = particleState['genIdx']
+
+    self._swarmGenToIndexes[(swarmId, genIdx)].remove(entryIdx)
+    self._swarmParticleGenToIndexes[(swarmId, particleId, genIdx)].remove(
+        entryIdx)
+    self._swarmIdToRunningIndexes[swarmId].discard(entryIdx)
+    self._swarmIdToUnmaturedIndexes[swarmId].discard(entryIdx)
+    self._swarmIndexedEntries.discard(entryIdx)
+
+  @staticmethod
+  def _updateStateIndex(index, entryIdx, isMember):
+    if isMember:
+      index.add(entryIdx)
+    else:
+      index.discard(entryIdx)
+
   def getNumErrModels(self):
     """Return number of models that completed with errors.
 
@@ -368,15 +475,12 @@ class ResultsDB(object):
 
       else:
         return len(self._swarmIdToIndexes.get(swarmId, []))
-    # Only count non-hidden models
+    # Only count non-hidden models. The swarm indexes exclude hidden models.
     else:
       if swarmId is None:
-        entries = self._allResults
+        return len(self._allResults) - self._numHidden
       else:
-        entries = [self._allResults[entryIdx]
-                   for entryIdx in self._swarmIdToIndexes.get(swarmId,[])]
-
-      return len([entry for entry in entries if not entry['hidden']])
+        return len(self._swarmIdToIndexes.get(swarmId, []))
 
   def bestModelIdAndErrScore(self, swarmId=None, genIdx=None):
     """Return the model ID of the model with the best result so far and
@@ -396,23 +500,14 @@ class ResultsDB(object):
       return (self._bestModelID, self._bestResult)
 
     else:
-      if swarmId not in self._swarmBestOverall:
+      bestUpTo = self._swarmBestUpToGeneration.get(swarmId)
+      if not bestUpTo or (genIdx is not None and genIdx < 0):
         return (None, numpy.inf)
 
-
       # Get the best score, considering the appropriate generations
-      genScores = self._swarmBestOverall[swarmId]
-      bestModelId = None
-      bestScore = numpy.inf
-
-      for (i, (modelId, errScore)) in enumerate(genScores):
-        if genIdx is not None and i > genIdx:
-          break
-        if errScore < bestScore:
-          bestScore = errScore
-          bestModelId = modelId
-
-      return (bestModelId, bestScore)
+      if genIdx is None or genIdx >= len(bestUpTo):
+        return bestUpTo[-1]
+      return bestUpTo[genIdx]
 
   def getParticleInfo(self, modelId):
     """Return particle info for a specific modelId.
@@ -461,10 +556,28 @@ class ResultsDB(object):
               completed: list of completed booleans
               matured: list of matured booleans
     """
-    # The indexes of all the models in this swarm. This list excludes hidden
-    #  (orphaned) models.
+    # The indexes of the models in this swarm, narrowed down through the most
+    #  selective secondary index. This list excludes hidden (orphaned) models.
+    #  All filters are still applied below.
     if swarmId is not None:
-      entryIdxs = self._swarmIdToIndexes.get(swarmId, [])
+      if lastDescendent:
+        entryIdxs = []
+        for particleId in self._swarmIdToParticleIds.get(swarmId, ()):
+          key = (swarmId, particleId, self._particleLatestGenIdx.get(particleId))
+          entryIdxs.extend(self._swarmParticleGenToIndexes.get(key, ()))
+        entryIdxs.sort()
+      elif genIdx is not None:
+        entryIdxs = self._swarmGenToIndexes.get((swarmId, genIdx), [])
+      elif completed is False:
+        entryIdxs = sorted(self._swarmIdToRunningIndexes.get(swarmId, ()))
+      elif matured is False:
+        entryIdxs = sorted(self._swarmIdToUnmaturedIndexes.get(swarmId, ()))
+      else:
+        entryIdxs = self._swarmIdToIndexes.get(swarmId, [])
+    elif completed is False:
+      entryIdxs = sorted(self._runningIndexes)
+    elif matured is False:
+      entryIdxs = sorted(self._unmaturedIndexes)
     else:
       entryIdxs = range(len(self._allResults))
     if len(entryIdxs) == 0:
@@ -538,7 +651,7 @@ class ResultsDB(object):
               matured: list of matured booleans
     """
 
-    entryIdxs = range(len(self._allResults))
+    entryIdxs = sorted(self._swarmIdToHiddenIndexes.get(swarmId, ()))
     if len(entryIdxs) == 0:
       return ([], [], [], [], [])
 
@@ -828,6 +941,18 @@ class HypersearchV2(object):
       speculativeParticles OPTIONAL - True or False (default obtained from
                                      nupic.hypersearch.speculative.particles.default
                                      configuration property). See note below.
+      earlyStopping       OPTIONAL - 'none', 'halving' or 'median' (default
+                                     obtained from
+                                     nupic.hypersearch.earlyStopping.policy
+                                     configuration property). Policy used to
+                                     stop models that fall behind the other
+                                     models of their swarm at record
+                                     milestones. See EarlyStopper.
+      particleProposal    OPTIONAL - 'pso' or 'tpe' (default obtained from
+                                     nupic.hypersearch.particleProposal.strategy
+                                     configuration property). How particles
+                                     choose their next position. See
+                                     ParticleProposer.
 
       NOTE: The caller must provide just ONE of the following to describe the
       hypersearch:
@@ -1071,6 +1196,14 @@ class HypersearchV2(object):
       # Instantiate the Swarm Terminator
       self._swarmTerminator = SwarmTerminator()
 
+      # Instantiate the early stopping policy for running models
+      self._earlyStopper = EarlyStopper(
+          policy=self._searchParams.get('earlyStopping', None))
+
+      # Instantiate the strategy used to move particles to new positions
+      self._particleProposer = ParticleProposer(
+          strategy=self._searchParams.get('particleProposal', None))
+
       # Initial hypersearch state
       self._hsState = None
 
@@ -2361,6 +2494,22 @@ class HypersearchV2(object):
     self.logger.debug('Best err score seen so far: %s on model %s' % \
                      (bestResult, bestModelID))
 
+    # Stop the model if it's falling behind the other models of its swarm.
+    #  Models that were killed or failed don't count as peers.
+    if self._earlyStopper.isEnabled() and metricResult is not None and \
+       (not completed or completionReason in [ClientJobsDAO.CMPL_REASON_EOF,
+                                              ClientJobsDAO.CMPL_REASON_STOPPED]):
+      particleState = self._resultsDB.getParticleInfo(modelID)[0]
+      if self._maximize:
+        metricResult = -1 * metricResult
+      stop = self._earlyStopper.recordDataPoint(
+          modelId=modelID, swarmId=particleState['swarmId'],
+          numRecords=numRecords, errScore=metricResult, completed=completed)
+      if stop:
+        self._cjDAO.modelSetFields(modelID,
+                dict(engStop=ClientJobsDAO.STOP_REASON_KILLED),
+                ignoreUnchanged = True)
+
   def runModel(self, modelID, jobID, modelParams, modelParamsHash,
                jobsDAO, modelCheckpointGUID):
     """Run the given model.
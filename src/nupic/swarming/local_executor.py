@@ -0,0 +1,980 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Runs a swarm on the local machine without the jobs database.
+
+The :class:`LocalSwarmExecutor` runs the Hypersearch logic
+(:meth:`HypersearchV2.createModels`) in a single coordinator and evaluates the
+models it proposes in a :class:`multiprocessing.Pool`. The job and model
+records live in a :class:`LocalJobsDAO`, an in-memory stand-in for the subset
+of :class:`~nupic.database.client_jobs_dao.ClientJobsDAO` used by swarming,
+which is served to the pool workers by a :mod:`multiprocessing` manager.
+The workers send their writes to model records through a queue instead, so
+reporting progress doesn't wait on the manager. The coordinator blocks on
+that queue, applies what it receives to the DAO in one call, and gets back
+the models that changed since its previous call, rather than polling every
+model of the job.
+"""
+
+import collections
+import copy
+import datetime
+import json
+import logging
+import multiprocessing
+import os
+import Queue
+import StringIO
+import threading
+import traceback
+from multiprocessing.managers import (
+    BaseManager, MakeProxyType, public_methods)
+from multiprocessing.util import Finalize
+
+from nupic.database.client_jobs_dao import (
+    ClientJobsDAO, InvalidConnectionException)
+from nupic.swarming.hypersearch_v2 import HypersearchV2
+
+
+
+# How long the coordinator waits for model updates before asking the
+# Hypersearch implementation for new models again
+_MODEL_WAIT_TIMEOUT_SEC = 1.0
+
+# LocalJobsDAO methods that the pool workers call through the update queue
+_QUEUED_METHODS = ("modelSetFields", "modelUpdateResults",
+                   "modelUpdateTimestamp", "modelsUpdateResults",
+                   "modelSetCompleted")
+
+# Queued by a pool task after its last update; its args are the model ID
+_MODEL_TASK_DONE = "modelTaskDone"
+
+# Public field names and default values of the job records, in the column
+# order of the ClientJobsDAO jobs table
+_JOB_FIELDS = (
+  ("jobId", None),
+  ("client", None),
+  ("clientInfo", None),
+  ("clientKey", None),
+  ("cmdLine", None),
+  ("params", None),
+  ("jobHash", None),
+  ("status", ClientJobsDAO.STATUS_NOTSTARTED),
+  ("completionReason", None),
+  ("completionMsg", None),
+  ("workerCompletionReason", ClientJobsDAO.CMPL_REASON_SUCCESS),
+  ("workerCompletionMsg", None),
+  ("cancel", False),
+  ("startTime", None),
+  ("endTime", None),
+  ("results", None),
+  ("engJobType", None),
+  ("minimumWorkers", 0),
+  ("maximumWorkers", 0),
+  ("priority", ClientJobsDAO.DEFAULT_JOB_PRIORITY),
+  ("engAllocateNewWorkers", True),
+  ("engUntendedDeadWorkers", False),
+  ("numFailedWorkers", 0),
+  ("lastFailedWorkerErrorMsg", None),
+  ("engCleaningStatus", ClientJobsDAO.CLEAN_NOT_DONE),
+  ("genBaseDescription", None),
+  ("genPermutations", None),
+  ("engLastUpdateTime", None),
+  ("engCjmConnId", None),
+  ("engWorkerState", None),
+  ("engStatus", None),
+  ("engModelMilestones", None),
+)
+
+# Public field names and default values of the model records, in the column
+# order of the ClientJobsDAO models table
+_MODEL_FIELDS = (
+  ("modelId", None),
+  ("jobId", None),
+  ("params", None),
+  ("status", ClientJobsDAO.STATUS_NOTSTARTED),
+  ("completionReason", None),
+  ("completionMsg", None),
+  ("results", None),
+  ("optimizedMetric", None),
+  ("updateCounter", 0),
+  ("numRecords", 0),
+  ("startTime", None),
+  ("endTime", None),
+  ("cpuTime", 0),
+  ("modelCheckpointId", None),
+  ("genDescription", None),
+  ("engParamsHash", None),
+  ("engParticleHash", None),
+  ("engLastUpdateTime", None),
+  ("engTaskTrackerId", None),
+  ("engWorkerId", None),
+  ("engAttemptId", None),
+  ("engWorkerConnId", 0),
+  ("engMilestones", None),
+  ("engStop", None),
+  ("engMatured", False),
+)
+
+# The namedtuples returned by LocalJobsDAO. They mirror the ones returned by
+# ClientJobsDAO and are defined at module level so that they can be pickled
+# by the manager.
+_jobInfoNamedTuple = collections.namedtuple(
+  "_jobInfoNamedTuple", [name for name, _ in _JOB_FIELDS])
+
+_modelInfoNamedTuple = collections.namedtuple(
+  "_modelInfoNamedTuple", [name for name, _ in _MODEL_FIELDS])
+
+_modelsGetParamsNamedTuple = collections.namedtuple(
+  "_modelsGetParamsNamedTuple",
+  ClientJobsDAO._ModelsTableInfo.getParamsNamedTuple._fields)
+
+_modelsGetResultAndStatusNamedTuple = collections.namedtuple(
+  "_modelsGetResultAndStatusNamedTuple",
+  ClientJobsDAO._ModelsTableInfo.getResultAndStatusNamedTuple._fields)
+
+_modelsGetUpdateCountersNamedTuple = collections.namedtuple(
+  "_modelsGetUpdateCountersNamedTuple",
+  ClientJobsDAO._ModelsTableInfo.getUpdateCountersNamedTuple._fields)
+
+
+
+class _JobsDAOConstants(object):
+  """ ClientJobsDAO equates used by the swarming code; shared by
+  LocalJobsDAO and its manager proxy. """
+
+  STATUS_NOTSTARTED = ClientJobsDAO.STATUS_NOTSTARTED
+  STATUS_STARTING = ClientJobsDAO.STATUS_STARTING
+  STATUS_RUNNING = ClientJobsDAO.STATUS_RUNNING
+  STATUS_TESTMODE = ClientJobsDAO.STATUS_TESTMODE
+  STATUS_COMPLETED = ClientJobsDAO.STATUS_COMPLETED
+
+  CMPL_REASON_SUCCESS = ClientJobsDAO.CMPL_REASON_SUCCESS
+  CMPL_REASON_CANCELLED = ClientJobsDAO.CMPL_REASON_CANCELLED
+  CMPL_REASON_KILLED = ClientJobsDAO.CMPL_REASON_KILLED
+  CMPL_REASON_ERROR = ClientJobsDAO.CMPL_REASON_ERROR
+  CMPL_REASON_EOF = ClientJobsDAO.CMPL_REASON_EOF
+  CMPL_REASON_STOPPED = ClientJobsDAO.CMPL_REASON_STOPPED
+  CMPL_REASON_ORPHAN = ClientJobsDAO.CMPL_REASON_ORPHAN
+
+  STOP_REASON_KILLED = ClientJobsDAO.STOP_REASON_KILLED
+  STOP_REASON_STOPPED = ClientJobsDAO.STOP_REASON_STOPPED
+
+  JOB_TYPE_HS = ClientJobsDAO.JOB_TYPE_HS
+
+
+
+class LocalJobsDAO(_JobsDAOConstants):
+  """ In-memory jobs and models store that implements the subset of the
+  :class:`~nupic.database.client_jobs_dao.ClientJobsDAO` API used by
+  Hypersearch, the model runners and the swarm report generator.
+
+  All methods are thread safe. Connection ownership is not tracked: each
+  model is evaluated by exactly one pool task, so there are no orphaned models
+  to detect.
+  """
+
+  # Same starting values as the AUTO_INCREMENT of the jobs and models tables
+  _FIRST_JOB_ID = 1000
+  _FIRST_MODEL_ID = 1000
+
+  _SEQUENCE_TYPES = ClientJobsDAO._SEQUENCE_TYPES
+
+
+  def __init__(self):
+    # Protects all the records; notified whenever a model record changes
+    self._changed = threading.Condition()
+
+    # Incremented on every change of a model record or of a job status
+    self._changeCounter = 0
+
+    self._jobs = collections.OrderedDict()
+    self._models = collections.OrderedDict()
+
+    # jobID -> IDs of the models changed since the last modelsGetChanges()
+    #  call, in the order they first changed
+    self._changedModelIDs = dict()
+
+    # (jobID, hash) -> modelID, for the params and particle hashes
+    self._modelsByParamsHash = dict()
+    self._modelsByParticleHash = dict()
+
+    self._nextJobID = self._FIRST_JOB_ID
+    self._nextModelID = self._FIRST_MODEL_ID
+
+
+  def getConnectionID(self):
+    """ There are no database connections; always 0. """
+    return 0
+
+
+  def waitForModelChanges(self, sinceCounter, timeout=None):
+    """ Block until a model record or job status changed after the given
+    change counter value was returned.
+
+    :param sinceCounter: (int) value returned by a previous call, or 0
+    :param timeout: (float) maximum number of seconds to wait, or None to wait
+           indefinitely
+    :returns: (int) the current change counter
+    """
+    with self._changed:
+      if self._changeCounter <= sinceCounter:
+        self._changed.wait(timeout)
+      return self._changeCounter
+
+
+  def _notifyChanged(self):
+    """ Must be called with self._changed held. """
+    self._changeCounter += 1
+    self._changed.notify_all()
+
+
+  def _modelChanged(self, model):
+    """ Must be called with self._changed held. """
+    self._changedModelIDs.setdefault(
+      model["jobId"], collections.OrderedDict())[model["modelId"]] = None
+
+
+  @staticmethod
+  def _utcNow():
+    return datetime.datetime.utcnow().replace(microsecond=0)
+
+
+  @classmethod
+  def _normalizeHash(cls, hashValue):
+    return ClientJobsDAO._normalizeHash(hashValue)
+
+
+  def _getJob(self, jobID):
+    job = self._jobs.get(jobID)
+    if job is None:
+      raise RuntimeError("jobID=%s not found within the jobs table" % (jobID,))
+    return job
+
+
+  def _getModels(self, modelIDs):
+    missing = set(modelIDs).difference(self._models)
+    if missing:
+      raise RuntimeError("modelIDs not found within the models table: %s" % (
+        missing,))
+    return [self._models[modelID] for modelID in modelIDs]
+
+
+  # --------------------------------------------------------------------------
+  # Jobs
+
+  def jobInsert(self, client, cmdLine, clientInfo='', clientKey='', params='',
+                alreadyRunning=False, minimumWorkers=0, maximumWorkers=0,
+                jobType='', priority=ClientJobsDAO.DEFAULT_JOB_PRIORITY):
+    """ Add a new job; see :meth:`ClientJobsDAO.jobInsert`.
+
+    :returns: (int) jobID
+    """
+    with self._changed:
+      jobID = self._nextJobID
+      self._nextJobID += 1
+
+      job = dict(_JOB_FIELDS)
+      job.update(jobId=jobID, client=client, clientInfo=clientInfo,
+                 clientKey=clientKey, cmdLine=cmdLine, params=params,
+                 minimumWorkers=minimumWorkers, maximumWorkers=maximumWorkers,
+                 engJobType=jobType, priority=priority,
+                 engLastUpdateTime=self._utcNow())
+      if alreadyRunning:
+        job.update(status=self.STATUS_RUNNING, startTime=self._utcNow())
+      self._jobs[jobID] = job
+
+    return jobID
+
+
+  def jobInfo(self, jobID):
+    """ :returns: namedtuple containing all the fields of the job """
+    with self._changed:
+      job = self._getJob(jobID)
+      return _jobInfoNamedTuple(**job)
+
+
+  def jobSetCompleted(self, jobID, completionReason, completionMsg,
+                      useConnectionID=True):
+    """ Change the status of the given job to completed. """
+    with self._changed:
+      self._getJob(jobID).update(status=self.STATUS_COMPLETED,
+                                 completionReason=completionReason,
+                                 completionMsg=completionMsg,
+                                 endTime=self._utcNow(),
+                                 engLastUpdateTime=self._utcNow())
+      self._notifyChanged()
+
+
+  def jobCancel(self, jobID):
+    """ Set the cancel field of the given job. """
+    self.jobSetFields(jobID, {"cancel": True}, useConnectionID=False,
+                      ignoreUnchanged=True)
+    with self._changed:
+      self._notifyChanged()
+
+
+  def jobGetModelIDs(self, jobID):
+    """ :returns: list of the IDs of all the models of the given job """
+    with self._changed:
+      return [model["modelId"] for model in self._models.itervalues()
+              if model["jobId"] == jobID]
+
+
+  def jobGetFields(self, jobID, fields):
+    """ :returns: list of the requested field values of the job """
+    return self.jobsGetFields([jobID], fields, requireAll=True)[0][1]
+
+
+  def jobsGetFields(self, jobIDs, fields, requireAll=True):
+    """ :returns: list of (jobID, [field1, field2, ...]) tuples """
+    assert isinstance(jobIDs, self._SEQUENCE_TYPES)
+    assert len(jobIDs) >= 1
+
+    with self._changed:
+      jobs = [self._jobs[jobID] for jobID in jobIDs if jobID in self._jobs]
+      if requireAll and len(jobs) < len(jobIDs):
+        raise RuntimeError("jobIDs %s not found within the jobs table" % (
+          set(jobIDs).difference(self._jobs),))
+      return [(job["jobId"], [job[f] for f in fields]) for job in jobs]
+
+
+  def jobSetFields(self, jobID, fields, useConnectionID=True,
+                   ignoreUnchanged=False):
+    """ Change the values of one or more fields of a job. Like the database
+    implementation, raises RuntimeError when no value changes unless
+    ignoreUnchanged is True. """
+    with self._changed:
+      job = self._jobs.get(jobID)
+      changed = job is not None and any(job[f] != v
+                                        for f, v in fields.iteritems())
+      if not changed:
+        if ignoreUnchanged:
+          return
+        raise RuntimeError("Tried to change fields (%r) of jobID=%s, but no "
+                           "value changed" % (fields.keys(), jobID))
+      job.update(fields)
+
+
+  def jobSetFieldIfEqual(self, jobID, fieldName, newValue, curValue):
+    """ Change one field of a job only if its current value matches curValue.
+
+    :returns: (bool) True if the field was changed
+    """
+    with self._changed:
+      job = self._getJob(jobID)
+      if job[fieldName] != curValue:
+        return False
+      job[fieldName] = newValue
+      job["engLastUpdateTime"] = self._utcNow()
+      return True
+
+
+  def jobUpdateResults(self, jobID, results):
+    """ Update the results field of a job. """
+    with self._changed:
+      self._getJob(jobID).update(results=results,
+                                 engLastUpdateTime=self._utcNow())
+
+
+  # --------------------------------------------------------------------------
+  # Models
+
+  def modelInsertAndStart(self, jobID, params, paramsHash, particleHash=None):
+    """ Insert a new model in the running state, unless a model with the same
+    params or particle hash already exists in the job.
+
+    :returns: (modelID, wasInserted)
+    """
+    if particleHash is None:
+      particleHash = paramsHash
+    paramsHash = self._normalizeHash(paramsHash)
+    particleHash = self._normalizeHash(particleHash)
+
+    with self._changed:
+      for index, key in ((self._modelsByParamsHash, paramsHash),
+                         (self._modelsByParticleHash, particleHash)):
+        modelID = index.get((jobID, key))
+        if modelID is not None:
+          return (modelID, False)
+
+      modelID = self._nextModelID
+      self._nextModelID += 1
+
+      model = dict(_MODEL_FIELDS)
+      model.update(modelId=modelID, jobId=jobID, params=params,
+                   status=self.STATUS_RUNNING, startTime=self._utcNow(),
+                   engParamsHash=paramsHash, engParticleHash=particleHash,
+                   engLastUpdateTime=self._utcNow())
+      self._models[modelID] = model
+      self._modelsByParamsHash[(jobID, paramsHash)] = modelID
+      self._modelsByParticleHash[(jobID, particleHash)] = modelID
+      self._modelChanged(model)
+      self._notifyChanged()
+
+    return (modelID, True)
+
+
+  def modelsInfo(self, modelIDs):
+    """ :returns: list of namedtuples with all the fields of each model """
+    assert isinstance(modelIDs, self._SEQUENCE_TYPES), (
+      "wrong modelIDs type: %s") % (type(modelIDs),)
+    assert modelIDs, "modelIDs is empty"
+
+    with self._changed:
+      return [_modelInfoNamedTuple(**model)
+              for model in self._getModels(modelIDs)]
+
+
+  def modelsInfoForJob(self, jobID, afterModelID=None, maxRows=1000):
+    """ :returns: list of namedtuples with all the fields of the first maxRows
+    models of the job with an ID greater than afterModelID, sorted by ID """
+    with self._changed:
+      models = sorted(
+        (model for model in self._models.itervalues()
+         if model["jobId"] == jobID and
+            (afterModelID is None or model["modelId"] > afterModelID)),
+        key=lambda model: model["modelId"])
+      return [_modelInfoNamedTuple(**model) for model in models[:maxRows]]
+
+
+  def modelsGetFields(self, modelIDs, fields):
+    """ :returns: list of (modelID, [field1, ...]) tuples if modelIDs is a
+    sequence, else the list of field values of the single model """
+    assert len(fields) >= 1, 'fields is empty'
+
+    isSequence = isinstance(modelIDs, self._SEQUENCE_TYPES)
+    if not isSequence:
+      modelIDs = [modelIDs]
+    assert len(modelIDs) >= 1, 'modelIDs is empty'
+
+    with self._changed:
+      rows = [(model["modelId"], [model[f] for f in fields])
+              for model in self._getModels(modelIDs)]
+
+    if not isSequence:
+      return rows[0][1]
+    return rows
+
+
+  def modelsGetFieldsForJob(self, jobID, fields, ignoreKilled=False):
+    """ :returns: list of (modelID, [field1, ...]) tuples for all the models
+    of the job """
+    assert len(fields) >= 1, 'fields is empty'
+
+    with self._changed:
+      return [(model["modelId"], [model[f] for f in fields])
+              for model in self._models.itervalues()
+              if model["jobId"] == jobID and not (
+                ignoreKilled and
+                model["completionReason"] == self.CMPL_REASON_KILLED)]
+
+
+  def modelSetFields(self, modelID, fields, ignoreUnchanged=False):
+    """ Change the values of one or more fields of a model. """
+    with self._changed:
+      model = self._getModels([modelID])[0]
+      model.update(fields)
+      model["updateCounter"] += 1
+      self._modelChanged(model)
+      self._notifyChanged()
+
+
+  def modelsGetParams(self, modelIDs):
+    """ :returns: list of (modelId, params, engParamsHash) namedtuples """
+    assert isinstance(modelIDs, self._SEQUENCE_TYPES), (
+      "Wrong modelIDs type: %r") % (type(modelIDs),)
+    assert len(modelIDs) >= 1, "modelIDs is empty"
+
+    with self._changed:
+      return [
+        _modelsGetParamsNamedTuple(
+          *[model[f] for f in _modelsGetParamsNamedTuple._fields])
+        for model in self._getModels(modelIDs)]
+
+
+  def modelsGetResultAndStatus(self, modelIDs):
+    """ :returns: list of (modelId, results, status, updateCounter, numRecords,
+    completionReason, completionMsg, engParamsHash, engMatured) namedtuples """
+    assert isinstance(modelIDs, self._SEQUENCE_TYPES), (
+      "Wrong modelIDs type: %r") % type(modelIDs)
+    assert len(modelIDs) >= 1, "modelIDs is empty"
+
+    with self._changed:
+      return [
+        _modelsGetResultAndStatusNamedTuple(
+          *[model[f] for f in _modelsGetResultAndStatusNamedTuple._fields])
+        for model in self._getModels(modelIDs)]
+
+
+  def modelsGetUpdateCounters(self, jobID):
+    """ :returns: list of (modelId, updateCounter) namedtuples for all the
+    models of the job """
+    with self._changed:
+      return [
+        _modelsGetUpdateCountersNamedTuple(model["modelId"],
+                                           model["updateCounter"])
+        for model in self._models.itervalues() if model["jobId"] == jobID]
+
+
+  def modelUpdateResults(self, modelID, results=None, metricValue=None,
+                         numRecords=None):
+    """ Update the results, optimized metric and/or number of records of a
+    model, and its last update time. """
+    self.modelsUpdateResults([(modelID, results, metricValue, numRecords)])
+
+
+  def modelUpdateTimestamp(self, modelID):
+    self.modelUpdateResults(modelID)
+
+
+  def modelsUpdateResults(self, updates):
+    """ Apply several modelUpdateResults() calls at once.
+
+    :param updates: sequence of (modelID, results, metricValue, numRecords)
+           tuples
+    """
+    with self._changed:
+      missing = [update[0] for update in updates
+                 if update[0] not in self._models]
+      if missing:
+        raise InvalidConnectionException(
+          "Tried to update the info of modelIDs=%r, but these modelIDs were "
+          "not found" % (missing,))
+
+      for modelID, results, metricValue, numRecords in updates:
+        model = self._models[modelID]
+        model["engLastUpdateTime"] = self._utcNow()
+        model["updateCounter"] += 1
+        self._modelChanged(model)
+        if results is not None:
+          model["results"] = results
+        if numRecords is not None:
+          model["numRecords"] = numRecords
+        # NOTE: (metricValue==metricValue) tests for NaN
+        if metricValue is not None and (metricValue == metricValue):
+          model["optimizedMetric"] = float(metricValue)
+      if updates:
+        self._notifyChanged()
+
+
+  def modelSetCompleted(self, modelID, completionReason, completionMsg,
+                        cpuTime=0, useConnectionID=True):
+    """ Mark a model as completed. """
+    if completionMsg is None:
+      completionMsg = ''
+
+    with self._changed:
+      model = self._models.get(modelID)
+      if model is None:
+        raise InvalidConnectionException(
+          "Tried to set modelID=%r completed, but this modelID was not "
+          "found" % (modelID,))
+
+      model.update(status=self.STATUS_COMPLETED,
+                   completionReason=completionReason,
+                   completionMsg=completionMsg,
+                   endTime=self._utcNow(),
+                   cpuTime=cpuTime,
+                   engLastUpdateTime=self._utcNow())
+      model["updateCounter"] += 1
+      self._modelChanged(model)
+      self._notifyChanged()
+
+
+  def modelsGetChanges(self, jobID, updates=()):
+    """ Apply the model updates queued by the pool workers, then return the
+    result and status of the models of the job that changed since the
+    previous call.
+
+    :param jobID: (int) ID of the job
+    :param updates: sequence of (methodName, args, kwargs) tuples, each
+           calling one of the model update methods of this DAO
+    :returns: the :meth:`modelsGetResultAndStatus` namedtuples of the changed
+              models, in the order they first changed
+    """
+    with self._changed:
+      for methodName, args, kwargs in updates:
+        if methodName not in _QUEUED_METHODS:
+          raise ValueError("Unexpected queued model update %r" % methodName)
+        getattr(self, methodName)(*args, **kwargs)
+
+      changedIDs = self._changedModelIDs.pop(jobID, None)
+      if not changedIDs:
+        return []
+      return self.modelsGetResultAndStatus(changedIDs.keys())
+
+
+  def modelAdoptNextOrphan(self, jobId, maxUpdateInterval):
+    """ Models can't be orphaned in a local swarm; always None. """
+    return None
+
+
+
+class _LocalJobsDAOProxy(
+    _JobsDAOConstants,
+    MakeProxyType("_LocalJobsDAOProxyBase", public_methods(LocalJobsDAO))):
+  """ Manager proxy of a LocalJobsDAO; also carries the DAO equates, which
+  callers read as attributes of the DAO. """
+  pass
+
+
+
+class _LocalJobsManager(BaseManager):
+  """ Serves a LocalJobsDAO to the coordinator and the pool workers. """
+  pass
+
+_LocalJobsManager.register("LocalJobsDAO", LocalJobsDAO,
+                           proxytype=_LocalJobsDAOProxy)
+
+
+
+class _QueuedJobsDAO(object):
+  """ The jobs DAO of the pool workers: sends the updates of model records to
+  the coordinator through a queue, without waiting for them to be applied,
+  and forwards everything else to the manager proxy.
+
+  The coordinator applies the queued updates as it receives them, so reads of
+  model records may briefly miss the latest updates of other workers, like
+  the buffered updates of ``ModelUpdateBuffer``.
+  """
+
+  def __init__(self, jobsDAO, updateQueue):
+    self._jobsDAO = jobsDAO
+    self._updateQueue = updateQueue
+
+
+  def __getattr__(self, name):
+    return getattr(self._jobsDAO, name)
+
+
+  def _queueUpdate(self, methodName, args, kwargs):
+    self._updateQueue.put((methodName, args, kwargs))
+
+
+  def modelSetFields(self, *args, **kwargs):
+    self._queueUpdate("modelSetFields", args, kwargs)
+
+
+  def modelUpdateResults(self, *args, **kwargs):
+    self._queueUpdate("modelUpdateResults", args, kwargs)
+
+
+  def modelUpdateTimestamp(self, *args, **kwargs):
+    self._queueUpdate("modelUpdateTimestamp", args, kwargs)
+
+
+  def modelsUpdateResults(self, *args, **kwargs):
+    self._queueUpdate("modelsUpdateResults", args, kwargs)
+
+
+  def modelSetCompleted(self, *args, **kwargs):
+    self._queueUpdate("modelSetCompleted", args, kwargs)
+
+
+
+# Per-process state of the pool workers, set up by _initWorker()
+_g_workerHypersearch = None
+_g_workerInitError = None
+_g_updateQueue = None
+
+
+
+def _initWorker(jobsDAO, updateQueue, jobParams, jobID, logLevel):
+  """ Pool initializer; builds the Hypersearch instance of this worker. An
+  exception is kept and raised from _runModel(), because a failing initializer
+  makes the pool restart its workers forever. """
+  global _g_workerHypersearch, _g_workerInitError, _g_updateQueue
+  _g_updateQueue = updateQueue
+  try:
+    _g_workerHypersearch = HypersearchV2(
+      searchParams=jobParams, workerID=os.getpid(),
+      cjDAO=_QueuedJobsDAO(jobsDAO, updateQueue), jobID=jobID,
+      logLevel=logLevel)
+  except Exception:
+    _g_workerInitError = traceback.format_exc()
+  else:
+    Finalize(_g_workerHypersearch, _g_workerHypersearch.close,
+             exitpriority=10)
+
+
+
+def _runModel(modelID, jobID, modelParams, modelParamsHash,
+              modelCheckpointGUID):
+  """ Pool task; evaluates one model and reports to the jobs DAO. Ends by
+  queueing _MODEL_TASK_DONE, so that the coordinator knows it received all
+  the updates of the model. """
+  try:
+    if _g_workerInitError is not None:
+      raise RuntimeError("Swarm worker initialization failed:\n%s" % (
+        _g_workerInitError,))
+
+    hs = _g_workerHypersearch
+    hs.runModel(modelID=modelID, jobID=jobID, modelParams=modelParams,
+                modelParamsHash=modelParamsHash, jobsDAO=hs._cjDAO,
+                modelCheckpointGUID=modelCheckpointGUID)
+  finally:
+    _g_updateQueue.put((_MODEL_TASK_DONE, (modelID,), {}))
+
+
+
+class LocalSwarmExecutor(object):
+  """ Runs a Hypersearch job on the local machine using a pool of worker
+  processes instead of Hypersearch workers coordinating through the jobs
+  database.
+
+  .. code-block:: python
+
+    executor = LocalSwarmExecutor(jobParams, numWorkers=8)
+    try:
+      executor.run()
+      bestResults = executor.jobsDAO.jobInfo(executor.jobID).results
+    finally:
+      executor.close()
+
+  :param jobParams: (dict) Hypersearch job parameters, as passed to
+         :meth:`ClientJobsDAO.jobInsert` in JSON form
+  :param numWorkers: (int) number of worker processes; defaults to the number
+         of CPUs
+  :param logLevel: (int) log level of the Hypersearch instances
+  """
+
+  def __init__(self, jobParams, numWorkers=None, logLevel=None):
+    if numWorkers is None:
+      numWorkers = multiprocessing.cpu_count()
+    assert numWorkers >= 1, "numWorkers must be at least 1"
+
+    self.logger = logging.getLogger(".".join(
+      ['com.numenta', self.__class__.__module__, self.__class__.__name__]))
+
+    self._jobParams = copy.deepcopy(jobParams)
+    self._numWorkers = numWorkers
+    self._logLevel = logLevel
+
+    self._manager = _LocalJobsManager()
+    self._manager.start()
+    self.jobsDAO = self._manager.LocalJobsDAO()
+    self.jobID = self.jobsDAO.jobInsert(
+      client="GRP", cmdLine="", params=json.dumps(self._jobParams),
+      alreadyRunning=True, minimumWorkers=1, maximumWorkers=numWorkers,
+      jobType=LocalJobsDAO.JOB_TYPE_HS)
+
+    self._thread = None
+
+    # IDs of the models already passed to the Hypersearch instance
+    self._knownModelIDs = set()
+
+
+  def start(self):
+    """ Run the job in a background thread; see :meth:`run`. """
+    assert self._thread is None, "Job already started"
+    self._thread = threading.Thread(target=self.run,
+                                    name="LocalSwarmExecutor")
+    self._thread.daemon = True
+    self._thread.start()
+
+
+  def join(self, timeout=None):
+    """ Wait for a job started by :meth:`start` to finish. """
+    if self._thread is not None:
+      self._thread.join(timeout)
+
+
+  def cancel(self):
+    """ Ask the running job to stop; running models stop at their next
+    periodic cancellation check. """
+    self.jobsDAO.jobCancel(self.jobID)
+
+
+  def close(self):
+    """ Stop the manager that holds the job and model records. """
+    if self._manager is not None:
+      self._manager.shutdown()
+      self._manager = None
+
+
+  def run(self):
+    """ Run the job to completion, marking it completed in the jobs DAO.
+    Errors of the Hypersearch logic fail the job and are re-raised.
+
+    :returns: (int) the job ID
+    """
+    jobsDAO = self.jobsDAO
+    completionReason = LocalJobsDAO.CMPL_REASON_SUCCESS
+    completionMsg = "Success"
+    try:
+      self._runSearch()
+    except Exception, e:
+      msg = StringIO.StringIO()
+      print >>msg, "Exception occurred in local swarm coordinator: %r" % (e,)
+      traceback.print_exc(None, msg)
+      completionReason = LocalJobsDAO.CMPL_REASON_ERROR
+      completionMsg = msg.getvalue()
+      self.logger.error(completionMsg)
+
+      jobsDAO.jobSetFields(self.jobID, fields=dict(
+          cancel=True,
+          workerCompletionReason=LocalJobsDAO.CMPL_REASON_ERROR,
+          workerCompletionMsg=completionMsg),
+          useConnectionID=False, ignoreUnchanged=True)
+      raise
+    finally:
+      jobsDAO.jobSetCompleted(self.jobID, completionReason, completionMsg,
+                              useConnectionID=False)
+
+    return self.jobID
+
+
+  def _runSearch(self):
+    jobsDAO = self.jobsDAO
+    jobID = self.jobID
+
+    hs = HypersearchV2(searchParams=self._jobParams, workerID=os.getpid(),
+                       cjDAO=jobsDAO, jobID=jobID, logLevel=self._logLevel)
+    updateQueue = multiprocessing.Queue()
+    pool = multiprocessing.Pool(
+      self._numWorkers, initializer=_initWorker,
+      initargs=(jobsDAO, updateQueue, self._jobParams, jobID, self._logLevel))
+
+    # The model checkpoint GUIDs are built the same way as by the
+    # Hypersearch workers
+    jobInfo = jobsDAO.jobInfo(jobID)
+    checkpointGUIDPrefix = "%s_%s_" % (jobInfo.client,
+                                       self._jobParams["persistentJobGUID"])
+
+    # modelID -> AsyncResult of the models being evaluated
+    running = dict()
+    numSubmitted = 0
+    waitSecs = 0
+    exit = False
+    try:
+      while True:
+        # A task is done once its last update was received
+        for modelID in self._processUpdatedModels(hs, updateQueue, waitSecs):
+          running.pop(modelID).get()
+
+        # Keep every worker busy
+        newModels = []
+        while not exit and len(running) < self._numWorkers:
+          (exit, newModels) = hs.createModels(numModels=1)
+          if len(newModels) == 0:
+            break
+
+          for (modelParams, modelParamsHash, particleHash) in newModels:
+            (modelID, ours) = jobsDAO.modelInsertAndStart(
+              jobID, json.dumps(modelParams), modelParamsHash, particleHash)
+            if not ours:
+              # Already known to the jobs DAO; hand it to the Hypersearch
+              # instance so that it isn't proposed again
+              for doneID in self._processUpdatedModels(hs, updateQueue):
+                running.pop(doneID).get()
+              continue
+
+            hs.recordModelProgress(modelID=modelID,
+                                   modelParams=modelParams,
+                                   modelParamsHash=modelParamsHash,
+                                   results=None,
+                                   completed=False,
+                                   completionReason=None,
+                                   matured=False,
+                                   numRecords=0)
+            self._knownModelIDs.add(modelID)
+
+            running[modelID] = pool.apply_async(
+              _runModel,
+              (modelID, jobID, modelParams, modelParamsHash,
+               checkpointGUIDPrefix + str(modelID)))
+            numSubmitted += 1
+
+        if exit and not running:
+          break
+
+        if exit or len(running) >= self._numWorkers or len(newModels) == 0:
+          waitSecs = _MODEL_WAIT_TIMEOUT_SEC
+        else:
+          waitSecs = 0
+
+      # Every update was received, so the workers can't block on a full queue
+      pool.close()
+      pool.join()
+
+    except:
+      pool.terminate()
+      raise
+
+    finally:
+      hs.close()
+
+    self.logger.info("FINISHED. Evaluated %d models.", numSubmitted)
+
+
+  def _processUpdatedModels(self, hs, updateQueue, waitSecs=0):
+    """ Apply the updates queued by the pool workers and pass the models that
+    changed to the Hypersearch instance.
+
+    :param waitSecs: (float) how long to wait for a first update
+    :returns: list of the IDs of the models whose pool task is done
+    """
+    updates = []
+    try:
+      if waitSecs > 0:
+        updates.append(updateQueue.get(timeout=waitSecs))
+      while True:
+        updates.append(updateQueue.get_nowait())
+    except Queue.Empty:
+      pass
+
+    doneIDs = [args[0] for methodName, args, _ in updates
+               if methodName == _MODEL_TASK_DONE]
+    updates = [update for update in updates if update[0] != _MODEL_TASK_DONE]
+
+    jobsDAO = self.jobsDAO
+    changes = jobsDAO.modelsGetChanges(self.jobID, updates)
+
+    newIDs = [mResult.modelId for mResult in changes
+              if mResult.modelId not in self._knownModelIDs]
+    newParams = dict()
+    if newIDs:
+      newParams = dict((p.modelId, p)
+                       for p in jobsDAO.modelsGetParams(newIDs))
+      self._knownModelIDs.update(newIDs)
+
+    for mResult in changes:
+      modelID = mResult.modelId
+      results = mResult.results
+      if results is not None:
+        results = json.loads(results)
+      modelParams = None
+      if modelID in newParams:
+        modelParams = json.loads(newParams[modelID].params)
+
+      completed = (mResult.status == LocalJobsDAO.STATUS_COMPLETED)
+      hs.recordModelProgress(modelID=modelID,
+                             modelParams=modelParams,
+                             modelParamsHash=mResult.engParamsHash,
+                             results=results,
+                             completed=completed,
+                             completionReason=mResult.completionReason,
+                             matured=mResult.engMatured,
+                             numRecords=mResult.numRecords)
+
+    return doneIDs
@@ -0,0 +1,418 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Checkpoint-and-fork evaluation of the models of a swarm.
+
+Many particles of a swarm share their encoder and spatial pooler parameters
+and only differ in the parameters of later stages (temporal memory,
+classifier). The spatial pooler gets no feedback from those stages, so all of
+these models compute the exact same spatial pooler outputs and states.
+
+The first such model to run records its spatial pooler's input and output of
+every record and checkpoints the spatial pooler every ``checkpointInterval``
+records. Later models fork from that run: while their spatial pooler input
+matches the recorded one, they copy the recorded output instead of computing
+it. The forked spatial pooler is only brought up to date when something needs
+its state, e.g. when the model is checkpointed. This is done by loading the
+latest checkpoint and running the records since then. Once the input diverges
+from the recording, or the model runs past its end, the model computes the
+spatial pooler itself from then on.
+
+The models of a swarm therefore form a prefix tree: one spatial pooler run per
+encoder and spatial pooler configuration, with the later stages of each model
+branching off it.
+
+Recordings are stored per dataset of the :class:`~nupic.swarming.
+dataset_cache.DatasetCache` and written under a temporary name, then renamed
+into place. When several models record the same configuration concurrently,
+the first one to finish wins.
+"""
+
+import cPickle as pickle
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy
+
+from nupic.support.configuration import Configuration
+
+
+
+# Bump when the layout of the recordings changes
+_FORK_FORMAT_VERSION = 1
+
+_META_FILE = "meta.json"
+
+# Methods of the spatial pooler that only depend on its constructor parameters
+_STATIC_METHODS = frozenset(["getNumColumns", "getNumInputs",
+                             "getColumnDimensions", "getInputDimensions"])
+
+
+
+def _getCheckpointPath(entryDir, iteration):
+  return os.path.join(entryDir, "sp-%d.pkl" % iteration)
+
+
+
+def _writeCheckpoint(path, sp):
+  with open(path, "wb") as outFile:
+    pickle.dump(sp, outFile, pickle.HIGHEST_PROTOCOL)
+
+
+
+def _concatenate(arrays, dtype):
+  """ Join per-record index arrays into (offsets, indices) such that the
+  indices of record i are ``indices[offsets[i]:offsets[i + 1]]``. """
+  offsets = numpy.zeros(len(arrays) + 1, dtype=numpy.int64)
+  offsets[1:] = numpy.cumsum([len(a) for a in arrays])
+  if arrays:
+    indices = numpy.concatenate(arrays).astype(dtype)
+  else:
+    indices = numpy.zeros(0, dtype=dtype)
+  return offsets, indices
+
+
+
+class _SpatialPoolerRecording(object):
+  """ A published recording of a spatial pooler run. """
+
+  def __init__(self, entryDir):
+    self.entryDir = entryDir
+    with open(os.path.join(entryDir, _META_FILE)) as metaFile:
+      meta = json.load(metaFile)
+    self.numRecords = meta["numRecords"]
+    self.checkpoints = set(meta["checkpoints"])
+
+    def load(name):
+      return numpy.load(os.path.join(entryDir, name), mmap_mode="r")
+
+    self.learn = load("learn.npy")
+    self.inputOffsets = load("input.offsets.npy")
+    self.inputIndices = load("input.indices.npy")
+    self.outputOffsets = load("output.offsets.npy")
+    self.outputIndices = load("output.indices.npy")
+
+
+  def getInput(self, iteration):
+    return self.inputIndices[self.inputOffsets[iteration]:
+                             self.inputOffsets[iteration + 1]]
+
+
+  def getOutput(self, iteration):
+    return self.outputIndices[self.outputOffsets[iteration]:
+                              self.outputOffsets[iteration + 1]]
+
+
+  def loadCheckpoint(self, iteration):
+    with open(_getCheckpointPath(self.entryDir, iteration), "rb") as inFile:
+      return pickle.load(inFile)
+
+
+
+def _isWrapperAttribute(wrapper, name):
+  """ Whether setting attribute name of a spatial pooler wrapper sets it on the
+  wrapper rather than on the wrapped spatial pooler. """
+  return name.startswith("_") or name in wrapper.__dict__
+
+
+
+class _RecordingSpatialPooler(object):
+  """ Wraps the spatial pooler of a model, recording its inputs and outputs
+  and checkpointing it periodically. Everything else is delegated to the
+  wrapped spatial pooler, and pickling stores the wrapped spatial pooler
+  itself. Setting a parameter of the spatial pooler, e.g. through
+  ``SPRegion.setParameter``, discards the recording, since it wouldn't match
+  its configuration anymore.
+  """
+
+  def __init__(self, sp, forksDir, entryDir, checkpointInterval):
+    self._sp = sp
+    self._entryDir = entryDir
+    self._checkpointInterval = checkpointInterval
+    self._tmpDir = tempfile.mkdtemp(dir=forksDir, prefix=".building-")
+    self._inputs = []
+    self._outputs = []
+    self._learn = []
+    self._checkpoints = []
+    self._logger = logging.getLogger(".".join(
+      ["com.numenta", self.__class__.__module__, self.__class__.__name__]))
+
+
+  def __getattr__(self, name):
+    return getattr(object.__getattribute__(self, "_sp"), name)
+
+
+  def __setattr__(self, name, value):
+    if _isWrapperAttribute(self, name):
+      object.__setattr__(self, name, value)
+    else:
+      self.abort()
+      setattr(self._sp, name, value)
+
+
+  def __reduce__(self):
+    return self._sp.__reduce_ex__(2)
+
+
+  def compute(self, inputVector, learn, activeArray):
+    self._sp.compute(inputVector, learn, activeArray)
+
+    if self._tmpDir is None:
+      return
+    self._inputs.append(numpy.flatnonzero(inputVector))
+    self._outputs.append(numpy.flatnonzero(activeArray))
+    self._learn.append(bool(learn))
+
+    iteration = len(self._learn)
+    if iteration % self._checkpointInterval == 0:
+      _writeCheckpoint(_getCheckpointPath(self._tmpDir, iteration), self._sp)
+      self._checkpoints.append(iteration)
+
+
+  def finish(self):
+    """ Publish the recording, unless another model published one for the same
+    configuration first. """
+    if self._tmpDir is None:
+      return
+
+    tmpDir, self._tmpDir = self._tmpDir, None
+    try:
+      if os.path.exists(os.path.join(self._entryDir, _META_FILE)):
+        return
+
+      numRecords = len(self._learn)
+      if numRecords not in self._checkpoints:
+        _writeCheckpoint(_getCheckpointPath(tmpDir, numRecords), self._sp)
+        self._checkpoints.append(numRecords)
+
+      numpy.save(os.path.join(tmpDir, "learn.npy"),
+                 numpy.array(self._learn, dtype=bool))
+      for name, arrays in (("input", self._inputs),
+                           ("output", self._outputs)):
+        offsets, indices = _concatenate(arrays, numpy.int32)
+        numpy.save(os.path.join(tmpDir, name + ".offsets.npy"), offsets)
+        numpy.save(os.path.join(tmpDir, name + ".indices.npy"), indices)
+      with open(os.path.join(tmpDir, _META_FILE), "w") as metaFile:
+        json.dump(dict(numRecords=numRecords, checkpoints=self._checkpoints),
+                  metaFile)
+
+      try:
+        os.rename(tmpDir, self._entryDir)
+        self._logger.info("Published spatial pooler recording %r of %d "
+                          "records", self._entryDir, numRecords)
+      except OSError:
+        # Another model published the same configuration first
+        if not os.path.exists(os.path.join(self._entryDir, _META_FILE)):
+          raise
+    finally:
+      self._inputs = self._outputs = self._learn = None
+      if os.path.exists(tmpDir):
+        shutil.rmtree(tmpDir)
+
+
+  def abort(self):
+    """ Stop recording and delete the unpublished recording, e.g. when the
+    model fails. """
+    if self._tmpDir is None:
+      return
+
+    tmpDir, self._tmpDir = self._tmpDir, None
+    self._inputs = self._outputs = self._learn = None
+    shutil.rmtree(tmpDir, ignore_errors=True)
+
+
+
+class _ForkedSpatialPooler(object):
+  """ Wraps the spatial pooler of a model, serving its outputs from a
+  recording of the same configuration for as long as the inputs match. The
+  wrapped spatial pooler is brought up to date before anything else accesses
+  or sets its attributes, and pickling stores the up to date spatial pooler
+  itself.
+  """
+
+  def __init__(self, sp, recording):
+    self._sp = sp
+    self._recording = recording
+
+    # Number of compute() calls so far
+    self._iteration = 0
+
+    # Iteration of the state self._sp is in while forked, and the
+    # (inputIndices, learn) of the compute() calls since then
+    self._spIteration = 0
+    self._pending = []
+
+    # True once self._sp is up to date and computes every record itself
+    self._detached = False
+    object.__setattr__(self, "numForkedRecords", 0)
+
+    self._logger = logging.getLogger(".".join(
+      ["com.numenta", self.__class__.__module__, self.__class__.__name__]))
+
+
+  def __getattr__(self, name):
+    if name not in _STATIC_METHODS:
+      object.__getattribute__(self, "_detach")()
+    return getattr(object.__getattribute__(self, "_sp"), name)
+
+
+  def __setattr__(self, name, value):
+    if _isWrapperAttribute(self, name):
+      object.__setattr__(self, name, value)
+    else:
+      self._detach()
+      setattr(self._sp, name, value)
+
+
+  def __reduce__(self):
+    self._detach()
+    return self._sp.__reduce_ex__(2)
+
+
+  def compute(self, inputVector, learn, activeArray):
+    iteration = self._iteration
+    if not self._detached and iteration < self._recording.numRecords:
+      inputIndices = numpy.flatnonzero(inputVector)
+      if (bool(learn) == self._recording.learn[iteration] and
+          numpy.array_equal(inputIndices, self._recording.getInput(iteration))):
+        activeArray[:] = 0
+        activeArray[self._recording.getOutput(iteration)] = 1
+        self._iteration += 1
+        self.numForkedRecords += 1
+
+        # Only the records since the latest checkpoint need to be kept
+        if self._iteration in self._recording.checkpoints:
+          self._spIteration = self._iteration
+          self._pending = []
+        else:
+          self._pending.append((inputIndices, bool(learn)))
+        return
+
+    self._detach()
+    self._sp.compute(inputVector, learn, activeArray)
+    self._iteration += 1
+
+
+  def _detach(self):
+    """ Bring the wrapped spatial pooler up to date and stop forking. """
+    if self._detached:
+      return
+    self._detached = True
+
+    if self._spIteration > 0:
+      self._sp = self._recording.loadCheckpoint(self._spIteration)
+
+    inputVector = numpy.zeros(self._sp.getNumInputs(), dtype=numpy.uint32)
+    activeArray = numpy.zeros(self._sp.getNumColumns(), dtype=numpy.uint32)
+    for inputIndices, learn in self._pending:
+      inputVector[:] = 0
+      inputVector[inputIndices] = 1
+      self._sp.compute(inputVector, learn, activeArray)
+
+    self._logger.debug("Detached from spatial pooler recording %r after %d "
+                       "records; replayed %d records from checkpoint %d",
+                       self._recording.entryDir, self._iteration,
+                       len(self._pending), self._spIteration)
+    self._pending = None
+
+
+  def finish(self):
+    pass
+
+
+  def abort(self):
+    pass
+
+
+
+class SpatialPoolerForks(object):
+  """
+  Spatial pooler recordings of a dataset, shared by the models of a swarm
+  through a directory.
+
+  :param forksDir: (string) directory holding the recordings; created if
+         missing
+  :param checkpointInterval: (int) number of records between the checkpoints of
+         a recording. Defaults to ``nupic.hypersearch.forkCheckpointInterval``.
+  """
+
+  def __init__(self, forksDir, checkpointInterval=None):
+    if checkpointInterval is None:
+      checkpointInterval = int(Configuration.get(
+        'nupic.hypersearch.forkCheckpointInterval'))
+    if checkpointInterval < 1:
+      raise ValueError("checkpointInterval must be positive")
+
+    self._forksDir = os.path.abspath(forksDir)
+    self._checkpointInterval = checkpointInterval
+    if not os.path.isdir(self._forksDir):
+      try:
+        os.makedirs(self._forksDir)
+      except OSError:
+        # Created by another worker in the meantime
+        if not os.path.isdir(self._forksDir):
+          raise
+
+
+  @staticmethod
+  def _getForkKey(modelParams):
+    keyData = json.dumps([_FORK_FORMAT_VERSION,
+                          modelParams['sensorParams']['encoders'],
+                          modelParams['spParams']],
+                         sort_keys=True, default=repr)
+    return hashlib.md5(keyData).hexdigest()
+
+
+  def attach(self, model, modelDescription):
+    """ Fork a model's spatial pooler from the recording of its configuration,
+    or record it if there is no such recording yet. The model must be fed the
+    records of the dataset in order, starting with the first one.
+
+    :param model: (:class:`~nupic.frameworks.opf.model.Model`) the model, just
+           created from modelDescription; only HTMPrediction models with a
+           spatial pooler are supported
+    :param modelDescription: (dict) the description the model was created from
+    :returns: the wrapper installed in the model, or None if the model isn't
+              supported. Call its ``finish()`` method after the model's last
+              record, or its ``abort()`` method if the model fails.
+    """
+    if modelDescription.get('model') != 'HTMPrediction':
+      return None
+    modelParams = modelDescription['modelParams']
+    spRegion = model._getSPRegion()
+    if spRegion is None or not modelParams.get('spEnable', True):
+      return None
+
+    spRegionImpl = spRegion.getSelf()
+    entryDir = os.path.join(self._forksDir, self._getForkKey(modelParams))
+    if os.path.exists(os.path.join(entryDir, _META_FILE)):
+      wrapper = _ForkedSpatialPooler(spRegionImpl._sfdr,
+                                     _SpatialPoolerRecording(entryDir))
+    else:
+      wrapper = _RecordingSpatialPooler(spRegionImpl._sfdr, self._forksDir,
+                                        entryDir, self._checkpointInterval)
+    spRegionImpl._sfdr = wrapper
+    return wrapper
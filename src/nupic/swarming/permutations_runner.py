@@ -22,7 +22,9 @@
 """ @file permutations_runner.py
 """
 
+import bisect
 import collections
+import copy
 import imp
 import csv
 from datetime import datetime, timedelta
@@ -35,12 +37,15 @@ from nupic.swarming.hypersearch import object_json as json
 import nupic.database.client_jobs_dao as cjdao
 from nupic.swarming import hypersearch_worker
 from nupic.swarming.hypersearch_v2 import HypersearchV2
+from nupic.swarming.local_executor import LocalSwarmExecutor
 from nupic.swarming.exp_generator.experiment_generator import expGenerator
 from nupic.swarming.utils import *
 
 
 g_currentVerbosityLevel = 0
 gCurrentSearch = None
+# LocalSwarmExecutor of the running search when the "local" executor is used
+gLocalExecutor = None
 DEFAULT_OPTIONS = {"overwrite": False,
                   "expDescJsonPath": None,
                   "expDescConfig": None,
@@ -53,8 +58,12 @@ DEFAULT_OPTIONS = {"overwrite": False,
                   "timeout": None,
                   "exports": None,
                   "useTerminators": False,
+                  "earlyStopping": None,
+                  "particleProposal": None,
                   "maxWorkers": 2,
+                  "executor": "workers",
                   "replaceReport": False,
+                  "resumeReport": False,
                   "maxPermutations": None,
                   "genTopNDescriptions": 1}
 
@@ -77,7 +86,7 @@ def _termHandler(signal, frame):
     print exc
   else:
     print "Canceling jobs due to receiving SIGTERM"
-    cjdao.ClientJobsDAO.get().jobCancel(jobID)
+    _clientJobsDB().jobCancel(jobID)
 
 
 
@@ -141,18 +150,21 @@ def _runHyperSearch(runOptions):
   search = _HyperSearchRunner(runOptions)
   # Save in global for the signal handler.
   gCurrentSearch = search
-  if runOptions["action"] in ("run", "dryRun"):
-    search.runNewSearch()
-  else:
-    search.pickupSearch()
-
-  # Generate reports
-  # Print results and generate report csv file
-  modelParams = _HyperSearchRunner.generateReport(
-    options=runOptions,
-    replaceReport=runOptions["replaceReport"],
-    hyperSearchJob=search.peekSearchJob(),
-    metricsKeys=search.getDiscoveredMetricsKeys())
+  try:
+    if runOptions["action"] in ("run", "dryRun"):
+      search.runNewSearch()
+    else:
+      search.pickupSearch()
+
+    # Generate reports
+    # Print results and generate report csv file
+    modelParams = _HyperSearchRunner.generateReport(
+      options=runOptions,
+      replaceReport=runOptions["replaceReport"],
+      hyperSearchJob=search.peekSearchJob(),
+      metricsKeys=search.getDiscoveredMetricsKeys())
+  finally:
+    search.close()
   secs = time.time() - startTime
   hours = int(secs) / (60 * 60)
   secs -= hours * (60 * 60)
@@ -178,6 +190,11 @@ def _validateOptions(options):
     raise Exception("Options must contain one of the following: "
                     "expDescJsonPath, expDescConfig, or "
                     "permutationsScriptPath.")
+  if options["executor"] not in ("workers", "local"):
+    raise Exception("Unknown executor: %r" % options["executor"])
+  if options["executor"] == "local" and options["action"] == "pickup":
+    raise Exception("Searches run by the local executor can't be picked up "
+                    "because their job records are not persisted.")
 
 
 
@@ -371,8 +388,11 @@ def _setUpExports(exports):
 
 def _clientJobsDB():
   """
-  Returns: The shared cjdao.ClientJobsDAO instance
+  Returns: The shared cjdao.ClientJobsDAO instance, or the in-memory jobs DAO
+  of the local executor while it runs a search
   """
+  if gLocalExecutor is not None:
+    return gLocalExecutor.jobsDAO
   return cjdao.ClientJobsDAO.get()
 
 
@@ -409,10 +429,15 @@ class _HyperSearchRunner(object):
     retval:         nothing
     """
 
-    self.__cjDAO = _clientJobsDB()
-
     self._options = options
 
+    # The local executor doesn't use the jobs database; its jobs DAO is set
+    # up when the search starts
+    if options["executor"] == "local":
+      self.__cjDAO = None
+    else:
+      self.__cjDAO = _clientJobsDB()
+
     # _HyperSearchJob instance set up by runNewSearch() and pickupSearch()
     self.__searchJob = None
 
@@ -427,6 +452,17 @@ class _HyperSearchRunner(object):
 
 
 
+  def close(self):
+    """Releases the resources of the local executor, if one was used. The
+    search job records are no longer available afterwards.
+    """
+    global gLocalExecutor
+    if gLocalExecutor is not None:
+      gLocalExecutor.close()
+      gLocalExecutor = None
+
+
+
   def runNewSearch(self):
     """Start a new hypersearch job and monitor it to completion
     Parameters:
@@ -646,6 +682,11 @@ class _HyperSearchRunner(object):
     params = _ClientJobUtils.makeSearchJobParamsDict(options=self._options,
                                                      forRunning=True)
 
+    if self._options["executor"] == "local":
+      jobID = self.__startLocalSearch(params)
+      print "Successfully started local HyperSearch job, jobID=%d" % (jobID)
+      return _HyperSearchJob(jobID)
+
     if self._options["action"] == "dryRun":
       args = [sys.argv[0], "--params=%s" % (json.dumps(params))]
 
@@ -693,6 +734,30 @@ class _HyperSearchRunner(object):
 
 
 
+  def __startLocalSearch(self, params):
+    """Starts HyperSearch in this process using LocalSwarmExecutor. The job and
+    model records are kept in memory until close() is called, so the search
+    job ID is not saved for later report generation.
+
+    Parameters:
+    ----------------------------------------------------------------------
+    params:         the HyperSearch job params dict
+    retval:         jobID of the new search job
+    """
+    global gLocalExecutor
+
+    numWorkers = self._options["maxWorkers"]
+    if self._options["action"] == "dryRun":
+      numWorkers = 1
+
+    gLocalExecutor = LocalSwarmExecutor(params, numWorkers=numWorkers)
+    self.__cjDAO = gLocalExecutor.jobsDAO
+    gLocalExecutor.start()
+
+    return gLocalExecutor.jobID
+
+
+
   def peekSearchJob(self):
     """Retrieves the runner's _HyperSearchJob instance; NOTE: only available
     after run().
@@ -744,9 +809,14 @@ class _HyperSearchRunner(object):
                      hyperSearchJob,
                      metricsKeys):
     """Prints all available results in the given HyperSearch job and emits
-    model information to the permutations report csv.
+    model information to the permutations report csv and json files.
 
-    The job may be completed or still in progress.
+    The job may be completed or still in progress. The models are streamed
+    from the jobs DAO in model ID order and the report aggregates are
+    computed as they go, so memory use doesn't grow with the number of
+    models. If options["resumeReport"] is True and an earlier report on the
+    same job was written with the same outputLabel, the report continues
+    after the last model that had finished when it was written.
 
     Parameters:
     ----------------------------------------------------------------------
@@ -766,37 +836,60 @@ class _HyperSearchRunner(object):
           permWorkDir=options["permWorkDir"],
           outputLabel=options["outputLabel"])
 
-    modelIDs = hyperSearchJob.queryModelIDs()
+    jobID = hyperSearchJob.getJobID()
     bestModel = None
-
-    # If metricsKeys was not provided, pre-scan modelInfos to create the list;
-    # this is needed by _ReportCSVWriter
-    # Also scan the parameters to generate a list of encoders and search
-    # parameters
-    metricstmp = set()
-    searchVar = set()
-    for modelInfo in _iterModels(modelIDs):
-      if modelInfo.isFinished():
-        vars = modelInfo.getParamLabels().keys()
-        searchVar.update(vars)
-        metrics = modelInfo.getReportMetrics()
-        metricstmp.update(metrics.keys())
-    if metricsKeys is None:
-      metricsKeys = metricstmp
-    # Create a csv report writer
+    model_description = None
+
+    # Pick up where an earlier report on this job left off, if requested
+    reportState = None
+    if options["resumeReport"]:
+      reportState = _ReportState.load(permWorkDir=options["permWorkDir"],
+                                      outputLabel=options["outputLabel"],
+                                      jobID=jobID)
+
+    if reportState is None:
+      # If metricsKeys was not provided, pre-scan modelInfos to create the list;
+      # this is needed by _ReportCSVWriter
+      # Also scan the parameters to generate a list of encoders and search
+      # parameters
+      metricstmp = set()
+      searchVar = set()
+      for modelInfo in _iterJobModels(jobID):
+        if modelInfo.isFinished():
+          vars = modelInfo.getParamLabels().keys()
+          searchVar.update(vars)
+          metrics = modelInfo.getReportMetrics()
+          metricstmp.update(metrics.keys())
+      if metricsKeys is None:
+        metricsKeys = metricstmp
+
+      reportState = _ReportState(
+        jobID=jobID,
+        metricsKeys=metricsKeys,
+        searchVar=searchVar,
+        maximize=_PermutationUtils.getOptimizationMetricInfo(
+          hyperSearchJob.getParams())[1],
+        numTopModels=options["genTopNDescriptions"])
+
+    # Create the csv and json report writers
     reportWriter = _ReportCSVWriter(hyperSearchJob=hyperSearchJob,
-                                    metricsKeys=metricsKeys,
-                                    searchVar=searchVar,
+                                    metricsKeys=reportState.metricsKeys,
+                                    searchVar=reportState.searchVar,
                                     outputDirAbsPath=options["permWorkDir"],
                                     outputLabel=options["outputLabel"],
-                                    replaceReport=replaceReport)
-
-    # Tallies of experiment dispositions
-    modelStats = _ModelStats()
-    #numCompletedOther = long(0)
+                                    replaceReport=replaceReport,
+                                    resumeOffset=reportState.csvOffset)
+    jsonWriter = _ReportJSONWriter(hyperSearchJob=hyperSearchJob,
+                                   outputDirAbsPath=options["permWorkDir"],
+                                   outputLabel=options["outputLabel"],
+                                   replaceReport=replaceReport,
+                                   resumeOffset=reportState.jsonOffset)
 
     print "\nResults from all experiments:"
     print "----------------------------------------------------------------"
+    if reportState.lastModelID is not None:
+      print "(resuming after the %d experiments up to model %s)" % (
+          reportState.numModels, reportState.lastModelID)
 
     # Get common optimization metric info from permutations script
     searchParams = hyperSearchJob.getParams()
@@ -807,11 +900,15 @@ class _HyperSearchRunner(object):
     # Print metrics, while looking for the best model
     formatStr = None
     # NOTE: we may find additional metrics if HyperSearch is still running
-    foundMetricsKeySet = set(metricsKeys)
-    sortedMetricsKeys = []
+    foundMetricsKeySet = set(reportState.metricsKeys)
+    foundMetricsKeySet.update(reportState.sortedMetricsKeys)
+    sortedMetricsKeys = reportState.sortedMetricsKeys
+    if sortedMetricsKeys:
+      maxKeyLen = max([len(k) for k in sortedMetricsKeys])
+      formatStr = "  %%-%ds" % (maxKeyLen+2)
 
     # pull out best Model from jobs table
-    jobInfo = _clientJobsDB().jobInfo(hyperSearchJob.getJobID())
+    jobInfo = _clientJobsDB().jobInfo(jobID)
 
     # Try to return a decent error message if the job was cancelled for some
     # reason.
@@ -829,41 +926,28 @@ class _HyperSearchRunner(object):
       raise
 
     bestModelNum = results["bestModel"]
-    bestModelIterIndex = None
 
-    # performance metrics for the entire job
-    totalWallTime = 0
-    totalRecords = 0
+    # Stream the models in model ID order. The report can later be resumed
+    # after the last model of the leading run of finished models; the models
+    # after it may still change, so they are reported again when resuming.
+    resumable = True
+    savedState = reportState.getState()
+    numSavedModels = reportState.numModels
+    for modelInfo in _iterJobModels(jobID, afterModelID=reportState.lastModelID):
+      i = reportState.numModels
 
-    # At the end, we will sort the models by their score on the optimization
-    # metric
-    scoreModelIDDescList = []
-    for (i, modelInfo) in enumerate(_iterModels(modelIDs)):
-
-      # Output model info to report csv
+      # Output model info to report csv and json
       reportWriter.emit(modelInfo)
+      jsonWriter.emit(modelInfo)
 
-      # Update job metrics
-      totalRecords+=modelInfo.getNumRecords()
-      format = "%Y-%m-%d %H:%M:%S"
-      startTime = modelInfo.getStartTime()
-      if modelInfo.isFinished():
-        endTime = modelInfo.getEndTime()
-        st = datetime.strptime(startTime, format)
-        et = datetime.strptime(endTime, format)
-        totalWallTime+=(et-st).seconds
-
-      # Tabulate experiment dispositions
-      modelStats.update(modelInfo)
+      # Update the job metrics and the experiment disposition tallies
+      optimizationMetrics = modelInfo.getOptimizationMetrics()
+      reportState.update(modelInfo, isBestModel=(
+        modelInfo.getModelID() == bestModelNum))
 
       # For convenience
       expDesc = modelInfo.getModelDescription()
       reportMetrics = modelInfo.getReportMetrics()
-      optimizationMetrics = modelInfo.getOptimizationMetrics()
-      if modelInfo.getModelID() == bestModelNum:
-        bestModel = modelInfo
-        bestModelIterIndex=i
-        bestMetric = optimizationMetrics.values()[0]
 
       # Keep track of the best-performing model
       if optimizationMetrics:
@@ -871,13 +955,6 @@ class _HyperSearchRunner(object):
             "expected 1 opt key, but got %d (%s) in %s" % (
                 len(optimizationMetrics), optimizationMetrics, modelInfo))
 
-      # Append to our list of modelIDs and scores
-      if modelInfo.getCompletionReason().isEOF():
-        scoreModelIDDescList.append((optimizationMetrics.values()[0],
-                                    modelInfo.getModelID(),
-                                    modelInfo.getGeneratedDescriptionFile(),
-                                    modelInfo.getParamLabels()))
-
       print "[%d] Experiment %s\n(%s):" % (i, modelInfo, expDesc)
       if (modelInfo.isFinished() and
           not (modelInfo.getCompletionReason().isStopped or
@@ -902,17 +979,35 @@ class _HyperSearchRunner(object):
               m = "%r" % reportMetrics[key]
             print formatStr % (key+":"), m
         print
+      reportState.sortedMetricsKeys = sortedMetricsKeys
+
+      if resumable and modelInfo.isFinished():
+        reportState.lastModelID = modelInfo.getModelID()
+        reportState.csvOffset = reportWriter.getOffset()
+        reportState.jsonOffset = jsonWriter.getOffset()
+        savedState = reportState.getState()
+        if reportState.numModels - numSavedModels >= _ReportState.SAVE_INTERVAL:
+          _ReportState.save(options["permWorkDir"], options["outputLabel"],
+                            savedState)
+          numSavedModels = reportState.numModels
+      else:
+        resumable = False
+
+    _ReportState.save(options["permWorkDir"], options["outputLabel"],
+                      savedState)
 
     # Summarize results
+    modelStats = reportState.modelStats
+    numModels = reportState.numModels
     print "--------------------------------------------------------------"
-    if len(modelIDs) > 0:
+    if numModels > 0:
       print "%d experiments total (%s).\n" % (
-          len(modelIDs),
+          numModels,
           ("all completed successfully"
            if (modelStats.numCompletedKilled + modelStats.numCompletedEOF) ==
-               len(modelIDs)
+               numModels
            else "WARNING: %d models have not completed or there were errors" % (
-               len(modelIDs) - (
+               numModels - (
                    modelStats.numCompletedKilled + modelStats.numCompletedEOF +
                    modelStats.numCompletedStopped))))
 
@@ -943,7 +1038,8 @@ class _HyperSearchRunner(object):
     # Print out the field contributions
     print
     global gCurrentSearch
-    jobStatus = hyperSearchJob.getJobStatus(gCurrentSearch._workers)
+    workers = gCurrentSearch._workers if gCurrentSearch is not None else None
+    jobStatus = hyperSearchJob.getJobStatus(workers)
     jobResults = jobStatus.getResults()
     if "fieldContributions" in jobResults:
       print "Field Contributions:"
@@ -952,7 +1048,8 @@ class _HyperSearchRunner(object):
       print "Field contributions info not available"
 
     # Did we have an optimize key?
-    if bestModel is not None:
+    if reportState.bestModelID is not None:
+      bestModel = _getOneModelInfo(reportState.bestModelID)
       maxKeyLen = max([len(k) for k in sortedMetricsKeys])
       maxKeyLen = max(maxKeyLen, len(optimizationMetricKey))
       formatStr = "  %%-%ds" % (maxKeyLen+2)
@@ -962,12 +1059,13 @@ class _HyperSearchRunner(object):
       print "Best results on the optimization metric %s (maximize=%s):" % (
           optimizationMetricName, maximizeMetric)
       print "[%d] Experiment %s (%s):" % (
-          bestModelIterIndex, bestModel, bestModel.getModelDescription())
+          reportState.bestModelIterIndex, bestModel,
+          bestModel.getModelDescription())
       print formatStr % (optimizationMetricName+":"), bestMetricValue
       print
-      print "Total number of Records processed: %d"  % totalRecords
+      print "Total number of Records processed: %d"  % reportState.totalRecords
       print
-      print "Total wall time for all models: %d" % totalWallTime
+      print "Total wall time for all models: %d" % reportState.totalWallTime
 
       hsJobParams = hyperSearchJob.getParams()
 
@@ -975,13 +1073,18 @@ class _HyperSearchRunner(object):
     if options["genTopNDescriptions"] > 0:
       print "\nGenerating description files for top %d models..." % (
               options["genTopNDescriptions"])
-      scoreModelIDDescList.sort()
-      scoreModelIDDescList = scoreModelIDDescList[
-          0:options["genTopNDescriptions"]]
+      topModels = reportState.topModels[0:options["genTopNDescriptions"]]
+      topModelInfos = dict()
+      if topModels:
+        topModelInfos = dict(
+          (modelInfo.getModelID(), modelInfo) for modelInfo in
+          _iterModels([modelID for (_, modelID) in topModels]))
 
       i = -1
-      for (score, modelID, description, paramLabels) in scoreModelIDDescList:
+      for (score, modelID) in topModels:
         i += 1
+        description = topModelInfos[modelID].getGeneratedDescriptionFile()
+        paramLabels = topModelInfos[modelID].getParamLabels()
         outDir = os.path.join(options["permWorkDir"], "model_%d" % (i))
         print "Generating description file for model %s at %s" % \
           (modelID, outDir)
@@ -1026,6 +1129,7 @@ class _HyperSearchRunner(object):
       print
 
     reportWriter.finalize()
+    jsonWriter.finalize(reportState.getSummary())
     return model_description
 
 
@@ -1166,6 +1270,248 @@ class _ModelStats(object):
 
 
 
+  def getState(self):
+    return dict(self.__dict__)
+
+
+
+  def setState(self, state):
+    self.__dict__.update(state)
+
+
+
+class _ReportState(object):
+  """ @private
+  Aggregates of a report that are computed incrementally while the models are
+  streamed, and the position the report can be resumed from.
+  """
+
+
+  # Number of models between saves of the resumable report state
+  SAVE_INTERVAL = 1000
+
+
+  def __init__(self, jobID, metricsKeys, searchVar, maximize, numTopModels):
+    """
+    Parameters:
+    ----------------------------------------------------------------------
+    jobID:          jobID of the HyperSearch job
+    metricsKeys:    sequence of report metrics key names of the csv report
+    searchVar:      sequence of search variable names of the csv report
+    maximize:       True if the optimization metric is maximized
+    numTopModels:   number of best models to keep track of
+    retval:         nothing
+    """
+    self.jobID = jobID
+    self.metricsKeys = sorted(metricsKeys)
+    self.searchVar = sorted(searchVar)
+    self.maximize = maximize
+    self.numTopModels = numTopModels
+
+    # ID of the last model reported and the corresponding report file sizes
+    self.lastModelID = None
+    self.csvOffset = None
+    self.jsonOffset = None
+
+    self.numModels = 0
+    self.sortedMetricsKeys = []
+    self.modelStats = _ModelStats()
+    self.totalRecords = 0
+    self.totalWallTime = 0
+    self.bestModelID = None
+    self.bestModelIterIndex = None
+
+    # (score, modelID) of the numTopModels models with the lowest score on
+    # the optimization metric that ran to EOF, sorted
+    self.topModels = []
+
+    # Best values of each report metric: {key: [minValue, minModelID,
+    # maxValue, maxModelID]}
+    self.metricBests = dict()
+
+    # Tallies and best model of each swarm: {swarmID: dict}
+    self.swarms = dict()
+
+
+
+  def update(self, modelInfo, isBestModel):
+    """Add a model to the aggregates
+
+    Parameters:
+    ----------------------------------------------------------------------
+    modelInfo:      _NupicModelInfo instance
+    isBestModel:    True if this is the best model of the job
+    retval:         nothing
+    """
+    modelID = modelInfo.getModelID()
+    if isBestModel:
+      self.bestModelID = modelID
+      self.bestModelIterIndex = self.numModels
+    self.numModels += 1
+
+    # Update job metrics
+    self.totalRecords += modelInfo.getNumRecords()
+    if modelInfo.isFinished():
+      dateFormat = "%Y-%m-%d %H:%M:%S"
+      st = datetime.strptime(modelInfo.getStartTime(), dateFormat)
+      et = datetime.strptime(modelInfo.getEndTime(), dateFormat)
+      self.totalWallTime += (et - st).seconds
+
+    # Tabulate experiment dispositions
+    self.modelStats.update(modelInfo)
+
+    for (key, value) in modelInfo.getReportMetrics().iteritems():
+      if not isinstance(value, (int, long, float)) or value != value:
+        continue
+      best = self.metricBests.get(key)
+      if best is None:
+        self.metricBests[key] = [value, modelID, value, modelID]
+        continue
+      if value < best[0]:
+        best[0:2] = [value, modelID]
+      if value > best[2]:
+        best[2:4] = [value, modelID]
+
+    optimizationMetrics = modelInfo.getOptimizationMetrics()
+    score = optimizationMetrics.values()[0] if optimizationMetrics else None
+
+    swarmID = modelInfo.getSwarmID()
+    if swarmID is not None:
+      swarm = self.swarms.setdefault(swarmID, dict(
+        numModels=0, numCompletedEOF=0, bestScore=None, bestModelID=None))
+      swarm["numModels"] += 1
+      if score is not None and (
+          swarm["bestScore"] is None or
+          (score > swarm["bestScore"] if self.maximize
+           else score < swarm["bestScore"])):
+        swarm["bestScore"] = score
+        swarm["bestModelID"] = modelID
+
+    if modelInfo.isFinished() and modelInfo.getCompletionReason().isEOF():
+      if swarmID is not None:
+        swarm["numCompletedEOF"] += 1
+      if self.numTopModels > 0:
+        bisect.insort(self.topModels, (score, modelID))
+        del self.topModels[self.numTopModels:]
+
+
+
+  def getSummary(self):
+    """
+    Parameters:
+    ----------------------------------------------------------------------
+    retval:         dict with the aggregates of the report
+    """
+    return dict(
+      jobID=self.jobID,
+      numModels=self.numModels,
+      modelStats=self.modelStats.getState(),
+      totalRecords=self.totalRecords,
+      totalWallTime=self.totalWallTime,
+      bestModelID=self.bestModelID,
+      metrics=dict((key, dict(min=best[0], minModelID=best[1],
+                              max=best[2], maxModelID=best[3]))
+                   for (key, best) in self.metricBests.iteritems()),
+      swarms=self.swarms)
+
+
+
+  def getState(self):
+    """
+    Parameters:
+    ----------------------------------------------------------------------
+    retval:         JSON-serializable copy of the report state
+    """
+    state = copy.deepcopy(self.__dict__)
+    state["modelStats"] = self.modelStats.getState()
+    return state
+
+
+
+  @classmethod
+  def save(cls, permWorkDir, outputLabel, state):
+    """Saves a state returned by getState() to file
+
+    Parameters:
+    ----------------------------------------------------------------------
+    permWorkDir:    Directory path of the report files
+    outputLabel:    Label string of the report file names
+    state:          dict returned by getState()
+    retval:         nothing
+    """
+    filePath = cls.__getFilePath(permWorkDir, outputLabel)
+    with open(filePath + ".tmp", "wb") as stateFile:
+      json.dump(state, stateFile)
+    os.rename(filePath + ".tmp", filePath)
+
+
+
+  @classmethod
+  def load(cls, permWorkDir, outputLabel, jobID):
+    """Loads the saved state of the last report
+
+    Parameters:
+    ----------------------------------------------------------------------
+    permWorkDir:    Directory path of the report files
+    outputLabel:    Label string of the report file names
+    jobID:          jobID of the HyperSearch job being reported
+    retval:         _ReportState instance, or None if there is no state of a
+                    report on the given job to resume from
+    """
+    filePath = cls.__getFilePath(permWorkDir, outputLabel)
+    if not os.path.exists(filePath):
+      return None
+
+    with open(filePath, "rb") as stateFile:
+      state = json.load(stateFile)
+    if state["jobID"] != jobID or state["lastModelID"] is None:
+      return None
+
+    reportState = cls(jobID=jobID, metricsKeys=(), searchVar=(),
+                      maximize=False, numTopModels=0)
+    modelStats = state.pop("modelStats")
+    reportState.__dict__.update(state)
+    reportState.modelStats.setState(modelStats)
+    reportState.topModels = [tuple(x) for x in reportState.topModels]
+    return reportState
+
+
+
+  @classmethod
+  def __getFilePath(cls, permWorkDir, outputLabel):
+    return os.path.join(permWorkDir, "%s_ReportState.json" % (outputLabel,))
+
+
+
+def _openReportFile(reportPath, replaceReport, resumeOffset):
+  """Backs up an existing report file and opens it for writing
+
+  Parameters:
+  ----------------------------------------------------------------------
+  reportPath:     path of the report file
+  replaceReport:  True to replace the existing report file, if any; False to
+                  append to it
+  resumeOffset:   if not None, the existing report file is truncated to this
+                  size and written from there, regardless of replaceReport
+  retval:         (file object, path of the backup file or None)
+  """
+  backupPath = None
+  if os.path.exists(reportPath):
+    backupPath = _backupFile(reportPath)
+
+  if resumeOffset is not None:
+    fileObj = open(reportPath, "r+")
+    fileObj.truncate(resumeOffset)
+    fileObj.seek(resumeOffset)
+  elif replaceReport:
+    fileObj = open(reportPath, "w")
+  else:
+    fileObj = open(reportPath, "a")
+
+  return (fileObj, backupPath)
+
+
+
 class _ReportCSVWriter(object):
   """ @private
   """
@@ -1180,7 +1526,8 @@ class _ReportCSVWriter(object):
                searchVar,
                outputDirAbsPath,
                outputLabel,
-               replaceReport):
+               replaceReport,
+               resumeOffset=None):
     """
     Parameters:
     ----------------------------------------------------------------------
@@ -1191,6 +1538,8 @@ class _ReportCSVWriter(object):
     outputLabel:    A string label to incorporate into report CSV file name
     replaceReport:  True to replace existing report csv, if any; False to
                     append to existing report csv, if any
+    resumeOffset:   If not None, continue the existing report csv after its
+                    first resumeOffset bytes instead
     retval:         nothing
     """
     self.__searchJob = hyperSearchJob
@@ -1199,6 +1548,7 @@ class _ReportCSVWriter(object):
     self.__outputDirAbsPath = os.path.abspath(outputDirAbsPath)
     self.__outputLabel = outputLabel
     self.__replaceReport = replaceReport
+    self.__resumeOffset = resumeOffset
     self.__sortedVariableNames=searchVar
     # These are set up by __openAndInitCSVFile
     self.__csvFileObj = None
@@ -1266,6 +1616,17 @@ class _ReportCSVWriter(object):
 
 
 
+  def getOffset(self):
+    """
+    Parameters:
+    ----------------------------------------------------------------------
+    retval:         size of the report csv written so far, in bytes
+    """
+    self.__csvFileObj.flush()
+    return self.__csvFileObj.tell()
+
+
+
   def finalize(self):
     """Close file and print report/backup csv file paths
 
@@ -1292,8 +1653,8 @@ class _ReportCSVWriter(object):
     """
     - Backs up old report csv file;
     - opens the report csv file in append or overwrite mode (per
-      self.__replaceReport);
-    - emits column fields;
+      self.__replaceReport), or truncates it to self.__resumeOffset;
+    - emits column fields, unless resuming;
     - sets up self.__sortedVariableNames, self.__csvFileObj,
       self.__backupCSVPath, and self.__reportCSVPath
 
@@ -1309,18 +1670,16 @@ class _ReportCSVWriter(object):
     reportCSVName = "%s_Report.csv" % (self.__outputLabel,)
     reportCSVPath = self.__reportCSVPath = os.path.join(basePath, reportCSVName)
 
-    # If a report CSV file already exists, back it up
-    backupCSVPath = None
-    if os.path.exists(reportCSVPath):
-      backupCSVPath = self.__backupCSVPath = _backupFile(reportCSVPath)
-
+    # If a report CSV file already exists, back it up, and open report file
+    (csv, backupCSVPath) = _openReportFile(reportCSVPath,
+                                           self.__replaceReport,
+                                           self.__resumeOffset)
+    self.__csvFileObj = csv
+    self.__backupCSVPath = backupCSVPath
 
-    # Open report file
-    if self.__replaceReport:
-      mode = "w"
-    else:
-      mode = "a"
-    csv = self.__csvFileObj = open(reportCSVPath, mode)
+    # When resuming, the column names were written already
+    if self.__resumeOffset is not None:
+      return
 
     # If we are appending, add some blank line separators
     if not self.__replaceReport and backupCSVPath:
@@ -1346,6 +1705,104 @@ class _ReportCSVWriter(object):
 
 
 
+class _ReportJSONWriter(object):
+  """ @private
+  Writes one JSON object per model to the report json file, and the report
+  aggregates to the report summary json file.
+  """
+
+
+  def __init__(self,
+               hyperSearchJob,
+               outputDirAbsPath,
+               outputLabel,
+               replaceReport,
+               resumeOffset=None):
+    """
+    Parameters:
+    ----------------------------------------------------------------------
+    hyperSearchJob: _HyperSearchJob instance
+    outputDirAbsPath:
+                    Directory for creating report json files (absolute path)
+    outputLabel:    A string label to incorporate into report json file names
+    replaceReport:  True to replace existing report json, if any; False to
+                    append to existing report json, if any
+    resumeOffset:   If not None, continue the existing report json after its
+                    first resumeOffset bytes instead
+    retval:         nothing
+    """
+    self.__searchJobID = hyperSearchJob.getJobID()
+    basePath = os.path.abspath(outputDirAbsPath)
+    self.__reportJSONPath = os.path.join(basePath,
+                                         "%s_Report.json" % (outputLabel,))
+    self.__summaryJSONPath = os.path.join(
+      basePath, "%s_ReportSummary.json" % (outputLabel,))
+
+    (self.__jsonFileObj, self.__backupJSONPath) = _openReportFile(
+      self.__reportJSONPath, replaceReport, resumeOffset)
+
+
+
+  def emit(self, modelInfo):
+    """Emit model info as a single line to the report json file
+
+    Parameters:
+    ----------------------------------------------------------------------
+    modelInfo:      _NupicModelInfo instance
+    retval:         nothing
+    """
+    finished = modelInfo.isFinished()
+    record = dict(
+      jobID=self.__searchJobID,
+      modelID=modelInfo.getModelID(),
+      swarmID=modelInfo.getSwarmID(),
+      status=modelInfo.statusAsString(),
+      completionReason=(str(modelInfo.getCompletionReason())
+                        if finished else None),
+      startTime=(None if modelInfo.isWaitingToStart()
+                 else modelInfo.getStartTime()),
+      endTime=modelInfo.getEndTime() if finished else None,
+      expDesc=modelInfo.getModelDescription(),
+      numRecords=modelInfo.getNumRecords(),
+      params=modelInfo.getParamLabels(),
+      metrics=modelInfo.getReportMetrics())
+    print >> self.__jsonFileObj, json.dumps(record, sort_keys=True)
+
+
+
+  def getOffset(self):
+    """
+    Parameters:
+    ----------------------------------------------------------------------
+    retval:         size of the report json written so far, in bytes
+    """
+    self.__jsonFileObj.flush()
+    return self.__jsonFileObj.tell()
+
+
+
+  def finalize(self, summary):
+    """Close the report json file, write the summary json file and print
+    their paths
+
+    Parameters:
+    ----------------------------------------------------------------------
+    summary:        dict of report aggregates, see _ReportState.getSummary()
+    retval:         nothing
+    """
+    self.__jsonFileObj.close()
+
+    with open(self.__summaryJSONPath, "w") as summaryFile:
+      json.dump(summary, summaryFile, sort_keys=True, indent=2)
+
+    print "Report json saved in %s" % (self.__reportJSONPath,)
+    print "Report summary json saved in %s" % (self.__summaryJSONPath,)
+    if self.__backupJSONPath:
+      print "Previous report json file was backed up to %s" % \
+              (self.__backupJSONPath,)
+
+
+
 class _NupicJob(object):
   """ @private
   Our Nupic Job abstraction"""
@@ -1810,6 +2267,12 @@ class _ClientJobUtils(object):
               "maxModels":          maxModels,
              }
 
+    if options["earlyStopping"] is not None:
+      params["earlyStopping"] = options["earlyStopping"]
+
+    if options["particleProposal"] is not None:
+      params["particleProposal"] = options["particleProposal"]
+
     if forRunning:
       params["persistentJobGUID"] = str(uuid.uuid1())
 
@@ -2038,6 +2501,31 @@ def _iterModels(modelIDs):
 
 
 
+def _iterJobModels(jobID, afterModelID=None):
+  """Creates an iterator that returns ModelInfo elements for all the models of
+  a job, in model ID order. The models are read a page at a time, so memory
+  use doesn't grow with the number of models.
+
+  Parameters:
+  ----------------------------------------------------------------------
+  jobID:          jobID of the models
+  afterModelID:   if not None, start after the model with this ID
+  retval:         Iterator that returns ModelInfo elements
+  """
+  pageSize = 1000
+  while True:
+    infoList = _clientJobsDB().modelsInfoForJob(jobID,
+                                                afterModelID=afterModelID,
+                                                maxRows=pageSize)
+    for rawInfo in infoList:
+      yield _NupicModelInfo(rawInfo=rawInfo)
+
+    if len(infoList) < pageSize:
+      return
+    afterModelID = infoList[-1].modelId
+
+
+
 class _NupicModelInfo(object):
   """ @private
   This class represents information obtained from ClientJobManager about a
@@ -2130,6 +2618,20 @@ class _NupicModelInfo(object):
 
 
 
+  def getSwarmID(self):
+    """
+    Parameters:
+    ----------------------------------------------------------------------
+    retval:         ID of the swarm of the model, or None if it wasn't
+                    created by Hypersearch v2
+    """
+    params = self.__unwrapParams()
+    if "particleState" in params:
+      return params["particleState"]["swarmId"]
+    return None
+
+
+
   def getGeneratedDescriptionFile(self):
     """
     Parameters:
@@ -148,6 +148,62 @@ class TemporalMemoryMonitorMixinTest(unittest.TestCase):
     self.assertTrue(sequencesPredictedActiveCellsSharedMetric.mean > 1)
 
 
+  def testStreaming(self):
+    sequence = self._generateSequence()
+    self._feedSequence(sequence, "Test1")
+    self._feedSequence(sequence, "Test2")
+    traces = self.tm.mmGetDefaultTraces(verbosity=2)
+    metrics = self.tm.mmGetDefaultMetrics()
+
+    self.setUp()
+    self.tm.mmEnableStreaming(historyLength=len(sequence) * 2)
+    self.assertTrue(self.tm.mmIsStreaming())
+    self._feedSequence(sequence, "Test1")
+    self._feedSequence(sequence, "Test2")
+
+    for expected, actual in zip(traces,
+                                self.tm.mmGetDefaultTraces(verbosity=2)):
+      self.assertEqual(actual.title, expected.title)
+      self.assertEqual(list(actual.data), list(expected.data))
+    for expected, actual in zip(metrics, self.tm.mmGetDefaultMetrics()):
+      self.assertEqual(actual.title, expected.title)
+      for expectedStat, actualStat in zip(expected.getStats(),
+                                          actual.getStats()):
+        self.assertAlmostEqual(actualStat, expectedStat)
+
+    # Only the end of the history is kept, but metrics cover all of it
+    self._feedSequence(sequence, "Test3")
+    recorded = (len(sequence) - 3) * 3
+    self.assertEqual(len(self.tm.mmGetTraceActiveColumns().data),
+                     len(sequence) * 2)
+    self.assertEqual(len(self.tm.mmGetTracePredictedActiveCells().data),
+                     len(sequence) * 2)
+    # 5 active columns per iteration, 3 resets per sequence fed
+    self.assertEqual(self.tm.mmGetDefaultMetrics()[0].sum, 5 * (recorded - 9))
+
+    self.tm.mmDisableStreaming()
+    self.assertFalse(self.tm.mmIsStreaming())
+    self.assertEqual(len(self.tm.mmGetTraceActiveColumns().data), 0)
+
+
+  def testStreamingSampling(self):
+    self.tm.mmEnableStreaming(historyLength=100, sampleInterval=3)
+    sequence = self._generateSequence()
+    self._feedSequence(sequence, "Test")
+
+    numIterations = len(sequence) - 3
+    activeColumnsTrace = self.tm.mmGetTraceActiveColumns()
+    self.assertEqual(len(activeColumnsTrace.data), (numIterations + 2) // 3)
+    self.assertEqual(list(activeColumnsTrace.data),
+                     [pattern for pattern in sequence if pattern is not None]
+                     [::3])
+    self.assertEqual(len(self.tm.mmGetTraceResets().data),
+                     len(activeColumnsTrace.data))
+
+    with self.assertRaises(ValueError):
+      self.tm.mmEnableStreaming(sampleInterval=0)
+
+
   # ==============================
   # Helper functions
   # ==============================
@@ -273,5 +273,60 @@ class ConnectionsTest(unittest.TestCase):
     self.assertEqual(c1, c2)
 
 
+  def testArraysRoundTrip(self):
+    c1 = Connections(1024)
+
+    s1 = c1.createSegment(0)
+    c1.createSynapse(s1, 254, 0.1173)
+    s2 = c1.createSegment(100)
+    c1.createSynapse(s2, 20, 0.3)
+    c1.createSynapse(s1, 40, 0.3)
+    s3 = c1.createSegment(0)
+    c1.createSynapse(s3, 0, 0.5)
+    synapse = c1.createSynapse(s3, 1, 0.5)
+    c1.destroySynapse(synapse)
+    s4 = c1.createSegment(10)
+    c1.createSynapse(s4, 0, 0.5)
+    c1.destroySegment(s1)
+
+    self.assertEqual(c1.idxOnCellForFlatIdx(), [-1, 0, 0, 0])
+
+    arrays = c1.toArrays()
+    self.assertEqual(arrays["segmentCells"].tolist(), [0, 10, 100])
+    self.assertEqual(arrays["numSynapsesForSegment"].tolist(), [1, 1, 1])
+    self.assertEqual(arrays["presynapticCells"].tolist(), [0, 0, 20])
+
+    c2 = Connections.fromArrays(1024, **arrays)
+    self.assertEqual(c1, c2)
+    self.assertEqual(c2.numSegments(), 3)
+    self.assertEqual(c2.numSynapses(), 3)
+    self.assertEqual(c2.segmentFlatListLength(), 3)
+    self.assertEqual(c2.getSegment(10, 0).flatIdx, 1)
+
+    # The restored instance keeps working
+    s5 = c2.createSegment(0)
+    c2.createSynapse(s5, 7, 0.2)
+    self.assertEqual(len(c2.segmentsForCell(0)), 2)
+    self.assertEqual(c2.numSynapses(), 4)
+
+
+  def testMemoryUsage(self):
+    connections = Connections(1024)
+    empty = connections.getMemoryUsage()
+    self.assertEqual(empty["synapses"], 0)
+
+    for cell in xrange(10):
+      segment = connections.createSegment(cell)
+      for presynapticCell in xrange(20):
+        connections.createSynapse(segment, presynapticCell, 0.5)
+
+    usage = connections.getMemoryUsage()
+    self.assertEqual(sorted(usage),
+                     ["cells", "presynapticIndex", "segments", "synapses"])
+    for component in usage:
+      self.assertGreater(usage[component], empty[component])
+    self.assertEqual(usage["synapses"] % 200, 0)
+
+
 if __name__ == '__main__':
   unittest.main()
@@ -506,6 +506,21 @@ class KNNClassifierTest(unittest.TestCase):
     self.assertEquals(cat, 1)
 
 
+  def testMemoryUsage(self):
+    knn = KNNClassifier(distanceMethod="norm", useSparseMemory=True)
+    empty = knn.getMemoryUsage()
+
+    a = np.array([1, 3, 7, 11, 13, 17, 19, 23, 29], dtype=np.int32)
+    b = np.array([2, 4, 8, 12, 14, 18, 20, 28, 30], dtype=np.int32)
+    knn.learn(a, 0, isSparse=40)
+    knn.learn(b, 1, isSparse=40)
+
+    usage = knn.getMemoryUsage()
+    self.assertEqual(sorted(usage), ["categories", "other", "patterns", "svd"])
+    self.assertGreater(usage["patterns"], empty["patterns"])
+    self.assertGreater(usage["categories"], empty["categories"])
+
+
   @unittest.skipUnless(
       capnp, "pycapnp is not installed, skipping serialization test.")
   def testWriteRead(self):
@@ -20,7 +20,7 @@
 # ----------------------------------------------------------------------
 
 import unittest
-from nupic.algorithms.monitor_mixin.metric import Metric
+from nupic.algorithms.monitor_mixin.metric import Metric, MetricAccumulator
 
 from nupic.algorithms.monitor_mixin.trace import CountsTrace, BoolsTrace
 
@@ -57,5 +57,18 @@ class MetricTest(unittest.TestCase):
 
 
 
+  def testAccumulator(self):
+    accumulator = MetricAccumulator(self, "# active cells")
+    self.assertEqual(accumulator.getMetric().getStats(), [None] * 5)
+
+    for value in self.trace.data:
+      accumulator.add(value)
+    metric = accumulator.getMetric()
+    self.assertEqual(metric.title, self.trace.title)
+    self.assertEqual(metric.getStats(),
+                     Metric.createFromTrace(self.trace).getStats())
+
+
+
 if __name__ == '__main__':
   unittest.main()
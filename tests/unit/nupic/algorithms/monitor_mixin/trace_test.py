@@ -21,7 +21,8 @@
 
 import unittest
 
-from nupic.algorithms.monitor_mixin.trace import IndicesTrace
+from nupic.algorithms.monitor_mixin.trace import (IndicesTrace,
+                                                  PackedIndicesTrace)
 
 
 
@@ -49,5 +50,41 @@ class IndicesTraceTest(unittest.TestCase):
 
 
 
+  def testMaxLength(self):
+    trace = IndicesTrace(self, "active cells", maxLength=2)
+    for indices in self.trace.data:
+      trace.data.append(indices)
+    self.assertEqual(list(trace.data), [set([6]), set([])])
+    self.assertEqual(trace.makeCountsTrace().data, [1, 0])
+
+
+
+class PackedIndicesTraceTest(unittest.TestCase):
+
+
+  def testPackedEntries(self):
+    trace = PackedIndicesTrace(self, "active cells", numIndices=100)
+    entries = [set([1, 2, 3]), set(range(0, 100, 2)), set(), set([99])]
+    for indices in entries:
+      trace.data.append(indices)
+
+    self.assertEqual(len(trace.data), 4)
+    self.assertEqual(list(trace.data), entries)
+    self.assertEqual(trace.data[1], entries[1])
+    self.assertEqual(trace.data[-1], set([99]))
+    self.assertEqual(trace.makeCountsTrace().data, [3, 50, 0, 1])
+    self.assertEqual(trace.makeCountsTrace().title, "# active cells")
+
+
+  def testMaxLength(self):
+    trace = PackedIndicesTrace(self, "active cells", numIndices=10,
+                               maxLength=2)
+    for i in xrange(5):
+      trace.data.append(set([i, i + 1]))
+    self.assertEqual(list(trace.data), [set([3, 4]), set([4, 5])])
+    self.assertEqual(trace.makeCountsTrace().data, [2, 2])
+
+
+
 if __name__ == '__main__':
   unittest.main()
@@ -323,6 +323,21 @@ class SDRClassifierTest(unittest.TestCase):
     self.assertGreater(retval[1][2], retval[1][9])
 
 
+  def testMemoryUsage(self):
+    classifier = self._classifier(steps=[1, 2])
+    for recordNum in xrange(5):
+      self._compute(classifier, recordNum=recordNum, pattern=[1, 5, 9],
+                    bucket=recordNum, value=recordNum)
+
+    usage = classifier.getMemoryUsage()
+    self.assertEqual(sorted(usage), ["actualValues", "other",
+                                     "patternHistory", "weightMatrices"])
+    self.assertEqual(usage["weightMatrices"],
+                     sum(matrix.nbytes
+                         for matrix in classifier._weightMatrix.values()))
+    self.assertGreater(usage["patternHistory"], 0)
+
+
   def testMultistepSingleValue(self):
     classifier = self._classifier(steps=[1, 2])
 
@@ -1543,6 +1543,16 @@ class SpatialPoolerTest(unittest.TestCase):
     self.assertEqual(sp._permanences, initialPerms)
 
 
+  def testMemoryUsage(self):
+    sp = SpatialPooler(inputDimensions=[100], columnDimensions=[200])
+    usage = sp.getMemoryUsage()
+    self.assertEqual(usage["permanences"], sp._permanences.nBytes())
+    self.assertEqual(usage["boostFactors"], 200 * sp._boostFactors.itemsize)
+    self.assertEqual(usage["dutyCycles"],
+                     3 * 200 * sp._activeDutyCycles.itemsize)
+    self.assertGreater(usage["other"], 0)
+
+
   @unittest.skip("Ported from the removed FlatSpatialPooler but fails. \
                   See: https://github.com/numenta/nupic/issues/1897")
   def testActiveColumnsEqualNumActive(self):
@@ -0,0 +1,86 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+import unittest
+
+import numpy as np
+
+from nupic.data.generators.high_order_sequence_generator import (
+  HighOrderSequenceGenerator)
+
+
+
+class HighOrderSequenceGeneratorTest(unittest.TestCase):
+
+
+  def testSequences(self):
+    generator = HighOrderSequenceGenerator(alphabetSize=50, numSequences=7,
+                                           sequenceLength=6, branching=3)
+    self.assertEqual(len(generator.sequences), 7)
+    for group in (generator.sequences[0:3], generator.sequences[3:6]):
+      # The branches only differ by their first and last elements
+      self.assertEqual(len(set(tuple(s[1:-1]) for s in group)), 1)
+      self.assertEqual(len(set(s[0] for s in group)), 3)
+      self.assertEqual(len(set(s[-1] for s in group)), 3)
+
+    pattern = generator.getPattern(3)
+    self.assertEqual(len(set(pattern)), 40)
+    self.assertTrue(np.all(np.diff(pattern) > 0))
+    self.assertTrue(pattern.max() < 2048)
+
+    with self.assertRaises(ValueError):
+      HighOrderSequenceGenerator(alphabetSize=5, branching=3)
+
+
+  def testGenerate(self):
+    generator = HighOrderSequenceGenerator(alphabetSize=50, numSequences=4,
+                                           sequenceLength=5)
+    stream = list(generator.generate(103))
+    self.assertEqual(len(stream), 103)
+    symbols = [symbol for symbol, _, _ in stream]
+    self.assertEqual(symbols,
+                     [symbol for symbol, _, _ in generator.generate(103)])
+    self.assertNotEqual(symbols, [symbol for symbol, _, _ in
+                                  generator.generate(103, seed=1)])
+
+    # Without noise, the stream is made of whole sequences
+    for start in xrange(0, 100, 5):
+      symbols = [symbol for symbol, _, _ in stream[start:start + 5]]
+      self.assertIn(symbols, generator.sequences)
+      self.assertEqual([reset for _, _, reset in stream[start:start + 5]],
+                       [True, False, False, False, False])
+    for symbol, pattern, _ in stream:
+      self.assertTrue(np.array_equal(pattern, generator.getPattern(symbol)))
+
+
+  def testNoise(self):
+    generator = HighOrderSequenceGenerator(alphabetSize=1000, numSequences=1,
+                                           sequenceLength=10, noise=0.2)
+    sequence = generator.sequences[0]
+    stream = list(generator.generate(5000))
+    numNoisy = sum(symbol != sequence[i % 10]
+                   for i, (symbol, _, _) in enumerate(stream))
+    self.assertTrue(900 < numNoisy < 1100)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,157 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for ModelUpdateBuffer and ClientJobsDAO.modelsUpdateResults."""
+
+import shutil
+import tempfile
+
+import unittest2 as unittest
+
+from nupic.database.client_jobs_dao import (ClientJobsDAO,
+                                            InvalidConnectionException)
+from nupic.database.connection import ConnectionFactory
+from nupic.database.model_update_buffer import ModelUpdateBuffer
+from nupic.support.configuration import Configuration
+
+
+
+class _RecordingDAO(object):
+  """ Records the modelsUpdateResults() calls. """
+
+  def __init__(self):
+    self.calls = []
+
+
+  def modelsUpdateResults(self, updates):
+    self.calls.append(updates)
+
+
+
+class ModelUpdateBufferTest(unittest.TestCase):
+  """ModelUpdateBuffer unit tests."""
+
+
+  def setUp(self):
+    self.databaseDir = tempfile.mkdtemp()
+    Configuration.set("nupic.cluster.database.backend", "sqlite")
+    Configuration.set("nupic.cluster.database.sqliteDir", self.databaseDir)
+    ConnectionFactory.close()
+    ClientJobsDAO._instance = None
+
+    self.dao = ClientJobsDAO.get()
+    self.dao.connect(recreate=True)
+    self.jobID = self.dao.jobInsert(client="test", cmdLine="echo",
+                                    clientInfo="info", clientKey="key",
+                                    params="{}")
+
+
+  def tearDown(self):
+    ConnectionFactory.close()
+    ClientJobsDAO._instance = None
+    Configuration.clear()
+    shutil.rmtree(self.databaseDir)
+
+
+  def _getUpdateInfo(self, modelID):
+    return self.dao.modelsGetFields(
+      modelID, ["results", "optimizedMetric", "numRecords", "updateCounter"])
+
+
+  def testModelsUpdateResults(self):
+    modelIDs = [self.dao.modelInsertAndStart(self.jobID, "{}", "hash%d" % i)[0]
+                for i in xrange(3)]
+    self.dao.modelUpdateResults(modelIDs[2], results="old", metricValue=1.0,
+                                numRecords=5)
+
+    self.dao.modelsUpdateResults([
+      (modelIDs[0], "r0", 0.5, 10),
+      (modelIDs[1], None, float("nan"), 20),
+      (modelIDs[2], None, None, None)])
+    self.assertEqual(self._getUpdateInfo(modelIDs[0]), ["r0", 0.5, 10, 1])
+    self.assertEqual(self._getUpdateInfo(modelIDs[1]), [None, None, 20, 1])
+    self.assertEqual(self._getUpdateInfo(modelIDs[2]), ["old", 1.0, 5, 2])
+
+    # Models of other workers are not updated
+    self.dao.modelSetFields(modelIDs[1], {"engWorkerConnId": 0})
+    with self.assertRaises(InvalidConnectionException):
+      self.dao.modelsUpdateResults([(modelIDs[0], "r1", None, None),
+                                    (modelIDs[1], "r1", None, None)])
+    self.assertEqual(self._getUpdateInfo(modelIDs[0])[0], "r1")
+    self.assertEqual(self._getUpdateInfo(modelIDs[1])[0], None)
+
+
+  def testCoalescesUpdates(self):
+    dao = _RecordingDAO()
+    modelUpdates = ModelUpdateBuffer(dao, flushIntervalSecs=3600)
+    modelUpdates.updateResults(1, results="a", metricValue=1.0, numRecords=10)
+    modelUpdates.updateTimestamp(2)
+    modelUpdates.updateResults(1, metricValue=float("nan"), numRecords=20)
+    modelUpdates.updateResults(1, results="b")
+    self.assertEqual(dao.calls, [])
+    self.assertTrue(modelUpdates.hasPendingUpdates())
+
+    modelUpdates.flush()
+    self.assertEqual(dao.calls, [[(1, "b", 1.0, 20), (2, None, None, None)]])
+    self.assertFalse(modelUpdates.hasPendingUpdates())
+    modelUpdates.flush()
+    self.assertEqual(len(dao.calls), 1)
+
+
+  def testFlushesWhenDue(self):
+    dao = _RecordingDAO()
+    modelUpdates = ModelUpdateBuffer(dao, flushIntervalSecs=0)
+    modelUpdates.updateTimestamp(1)
+    modelUpdates.updateTimestamp(1)
+    self.assertEqual(len(dao.calls), 2)
+
+    modelUpdates = ModelUpdateBuffer(dao, flushIntervalSecs=3600)
+    modelUpdates.updateTimestamp(1)
+    modelUpdates._lastFlushTime -= modelUpdates.getMaxDelaySecs()
+    modelUpdates.updateTimestamp(1)
+    self.assertEqual(len(dao.calls), 3)
+
+
+  def testDelayLeavesRoomForOrphanDetection(self):
+    modelUpdates = ModelUpdateBuffer(_RecordingDAO(), flushIntervalSecs=3600,
+                                     orphanIntervalSecs=60)
+    self.assertEqual(modelUpdates.getMaxDelaySecs(), 15)
+
+    Configuration.set("nupic.hypersearch.modelUpdateFlushSecs", "5")
+    self.assertEqual(ModelUpdateBuffer(_RecordingDAO()).getMaxDelaySecs(), 5)
+
+
+  def testWritesThroughToDatabase(self):
+    modelID = self.dao.modelInsertAndStart(self.jobID, "{}", "hash")[0]
+    modelUpdates = ModelUpdateBuffer(self.dao, flushIntervalSecs=3600)
+    for numRecords in xrange(1, 101):
+      modelUpdates.updateResults(modelID, results="r%d" % numRecords,
+                                 metricValue=1.0 / numRecords,
+                                 numRecords=numRecords)
+    self.assertEqual(self._getUpdateInfo(modelID), [None, None, 0, 0])
+
+    modelUpdates.flush()
+    self.assertEqual(self._getUpdateInfo(modelID), ["r100", 0.01, 100, 1])
+
+
+
+if __name__ == "__main__":
+  unittest.main()
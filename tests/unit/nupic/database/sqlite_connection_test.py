@@ -0,0 +1,289 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for the SQLite backend of ClientJobsDAO."""
+
+import multiprocessing
+import shutil
+import tempfile
+import time
+
+import pymysql
+import unittest2 as unittest
+
+from nupic.database.client_jobs_dao import ClientJobsDAO
+from nupic.database.connection import ConnectionFactory
+from nupic.database.sqlite_connection import SQLiteConnectionPolicy
+from nupic.support.configuration import Configuration
+
+
+
+def _connectWorker():
+  """ Give each worker process its own DAO connection id. """
+  ClientJobsDAO._instance = None
+  ClientJobsDAO.get().connect()
+
+
+
+def _insertModel(args):
+  """ Insert a model from a worker process; returns wasInserted. """
+  jobID, params, paramsHash = args
+  return ClientJobsDAO.get().modelInsertAndStart(jobID, params, paramsHash)[1]
+
+
+
+class SQLiteClientJobsDAOTest(unittest.TestCase):
+  """ClientJobsDAO unit tests against the SQLite backend."""
+
+
+  def setUp(self):
+    self.databaseDir = tempfile.mkdtemp()
+    Configuration.set("nupic.cluster.database.backend", "sqlite")
+    Configuration.set("nupic.cluster.database.sqliteDir", self.databaseDir)
+    ConnectionFactory.close()
+    ClientJobsDAO._instance = None
+
+    self.dao = ClientJobsDAO.get()
+    self.dao.connect(recreate=True)
+
+
+  def tearDown(self):
+    ConnectionFactory.close()
+    ClientJobsDAO._instance = None
+    Configuration.clear()
+    shutil.rmtree(self.databaseDir)
+
+
+  def _insertJob(self, **kwargs):
+    jobArgs = dict(client="test", cmdLine="echo", clientInfo="info",
+                   clientKey="key", params="{}", minimumWorkers=1,
+                   maximumWorkers=2)
+    jobArgs.update(kwargs)
+    return self.dao.jobInsert(**jobArgs)
+
+
+  def testUsesSQLitePolicy(self):
+    with ConnectionFactory.get() as conn:
+      conn.cursor.execute("SELECT CONNECTION_ID()")
+      self.assertEqual(conn.cursor.fetchall()[0][0], self.dao._connectionID)
+    self.assertIsInstance(ConnectionFactory._connectionPolicy,
+                          SQLiteConnectionPolicy)
+
+
+  def testJobLifecycle(self):
+    jobID = self._insertJob()
+    self.assertGreaterEqual(jobID, 1000)
+
+    jobInfo = self.dao.jobInfo(jobID)
+    self.assertEqual(jobInfo.status, ClientJobsDAO.STATUS_NOTSTARTED)
+    self.assertEqual(jobInfo.clientKey, "key")
+    self.assertEqual(jobInfo.workerCompletionReason,
+                     ClientJobsDAO.CMPL_REASON_SUCCESS)
+    self.assertFalse(jobInfo.cancel)
+
+    self.assertEqual(self.dao.jobStartNext(), jobID)
+    self.assertIsNone(self.dao.jobStartNext())
+    status, startTime = self.dao.jobGetFields(jobID, ["status", "startTime"])
+    self.assertEqual(status, ClientJobsDAO.STATUS_RUNNING)
+    self.assertIsNotNone(startTime)
+
+    self.dao.jobSetFields(jobID, {"results": "{\"best\": 1}"})
+    self.assertEqual(self.dao.jobGetFields(jobID, ["results"]),
+                     ["{\"best\": 1}"])
+    self.assertTrue(self.dao.jobSetFieldIfEqual(
+      jobID, "engWorkerState", "state1", None))
+    self.assertFalse(self.dao.jobSetFieldIfEqual(
+      jobID, "engWorkerState", "state2", None))
+    self.dao.jobIncrementIntField(jobID, "numFailedWorkers", 2)
+    self.assertEqual(self.dao.jobGetFields(jobID, ["numFailedWorkers"]), [2])
+
+    self.dao.jobCancel(jobID)
+    self.assertEqual(self.dao.jobGetCancellingJobs(), (jobID,))
+
+    self.dao.jobSetCompleted(jobID, ClientJobsDAO.CMPL_REASON_SUCCESS, "done")
+    self.assertEqual(self.dao.jobsGetFields([jobID], ["status"]),
+                     [(jobID, [ClientJobsDAO.STATUS_COMPLETED])])
+
+
+  def testJobInsertUnique(self):
+    jobHash = "\x00\xff" + "h" * 14
+    jobID = self.dao.jobInsertUnique(client="test", cmdLine="echo",
+                                     jobHash=jobHash)
+    self.assertEqual(self.dao.jobInsertUnique(client="test", cmdLine="echo",
+                                              jobHash=jobHash), jobID)
+    self.assertNotEqual(self.dao.jobInsertUnique(client="other", cmdLine="echo",
+                                                 jobHash=jobHash), jobID)
+    self.assertEqual(self.dao.jobInfo(jobID).jobHash, jobHash)
+
+
+  def testModelLifecycle(self):
+    jobID = self._insertJob()
+    paramsHash = "params\x00\xfe"
+
+    modelID, inserted = self.dao.modelInsertAndStart(jobID, "{}", paramsHash)
+    self.assertTrue(inserted)
+    # A duplicate params hash returns the existing model
+    self.assertEqual(self.dao.modelInsertAndStart(jobID, "{}", paramsHash),
+                     (modelID, False))
+    self.assertEqual(self.dao.modelsGetFieldsForJob(jobID, ["params"]),
+                     [(modelID, ["{}"])])
+
+    self.dao.modelUpdateResults(modelID, results="{}", metricValue=0.25,
+                                numRecords=10)
+    self.assertEqual(
+      self.dao.modelsGetFields(modelID, ["optimizedMetric", "numRecords"]),
+      [0.25, 10])
+
+    self.dao.modelSetCompleted(modelID, ClientJobsDAO.CMPL_REASON_EOF, "eof")
+    modelInfo = self.dao.modelsInfo([modelID])[0]
+    self.assertEqual(modelInfo.status, ClientJobsDAO.STATUS_COMPLETED)
+    self.assertEqual(modelInfo.engParamsHash, paramsHash.ljust(16, "\0"))
+    self.assertIsNotNone(modelInfo.endTime)
+
+    jobInfo, models = self.dao.jobInfoWithModels(jobID)[0]
+    self.assertEqual(jobInfo.jobId, jobID)
+    self.assertEqual(models.modelId, modelID)
+
+
+  def testAdoptOrphanedModel(self):
+    jobID = self._insertJob()
+    modelID, _ = self.dao.modelInsertAndStart(jobID, "{}", "orphan")
+    self.assertIsNone(self.dao.modelAdoptNextOrphan(jobID, 5))
+
+    with ConnectionFactory.get() as conn:
+      conn.cursor.execute(
+        "UPDATE %s SET _eng_last_update_time=%%s, _eng_worker_conn_id=0 "
+        "WHERE model_id=%%s" % self.dao.modelsTableName,
+        ("2017-01-01 00:00:00", modelID))
+
+    self.assertEqual(self.dao.modelAdoptNextOrphan(jobID, 5), modelID)
+    self.assertEqual(
+      self.dao.modelsGetFields(modelID, ["engWorkerConnId"]),
+      [self.dao._connectionID])
+    self.assertIsNone(self.dao.modelAdoptNextOrphan(jobID, 5))
+
+
+  def testConcurrentInsertsFromProcesses(self):
+    jobID = self._insertJob()
+    pool = multiprocessing.Pool(4, initializer=_connectWorker)
+    try:
+      inserted = pool.map(_insertModel,
+                          [(jobID, "{}", "hash%d" % (i % 5)) for i in xrange(20)])
+    finally:
+      pool.close()
+      pool.join()
+
+    self.assertEqual(inserted.count(True), 5)
+    self.assertEqual(len(self.dao.modelsGetFieldsForJob(jobID, ["params"])), 5)
+
+
+  def testErrorsMapToPymysql(self):
+    with ConnectionFactory.get() as conn:
+      with self.assertRaises(pymysql.ProgrammingError):
+        conn.cursor.execute("SELECT * FROM %s.no_such_table" % self.dao.dbName)
+
+    # A write lock held by another connection surfaces as a retriable lock
+    # wait timeout
+    policy = SQLiteConnectionPolicy(self.databaseDir, busyTimeout=0.1)
+    with policy.acquireConnection() as otherConn:
+      with ConnectionFactory.get() as conn:
+        conn.cursor.execute("BEGIN IMMEDIATE")
+        try:
+          start = time.time()
+          with self.assertRaises(pymysql.OperationalError) as cm:
+            otherConn.cursor.execute(
+              "DELETE FROM %s" % self.dao.modelsTableName)
+          self.assertEqual(cm.exception.args[0],
+                           pymysql.constants.ER.LOCK_WAIT_TIMEOUT)
+          self.assertLess(time.time() - start, 5)
+        finally:
+          conn.cursor.execute("ROLLBACK")
+    policy.close()
+
+
+  def testBulkModelQueries(self):
+    jobID = self._insertJob()
+    modelIDs = [self.dao.modelInsertAndStart(jobID, "{}", "hash%d" % i)[0]
+                for i in xrange(7)]
+
+    self.dao._MAX_IN_LIST_LEN = 3
+    ConnectionFactory.resetMetrics()
+    rows = self.dao.modelsGetParams(modelIDs)
+    self.assertEqual(sorted(row.modelId for row in rows), modelIDs)
+    # One statement per chunk of 3 model IDs, on a single connection
+    metrics = ConnectionFactory.getMetrics()
+    self.assertEqual(metrics["query"]["count"], 3)
+    self.assertEqual(metrics["poolWait"]["count"], 1)
+
+    # The chunks share the LIMIT
+    rows = self.dao._getMatchingRowsWithRetries(
+      self.dao._models, dict(model_id=modelIDs), ["model_id"], maxRows=4)
+    self.assertEqual(len(rows), 4)
+
+    numQueries = len(self.dao._matchingRowsQueries)
+    self.dao.modelsGetParams(modelIDs[:2])
+    self.assertEqual(len(self.dao._matchingRowsQueries), numQueries)
+
+
+  def testExecutemany(self):
+    jobID = self._insertJob()
+    modelIDs = [self.dao.modelInsertAndStart(jobID, "{}", "hash%d" % i)[0]
+                for i in xrange(4)]
+
+    with ConnectionFactory.get() as conn:
+      numRows = conn.cursor.executemany(
+        "UPDATE %s SET num_records=%%s WHERE model_id=%%s" %
+        self.dao.modelsTableName,
+        [(10 * i, modelID) for i, modelID in enumerate(modelIDs)])
+    self.assertEqual(numRows, 4)
+
+    # Sequence parameters are expanded statement by statement
+    with ConnectionFactory.get() as conn:
+      numRows = conn.cursor.executemany(
+        "UPDATE %s SET num_records=num_records+1 WHERE model_id IN %%s" %
+        self.dao.modelsTableName, [(modelIDs[:2],), (modelIDs[1:],)])
+    self.assertEqual(numRows, 5)
+
+    self.assertEqual(
+      sorted(self.dao.modelsGetFields(modelIDs, ["numRecords"])),
+      [(modelIDs[0], [1]), (modelIDs[1], [12]), (modelIDs[2], [21]),
+       (modelIDs[3], [31])])
+
+
+  def testPoolSize(self):
+    Configuration.set("nupic.cluster.database.poolSize", "1")
+    policy = SQLiteConnectionPolicy(self.databaseDir)
+    conns = [policy.acquireConnection() for _ in xrange(3)]
+    for conn in conns:
+      conn.release()
+    self.assertEqual(len(policy._idle), 1)
+    policy.close()
+
+    ConnectionFactory.resetMetrics()
+    with ConnectionFactory.get():
+      with ConnectionFactory.get():
+        pass
+    self.assertEqual(ConnectionFactory.getMetrics()["peakConnections"], 2)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,190 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for the delta_checkpoint module."""
+
+import math
+import os
+import random
+import shutil
+import tempfile
+
+import unittest2 as unittest
+
+from nupic.frameworks.opf.delta_checkpoint import (DeltaCheckpoint,
+                                                   _chunkBoundaries)
+from nupic.frameworks.opf.model import Model
+from nupic.frameworks.opf.model_factory import ModelFactory
+from tests.unit.nupic.swarming.model_fork_test import MODEL_DESCRIPTION
+
+
+
+def _randomBytes(rng, numBytes):
+  return "".join(chr(rng.randint(0, 255)) for _ in xrange(numBytes))
+
+
+
+def _chunks(data):
+  chunks = set()
+  start = 0
+  for end in _chunkBoundaries(data):
+    chunks.add(data[start:end])
+    start = end
+  return chunks
+
+
+
+def _writeFiles(files):
+  def writeState(stateDir):
+    for relPath, data in files.iteritems():
+      path = os.path.join(stateDir, relPath)
+      if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+      with open(path, "wb") as f:
+        f.write(data)
+  return writeState
+
+
+
+def _readFiles(stateDir):
+  files = dict()
+  for dirPath, _, fileNames in os.walk(stateDir):
+    for fileName in fileNames:
+      path = os.path.join(dirPath, fileName)
+      with open(path, "rb") as f:
+        files[os.path.relpath(path, stateDir)] = f.read()
+  return files
+
+
+
+class DeltaCheckpointTest(unittest.TestCase):
+  """DeltaCheckpoint unit tests."""
+
+
+  def setUp(self):
+    self.checkpointDir = os.path.join(tempfile.mkdtemp(), "checkpoint")
+    self.rng = random.Random(42)
+
+
+  def tearDown(self):
+    shutil.rmtree(os.path.dirname(self.checkpointDir))
+
+
+  def testChunksSurviveInsertions(self):
+    data = _randomBytes(self.rng, 300000)
+    boundaries = _chunkBoundaries(data)
+    self.assertEqual(boundaries[-1], len(data))
+    sizes = [end - start for start, end in zip([0] + boundaries, boundaries)]
+    self.assertLessEqual(max(sizes), 65536)
+    self.assertGreaterEqual(min(sizes[:-1]), 2048)
+
+    edited = data[:100000] + "inserted" + data[100000:]
+    self.assertLessEqual(len(_chunks(edited) - _chunks(data)), 2)
+
+    self.assertEqual(_chunkBoundaries(""), [0])
+    self.assertEqual(_chunkBoundaries("abc"), [3])
+
+
+  def testWritesOnlyChangedChunks(self):
+    files = {"model.pkl": _randomBytes(self.rng, 200000),
+             "extra/network.bin": _randomBytes(self.rng, 100000),
+             "empty": ""}
+    checkpoint = DeltaCheckpoint(self.checkpointDir, maxDeltas=2,
+                                 maxDeltaRatio=0.5)
+    baseBytes = checkpoint.write(_writeFiles(files), metadata={"a": 1})
+    self.assertEqual(baseBytes, 300000)
+
+    files["model.pkl"] = (files["model.pkl"][:50000] + "changed" +
+                          files["model.pkl"][50007:])
+    self.assertLess(checkpoint.write(_writeFiles(files)), 0.1 * baseBytes)
+    self.assertEqual(checkpoint.getNumDeltas(), 1)
+    self.assertEqual(checkpoint.read(_readFiles), files)
+
+    files["extra/network.bin"] = files["extra/network.bin"][:-5]
+    checkpoint.write(_writeFiles(files))
+    self.assertEqual(checkpoint.getNumDeltas(), 2)
+    self.assertEqual(checkpoint.read(_readFiles), files)
+    self.assertEqual(checkpoint.getMetadata(), {})
+
+    # The third delta is written as a new base, and the old packs go away
+    self.assertGreater(checkpoint.write(_writeFiles(files)), 0.9 * baseBytes)
+    self.assertEqual(checkpoint.getNumDeltas(), 0)
+    self.assertEqual(len([fileName
+                          for fileName in os.listdir(self.checkpointDir)
+                          if fileName.endswith(".chunks")]), 1)
+    self.assertEqual(DeltaCheckpoint(self.checkpointDir).read(_readFiles),
+                     files)
+
+
+  def testLargeDeltasCompact(self):
+    checkpoint = DeltaCheckpoint(self.checkpointDir, maxDeltas=10,
+                                 maxDeltaRatio=0.5)
+    checkpoint.write(_writeFiles({"a": _randomBytes(self.rng, 50000)}))
+    checkpoint.write(_writeFiles({"a": _randomBytes(self.rng, 30000)}))
+    self.assertEqual(checkpoint.getNumDeltas(), 1)
+    checkpoint.write(_writeFiles({"a": _randomBytes(self.rng, 30000)}))
+    self.assertEqual(checkpoint.getNumDeltas(), 0)
+
+
+  def testFailedWriteKeepsPreviousState(self):
+    files = {"a": _randomBytes(self.rng, 10000)}
+    checkpoint = DeltaCheckpoint(self.checkpointDir, maxDeltas=2,
+                                 maxDeltaRatio=0.5)
+    checkpoint.write(_writeFiles(files))
+
+    def failingWriteState(stateDir):
+      _writeFiles({"a": "partial"})(stateDir)
+      raise IOError("disk full")
+
+    with self.assertRaises(IOError):
+      checkpoint.write(failingWriteState)
+    self.assertEqual(checkpoint.read(_readFiles), files)
+    self.assertEqual(sorted(os.listdir(self.checkpointDir)),
+                     ["delta_checkpoint.json", "pack-000001.chunks"])
+
+
+  def testModelRoundTrip(self):
+    model = ModelFactory.create(MODEL_DESCRIPTION)
+    model.enableInference({"predictedField": "value"})
+    records = [{"value": 5.0 + 4.0 * math.sin(i * 0.3)} for i in xrange(60)]
+
+    for record in records[:30]:
+      model.run(record)
+    baseBytes = model.writeToDeltaCheckpoint(self.checkpointDir,
+                                             newSerialization=False)
+    model.run(records[30])
+    self.assertLess(
+      model.writeToDeltaCheckpoint(self.checkpointDir, newSerialization=False),
+      baseBytes)
+
+    # The model restores as it would from a full checkpoint
+    savedModelDir = os.path.join(os.path.dirname(self.checkpointDir), "saved")
+    model.save(savedModelDir)
+    restored = Model.readFromDeltaCheckpoint(self.checkpointDir)
+    reference = Model.load(savedModelDir)
+    for record in records[31:]:
+      self.assertEqual(restored.run(record).inferences,
+                       reference.run(record).inferences)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -23,10 +23,59 @@
 
 import datetime
 import unittest2 as unittest
+from mock import patch
 
-from nupic.frameworks.opf.htm_prediction_model import HTMPredictionModel
+from nupic.engine import Region
+from nupic.frameworks.opf.htm_prediction_model import (HTMPredictionModel,
+                                                        RUN_STAGES)
 from nupic.frameworks.opf.model_factory import ModelFactory
-from nupic.frameworks.opf.opf_utils import ModelResult
+from nupic.frameworks.opf.opf_utils import InferenceElement, ModelResult
+from nupic.support.memory_usage import getTotal
+
+
+
+def _createMultiStepModel():
+  """Creates a small TemporalMultiStep model for the fast run tests."""
+  modelConfig = {
+    "model": "HTMPrediction",
+    "version": 1,
+    "predictAheadTime": None,
+    "modelParams": {
+      "inferenceType": "TemporalMultiStep",
+      "sensorParams": {
+        "verbosity": 0,
+        "sensorAutoReset": None,
+        "encoders": {
+          "value": {"fieldname": "value", "name": "value", "n": 50, "w": 21,
+                    "minval": 0, "maxval": 10, "clipInput": True,
+                    "type": "ScalarEncoder"},
+        },
+      },
+      "spEnable": True,
+      "spParams": {"spVerbosity": 0, "spatialImp": "py",
+                   "globalInhibition": 1, "columnCount": 128,
+                   "inputWidth": 0, "numActiveColumnsPerInhArea": 8,
+                   "seed": 1956, "potentialPct": 0.8,
+                   "synPermConnected": 0.1, "synPermActiveInc": 0.05,
+                   "synPermInactiveDec": 0.01, "boostStrength": 0.0},
+      "tmEnable": True,
+      "tmParams": {"verbosity": 0, "columnCount": 128, "cellsPerColumn": 4,
+                   "inputWidth": 128, "seed": 1960, "temporalImp": "py",
+                   "newSynapseCount": 6, "maxSynapsesPerSegment": 16,
+                   "maxSegmentsPerCell": 16, "initialPerm": 0.21,
+                   "permanenceInc": 0.1, "permanenceDec": 0.1,
+                   "globalDecay": 0.0, "maxAge": 0, "minThreshold": 3,
+                   "activationThreshold": 4, "outputType": "normal",
+                   "pamLength": 1},
+      "clEnable": True,
+      "clParams": {"regionName": "SDRClassifierRegion", "verbosity": 0,
+                   "alpha": 0.1, "steps": "1,2"},
+      "trainSPNetOnlyIfRequested": False,
+    },
+  }
+  model = ModelFactory.create(modelConfig)
+  model.enableInference({"predictedField": "value"})
+  return model
 
 
 
@@ -191,5 +240,101 @@ class HTMPredictionModelTest(unittest.TestCase):
       self.assertIsInstance(result, ModelResult)
 
 
+  def testFastRunMatchesRun(self):
+    model = _createMultiStepModel()
+    fastModel = _createMultiStepModel()
+    fastModel.enableFastRun()
+    self.assertTrue(fastModel.isFastRunEnabled())
+
+    for i in xrange(40):
+      record = {"value": float(i % 5)}
+      result = model.run(record)
+      fastResult = fastModel.run(record)
+
+      self.assertEqual(fastResult.predictionNumber, result.predictionNumber)
+      self.assertEqual(fastResult.inferences, result.inferences)
+      self.assertEqual(list(fastResult.sensorInput.dataRow),
+                       list(result.sensorInput.dataRow))
+      self.assertEqual(dict(fastResult.sensorInput.dataDict),
+                       result.sensorInput.dataDict)
+      self.assertEqual(fastResult.classifierInput.bucketIndex,
+                       result.classifierInput.bucketIndex)
+
+    self.assertIn(
+      1, fastResult.inferences[InferenceElement.multiStepBestPredictions])
+
+
+  def testFastRunRecyclesResults(self):
+    model = _createMultiStepModel()
+    model.enableFastRun(resultPoolSize=2)
+
+    results = [model.run({"value": float(i)}) for i in xrange(3)]
+    self.assertIsNot(results[0], results[1])
+    self.assertIs(results[0], results[2])
+    self.assertEqual(results[2].predictionNumber, 2)
+
+    with self.assertRaises(TypeError):
+      results[2].sensorInput.dataDict["value"] = 1.0
+
+    model.disableFastRun()
+    self.assertFalse(model.isFastRunEnabled())
+    self.assertIsNot(model.run({"value": 1.0}), results[2])
+
+
+  def testFastRunSkipsUnchangedRegionParameters(self):
+    model = _createMultiStepModel()
+    model.enableFastRun()
+    model.run({"value": 1.0})
+
+    with patch.object(Region, "setParameter", autospec=True,
+                      side_effect=Region.setParameter) as setParameter:
+      model.run({"value": 2.0})
+      self.assertEqual(setParameter.call_count, 0)
+
+      model.disableLearning()
+      model.run({"value": 3.0})
+      self.assertEqual(
+        sorted(call[0][1:] for call in setParameter.call_args_list),
+        [("learningMode", False)] * 3)
+
+
+  def testStageTiming(self):
+    model = _createMultiStepModel()
+    self.assertNotIn("stageLatencies", model.getRuntimeStats())
+
+    model.enableStageTiming(sampleInterval=3)
+    self.assertTrue(model.isStageTimingEnabled())
+    for i in xrange(10):
+      model.run({"value": float(i % 5)})
+
+    stats = model.getRuntimeStats()["stageLatencies"]
+    self.assertEqual(sorted(stats), sorted(RUN_STAGES + ("total",)))
+    for stage in stats:
+      self.assertEqual(stats[stage]["count"], 4)
+      self.assertLessEqual(stats[stage]["p50Secs"], stats[stage]["maxSecs"])
+    self.assertGreater(stats["tm"]["totalSecs"], 0.0)
+    self.assertAlmostEqual(
+      sum(stats[stage]["totalSecs"] for stage in RUN_STAGES),
+      stats["total"]["totalSecs"])
+
+    model.disableStageTiming()
+    self.assertNotIn("stageLatencies", model.getRuntimeStats())
+    with self.assertRaises(ValueError):
+      model.enableStageTiming(sampleInterval=0)
+
+
+  def testMemoryUsage(self):
+    model = _createMultiStepModel()
+    for i in xrange(10):
+      model.run({"value": float(i % 5)})
+
+    usage = model.getMemoryUsage()
+    self.assertIn("value", usage["encoders"])
+    self.assertGreater(usage["sp"]["permanences"], 0)
+    total = usage.pop("total")
+    self.assertEqual(total, getTotal(usage))
+
+
+
 if __name__ == "__main__":
   unittest.main()
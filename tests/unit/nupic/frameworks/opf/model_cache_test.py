@@ -0,0 +1,204 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for the model_cache module."""
+
+import os
+import shutil
+import tempfile
+import unittest2 as unittest
+
+from mock import patch
+
+from nupic.frameworks.opf.delta_checkpoint import DeltaCheckpoint
+from nupic.frameworks.opf.model_cache import ModelCache
+from nupic.frameworks.opf.model_factory import ModelFactory
+from nupic.frameworks.opf.opf_utils import InferenceElement
+
+
+
+MODEL_CONFIG = {
+  "model": "HTMPrediction",
+  "modelParams": {
+    "inferenceType": "NontemporalMultiStep",
+    "sensorParams": {
+      "verbosity": 0,
+      "encoders": {
+        "value": {"fieldname": "value", "name": "value", "n": 50, "w": 21,
+                  "minval": 0, "maxval": 10, "clipInput": True,
+                  "type": "ScalarEncoder"},
+      },
+    },
+    "spEnable": False,
+    "tmEnable": False,
+    "clEnable": True,
+    "clParams": {"regionName": "SDRClassifierRegion", "verbosity": 0,
+                 "alpha": 0.1, "steps": "0"},
+  },
+}
+
+
+
+def _createModel():
+  model = ModelFactory.create(MODEL_CONFIG)
+  model.enableInference({"predictedField": "value"})
+  return model
+
+
+
+class ModelCacheTest(unittest.TestCase):
+  """ModelCache unit tests."""
+
+
+  def setUp(self):
+    self.checkpointDir = tempfile.mkdtemp()
+    self.cache = ModelCache(self.checkpointDir, maxResident=2,
+                            newSerialization=False)
+
+
+  def tearDown(self):
+    shutil.rmtree(self.checkpointDir)
+
+
+  def testEvictsLeastRecentlyUsed(self):
+    for name in ("a", "b", "c"):
+      self.cache.add(name, _createModel())
+
+    self.assertFalse(self.cache.isResident("a"))
+    self.assertTrue(self.cache.isResident("b"))
+    self.assertTrue(self.cache.isResident("c"))
+    self.assertTrue(os.path.isdir(self.cache.getCheckpointDir("a")))
+
+    self.cache.get("b")
+    self.cache.get("a")
+    self.assertFalse(self.cache.isResident("c"))
+
+    stats = self.cache.getStats()
+    self.assertEqual(stats["numModels"], 3)
+    self.assertEqual(stats["numResident"], 2)
+    self.assertEqual(stats["hits"], 1)
+    self.assertEqual(stats["misses"], 1)
+    self.assertEqual(stats["hitRate"], 0.5)
+    self.assertEqual(stats["evictions"], 2)
+    self.assertEqual(stats["loads"], 1)
+
+
+  def testReloadedModelMatchesResidentModel(self):
+    reference = _createModel()
+    self.cache.add("a", _createModel())
+    self.cache.add("b", _createModel())
+
+    for i in xrange(20):
+      record = {"value": float(i % 4)}
+      expected = reference.run(record)
+      result = self.cache.run("a", record)
+      self.cache.run("b", record)
+      self.cache.add("c%d" % i, _createModel())
+
+      self.assertEqual(result.predictionNumber, expected.predictionNumber)
+      self.assertEqual(
+        result.inferences[InferenceElement.multiStepBestPredictions],
+        expected.inferences[InferenceElement.multiStepBestPredictions])
+
+
+  def testRemoveDeletesCheckpoint(self):
+    self.cache.add("a/b", _createModel())
+    self.cache.add("b", _createModel())
+    self.cache.add("c", _createModel())
+    checkpointDir = self.cache.getCheckpointDir("a/b")
+    self.assertEqual(os.path.dirname(checkpointDir), self.checkpointDir)
+    self.assertTrue(os.path.isdir(checkpointDir))
+
+    self.cache.remove("a/b")
+    self.assertNotIn("a/b", self.cache)
+    self.assertFalse(os.path.isdir(checkpointDir))
+    with self.assertRaises(KeyError):
+      self.cache.get("a/b")
+
+
+  @patch("nupic.frameworks.opf.model_cache.time")
+  def testPrefetchPredictedModels(self, timeMock):
+    timeMock.time.return_value = 0.0
+    for name in ("a", "b"):
+      self.cache.add(name, _createModel())
+    for now in (0.0, 10.0):
+      timeMock.time.return_value = now
+      self.cache.get("a")
+
+    # "b" was never used, "a" is predicted to be used again at 20s
+    timeMock.time.return_value = 11.0
+    self.cache.add("c", _createModel())
+    self.cache.add("d", _createModel())
+    self.assertFalse(self.cache.isResident("a"))
+    self.assertEqual(self.cache.predictNextUse("a"), 20.0)
+    self.assertIsNone(self.cache.predictNextUse("b"))
+
+    self.assertEqual(self.cache.prefetch(horizon=5.0), [])
+    self.assertEqual(self.cache.prefetch(horizon=10.0), ["a"])
+    self.assertTrue(self.cache.isResident("a"))
+
+    timeMock.time.return_value = 20.0
+    self.cache.get("a")
+    stats = self.cache.getStats()
+    self.assertEqual(stats["prefetches"], 1)
+    self.assertEqual(stats["prefetchHits"], 1)
+
+
+  def testDeltaCheckpoints(self):
+    cache = ModelCache(self.checkpointDir, maxResident=1,
+                       newSerialization=False, deltaCheckpoints=True)
+    reference = _createModel()
+    cache.add("a", _createModel())
+    for i in xrange(3):
+      record = {"value": float(i % 4)}
+      expected = reference.run(record)
+      result = cache.run("a", record)
+      # Page "a" out to a new delta of its checkpoint
+      cache.add("b%d" % i, _createModel())
+      self.assertEqual(
+        result.inferences[InferenceElement.multiStepBestPredictions],
+        expected.inferences[InferenceElement.multiStepBestPredictions])
+
+    self.assertTrue(DeltaCheckpoint(cache.getCheckpointDir("a")).exists())
+    self.assertEqual(cache.getStats()["loads"], 2)
+
+
+  def testMappedArrays(self):
+    cache = ModelCache(self.checkpointDir, maxResident=1,
+                       newSerialization=False, mmapArrays=True)
+    cache.add("a", _createModel())
+    cache.add("b", _createModel())
+    self.assertTrue(os.path.isdir(
+      os.path.join(cache.getCheckpointDir("a"), "modelarrays")))
+    self.assertIsNotNone(cache.run("a", {"value": 1.0}))
+
+
+  def testUnboundedCacheNeverEvicts(self):
+    cache = ModelCache(None, maxResident=None)
+    for i in xrange(5):
+      cache.add(str(i), _createModel())
+    self.assertEqual(cache.getStats()["numResident"], 5)
+    self.assertEqual(cache.prefetch(horizon=100.0), [])
+
+
+
+if __name__ == "__main__":
+  unittest.main()
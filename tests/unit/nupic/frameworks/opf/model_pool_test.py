@@ -0,0 +1,212 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for the model_pool module."""
+
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import unittest2 as unittest
+
+from nupic.frameworks.opf.model_pool import ModelPool, ModelPoolError
+from nupic.frameworks.opf.opf_utils import InferenceElement
+
+
+
+MODEL_CONFIG = {
+  "model": "PreviousValue",
+  "modelParams": {
+    "inferenceType": "TemporalNextStep",
+    "fieldNames": ["value"],
+    "fieldTypes": ["float"],
+    "predictedField": "value",
+  },
+}
+
+# Small HTMPrediction model, used where the model has to be pickled
+HTM_MODEL_CONFIG = {
+  "model": "HTMPrediction",
+  "modelParams": {
+    "inferenceType": "NontemporalMultiStep",
+    "sensorParams": {
+      "verbosity": 0,
+      "encoders": {
+        "value": {"fieldname": "value", "name": "value", "n": 50, "w": 21,
+                  "minval": 0, "maxval": 10, "clipInput": True,
+                  "type": "ScalarEncoder"},
+      },
+    },
+    "spEnable": False,
+    "tmEnable": False,
+    "clEnable": True,
+    "clParams": {"regionName": "SDRClassifierRegion", "verbosity": 0,
+                 "alpha": 0.1, "steps": "0"},
+  },
+}
+
+TIMEOUT = 30
+
+
+
+class ModelPoolTest(unittest.TestCase):
+  """ModelPool unit tests."""
+
+
+  def setUp(self):
+    self.pool = ModelPool(numWorkers=2, maxBatchSize=4)
+    self.pool.start()
+
+
+  def tearDown(self):
+    self.pool.close(timeout=TIMEOUT)
+
+
+  def testRunPreservesOrderPerModel(self):
+    names = ["model%d" % i for i in xrange(5)]
+    for name in names:
+      self.pool.createModel(name, MODEL_CONFIG)
+
+    futures = dict((name, self.pool.runMany(
+      name, [{"value": float(i)} for i in xrange(20)])) for name in names)
+
+    for name in names:
+      results = [future.get(TIMEOUT) for future in futures[name]]
+      self.assertEqual([r.predictionNumber for r in results], range(20))
+      self.assertEqual([r.inferences[InferenceElement.prediction]
+                        for r in results], [float(i) for i in xrange(20)])
+
+    stats = self.pool.getStats()
+    self.assertEqual(stats["numModels"], 5)
+    self.assertEqual(stats["recordsCompleted"], 100)
+    self.assertEqual(stats["recordsPending"], 0)
+    self.assertEqual(sum(stats["workerRecords"]), 100)
+    self.assertGreater(stats["meanBatchSize"], 1.0)
+    self.assertLessEqual(stats["meanBatchSize"], 4.0)
+    self.assertGreater(stats["recordsPerSecond"], 0.0)
+
+
+  def testStableRouting(self):
+    other = ModelPool(numWorkers=2)
+    for name in ("a", "b", u"metric.cpu", "x" * 100):
+      self.assertEqual(self.pool.getWorkerIndex(name),
+                       other.getWorkerIndex(name))
+
+
+  def testModelLifecycle(self):
+    self.pool.createModel("m", HTM_MODEL_CONFIG,
+                          {"predictedField": "value"}).get(TIMEOUT)
+    self.assertTrue(self.pool.hasModel("m"))
+    with self.assertRaises(ValueError):
+      self.pool.createModel("m", HTM_MODEL_CONFIG)
+
+    self.pool.run("m", {"value": 1.0})
+    saveDir = tempfile.mkdtemp()
+    try:
+      checkpointDir = saveDir + "/m"
+      self.pool.saveModel("m", checkpointDir).get(TIMEOUT)
+      self.pool.removeModel("m").get(TIMEOUT)
+      self.assertEqual(self.pool.getModelNames(), [])
+      with self.assertRaises(KeyError):
+        self.pool.run("m", {"value": 2.0})
+
+      self.pool.loadModel("m", checkpointDir).get(TIMEOUT)
+      result = self.pool.run("m", {"value": 2.0}).get(TIMEOUT)
+      self.assertEqual(result.predictionNumber, 1)
+    finally:
+      shutil.rmtree(saveDir)
+
+
+  def testBoundedResidency(self):
+    checkpointDir = tempfile.mkdtemp()
+    pool = ModelPool(numWorkers=1, maxResidentModels=2,
+                     checkpointDir=checkpointDir, newSerialization=False)
+    try:
+      names = ["m%d" % i for i in xrange(4)]
+      for name in names:
+        pool.createModel(name, HTM_MODEL_CONFIG, {"predictedField": "value"})
+      for i in xrange(3):
+        futures = [pool.run(name, {"value": float(i)}) for name in names]
+        results = [future.get(TIMEOUT) for future in futures]
+        self.assertEqual([r.predictionNumber for r in results], [i] * 4)
+
+      cacheStats = pool.getStats()["cache"]
+      self.assertEqual(cacheStats["numModels"], 4)
+      self.assertEqual(cacheStats["numResident"], 2)
+      self.assertGreater(cacheStats["evictions"], 0)
+      self.assertGreater(cacheStats["loads"], 0)
+    finally:
+      pool.close(timeout=TIMEOUT)
+      shutil.rmtree(checkpointDir)
+
+
+  def testFailedCommands(self):
+    with self.assertRaises(ModelPoolError):
+      self.pool.createModel("bad", {"model": "Unknown"}).get(TIMEOUT)
+    self.assertFalse(self.pool.hasModel("bad"))
+
+    self.pool.createModel("m", MODEL_CONFIG)
+    with self.assertRaises(ModelPoolError):
+      self.pool.run("m", {"other": 1.0}).get(TIMEOUT)
+    self.assertEqual(self.pool.getStats()["recordsFailed"], 1)
+    self.assertIsNotNone(self.pool.run("m", {"value": 1.0}).get(TIMEOUT))
+
+
+
+  def testWorkerDeathUnderLoad(self):
+    names = dict((self.pool.getWorkerIndex(name), name)
+                 for name in ("m%d" % i for i in xrange(20)))
+    for name in names.itervalues():
+      self.pool.createModel(name, MODEL_CONFIG).get(TIMEOUT)
+
+    # Keep worker 1 replying while worker 0 dies
+    stop = threading.Event()
+    def load():
+      while not stop.is_set():
+        for future in self.pool.runMany(names[1], [{"value": 1.0}] * 20):
+          future.get(TIMEOUT)
+    loadThread = threading.Thread(target=load)
+    loadThread.start()
+    try:
+      # A request in flight when its worker dies fails
+      worker = self.pool._workers[0]
+      os.kill(worker.pid, signal.SIGSTOP)
+      inFlight = self.pool.run(names[0], {"value": 1.0})
+      os.kill(worker.pid, signal.SIGKILL)
+      worker.join(TIMEOUT)
+      with self.assertRaisesRegexp(ModelPoolError, "Worker 0 died"):
+        inFlight.get(8)
+
+      # So does a request for a model of the dead worker submitted later
+      with self.assertRaisesRegexp(ModelPoolError, "Worker 0 died"):
+        self.pool.run(names[0], {"value": 2.0}).get(1)
+
+      self.assertTrue(loadThread.is_alive())
+    finally:
+      stop.set()
+      loadThread.join(TIMEOUT)
+    self.assertIsNotNone(self.pool.run(names[1], {"value": 1.0}).get(TIMEOUT))
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -24,6 +24,7 @@ import numpy as np
 import unittest2 as unittest
 
 from nupic.frameworks.opf.metrics import getModule, MetricSpec, MetricMulti
+from nupic.math import roc_utils
 
 
 
@@ -482,6 +483,83 @@ record={"test":gt[i]})
 < OPFMetricsTest.DELTA)
 
 
+  def testWindowedRMSEMatchesRecomputation(self):
+    """Windowed RMSE kept with running sums matches a full recomputation"""
+    window = 7
+    rmse = getModule(MetricSpec("rmse", None, None, {"window": window}))
+    rng = np.random.RandomState(42)
+    gt = rng.uniform(-1e6, 1e6, 500)
+    p = gt + rng.normal(0, 1e-3, 500)
+    for i in xrange(len(gt)):
+      value = rmse.addInstance(gt[i], p[i])
+      errors = (gt[max(0, i - window + 1):i + 1] -
+                p[max(0, i - window + 1):i + 1]) ** 2
+      self.assertAlmostEqual(value, np.sqrt(errors.mean()), delta=1e-6)
+
+
+  def testNRMSEMatchesNumpy(self):
+    nrmse = getModule(MetricSpec("nrmse", None, None, {"window": 50}))
+    rng = np.random.RandomState(42)
+    gt = rng.uniform(0, 100, 200)
+    p = rng.uniform(0, 100, 200)
+    for i in xrange(len(gt)):
+      value = nrmse.addInstance(gt[i], p[i])
+    errors = (gt[-50:] - p[-50:]) ** 2
+    self.assertAlmostEqual(value, np.sqrt(errors.mean()) / np.std(gt))
+
+
+  def testMAPEWithoutWindow(self):
+    mape = getModule(MetricSpec("MAPE", None, None, {}))
+    for gt, p in [(10, 9), (0, 5), (20, 25)]:
+      mape.addInstance(gt, p)
+    self.assertAlmostEqual(mape.getMetric()["value"], 17.5)
+
+
+  def testWindowedAltMAPE(self):
+    altMAPE = getModule(MetricSpec("altMAPE", None, None, {"window": 2}))
+    for gt, p in [(-100, 0), (10, 9), (20, 25)]:
+      altMAPE.addInstance(gt, p)
+    self.assertAlmostEqual(altMAPE.getMetric()["value"], 100.0 * 6 / 30)
+
+
+  def testMultistepMostLikelyPrediction(self):
+    """multiStep uses the most probable value, the largest one on ties"""
+    aae = getModule(MetricSpec("multiStep", None, None,
+                               {"errorMetric": "aae", "steps": 1}))
+    aae.addInstance(10, {1: {2: 0.2, 5: 0.4, 3: 0.4}})
+    self.assertEqual(aae.getMetric()["value"], 5)
+
+
+  def testWindowedNegAUCMatchesROCCurve(self):
+    """Incremental windowed AUC matches the AUC of the ROC of the window"""
+    window = 20
+    negAUC = getModule(MetricSpec("neg_auc", None, None, {"window": window}))
+    rng = np.random.RandomState(42)
+    actuals = rng.randint(0, 2, 300)
+    # Tied scores, except for the top score of each window: ROCCurve() omits
+    # the (0, 0) point, so it differs from the exact AUC when the top is tied
+    scores = np.round(0.3 * actuals + rng.uniform(0, 0.7, 300), 1) * 0.9
+    scores[::10] = 1 + np.arange(30)
+
+    for i in xrange(len(actuals)):
+      value = negAUC.addInstance(actuals[i], {0: {1: scores[i]}})
+      windowActuals = actuals[max(0, i - window + 1):i + 1]
+      windowScores = scores[max(0, i - window + 1):i + 1]
+      if len(np.unique(windowActuals)) < 2:
+        self.assertEqual(value, -0.5)
+        continue
+      fpr, tpr, _ = roc_utils.ROCCurve(windowActuals, windowScores)
+      self.assertAlmostEqual(value, -roc_utils.AreaUnderCurve(fpr, tpr))
+
+
+  def testNegAUCDisablesOnNonBinaryClasses(self):
+    negAUC = getModule(MetricSpec("neg_auc", None, None, {"window": 10}))
+    negAUC.addInstance(0, {0: {1: 0.2}})
+    negAUC.addInstance(2, {0: {1: 0.2}})
+    self.assertTrue(negAUC.disabled)
+    self.assertEqual(negAUC.getMetric()["value"], 0.0)
+
+
   def testNegativeLogLikelihood(self):
     # make sure negativeLogLikelihood returns correct LL numbers
 
@@ -0,0 +1,180 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for the prediction_log_metrics module."""
+
+import math
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import unittest2 as unittest
+
+from nupic.frameworks.opf.metrics import MetricSpec
+from nupic.frameworks.opf.model_factory import ModelFactory
+from nupic.frameworks.opf.opf_basic_environment import BasicPredictionLogger
+from nupic.frameworks.opf.prediction_log_metrics import (
+  PredictionLog, computeMetrics, shiftValues)
+from nupic.frameworks.opf.prediction_metrics_manager import MetricsManager
+
+
+
+MODEL_CONFIG = {
+  "model": "HTMPrediction",
+  "modelParams": {
+    "inferenceType": "NontemporalMultiStep",
+    "sensorParams": {
+      "verbosity": 0,
+      "encoders": {
+        "value": {"fieldname": "value", "name": "value", "n": 50, "w": 21,
+                  "minval": 0, "maxval": 10, "clipInput": True,
+                  "type": "ScalarEncoder"},
+      },
+    },
+    "spEnable": False,
+    "tmEnable": False,
+    "clEnable": True,
+    "clParams": {"regionName": "SDRClassifierRegion", "verbosity": 0,
+                 "alpha": 0.1, "steps": "1,3"},
+  },
+}
+
+
+
+def _multiStepSpec(errorMetric, steps, window=None,
+                   inferenceElement="multiStepBestPredictions"):
+  params = {"errorMetric": errorMetric, "steps": steps}
+  if window is not None:
+    params["window"] = window
+  return MetricSpec(field="value", metric="multiStep",
+                    inferenceElement=inferenceElement, params=params)
+
+
+
+METRIC_SPECS = (
+  _multiStepSpec("aae", [1, 3], window=50),
+  _multiStepSpec("rmse", 1),
+  _multiStepSpec("nrmse", 3, window=30),
+  _multiStepSpec("altMAPE", 3, window=20),
+  _multiStepSpec("MAPE", 1, window=20),
+  _multiStepSpec("avg_err", 1, window=10,
+                 inferenceElement="multiStepPredictions"),
+  MetricSpec(field="value", metric="trivial",
+             inferenceElement="multiStepBestPredictions",
+             params={"errorMetric": "aae", "window": 25, "steps": 1}),
+  # Not vectorized, replayed through the metric module
+  MetricSpec(field="value", metric="multiStep",
+             inferenceElement="multiStepBestPredictions",
+             params={"errorMetric": "custom_error_metric", "steps": 1,
+                     "customExpr": "abs(prediction - groundTruth)",
+                     "storeWindow": 5}),
+)
+
+
+
+class PredictionLogMetricsTest(unittest.TestCase):
+  """prediction_log_metrics unit tests."""
+
+
+  def setUp(self):
+    self.experimentDir = tempfile.mkdtemp()
+
+
+  def tearDown(self):
+    shutil.rmtree(self.experimentDir)
+
+
+  def _runModel(self, numRecords):
+    """ Run a model, logging its predictions, and return the metric values
+    the MetricsManager reported after each record. """
+    model = ModelFactory.create(MODEL_CONFIG)
+    model.enableInference({"predictedField": "value"})
+    metricsManager = MetricsManager(METRIC_SPECS, model.getFieldInfo(),
+                                    model.getInferenceType())
+    logger = BasicPredictionLogger(model.getFieldInfo(), self.experimentDir,
+                                   "test", model.getInferenceType())
+
+    onlineValues = dict((spec.getLabel(), []) for spec in METRIC_SPECS)
+    for i in xrange(numRecords):
+      result = model.run({"value": 5 + 4 * math.sin(i * 0.7)})
+      result.metrics = metricsManager.update(result)
+      logger.writeRecord(result)
+      for label, value in result.metrics.iteritems():
+        onlineValues[label].append(np.nan if value is None else value)
+    logger.close()
+
+    return onlineValues
+
+
+  def _getLogPath(self):
+    inferenceDir = os.path.join(self.experimentDir, "inference")
+    return os.path.join(inferenceDir, os.listdir(inferenceDir)[0])
+
+
+  def testMatchesMetricsManager(self):
+    onlineValues = self._runModel(200)
+
+    log = PredictionLog(self._getLogPath())
+    self.assertTrue(log.isShifted)
+    self.assertEqual(len(log), 200)
+
+    offlineValues = computeMetrics(METRIC_SPECS, log)
+    self.assertEqual(set(offlineValues), set(onlineValues))
+    for label, values in offlineValues.iteritems():
+      np.testing.assert_allclose(values, onlineValues[label], rtol=1e-9,
+                                 err_msg=label)
+
+
+  def testShiftsUnshiftedLog(self):
+    self._runModel(20)
+    shiftedLog = PredictionLog(self._getLogPath())
+    unshiftedLog = PredictionLog(self._getLogPath(), shifted=False)
+
+    for step in (1, 3):
+      shifted = shiftedLog.getInference("multiStepBestPredictions", key=step)
+      self.assertTrue(np.all(np.isnan(
+        unshiftedLog.getInference("multiStepBestPredictions", key=step)[:step])))
+      np.testing.assert_array_equal(
+        unshiftedLog.getInference("multiStepBestPredictions", key=step)[step:],
+        shifted[:-step])
+
+
+  def testShiftValues(self):
+    np.testing.assert_array_equal(shiftValues(np.array([1.0, 2.0, 3.0]), 2),
+                                  [np.nan, np.nan, 1.0])
+    self.assertEqual(list(shiftValues(np.array(["a", "b"], dtype=object), 1)),
+                     [None, "a"])
+    np.testing.assert_array_equal(shiftValues(np.array([1.0]), 3), [np.nan])
+
+
+  def testRejectsMetricsNeedingModelResults(self):
+    self._runModel(5)
+    spec = MetricSpec(field="value", metric="negativeLogLikelihood",
+                      inferenceElement="multiStepBestPredictions",
+                      params={"window": 10})
+    with self.assertRaises(ValueError):
+      computeMetrics([spec], PredictionLog(self._getLogPath()))
+
+
+
+if __name__ == "__main__":
+  unittest.main()
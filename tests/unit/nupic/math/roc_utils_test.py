@@ -0,0 +1,104 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""Unit tests for the roc_utils module."""
+
+import numpy as np
+import unittest2 as unittest
+
+from nupic.math.roc_utils import (AreaUnderCurve, AreaUnderROC, ROCCurve,
+                                  SlidingAUC)
+
+
+
+def _bruteForceAUC(yTrue, yScore):
+  positives = yScore[yTrue == 1][:, None]
+  negatives = yScore[yTrue == 0][None, :]
+  pairs = (positives > negatives).sum() + 0.5 * (positives == negatives).sum()
+  return pairs / float(positives.size * negatives.size)
+
+
+
+class ROCUtilsTest(unittest.TestCase):
+  """roc_utils unit tests."""
+
+
+  def testROCCurve(self):
+    yTrue = np.array([0, 0, 1, 1, 1])
+    yScore = np.array([0.1, 0.4, 0.5, 0.3, 0.45])
+    fpr, tpr, thresholds = ROCCurve(yTrue, yScore)
+    np.testing.assert_allclose(thresholds, [0.1, 0.3, 0.4, 0.45, 0.5])
+    np.testing.assert_allclose(fpr, [0.0, 0.0, 0.5, 0.5, 1.0])
+    np.testing.assert_allclose(tpr, [1.0 / 3, 2.0 / 3, 2.0 / 3, 1.0, 1.0])
+    self.assertAlmostEqual(AreaUnderCurve(fpr, tpr), 5.0 / 6)
+
+    # Tied scores share a point of the curve
+    fpr, tpr, _ = ROCCurve([1, 2, 2, 1, 2], [0.1, 0.4, 0.4, 0.4, 0.8])
+    np.testing.assert_allclose(fpr, [0.0, 0.5, 1.0])
+    np.testing.assert_allclose(tpr, [1.0 / 3, 1.0, 1.0])
+
+    with self.assertRaises(ValueError):
+      ROCCurve([0, 1, 2], [0.1, 0.2, 0.3])
+
+
+  def testAreaUnderROC(self):
+    rng = np.random.RandomState(42)
+    for _ in xrange(20):
+      yTrue = rng.randint(0, 2, 50)
+      yScore = np.round(rng.uniform(size=50), 1)
+      self.assertAlmostEqual(AreaUnderROC(yTrue, yScore),
+                             _bruteForceAUC(yTrue, yScore))
+      # Matches the curve when the top score is not tied
+      yScore[0] = 2.0
+      fpr, tpr, _ = ROCCurve(yTrue, yScore)
+      self.assertAlmostEqual(AreaUnderROC(yTrue, yScore),
+                             AreaUnderCurve(fpr, tpr))
+
+    with self.assertRaises(ValueError):
+      AreaUnderROC([1, 1], [0.1, 0.2])
+
+
+  def testSlidingAUC(self):
+    window = 30
+    rng = np.random.RandomState(42)
+    yTrue = rng.randint(0, 2, 500)
+    yScore = np.round(0.3 * yTrue + rng.uniform(0, 0.7, 500), 1)
+
+    slidingAUC = SlidingAUC()
+    self.assertIsNone(slidingAUC.getAUC())
+    for i in xrange(len(yTrue)):
+      slidingAUC.add(yTrue[i], yScore[i])
+      if i >= window:
+        slidingAUC.remove(yTrue[i - window], yScore[i - window])
+      self.assertEqual(len(slidingAUC), min(i + 1, window))
+      windowTrue = yTrue[max(0, i - window + 1):i + 1]
+      windowScore = yScore[max(0, i - window + 1):i + 1]
+      if len(np.unique(windowTrue)) < 2:
+        self.assertIsNone(slidingAUC.getAUC())
+      else:
+        self.assertAlmostEqual(slidingAUC.getAUC(),
+                               AreaUnderROC(windowTrue, windowScore))
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -23,6 +23,7 @@
 
 import sys
 import copy
+import cPickle as pickle
 from datetime import datetime
 import unittest2 as unittest
 import random
@@ -37,7 +38,8 @@ from nupic.frameworks.opf.opf_utils import InferenceType
 
 from nupic.regions.knn_anomaly_classifier_region import (
     KNNAnomalyClassifierRegion,
-    _CLAClassificationRecord)
+    _CLAClassificationRecord,
+    _RecordsCache)
 
 from nupic.frameworks.opf.opf_utils import InferenceType
 
@@ -823,6 +825,79 @@ class KNNAnomalyClassifierRegionTest(unittest.TestCase):
     self.assertEqual(state.setByUser, record['setByUser'])
 
 
+  def testRecordsCache(self):
+    records = [Mock(ROWID=i) for i in xrange(10)]
+    cache = _RecordsCache(4, records[:2])
+    self.assertEqual(list(cache), records[:2])
+
+    for record in records[2:]:
+      cache.append(record)
+    self.assertEqual(len(cache), 4)
+    self.assertEqual(list(cache), records[6:])
+    self.assertEqual(cache[0], records[6])
+    self.assertEqual(cache[-1], records[9])
+    self.assertEqual(cache[1:3], records[7:9])
+    self.assertRaises(IndexError, cache.__getitem__, 4)
+
+    self.assertEqual(cache.getIndex(8), 2)
+    self.assertEqual(cache.getIndex(2), 0)
+    self.assertEqual(cache.getIndex(20), 4)
+    self.assertEqual(_RecordsCache(4).getIndex(8), 0)
+
+    restored = pickle.loads(pickle.dumps(_RecordsCache(
+      3, [_CLAClassificationRecord(i, 0.5, [i], []) for i in xrange(5)])))
+    self.assertEqual([record.ROWID for record in restored], [2, 3, 4])
+    restored.append(_CLAClassificationRecord(5, 0.5, [5], []))
+    self.assertEqual([record.ROWID for record in restored], [3, 4, 5])
+
+
+  def testRecordsCacheResize(self):
+    self.helper._recordsCache = [Mock(ROWID=i) for i in xrange(5)]
+    self.helper.cacheSize = 3
+    self.assertEqual(self.helper.getLabels(5, 10)['recordLabels'], [])
+    self.assertEqual([record.ROWID for record in self.helper._recordsCache],
+                     [2, 3, 4])
+
+
+  def testClassifyInBatch(self):
+    for distanceMethod in ("rawOverlap", "pctOverlapOfInput",
+                           "pctOverlapOfProto", "pctOverlapOfLarger", "norm"):
+      params = dict(self.params, trainRecords=5, anomalyThreshold=0.8,
+                    distanceMethod=distanceMethod, distanceNorm=2)
+      regions = []
+      for canBatch in (True, False):
+        region = KNNAnomalyClassifierRegion(**params)
+        region._classificationMaxDist = 0.5
+        region._CLASSIFY_BATCH_SIZE = 7
+        region._canClassifyInBatch = Mock(return_value=canBatch)
+        regions.append(region)
+        random.seed(42)
+        for rowID in xrange(60):
+          record = _CLAClassificationRecord(
+            ROWID=rowID,
+            anomalyScore=random.random(),
+            anomalyVector=sorted(random.sample(xrange(30),
+                                               random.randint(2, 6))),
+            anomalyLabel=[])
+          region._anomalyVectorLength = 30
+          with patch.object(KNNAnomalyClassifierRegion,
+                            '_constructClassificationRecord',
+                            return_value=record):
+            region.compute(dict(), dict())
+
+        region.addLabel(10, 20, "Label")
+        region.removeLabels(15, 18, "Label")
+        region.setParameter('anomalyThreshold', None, 0.9)
+        region.setParameter('trainRecords', None, 8)
+
+      batched, sequential = regions
+      self.assertTrue(batched._canClassifyInBatch())
+      self.assertEqual([r.anomalyLabel for r in batched._recordsCache],
+                       [r.anomalyLabel for r in sequential._recordsCache])
+      self.assertEqual(batched.getLabels(), sequential.getLabels())
+      self.assertEqual(
+        batched._knnclassifier.getParameter('categoryRecencyList'),
+        sequential._knnclassifier.getParameter('categoryRecencyList'))
 
 
   def mockRemoveIds(self, ids):
@@ -19,7 +19,9 @@
 # http://numenta.org/licenses/
 # ----------------------------------------------------------------------
 
+import mmap
 import os
+import tempfile
 import unittest
 
 try:
@@ -29,7 +31,7 @@ except ImportError:
   # Ignore for platforms in which capnp is not available, e.g. windows
   capnp = None
 
-from nupic.serializable import  Serializable
+from nupic.serializable import  Serializable, readMappedProto
 
 
 
@@ -85,3 +87,75 @@ class SerializableTest(unittest.TestCase):
 
     with open("foo.data", "rb") as inp:
       self.assertEqual(Foo.readFromFile(inp).bar, "bar")
+
+
+  def testReadFromUnpackedFile(self):
+    """ Unpacked files are read from a memory map """
+
+    class Foo(Serializable):
+
+
+      def __init__(self, bar):
+        self.bar = bar
+
+
+      @classmethod
+      def getSchema(cls):
+        return serializable_test_capnp.Foo
+
+
+      @classmethod
+      def read(cls, proto):
+        foo = object.__new__(cls)
+        foo.bar = proto.bar
+        return foo
+
+
+      def write(self, proto):
+        proto.bar = self.bar
+
+    def _remove(fname):
+      if os.path.isfile(fname):
+        os.remove(fname)
+
+    self.addCleanup(_remove, "foo_unpacked.data")
+
+    with open("foo_unpacked.data", "wb") as outp:
+      Foo("bar").writeToFile(outp, packed=False)
+
+    with open("foo_unpacked.data", "rb") as inp:
+      self.assertEqual(Foo.readFromFile(inp, packed=False).bar, "bar")
+
+
+
+class _SchemaStub(object):
+  """ Returns what readMappedProto passed to the schema. """
+
+  @staticmethod
+  def from_bytes(buf):
+    return ("mapped", buf[:])
+
+
+  @staticmethod
+  def read(f):
+    return ("read", f.read())
+
+
+
+class ReadMappedProtoTest(unittest.TestCase):
+
+  def testReadsFromFilePosition(self):
+    granularity = mmap.ALLOCATIONGRANULARITY
+    with tempfile.TemporaryFile() as f:
+      f.write("a" * granularity + "message")
+      f.flush()
+
+      f.seek(0)
+      self.assertEqual(readMappedProto(_SchemaStub, f),
+                       ("mapped", "a" * granularity + "message"))
+      f.seek(granularity)
+      self.assertEqual(readMappedProto(_SchemaStub, f), ("mapped", "message"))
+
+      # Positions that can't be mapped are read instead
+      f.seek(granularity - 1)
+      self.assertEqual(readMappedProto(_SchemaStub, f), ("read", "amessage"))
@@ -0,0 +1,124 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for the benchmark module."""
+
+import os
+import shutil
+import tempfile
+
+import numpy
+import unittest2 as unittest
+
+from nupic.support.benchmark import (BenchmarkError, BenchmarkSuite,
+                                     findRegressions, readResults,
+                                     writeResults)
+
+
+
+suite = BenchmarkSuite()
+teardowns = []
+
+
+
+@suite.add("allocate", params=[dict(megabytes=1), dict(megabytes=40)],
+           numOps=2)
+def allocate(megabytes):
+  def run():
+    for _ in xrange(2):
+      numpy.ones(megabytes * 1024 * 1024, dtype=numpy.uint8)
+  return run, lambda: teardowns.append(megabytes)
+
+
+
+@suite.add("fail")
+def fail():
+  raise ValueError("broken benchmark")
+
+
+
+def _result(opsPerSec, peakMemoryMB):
+  return dict(opsPerSec=opsPerSec, secondsPerOp=1.0 / opsPerSec,
+              peakMemoryMB=peakMemoryMB, numOps=1, repeats=1)
+
+
+
+class BenchmarkTest(unittest.TestCase):
+  """benchmark unit tests."""
+
+
+  def testCases(self):
+    self.assertEqual([case[0] for case in suite.getCases()],
+                     ["allocate[megabytes=1]", "allocate[megabytes=40]",
+                      "fail"])
+    self.assertEqual([case[0] for case in suite.getCases("megabytes=4")],
+                     ["allocate[megabytes=40]"])
+
+
+  def testRunIsolated(self):
+    results = suite.run(pattern="allocate", repeats=2)
+    self.assertEqual(sorted(results),
+                     ["allocate[megabytes=1]", "allocate[megabytes=40]"])
+    small = results["allocate[megabytes=1]"]
+    large = results["allocate[megabytes=40]"]
+    self.assertEqual((large["numOps"], large["repeats"]), (2, 2))
+    self.assertGreater(large["opsPerSec"], 0.0)
+    self.assertGreater(large["peakMemoryMB"], 30.0)
+    self.assertLess(small["peakMemoryMB"], 30.0)
+
+    with self.assertRaises(BenchmarkError):
+      suite.run(pattern="fail")
+
+
+  def testRunInProcess(self):
+    del teardowns[:]
+    results = suite.run(pattern="megabytes=1", repeats=1, isolate=False)
+    self.assertEqual(results.keys(), ["allocate[megabytes=1]"])
+    self.assertEqual(teardowns, [1])
+
+
+  def testFindRegressions(self):
+    baseline = {"a": _result(100.0, 10.0), "b": _result(100.0, 0.1),
+                "c": _result(100.0, 10.0)}
+    results = {"a": _result(85.0, 11.5), "b": _result(50.0, 0.9),
+               "c": _result(100.0, 20.0), "new": _result(1.0, 100.0)}
+    self.assertEqual(findRegressions(results, baseline, tolerance=0.2),
+                     [("b", "opsPerSec", 100.0, 50.0),
+                      ("c", "peakMemoryMB", 10.0, 20.0)])
+
+    # The default tolerance accepts the run-to-run noise of a shared host
+    self.assertEqual(findRegressions({"a": _result(70.0, 13.0)}, baseline), [])
+    self.assertEqual(len(findRegressions({"a": _result(60.0, 10.0)},
+                                         baseline)), 1)
+
+
+  def testResultsFile(self):
+    tmpDir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, tmpDir)
+    path = os.path.join(tmpDir, "results.json")
+    results = {"a": _result(100.0, 10.0)}
+    writeResults(path, results)
+    self.assertEqual(readResults(path), results)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
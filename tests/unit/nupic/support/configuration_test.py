@@ -56,6 +56,9 @@ class ConfigurationTest(unittest.TestCase):
 
     self.files = {}
 
+    # Don't leave the test configurations loaded for the tests that follow
+    self.addCleanup(configuration.Configuration.clear)
+
     with tempfile.NamedTemporaryFile(
       prefix='nupic-default.xml-unittest-', delete=False) as outp:
       self.addCleanup(os.remove, outp.name)
@@ -59,6 +59,9 @@ class ConfigurationCustomTest(unittest.TestCase):
 
     self.files = dict()
 
+    # Don't leave the test configurations loaded for the tests that follow
+    self.addCleanup(configuration.Configuration.clear)
+
     tmpDir = tempfile.mkdtemp()
     self.addCleanup(shutil.rmtree, tmpDir)
 
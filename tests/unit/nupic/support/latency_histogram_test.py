@@ -0,0 +1,75 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for the LatencyHistogram class."""
+
+import numpy
+import unittest2 as unittest
+
+from nupic.support.latency_histogram import LatencyHistogram
+
+
+
+class LatencyHistogramTest(unittest.TestCase):
+  """LatencyHistogram unit tests."""
+
+
+  def testEmpty(self):
+    histogram = LatencyHistogram()
+    self.assertIsNone(histogram.getPercentile(50))
+    self.assertEqual(histogram.getStats()["count"], 0)
+    self.assertEqual(histogram.getStats()["p99Secs"], 0.0)
+
+
+  def testPercentiles(self):
+    durations = numpy.random.RandomState(42).lognormal(-7.0, 1.5, 10000)
+    histogram = LatencyHistogram()
+    for duration in durations:
+      histogram.record(duration)
+
+    stats = histogram.getStats()
+    self.assertEqual(stats["count"], 10000)
+    self.assertAlmostEqual(stats["totalSecs"], durations.sum())
+    self.assertEqual(stats["minSecs"], durations.min())
+    self.assertEqual(stats["maxSecs"], durations.max())
+    for percent in (50, 90, 99, 99.9):
+      expected = numpy.percentile(durations, percent)
+      self.assertLess(abs(histogram.getPercentile(percent) - expected),
+                      0.1 * expected)
+    self.assertEqual(histogram.getPercentile(100), durations.max())
+
+
+  def testOutOfRangeDurations(self):
+    histogram = LatencyHistogram(minSecs=1e-3, maxSecs=1.0)
+    for duration in (0.0, 1e-5, 5.0, 500.0):
+      histogram.record(duration)
+    # Durations below minSecs are reported as minSecs
+    self.assertEqual(histogram.getPercentile(50), 1e-3)
+    self.assertGreaterEqual(histogram.getPercentile(75), 1.0)
+    self.assertEqual(histogram.getPercentile(100), 500.0)
+
+    histogram.reset()
+    self.assertEqual(histogram.getCount(), 0)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,135 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for the mapped_arrays module."""
+
+import copy
+import copy_reg
+import cPickle as pickle
+import math
+import os
+import shutil
+import tempfile
+
+import numpy
+import unittest2 as unittest
+
+from nupic.frameworks.opf.model import Model
+from nupic.frameworks.opf.model_factory import ModelFactory
+from nupic.support import mapped_arrays
+from nupic.support.configuration import Configuration
+from tests.unit.nupic.swarming.model_fork_test import MODEL_DESCRIPTION
+
+
+
+class MappedArraysTest(unittest.TestCase):
+  """mapped_arrays unit tests."""
+
+
+  def setUp(self):
+    self.tmpDir = tempfile.mkdtemp()
+    self.arrayDir = os.path.join(self.tmpDir, "arrays")
+    self.addCleanup(Configuration.clear)
+
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpDir)
+
+
+  def testLargeArraysAreMapped(self):
+    large = numpy.arange(1000, dtype=numpy.float64)
+    state = {"large": large, "alias": large, "small": numpy.arange(10),
+             "objects": numpy.array([None] * 200, dtype=object)}
+
+    with mapped_arrays.externalArrays(self.arrayDir, minArrayBytes=1000):
+      data = pickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+    self.assertEqual(os.listdir(self.arrayDir), ["array-000000.npy"])
+    self.assertLess(len(data), large.nbytes)
+
+    # Outside of the context, arrays are pickled as usual
+    self.assertNotIn(numpy.ndarray, copy_reg.dispatch_table)
+    self.assertNotIn(numpy.memmap, copy_reg.dispatch_table)
+    self.assertEqual(len(pickle.loads(pickle.dumps(large))), 1000)
+    with self.assertRaises(RuntimeError):
+      pickle.loads(data)
+
+    with mapped_arrays.mappedArrays(self.arrayDir):
+      restored = pickle.loads(data)
+    self.assertIsInstance(restored["large"], numpy.memmap)
+    self.assertIs(restored["alias"], restored["large"])
+    self.assertNotIsInstance(restored["small"], numpy.memmap)
+    numpy.testing.assert_array_equal(restored["large"], large)
+    numpy.testing.assert_array_equal(restored["small"], numpy.arange(10))
+
+    # Modifications are copied on write, and never reach the file
+    restored["large"][:10] = -1.0
+    self.assertEqual(restored["large"][0], -1.0)
+    numpy.testing.assert_array_equal(
+      numpy.load(os.path.join(self.arrayDir, "array-000000.npy")), large)
+
+
+  def testNestedContexts(self):
+    large = numpy.arange(1000, dtype=numpy.float64)
+    innerDir = os.path.join(self.tmpDir, "inner")
+    with mapped_arrays.externalArrays(self.arrayDir, minArrayBytes=1000):
+      with mapped_arrays.externalArrays(innerDir, minArrayBytes=1000):
+        pickle.dumps(large)
+      # Leaving the inner context keeps the arrays of the outer one external
+      pickle.dumps(large)
+    self.assertEqual(os.listdir(innerDir), ["array-000000.npy"])
+    self.assertEqual(os.listdir(self.arrayDir), ["array-000000.npy"])
+    self.assertNotIn(numpy.ndarray, copy_reg.dispatch_table)
+
+
+  def testModelRoundTrip(self):
+    Configuration.set("nupic.model.checkpoint.minMappedArrayBytes", "1024")
+    description = copy.deepcopy(MODEL_DESCRIPTION)
+    description["modelParams"]["clParams"]["implementation"] = "py"
+    model = ModelFactory.create(description)
+    model.enableInference({"predictedField": "value"})
+    records = [{"value": 5.0 + 4.0 * math.sin(i * 0.3)} for i in xrange(60)]
+    for record in records[:30]:
+      model.run(record)
+
+    mappedDir = os.path.join(self.tmpDir, "mapped")
+    savedDir = os.path.join(self.tmpDir, "saved")
+    model.save(mappedDir, mmapArrays=True)
+    model.save(savedDir)
+    self.assertTrue(os.listdir(os.path.join(mappedDir, "modelarrays")))
+    self.assertFalse(os.path.exists(os.path.join(savedDir, "modelarrays")))
+
+    mapped = Model.load(mappedDir)
+    classifier = mapped._getClassifierRegion().getSelf()._sdrClassifier
+    self.assertIsInstance(classifier._weightMatrix[1], numpy.memmap)
+
+    # The mapped model can be saved again over its own checkpoint
+    mapped.save(mappedDir, mmapArrays=True)
+    mapped = Model.load(mappedDir)
+
+    reference = Model.load(savedDir)
+    for record in records[30:]:
+      self.assertEqual(mapped.run(record).inferences,
+                       reference.run(record).inferences)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,79 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for the memory_usage module."""
+
+import sys
+
+import numpy
+import unittest2 as unittest
+
+from nupic.bindings.math import SM32
+from nupic.support.memory_usage import getArraysSize, getObjectSize, getTotal
+
+
+
+class _Slotted(object):
+  __slots__ = ["values"]
+
+  def __init__(self, values):
+    self.values = values
+
+
+
+class MemoryUsageTest(unittest.TestCase):
+  """memory_usage unit tests."""
+
+
+  def testArrays(self):
+    array = numpy.zeros(10000)
+    self.assertEqual(getArraysSize(array, None, array[:10]), 80080)
+    self.assertGreaterEqual(getObjectSize(array), 80000)
+    # A view counts the array owning its data, once
+    views = [array[:10], array[10:]]
+    self.assertEqual(getObjectSize(views),
+                     sys.getsizeof(views) + getObjectSize(array) +
+                     sum(sys.getsizeof(view) for view in views))
+
+
+  def testObjects(self):
+    values = [float(i) for i in xrange(1000)]
+    size = getObjectSize(values)
+    self.assertEqual(size, sys.getsizeof(values) +
+                     sum(sys.getsizeof(value) for value in values))
+    self.assertGreater(getObjectSize(_Slotted(values)), size)
+    self.assertEqual(getObjectSize({"a": values, "b": values}) -
+                     getObjectSize({"a": None, "b": None}), size)
+    self.assertLess(getObjectSize(_Slotted(values), exclude=[values]), 100)
+
+    matrix = SM32(100, 100)
+    matrix.set(3, 4, 1.0)
+    self.assertEqual(getObjectSize(matrix), matrix.nBytes())
+
+
+  def testTotal(self):
+    self.assertEqual(getTotal({"a": 1, "b": {"c": 2, "d": {"e": 3}}}), 6)
+    self.assertEqual(getTotal({}), 0)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
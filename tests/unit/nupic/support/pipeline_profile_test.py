@@ -0,0 +1,114 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""Unit tests for the pipeline_profile module."""
+
+import os
+import shutil
+import tempfile
+
+import unittest2 as unittest
+
+from nupic.data.generators.high_order_sequence_generator import (
+  HighOrderSequenceGenerator)
+from nupic.support.pipeline_profile import (readProfile, runPipelineProfile,
+                                            summarize, writeProfile)
+
+
+
+def _checkpoint(step, elapsedSecs, rssMB):
+  return dict(step=step, elapsedSecs=elapsedSecs, stepsPerSec=0.0,
+              rssMB=rssMB, numSegments=step, numSynapses=10 * step)
+
+
+
+class PipelineProfileTest(unittest.TestCase):
+  """pipeline_profile unit tests."""
+
+
+  def setUp(self):
+    self.generator = HighOrderSequenceGenerator(alphabetSize=40,
+                                                numSequences=4,
+                                                sequenceLength=5, n=256,
+                                                w=10)
+
+
+  def testProfile(self):
+    for implementation in ("py", "cpp"):
+      profile = runPipelineProfile(self.generator, 650,
+                                   checkpointInterval=200,
+                                   cellsPerColumn=8, useResets=True,
+                                   implementation=implementation,
+                                   tmParams=dict(activationThreshold=5,
+                                                 minThreshold=4,
+                                                 maxNewSynapseCount=8))
+      checkpoints = profile["checkpoints"]
+      self.assertEqual([c["step"] for c in checkpoints], [200, 400, 600, 650])
+      self.assertEqual(profile["config"]["columnCount"], 256)
+      self.assertEqual(profile["config"]["generator"]["sequenceLength"], 5)
+      self.assertEqual(sorted(profile["latency"]),
+                       ["classifier", "step", "tm"])
+      self.assertEqual(profile["latency"]["step"]["count"], 650)
+
+      self.assertGreater(checkpoints[-1]["numSegments"], 0)
+      self.assertGreater(checkpoints[-1]["numSynapses"],
+                         checkpoints[-1]["numSegments"])
+      # The sequences are learned: all but their first elements are predicted
+      self.assertAlmostEqual(checkpoints[-1]["predictedColumnsFraction"], 0.8)
+      self.assertEqual(checkpoints[-1]["classifierAccuracy"], 1.0)
+      self.assertGreater(profile["summary"]["steadyStateStepsPerSec"], 0)
+
+
+  def testSpatialPooler(self):
+    profile = runPipelineProfile(self.generator, 20, checkpointInterval=10,
+                                 columnCount=512, cellsPerColumn=4,
+                                 useSpatialPooler=True, useClassifier=False)
+    self.assertEqual(profile["config"]["columnCount"], 512)
+    self.assertEqual(sorted(profile["latency"]), ["sp", "step", "tm"])
+    self.assertIsNone(profile["checkpoints"][-1]["classifierAccuracy"])
+
+
+  def testSummarize(self):
+    checkpoints = [_checkpoint(100 * (i + 1), 2.0 * (i + 1), 10.0 + i)
+                   for i in xrange(4)]
+    summary = summarize(checkpoints)
+    self.assertAlmostEqual(summary["steadyStateStepsPerSec"], 50.0)
+    self.assertAlmostEqual(summary["memoryGrowthMBPerMillionSteps"], 1e4)
+    self.assertEqual(summary["numSegments"], 400)
+    self.assertEqual(summarize(checkpoints[:1])["steadyStateStepsPerSec"],
+                     50.0)
+
+
+  def testProfileFile(self):
+    tmpDir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, tmpDir)
+    path = os.path.join(tmpDir, "profile.json")
+    profile = dict(config=dict(numSteps=1),
+                   checkpoints=[_checkpoint(1, 1.0, 1.0)],
+                   latency={}, summary=summarize([_checkpoint(1, 1.0, 1.0)]))
+    writeProfile(path, profile)
+    self.assertEqual(readProfile(path), profile)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,234 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for the swarm dataset cache."""
+
+import cPickle as pickle
+import os
+import shutil
+import tempfile
+import time
+
+import numpy
+import unittest2 as unittest
+
+from nupic.data.stream_reader import StreamReader
+from nupic.encoders.scalar import ScalarEncoder
+from nupic.frameworks.opf.model_factory import ModelFactory
+from nupic.swarming.dataset_cache import (CachedStreamReader, DatasetCache,
+                                          _CachedEncoder)
+
+
+
+CSV_HEADER = ("timestamp,value,label,count\n"
+              "datetime,float,string,int\n"
+              "T,,,\n")
+
+
+
+def _getStreamDef(path, aggregation=None):
+  streamDef = {"version": 1, "info": "test",
+               "streams": [{"source": "file://" + path, "info": path,
+                            "columns": ["*"]}]}
+  if aggregation is not None:
+    streamDef["aggregation"] = aggregation
+  return streamDef
+
+
+
+def _readAll(stream):
+  records = []
+  while True:
+    record = stream.getNextRecordDict()
+    if record is None:
+      return records
+    records.append(record)
+
+
+
+def _getModelDescription():
+  return {
+    "model": "HTMPrediction",
+    "modelParams": {
+      "inferenceType": "TemporalNextStep",
+      "sensorParams": {
+        "verbosity": 0,
+        "encoders": {
+          "value": {"fieldname": "value", "name": "value", "n": 60, "w": 21,
+                    "minval": 0, "maxval": 40, "clipInput": True,
+                    "type": "ScalarEncoder"},
+          "timestamp_timeOfDay": {"fieldname": "timestamp",
+                                  "name": "timestamp_timeOfDay",
+                                  "timeOfDay": (21, 1),
+                                  "type": "DateEncoder"},
+          "count": {"fieldname": "count", "name": "count", "n": 50, "w": 21,
+                    "type": "AdaptiveScalarEncoder"},
+          "label": None,
+        },
+      },
+      "spEnable": False,
+      "tmEnable": False,
+      "clEnable": False,
+    },
+  }
+
+
+
+class DatasetCacheTest(unittest.TestCase):
+  """DatasetCache unit tests."""
+
+
+  def setUp(self):
+    self.tempDir = tempfile.mkdtemp()
+    self.cacheDir = os.path.join(self.tempDir, "cache")
+    self.dataPath = os.path.join(self.tempDir, "data.csv")
+    with open(self.dataPath, "w") as outFile:
+      outFile.write(CSV_HEADER)
+      for i in xrange(50):
+        value = "" if i % 7 == 3 else "%.1f" % (i % 13 * 2.5)
+        outFile.write("2017-01-01 %02d:%02d:00,%s,label%d,%d\n" % (
+          i // 4, i % 4 * 15, value, i % 3, i))
+
+
+  def tearDown(self):
+    shutil.rmtree(self.tempDir)
+
+
+  def testMatchesStreamReader(self):
+    for aggregation in (None, {"minutes": 30,
+                               "fields": [("value", "sum"),
+                                          ("label", "first"),
+                                          ("count", "max")]}):
+      streamDef = _getStreamDef(self.dataPath, aggregation)
+      expected = StreamReader(streamDef, isBlocking=False, maxTimeout=0)
+      cached = DatasetCache(self.cacheDir).openStream(streamDef)
+      self.assertIsInstance(cached, CachedStreamReader)
+
+      self.assertEqual(cached.getFields(), expected.getFields())
+      self.assertEqual(cached.getAggregationMonthsAndSeconds(),
+                       expected.getAggregationMonthsAndSeconds())
+      for name in expected.getFieldNames():
+        self.assertEqual(cached.getFieldMin(name), expected.getFieldMin(name))
+        self.assertEqual(cached.getFieldMax(name), expected.getFieldMax(name))
+
+      expectedRecords = _readAll(expected)
+      self.assertEqual(cached.getDataRowCount(), len(expectedRecords))
+      self.assertEqual(_readAll(cached), expectedRecords)
+      self.assertIsNone(cached.getNextRecordDict())
+
+
+  def testReusesAndInvalidatesEntries(self):
+    streamDef = _getStreamDef(self.dataPath)
+    cache = DatasetCache(self.cacheDir)
+    firstDir = cache.openStream(streamDef).datasetDir
+    self.assertEqual(cache.openStream(streamDef).datasetDir, firstDir)
+    self.assertEqual(os.listdir(self.cacheDir), [os.path.basename(firstDir)])
+
+    with open(self.dataPath, "a") as outFile:
+      outFile.write("2017-01-02 00:00:00,1.0,label0,50\n")
+    os.utime(self.dataPath, (time.time() + 10, time.time() + 10))
+
+    stream = cache.openStream(streamDef)
+    self.assertNotEqual(stream.datasetDir, firstDir)
+    self.assertEqual(stream.getDataRowCount(), 51)
+
+
+  def testUncacheableFieldType(self):
+    with open(self.dataPath, "w") as outFile:
+      outFile.write("timestamp,values\ndatetime,list\nT,\n"
+                    "2017-01-01 00:00:00,1 2\n")
+    self.assertIsNone(
+      DatasetCache(self.cacheDir).openStream(_getStreamDef(self.dataPath)))
+
+
+  def testEncodingCache(self):
+    streamDef = _getStreamDef(self.dataPath)
+    description = _getModelDescription()
+    cache = DatasetCache(self.cacheDir)
+
+    stream = cache.openStream(streamDef)
+    model = ModelFactory.create(description)
+    self.assertEqual(cache.attachEncodingCache(model, description, stream), 2)
+    multiEncoder = model._getEncoder()
+    wrapped = dict((name, encoder) for name, encoder, _ in multiEncoder.encoders)
+    self.assertIsInstance(wrapped["value"], _CachedEncoder)
+    self.assertIsInstance(wrapped["timestamp"], _CachedEncoder)
+    self.assertNotIsInstance(wrapped["count"], _CachedEncoder)
+
+    reference = ModelFactory.create(description)._getEncoder()
+    while True:
+      record = stream.getNextRecordDict()
+      if record is None:
+        break
+      expected = numpy.zeros(reference.getWidth(), dtype=numpy.float32)
+      reference.encodeIntoArray(record, expected)
+      actual = numpy.ones(multiEncoder.getWidth(), dtype=numpy.float32)
+      multiEncoder.encodeIntoArray(record, actual)
+      numpy.testing.assert_array_equal(actual, expected)
+
+    # Values that don't come from the stream use the encoder itself
+    encoder = wrapped["value"]
+    output = numpy.zeros(encoder.getWidth())
+    encoder.encodeIntoArray(12.5, output)
+    numpy.testing.assert_array_equal(output, encoder.encode(12.5))
+
+    # Pickling stores the wrapped encoder
+    self.assertIs(type(pickle.loads(pickle.dumps(encoder))), ScalarEncoder)
+
+    # A second model reuses the cached encodings
+    encodingsDir = os.path.join(stream.datasetDir, "encodings")
+    cachedFiles = sorted(os.listdir(encodingsDir))
+    self.assertEqual(len(cachedFiles), 2)
+    mtimes = [os.path.getmtime(os.path.join(encodingsDir, name))
+              for name in cachedFiles]
+    self.assertEqual(cache.attachEncodingCache(
+      ModelFactory.create(description), description, stream), 2)
+    self.assertEqual(mtimes, [os.path.getmtime(os.path.join(encodingsDir, name))
+                              for name in cachedFiles])
+
+
+  def testInconsistentEncodingsAreRebuilt(self):
+    streamDef = _getStreamDef(self.dataPath)
+    description = _getModelDescription()
+    cache = DatasetCache(self.cacheDir)
+    stream = cache.openStream(streamDef)
+    cache.attachEncodingCache(ModelFactory.create(description), description,
+                              stream)
+
+    encodingsDir = os.path.join(stream.datasetDir, "encodings")
+    paths = [os.path.join(encodingsDir, name)
+             for name in sorted(os.listdir(encodingsDir))]
+    expected = [numpy.load(path) for path in paths]
+    # Offsets that point past the indices, e.g. from another build
+    encodings = expected[0].copy()
+    encodings[encodings[0]] += 1
+    numpy.save(paths[0], encodings)
+    numpy.save(paths[1], expected[1][:1])
+
+    model = ModelFactory.create(description)
+    self.assertEqual(cache.attachEncodingCache(model, description, stream), 2)
+    for path, array in zip(paths, expected):
+      numpy.testing.assert_array_equal(numpy.load(path), array)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
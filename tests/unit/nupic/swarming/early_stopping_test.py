@@ -0,0 +1,172 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for the EarlyStopper class."""
+
+import logging
+
+import numpy
+import unittest2 as unittest
+
+from nupic.database.client_jobs_dao import ClientJobsDAO
+from nupic.swarming.hypersearch.early_stopping import EarlyStopper
+from nupic.swarming.hypersearch_v2 import HypersearchV2, ResultsDB
+
+
+
+class _ModelsTableStub(object):
+  """ The engStop field of the models table, shared by all the workers. """
+
+  def __init__(self):
+    self.engStop = {}
+
+  def modelSetFields(self, modelID, fields, ignoreUnchanged=False):
+    self.engStop[modelID] = fields["engStop"]
+
+
+
+class _HypersearchStub(object):
+  """ The attributes of HypersearchV2 that recordModelProgress reads. """
+  _maximize = False
+  _minParticlesPerSwarm = 3
+  logger = logging.getLogger(__name__)
+
+  def __init__(self, cjDAO):
+    self._earlyStopper = EarlyStopper(policy="median", minRecords=100,
+                                      reductionFactor=2, minPeers=2)
+    self._resultsDB = ResultsDB(self)
+    self._cjDAO = cjDAO
+
+  recordModelProgress = HypersearchV2.recordModelProgress.im_func
+
+
+
+class EarlyStopperTest(unittest.TestCase):
+  """EarlyStopper unit tests."""
+
+
+  def testDisabledByDefault(self):
+    stopper = EarlyStopper()
+    self.assertFalse(stopper.isEnabled())
+    for modelId in xrange(10):
+      self.assertFalse(stopper.recordDataPoint(modelId, "swarm", 10000,
+                                               float(modelId)))
+
+
+  def testMilestones(self):
+    stopper = EarlyStopper(policy="halving", minRecords=100,
+                           reductionFactor=3)
+    self.assertEqual([stopper.getMilestone(i) for i in xrange(4)],
+                     [100, 300, 900, 2700])
+
+
+  def testHalving(self):
+    stopper = EarlyStopper(policy="halving", minRecords=100, reductionFactor=2,
+                           minPeers=3)
+
+    # Too few peers to decide
+    self.assertFalse(stopper.recordDataPoint(1, "a", 50, 9.0))
+    self.assertFalse(stopper.recordDataPoint(1, "a", 100, 9.0))
+    self.assertFalse(stopper.recordDataPoint(2, "a", 100, 1.0))
+    self.assertFalse(stopper.recordDataPoint(3, "a", 100, 2.0))
+
+    # Only the best half of the models at the milestone keep running
+    self.assertFalse(stopper.recordDataPoint(4, "a", 100, 0.5))
+    self.assertTrue(stopper.recordDataPoint(5, "a", 100, 3.0))
+    self.assertEqual(stopper.stoppedModels, set([5]))
+
+    # Models of other swarms aren't peers
+    self.assertFalse(stopper.recordDataPoint(6, "b", 100, 100.0))
+
+    # Each milestone is only recorded once per model
+    self.assertFalse(stopper.recordDataPoint(1, "a", 150, 20.0))
+    self.assertEqual(stopper.milestoneScores["a"][0][1], 9.0)
+
+    # A report that skips milestones is recorded at the highest one
+    self.assertFalse(stopper.recordDataPoint(2, "a", 450, 1.0))
+    self.assertEqual(len(stopper.milestoneScores["a"]), 3)
+    self.assertEqual(stopper.milestoneScores["a"][2], {2: 1.0})
+
+
+  def testMedian(self):
+    stopper = EarlyStopper(policy="median", minRecords=100, reductionFactor=2,
+                           minPeers=2)
+    self.assertFalse(stopper.recordDataPoint(1, "a", 100, 1.0))
+    self.assertFalse(stopper.recordDataPoint(2, "a", 100, 3.0))
+    self.assertFalse(stopper.recordDataPoint(3, "a", 100, 2.0))
+    self.assertTrue(stopper.recordDataPoint(4, "a", 100, 2.5))
+
+    # Completed models are recorded as peers but never stopped
+    self.assertFalse(stopper.recordDataPoint(5, "a", 100, 10.0,
+                                             completed=True))
+    self.assertEqual(len(stopper.milestoneScores["a"][0]), 5)
+
+
+  def testStoppedModelsHaveNoFinalScore(self):
+    for completionReason, numRecords, errScore in (
+        (ClientJobsDAO.CMPL_REASON_KILLED, 150, numpy.inf),
+        # The model reached the end of the data before it saw the stop request:
+        #  it ran to completion, so its result counts
+        (ClientJobsDAO.CMPL_REASON_EOF, 200, 2.5)):
+      modelsTable = _ModelsTableStub()
+      # The worker that stops the model sees its milestone results, another
+      #  worker or a restarted one only sees the final model records
+      deciding = _HypersearchStub(modelsTable)
+      other = _HypersearchStub(modelsTable)
+      for modelID, metric in enumerate((1.0, 2.0, 3.0)):
+        particleState = dict(id=str(modelID), genIdx=0, swarmId="a",
+                             varStates={})
+        for hs in (deciding, other):
+          hs.recordModelProgress(modelID, dict(particleState=particleState),
+                                 str(modelID), None, completed=False,
+                                 completionReason=None, matured=False,
+                                 numRecords=0)
+        deciding.recordModelProgress(modelID, None, str(modelID),
+                                     (None, {"metric": metric}),
+                                     completed=False, completionReason=None,
+                                     matured=False, numRecords=100)
+      self.assertEqual(modelsTable.engStop,
+                       {2: ClientJobsDAO.STOP_REASON_KILLED})
+
+      finalRecords = [(0, ClientJobsDAO.CMPL_REASON_EOF, 200, 0.5),
+                      (1, ClientJobsDAO.CMPL_REASON_EOF, 200, 1.5),
+                      (2, completionReason, numRecords, 2.5)]
+      for hs in (deciding, other):
+        for modelID, reason, modelNumRecords, metric in finalRecords:
+          hs.recordModelProgress(modelID, None, str(modelID),
+                                 (None, {"metric": metric}), completed=True,
+                                 completionReason=reason, matured=True,
+                                 numRecords=modelNumRecords)
+        self.assertEqual(hs._resultsDB.getParticleInfos("a")[2],
+                         [0.5, 1.5, errScore])
+        self.assertEqual(hs._resultsDB.bestModelIdAndErrScore("a"), (0, 0.5))
+
+
+  def testInvalidArguments(self):
+    with self.assertRaises(ValueError):
+      EarlyStopper(policy="asap")
+    with self.assertRaises(ValueError):
+      EarlyStopper(policy="median", reductionFactor=1)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
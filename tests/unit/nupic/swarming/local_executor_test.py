@@ -0,0 +1,245 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for the local swarm executor."""
+
+import json
+import threading
+import time
+import uuid
+
+import unittest2 as unittest
+
+from nupic.support.configuration import Configuration
+from nupic.swarming.local_executor import LocalJobsDAO, LocalSwarmExecutor
+
+
+
+SWARM_DESCRIPTION = {
+  "includedFields": [
+    {"fieldName": "timestamp", "fieldType": "datetime"},
+    {"fieldName": "consumption", "fieldType": "float"},
+  ],
+  "streamDef": {
+    "info": "test",
+    "version": 1,
+    "streams": [
+      {"info": "rec-center-hourly",
+       "source": "file://extra/hotgym/rec-center-hourly.csv",
+       "columns": ["*"],
+       "last_record": 50},
+    ],
+  },
+  "inferenceType": "TemporalMultiStep",
+  "inferenceArgs": {"predictionSteps": [1], "predictedField": "consumption"},
+  "iterationCount": 50,
+}
+
+
+
+def _makeJobParams(maxModels, **kwargs):
+  jobParams = {"hsVersion": "v2",
+               "maxModels": maxModels,
+               "persistentJobGUID": str(uuid.uuid1()),
+               "description": SWARM_DESCRIPTION}
+  jobParams.update(kwargs)
+  return jobParams
+
+
+
+class LocalJobsDAOTest(unittest.TestCase):
+  """LocalJobsDAO unit tests."""
+
+
+  def setUp(self):
+    self.dao = LocalJobsDAO()
+    self.jobID = self.dao.jobInsert(client="test", cmdLine="", params="{}",
+                                    alreadyRunning=True)
+
+
+  def testJobFields(self):
+    self.assertEqual(self.jobID, 1000)
+    jobInfo = self.dao.jobInfo(self.jobID)
+    self.assertEqual(jobInfo.status, LocalJobsDAO.STATUS_RUNNING)
+    self.assertEqual(jobInfo.workerCompletionReason,
+                     LocalJobsDAO.CMPL_REASON_SUCCESS)
+    self.assertFalse(jobInfo.cancel)
+
+    self.assertTrue(self.dao.jobSetFieldIfEqual(self.jobID, "results", "a",
+                                                None))
+    self.assertFalse(self.dao.jobSetFieldIfEqual(self.jobID, "results", "b",
+                                                 None))
+    self.assertEqual(self.dao.jobGetFields(self.jobID, ["results"]), ["a"])
+
+    # Like the database implementation, not changing anything is an error
+    with self.assertRaises(RuntimeError):
+      self.dao.jobSetFields(self.jobID, {"results": "a"})
+    self.dao.jobSetFields(self.jobID, {"results": "a"}, ignoreUnchanged=True)
+
+    self.dao.jobCancel(self.jobID)
+    self.dao.jobSetCompleted(self.jobID, LocalJobsDAO.CMPL_REASON_SUCCESS, "")
+    jobInfo = self.dao.jobInfo(self.jobID)
+    self.assertTrue(jobInfo.cancel)
+    self.assertEqual(jobInfo.status, LocalJobsDAO.STATUS_COMPLETED)
+    self.assertIsNotNone(jobInfo.endTime)
+
+
+  def testModelLifecycle(self):
+    modelID, inserted = self.dao.modelInsertAndStart(self.jobID, "{}", "p1",
+                                                     "q1")
+    self.assertTrue(inserted)
+    # Duplicate params or particle hashes return the existing model
+    self.assertEqual(self.dao.modelInsertAndStart(self.jobID, "{}", "p1", "q2"),
+                     (modelID, False))
+    self.assertEqual(self.dao.modelInsertAndStart(self.jobID, "{}", "p2", "q1"),
+                     (modelID, False))
+    self.assertEqual(self.dao.jobGetModelIDs(self.jobID), [modelID])
+
+    self.dao.modelUpdateResults(modelID, results="{}", metricValue=0.5,
+                                numRecords=10)
+    self.assertEqual(
+      self.dao.modelsGetFields(modelID, ["optimizedMetric", "numRecords"]),
+      [0.5, 10])
+    self.assertEqual(self.dao.modelsGetUpdateCounters(self.jobID),
+                     [(modelID, 1)])
+
+    self.dao.modelSetCompleted(modelID, LocalJobsDAO.CMPL_REASON_EOF, None)
+    result = self.dao.modelsGetResultAndStatus([modelID])[0]
+    self.assertEqual(result.status, LocalJobsDAO.STATUS_COMPLETED)
+    self.assertEqual(result.updateCounter, 2)
+    self.assertEqual(result.engParamsHash, "p1".ljust(16, "\0"))
+
+    modelInfo = self.dao.modelsInfo([modelID])[0]
+    self.assertEqual(modelInfo.completionReason, LocalJobsDAO.CMPL_REASON_EOF)
+    self.assertEqual(modelInfo.completionMsg, "")
+    self.assertIsNone(self.dao.modelAdoptNextOrphan(self.jobID, 0))
+
+
+  def testWaitForModelChanges(self):
+    counter = self.dao.waitForModelChanges(0, timeout=0)
+
+    start = time.time()
+    self.assertEqual(self.dao.waitForModelChanges(counter, timeout=0.05),
+                     counter)
+    self.assertGreaterEqual(time.time() - start, 0.04)
+
+    timer = threading.Timer(
+      0.05, self.dao.modelInsertAndStart, (self.jobID, "{}", "p1"))
+    timer.start()
+    try:
+      self.assertGreater(self.dao.waitForModelChanges(counter, timeout=10),
+                         counter)
+    finally:
+      timer.join()
+
+
+  def testModelsGetChanges(self):
+    modelID1, _ = self.dao.modelInsertAndStart(self.jobID, "{}", "p1")
+    modelID2, _ = self.dao.modelInsertAndStart(self.jobID, "{}", "p2")
+    self.assertEqual([r.modelId for r in self.dao.modelsGetChanges(self.jobID)],
+                     [modelID1, modelID2])
+    self.assertEqual(self.dao.modelsGetChanges(self.jobID), [])
+
+    # Queued updates are applied, and only the changed models are returned
+    changes = self.dao.modelsGetChanges(self.jobID, [
+      ("modelUpdateResults", (modelID2,),
+       {"results": "{}", "metricValue": 0.5, "numRecords": 10}),
+      ("modelSetCompleted", (modelID2, LocalJobsDAO.CMPL_REASON_EOF, None),
+       {})])
+    self.assertEqual(len(changes), 1)
+    self.assertEqual(changes[0].modelId, modelID2)
+    self.assertEqual(changes[0].numRecords, 10)
+    self.assertEqual(changes[0].status, LocalJobsDAO.STATUS_COMPLETED)
+
+    # Changes made outside of modelsGetChanges() are tracked as well
+    self.dao.modelSetFields(modelID1, {"engStop": "killed"})
+    self.assertEqual([r.modelId for r in self.dao.modelsGetChanges(self.jobID)],
+                     [modelID1])
+
+    with self.assertRaises(ValueError):
+      self.dao.modelsGetChanges(self.jobID, [("jobCancel", (self.jobID,), {})])
+
+
+
+class LocalSwarmExecutorTest(unittest.TestCase):
+  """LocalSwarmExecutor unit tests."""
+
+
+  def setUp(self):
+    # Start from the default configuration; Hypersearch reads its settings
+    # from there
+    Configuration.clear()
+
+
+  def tearDown(self):
+    Configuration.clear()
+
+
+  def testRunDummySwarm(self):
+    executor = LocalSwarmExecutor(
+      _makeJobParams(maxModels=6, dummyModel={"iterations": 10}),
+      numWorkers=3)
+    try:
+      self.assertEqual(executor.run(), executor.jobID)
+      jobsDAO = executor.jobsDAO
+      self.assertEqual(jobsDAO.STATUS_COMPLETED,
+                       LocalJobsDAO.STATUS_COMPLETED)
+
+      jobInfo = jobsDAO.jobInfo(executor.jobID)
+      self.assertEqual(jobInfo.status, LocalJobsDAO.STATUS_COMPLETED)
+      self.assertEqual(jobInfo.completionReason,
+                       LocalJobsDAO.CMPL_REASON_SUCCESS)
+      self.assertEqual(jobInfo.workerCompletionReason,
+                       LocalJobsDAO.CMPL_REASON_SUCCESS)
+      self.assertIsNotNone(jobInfo.genBaseDescription)
+      self.assertIn(json.loads(jobInfo.results)["bestModel"],
+                    jobsDAO.jobGetModelIDs(executor.jobID))
+
+      modelInfos = jobsDAO.modelsInfo(jobsDAO.jobGetModelIDs(executor.jobID))
+      self.assertEqual(len(modelInfos), 6)
+      for modelInfo in modelInfos:
+        self.assertEqual(modelInfo.status, LocalJobsDAO.STATUS_COMPLETED)
+        self.assertEqual(modelInfo.completionReason,
+                         LocalJobsDAO.CMPL_REASON_EOF)
+        self.assertEqual(modelInfo.numRecords, 10)
+    finally:
+      executor.close()
+
+
+  def testCoordinatorErrorFailsJob(self):
+    jobParams = _makeJobParams(maxModels=1)
+    del jobParams["description"]
+    executor = LocalSwarmExecutor(jobParams, numWorkers=1)
+    try:
+      with self.assertRaises(RuntimeError):
+        executor.run()
+      jobInfo = executor.jobsDAO.jobInfo(executor.jobID)
+      self.assertEqual(jobInfo.status, LocalJobsDAO.STATUS_COMPLETED)
+      self.assertEqual(jobInfo.completionReason,
+                       LocalJobsDAO.CMPL_REASON_ERROR)
+      self.assertTrue(jobInfo.cancel)
+    finally:
+      executor.close()
+
+
+
+if __name__ == "__main__":
+  unittest.main()
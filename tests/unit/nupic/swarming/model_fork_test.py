@@ -0,0 +1,240 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for checkpoint-and-fork evaluation of swarm models."""
+
+import copy
+import cPickle as pickle
+import math
+import os
+import shutil
+import tempfile
+
+import numpy
+import unittest2 as unittest
+
+from nupic.frameworks.opf.model_factory import ModelFactory
+from nupic.swarming.model_fork import (SpatialPoolerForks,
+                                       _ForkedSpatialPooler,
+                                       _RecordingSpatialPooler)
+
+
+
+MODEL_DESCRIPTION = {
+  "model": "HTMPrediction",
+  "version": 1,
+  "predictAheadTime": None,
+  "modelParams": {
+    "inferenceType": "TemporalMultiStep",
+    "sensorParams": {
+      "verbosity": 0,
+      "sensorAutoReset": None,
+      "encoders": {
+        "value": {"fieldname": "value", "name": "value", "n": 50, "w": 21,
+                  "minval": 0, "maxval": 10, "clipInput": True,
+                  "type": "ScalarEncoder"},
+      },
+    },
+    "spEnable": True,
+    "spParams": {"spVerbosity": 0, "spatialImp": "cpp",
+                 "globalInhibition": 1, "columnCount": 128,
+                 "inputWidth": 0, "numActiveColumnsPerInhArea": 8,
+                 "seed": 1956, "potentialPct": 0.8,
+                 "synPermConnected": 0.1, "synPermActiveInc": 0.05,
+                 "synPermInactiveDec": 0.01, "boostStrength": 0.0},
+    "tmEnable": True,
+    "tmParams": {"verbosity": 0, "columnCount": 128, "cellsPerColumn": 4,
+                 "inputWidth": 128, "seed": 1960, "temporalImp": "cpp",
+                 "newSynapseCount": 6, "maxSynapsesPerSegment": 16,
+                 "maxSegmentsPerCell": 16, "initialPerm": 0.21,
+                 "permanenceInc": 0.1, "permanenceDec": 0.1,
+                 "globalDecay": 0.0, "maxAge": 0, "minThreshold": 3,
+                 "activationThreshold": 4, "outputType": "normal",
+                 "pamLength": 1},
+    "clEnable": True,
+    "clParams": {"regionName": "SDRClassifierRegion", "verbosity": 0,
+                 "alpha": 0.1, "steps": "1"},
+    "trainSPNetOnlyIfRequested": False,
+  },
+}
+
+
+
+def _getRecords(numRecords, offset=0.0):
+  return [{"value": 5.0 + 4.0 * math.sin((i + offset) * 0.3)}
+          for i in xrange(numRecords)]
+
+
+
+def _createModel(**tmParams):
+  description = copy.deepcopy(MODEL_DESCRIPTION)
+  description["modelParams"]["tmParams"].update(tmParams)
+  model = ModelFactory.create(description)
+  model.enableInference({"predictedField": "value"})
+  return model, description
+
+
+
+def _run(model, records):
+  return [model.run(record).inferences for record in records]
+
+
+
+def _getSP(model):
+  return model._getSPRegion().getSelf()._sfdr
+
+
+
+class SpatialPoolerForksTest(unittest.TestCase):
+  """SpatialPoolerForks unit tests."""
+
+
+  def setUp(self):
+    self.forksDir = tempfile.mkdtemp()
+    self.forks = SpatialPoolerForks(self.forksDir, checkpointInterval=64)
+
+    # Record the spatial pooler run of a first model
+    model, description = _createModel()
+    recorder = self.forks.attach(model, description)
+    self.assertIsInstance(recorder, _RecordingSpatialPooler)
+    _run(model, _getRecords(200))
+    recorder.finish()
+
+
+  def tearDown(self):
+    shutil.rmtree(self.forksDir)
+
+
+  def _fork(self, **tmParams):
+    model, description = _createModel(**tmParams)
+    fork = self.forks.attach(model, description)
+    self.assertIsInstance(fork, _ForkedSpatialPooler)
+    return model, fork
+
+
+  def testForkMatchesFullRun(self):
+    model, fork = self._fork(activationThreshold=3, minThreshold=2)
+    reference, _ = _createModel(activationThreshold=3, minThreshold=2)
+
+    records = _getRecords(200)
+    self.assertEqual(_run(model, records), _run(reference, records))
+    self.assertEqual(fork.numForkedRecords, 200)
+
+    # Past the end of the recording the model computes its spatial pooler
+    records = _getRecords(80, offset=200)
+    self.assertEqual(_run(model, records), _run(reference, records))
+    self.assertEqual(fork.numForkedRecords, 200)
+
+
+  def testDivergingInputDetaches(self):
+    model, fork = self._fork(pamLength=2)
+    reference, _ = _createModel(pamLength=2)
+
+    records = _getRecords(100) + _getRecords(50, offset=0.5)
+    self.assertEqual(_run(model, records), _run(reference, records))
+    self.assertEqual(fork.numForkedRecords, 100)
+
+
+  def testPicklingStoresUpToDateSpatialPooler(self):
+    model, fork = self._fork(permanenceInc=0.05)
+    reference, _ = _createModel(permanenceInc=0.05)
+    records = _getRecords(150)
+    _run(model, records)
+    _run(reference, records)
+
+    sp = pickle.loads(pickle.dumps(fork))
+    self.assertIs(type(sp), type(_getSP(reference)))
+
+    inputVector = numpy.zeros(sp.getNumInputs(), dtype=numpy.uint32)
+    for start in xrange(0, 30, 3):
+      inputVector[:] = 0
+      inputVector[start:start + 21] = 1
+      expected = numpy.zeros(sp.getNumColumns(), dtype=numpy.uint32)
+      actual = numpy.zeros(sp.getNumColumns(), dtype=numpy.uint32)
+      _getSP(reference).compute(inputVector, False, expected)
+      sp.compute(inputVector, False, actual)
+      numpy.testing.assert_array_equal(actual, expected)
+
+
+  def testSetParameterReachesSpatialPooler(self):
+    model, fork = self._fork(pamLength=3)
+    _run(model, _getRecords(100))
+    spRegion = model._getSPRegion().getSelf()
+    spRegion.setParameter("synPermActiveInc", -1, 0.2)
+    self.assertNotIn("synPermActiveInc", fork.__dict__)
+    self.assertEqual(fork._sp.synPermActiveInc, 0.2)
+
+    # The fork detached first, so it computes the next records itself
+    _run(model, _getRecords(10))
+    self.assertTrue(fork._detached)
+    self.assertEqual(fork.numForkedRecords, 100)
+
+    # A recording whose parameters change is discarded
+    forksDir = os.path.join(self.forksDir, "changed")
+    forks = SpatialPoolerForks(forksDir, checkpointInterval=64)
+    model, description = _createModel()
+    recorder = forks.attach(model, description)
+    _run(model, _getRecords(20))
+    model._getSPRegion().getSelf().setParameter("synPermActiveInc", -1, 0.2)
+    self.assertEqual(recorder._sp.synPermActiveInc, 0.2)
+    recorder.finish()
+    self.assertEqual(os.listdir(forksDir), [])
+
+
+  def testAbortDeletesRecording(self):
+    forksDir = os.path.join(self.forksDir, "aborted")
+    forks = SpatialPoolerForks(forksDir, checkpointInterval=8)
+    model, description = _createModel()
+    recorder = forks.attach(model, description)
+    _run(model, _getRecords(20))
+    self.assertEqual(len(os.listdir(forksDir)), 1)
+    recorder.abort()
+    recorder.finish()
+    self.assertEqual(os.listdir(forksDir), [])
+
+
+  def testFirstRecordingWins(self):
+    forksDir = os.path.join(self.forksDir, "concurrent")
+    forks = SpatialPoolerForks(forksDir, checkpointInterval=64)
+    recorders = []
+    for numRecords in (30, 20):
+      model, description = _createModel()
+      recorders.append(forks.attach(model, description))
+      _run(model, _getRecords(numRecords))
+    for recorder in recorders:
+      self.assertIsInstance(recorder, _RecordingSpatialPooler)
+      recorder.finish()
+
+    self.assertEqual(len(os.listdir(forksDir)), 1)
+    model, description = _createModel()
+    self.assertEqual(forks.attach(model, description)._recording.numRecords, 30)
+
+    # Other spatial pooler parameters get their own recording
+    description = copy.deepcopy(MODEL_DESCRIPTION)
+    description["modelParams"]["spParams"]["synPermActiveInc"] = 0.1
+    model = ModelFactory.create(description)
+    self.assertIsInstance(forks.attach(model, description),
+                          _RecordingSpatialPooler)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
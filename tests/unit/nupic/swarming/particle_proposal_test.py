@@ -0,0 +1,147 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for the ParticleProposer class."""
+
+import random
+
+import unittest2 as unittest
+
+from nupic.swarming.hypersearch.particle_proposal import ParticleProposer
+from nupic.swarming.hypersearch.permutation_helpers import (PermuteChoices,
+                                                            PermuteFloat,
+                                                            PermuteInt)
+
+
+
+def _errScore(position):
+  return ((position["x"] - 7.0) ** 2 + (position["n"] - 3) ** 2 +
+          (0.0 if position["c"] == "b" else 10.0))
+
+
+
+def _createVars():
+  return {"x": PermuteFloat(0.0, 10.0),
+          "n": PermuteInt(1, 20),
+          "c": PermuteChoices(["a", "b", "c"])}
+
+
+
+def _getPosition(permuteVars):
+  return dict((varName, var.getPosition())
+              for (varName, var) in permuteVars.iteritems())
+
+
+
+def _psoMove(permuteVars, rng, whichVars=None):
+  def psoMove():
+    for (varName, var) in permuteVars.iteritems():
+      if whichVars is None or varName in whichVars:
+        var.newPosition(None, rng)
+  return psoMove
+
+
+
+class ParticleProposerTest(unittest.TestCase):
+  """ParticleProposer unit tests."""
+
+
+  def setUp(self):
+    rng = random.Random(42)
+    self.positions = [{"x": rng.uniform(0.0, 10.0),
+                       "n": rng.randint(1, 20),
+                       "c": rng.choice(["a", "b", "c"])}
+                      for _ in xrange(40)]
+    self.errScores = [_errScore(position) for position in self.positions]
+
+
+  def testDisabledByDefault(self):
+    self.assertFalse(ParticleProposer().isEnabled())
+    self.assertTrue(ParticleProposer(strategy="tpe").isEnabled())
+    with self.assertRaises(ValueError):
+      ParticleProposer(strategy="bayes")
+    with self.assertRaises(ValueError):
+      ParticleProposer(strategy="tpe", gamma=1.0)
+
+
+  def testSurrogateFavorsBestResults(self):
+    proposer = ParticleProposer(strategy="tpe", minResults=10, gamma=0.25)
+    surrogate = proposer.fitSurrogate(_createVars(), self.positions,
+                                      self.errScores)
+    good = surrogate.score({"x": 7.0, "n": 3, "c": "b"})
+    self.assertGreater(good, surrogate.score({"x": 1.0, "n": 3, "c": "b"}))
+    self.assertGreater(good, surrogate.score({"x": 7.0, "n": 18, "c": "b"}))
+    self.assertGreater(good, surrogate.score({"x": 7.0, "n": 3, "c": "a"}))
+
+    # Infinite errScores (models without results yet) are ignored
+    self.assertIsNone(proposer.fitSurrogate(
+      _createVars(), self.positions, [float("inf")] * len(self.positions)))
+
+
+  def testFallsBackToPSOWithFewResults(self):
+    proposer = ParticleProposer(strategy="tpe", minResults=10)
+    permuteVars = _createVars()
+    before = _getPosition(permuteVars)
+    self.assertFalse(proposer.proposePosition(
+      permuteVars, self.positions[:9], self.errScores[:9],
+      _psoMove(permuteVars, random.Random(1)), random.Random(1)))
+    self.assertEqual(_getPosition(permuteVars), before)
+
+
+  def testProposalsBeatPSOMoves(self):
+    proposer = ParticleProposer(strategy="tpe", numCandidates=24,
+                                minResults=10, gamma=0.25)
+    rng = random.Random(7)
+    psoScores = []
+    tpeScores = []
+    for _ in xrange(20):
+      permuteVars = _createVars()
+      _psoMove(permuteVars, rng)()
+      psoScores.append(_errScore(_getPosition(permuteVars)))
+
+      permuteVars = _createVars()
+      self.assertTrue(proposer.proposePosition(
+        permuteVars, self.positions, self.errScores,
+        _psoMove(permuteVars, rng), rng))
+      position = _getPosition(permuteVars)
+      self.assertNotIn(position, self.positions)
+      tpeScores.append(_errScore(position))
+
+    self.assertLess(sum(tpeScores), 0.5 * sum(psoScores))
+
+
+  def testOnlyMovesSelectedVars(self):
+    proposer = ParticleProposer(strategy="tpe", minResults=10)
+    permuteVars = _createVars()
+    before = _getPosition(permuteVars)
+    rng = random.Random(3)
+    self.assertTrue(proposer.proposePosition(
+      permuteVars, self.positions, self.errScores,
+      _psoMove(permuteVars, rng, ["x"]), rng, whichVars=["x"]))
+    after = _getPosition(permuteVars)
+    self.assertEqual(after["c"], before["c"])
+    self.assertEqual(after["n"], before["n"])
+    self.assertNotEqual(after["x"], before["x"])
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,198 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for the indexed queries of HypersearchV2's ResultsDB."""
+
+import logging
+import random
+
+import numpy
+import unittest2 as unittest
+
+from nupic.database.client_jobs_dao import ClientJobsDAO
+from nupic.swarming.hypersearch_v2 import ResultsDB
+
+
+
+SWARM_IDS = ("a", "a.b", "a.c")
+
+
+
+class _HypersearchStub(object):
+  """ The attributes of HypersearchV2 that ResultsDB reads. """
+  _maximize = False
+  _minParticlesPerSwarm = 3
+  logger = logging.getLogger(__name__)
+
+
+
+def _scanParticleInfos(resultsDB, swarmId=None, genIdx=None, completed=None,
+                       matured=None, lastDescendent=False):
+  """ Reference implementation of getParticleInfos: a scan over all
+  results. """
+  infos = ([], [], [], [], [])
+  for entry in resultsDB._allResults:
+    particleState = entry['modelParams']['particleState']
+    if swarmId is not None and (entry['hidden'] or
+                                particleState['swarmId'] != swarmId):
+      continue
+    if genIdx is not None and particleState['genIdx'] != genIdx:
+      continue
+    if completed is not None and completed != entry['completed']:
+      continue
+    if matured is not None and matured != entry['matured']:
+      continue
+    if lastDescendent and (resultsDB._particleLatestGenIdx[particleState['id']]
+                           != particleState['genIdx']):
+      continue
+    for values, value in zip(infos, (particleState, entry['modelID'],
+                                     entry['errScore'], entry['completed'],
+                                     entry['matured'])):
+      values.append(value)
+  return infos
+
+
+
+def _scanBestModelIdAndErrScore(resultsDB, swarmId, genIdx=None):
+  bestModelId, bestScore = None, numpy.inf
+  for i, (modelId, errScore) in enumerate(
+      resultsDB._swarmBestOverall.get(swarmId, [])):
+    if genIdx is not None and i > genIdx:
+      break
+    if errScore < bestScore:
+      bestModelId, bestScore = modelId, errScore
+  return (bestModelId, bestScore)
+
+
+
+class ResultsDBTest(unittest.TestCase):
+  """ResultsDB unit tests."""
+
+
+  def _runRandomUpdates(self, resultsDB, numModels, rng):
+    running = []
+    firstID = len(resultsDB._allResults)
+    for modelID in xrange(firstID, firstID + numModels):
+      swarmId = rng.choice(SWARM_IDS)
+      particleState = dict(id="%s-%d" % (swarmId, rng.randint(0, 4)),
+                           genIdx=rng.randint(0, 5), swarmId=swarmId,
+                           varStates={"x": {"position": rng.random()}})
+      resultsDB.update(modelID=modelID,
+                       modelParams=dict(particleState=particleState),
+                       modelParamsHash=str(modelID), metricResult=None,
+                       completed=False, completionReason=None, matured=False,
+                       numRecords=0)
+      running.append(modelID)
+
+      # Progress and complete some of the running models
+      for runningID in rng.sample(running, min(len(running), 2)):
+        completed = rng.random() < 0.5
+        reason = rng.choice([ClientJobsDAO.CMPL_REASON_EOF,
+                             ClientJobsDAO.CMPL_REASON_STOPPED,
+                             ClientJobsDAO.CMPL_REASON_KILLED,
+                             ClientJobsDAO.CMPL_REASON_ORPHAN])
+        resultsDB.update(modelID=runningID, modelParams=None,
+                         modelParamsHash=str(runningID),
+                         metricResult=round(rng.random() * 10, 1),
+                         completed=completed,
+                         completionReason=reason if completed else None,
+                         matured=completed or rng.random() < 0.2,
+                         numRecords=100)
+        if completed:
+          running.remove(runningID)
+
+
+  def _checkQueries(self, resultsDB):
+    self.assertEqual(resultsDB.getParticleInfos(),
+                     _scanParticleInfos(resultsDB))
+    self.assertEqual(resultsDB.getParticleInfos(completed=False),
+                     _scanParticleInfos(resultsDB, completed=False))
+    self.assertEqual(resultsDB.getParticleInfos(matured=False),
+                     _scanParticleInfos(resultsDB, matured=False))
+    self.assertEqual(
+      resultsDB.numModels(),
+      len([e for e in resultsDB._allResults if not e['hidden']]))
+
+    for swarmId in SWARM_IDS:
+      queries = [dict(), dict(completed=False), dict(completed=True),
+                 dict(matured=False), dict(matured=True),
+                 dict(matured=True, lastDescendent=True)]
+      for genIdx in xrange(7):
+        queries.append(dict(genIdx=genIdx))
+        queries.append(dict(genIdx=genIdx, matured=False))
+        self.assertEqual(
+          resultsDB.bestModelIdAndErrScore(swarmId, genIdx),
+          _scanBestModelIdAndErrScore(resultsDB, swarmId, genIdx))
+
+        orphans = resultsDB.getOrphanParticleInfos(swarmId, genIdx)
+        self.assertEqual(
+          orphans[1],
+          [e['modelID'] for e in resultsDB._allResults if e['hidden'] and
+           e['modelParams']['particleState']['swarmId'] == swarmId and
+           e['modelParams']['particleState']['genIdx'] == genIdx])
+
+      for query in queries:
+        self.assertEqual(resultsDB.getParticleInfos(swarmId, **query),
+                         _scanParticleInfos(resultsDB, swarmId, **query),
+                         query)
+      self.assertEqual(resultsDB.bestModelIdAndErrScore(swarmId),
+                       _scanBestModelIdAndErrScore(resultsDB, swarmId))
+
+
+  def testIndexedQueriesMatchScans(self):
+    rng = random.Random(42)
+    resultsDB = ResultsDB(_HypersearchStub())
+    for _ in xrange(10):
+      self._runRandomUpdates(resultsDB, 30, rng)
+      self._checkQueries(resultsDB)
+    self.assertGreater(resultsDB._numHidden, 0)
+
+
+  def testTiedScoresKeepEarliestGeneration(self):
+    resultsDB = ResultsDB(_HypersearchStub())
+    for modelID, genIdx in ((0, 2), (1, 0), (2, 3), (3, 1)):
+      particleState = dict(id="a-%d" % modelID, genIdx=genIdx, swarmId="a",
+                           varStates={"x": {"position": 0.5}})
+      resultsDB.update(modelID=modelID,
+                       modelParams=dict(particleState=particleState),
+                       modelParamsHash=str(modelID), metricResult=1.0,
+                       completed=True,
+                       completionReason=ClientJobsDAO.CMPL_REASON_EOF,
+                       matured=True, numRecords=100)
+
+    for genIdx in (None, 0, 1, 2, 3):
+      self.assertEqual(resultsDB.bestModelIdAndErrScore("a", genIdx), (1, 1.0))
+      self.assertEqual(resultsDB.bestModelIdAndErrScore("a", genIdx),
+                       _scanBestModelIdAndErrScore(resultsDB, "a", genIdx))
+
+
+  def testEmpty(self):
+    resultsDB = ResultsDB(_HypersearchStub())
+    self.assertEqual(resultsDB.getParticleInfos("a"), ([], [], [], [], []))
+    self.assertEqual(resultsDB.getOrphanParticleInfos("a", 0),
+                     ([], [], [], [], []))
+    self.assertEqual(resultsDB.bestModelIdAndErrScore("a", 0), (None, numpy.inf))
+    self.assertEqual(resultsDB.numModels(), 0)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,197 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for the streaming swarm report of permutations_runner."""
+
+import json
+import os
+import shutil
+import tempfile
+
+import unittest2 as unittest
+
+from nupic.database.client_jobs_dao import ClientJobsDAO
+from nupic.database.connection import ConnectionFactory
+from nupic.support.configuration import Configuration
+from nupic.swarming import permutations_runner
+from nupic.swarming.local_executor import LocalSwarmExecutor
+from tests.unit.nupic.swarming.local_executor_test import _makeJobParams
+
+
+
+class SwarmReportTest(unittest.TestCase):
+  """generateReport() unit tests."""
+
+
+  @classmethod
+  def setUpClass(cls):
+    cls.executor = LocalSwarmExecutor(
+      _makeJobParams(maxModels=6, dummyModel={"iterations": 10}),
+      numWorkers=2)
+    cls.executor.run()
+
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.executor.close()
+
+
+  def setUp(self):
+    self.permWorkDir = tempfile.mkdtemp()
+    permutations_runner.gLocalExecutor = self.executor
+    self.jobsDAO = self.executor.jobsDAO
+    self.jobID = self.executor.jobID
+
+
+  def tearDown(self):
+    permutations_runner.gLocalExecutor = None
+    shutil.rmtree(self.permWorkDir)
+
+
+  def _generateReport(self, replaceReport=True, resumeReport=False):
+    options = dict(permutations_runner.DEFAULT_OPTIONS,
+                   permWorkDir=self.permWorkDir, outDir=self.permWorkDir,
+                   genTopNDescriptions=0, resumeReport=resumeReport)
+    permutations_runner._HyperSearchRunner.generateReport(
+      options=options, replaceReport=replaceReport,
+      hyperSearchJob=permutations_runner._HyperSearchJob(self.jobID),
+      metricsKeys=None)
+
+
+  def _readReport(self, suffix):
+    with open(os.path.join(self.permWorkDir, "swarm_out_%s" % suffix)) as f:
+      return f.read()
+
+
+  def testModelsInfoForJob(self):
+    modelIDs = sorted(self.jobsDAO.jobGetModelIDs(self.jobID))
+    pages = [self.jobsDAO.modelsInfoForJob(self.jobID, maxRows=4),
+             self.jobsDAO.modelsInfoForJob(self.jobID, afterModelID=modelIDs[3],
+                                           maxRows=4)]
+    self.assertEqual([[info.modelId for info in page] for page in pages],
+                     [modelIDs[:4], modelIDs[4:]])
+
+
+  def testWritesReportAndSummary(self):
+    self._generateReport()
+
+    modelIDs = sorted(self.jobsDAO.jobGetModelIDs(self.jobID))
+    csvLines = self._readReport("Report.csv").splitlines()
+    self.assertEqual(len(csvLines), len(modelIDs) + 1)
+    records = [json.loads(line)
+               for line in self._readReport("Report.json").splitlines()]
+    self.assertEqual([record["modelID"] for record in records], modelIDs)
+
+    summary = json.loads(self._readReport("ReportSummary.json"))
+    self.assertEqual(summary["numModels"], len(modelIDs))
+    self.assertEqual(summary["modelStats"]["numCompletedEOF"], len(modelIDs))
+    self.assertEqual(summary["totalRecords"], 10 * len(modelIDs))
+    self.assertEqual(sum(swarm["numModels"]
+                         for swarm in summary["swarms"].itervalues()),
+                     len(modelIDs))
+    self.assertIn(summary["bestModelID"], modelIDs)
+
+    state = json.loads(self._readReport("ReportState.json"))
+    self.assertEqual(state["lastModelID"], modelIDs[-1])
+
+
+  def testResumeAfterLastFinishedModel(self):
+    # A model that is still running when the report is first generated
+    params = self.jobsDAO.modelsGetParams(
+      [self.jobsDAO.jobGetModelIDs(self.jobID)[0]])[0].params
+    (modelID, _) = self.jobsDAO.modelInsertAndStart(self.jobID, params,
+                                                    "resumeTest")
+    try:
+      self._generateReport()
+      state = json.loads(self._readReport("ReportState.json"))
+      self.assertLess(state["lastModelID"], modelID)
+
+      self.jobsDAO.modelUpdateResults(modelID, numRecords=10)
+      self.jobsDAO.modelSetCompleted(modelID,
+                                     self.jobsDAO.CMPL_REASON_EOF, "")
+      self._generateReport(replaceReport=False, resumeReport=True)
+      resumed = [self._readReport(suffix)
+                 for suffix in ("Report.csv", "Report.json",
+                                "ReportSummary.json")]
+      self.assertEqual(
+        json.loads(self._readReport("ReportState.json"))["lastModelID"],
+        modelID)
+
+      self._generateReport()
+      self.assertEqual(resumed, [self._readReport(suffix)
+                                 for suffix in ("Report.csv", "Report.json",
+                                                "ReportSummary.json")])
+    finally:
+      self.jobsDAO.modelSetFields(modelID, dict(jobId=None))
+
+
+
+class ClientJobsDAOPagingTest(unittest.TestCase):
+  """ClientJobsDAO.modelsInfoForJob() unit tests."""
+
+
+  def setUp(self):
+    self.databaseDir = tempfile.mkdtemp()
+    Configuration.set("nupic.cluster.database.backend", "sqlite")
+    Configuration.set("nupic.cluster.database.sqliteDir", self.databaseDir)
+    ConnectionFactory.close()
+    ClientJobsDAO._instance = None
+
+    self.dao = ClientJobsDAO.get()
+    self.dao.connect(recreate=True)
+
+
+  def tearDown(self):
+    ConnectionFactory.close()
+    ClientJobsDAO._instance = None
+    Configuration.clear()
+    shutil.rmtree(self.databaseDir)
+
+
+  def testModelsInfoForJob(self):
+    jobIDs = [self.dao.jobInsert(client="test", cmdLine="echo",
+                                 clientInfo="info", clientKey="key%d" % i,
+                                 params="{}")
+              for i in xrange(2)]
+    modelIDs = dict((jobID, []) for jobID in jobIDs)
+    for i in xrange(7):
+      jobID = jobIDs[i % 2]
+      modelIDs[jobID].append(
+        self.dao.modelInsertAndStart(jobID, "{}", "hash%d" % i)[0])
+
+    jobID = jobIDs[0]
+    pages = []
+    afterModelID = None
+    while True:
+      page = self.dao.modelsInfoForJob(jobID, afterModelID=afterModelID,
+                                       maxRows=3)
+      pages.append([info.modelId for info in page])
+      if len(page) < 3:
+        break
+      afterModelID = page[-1].modelId
+
+    self.assertEqual(pages, [modelIDs[jobID][:3], modelIDs[jobID][3:]])
+    self.assertEqual(self.dao.modelsInfoForJob(jobID)[0].params, "{}")
+
+
+
+if __name__ == "__main__":
+  unittest.main()